@@ -1,34 +1,49 @@
+# ✅ ОТСЧЕТ ВРЕМЕНИ ЗАПУСКА - ДО ИМПОРТА БИБЛИОТЕК
+import time
+from modules.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
 import telebot
 from telebot import types
-import pandas as pd
 import datetime
 import os
+import argparse
 import re
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from openpyxl.utils import range_boundaries
 import shutil
 import pathlib
 from dotenv import load_dotenv
-import time
-from num2words import num2words
 import logging
 import pickle
-from typing import Dict, List, Tuple, Optional, Union, Any
-
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
+from typing import Dict, List, Tuple, Optional, Union, Any, Callable
+STARTUP.imported('библиотеки (telebot, requests)')
 
 # ✅ ИМПОРТ МОДУЛЕЙ
 from modules.excel_processor import ExcelProcessor, ExcelProcessingError
 from modules.data_repositories import (RepositoryFactory, WorksRepository, MaterialsRepository, 
                                      AccountingRepository, RepositoryError, DataNotFoundError)
-from modules.document_factory import DocumentFactory, DocumentCreationError
+from modules.document_factory import DocumentFactory
+from modules.order_snapshot import OrderSnapshot, build_draft_text
+from modules.order_pipeline import OrderPipeline
+from modules.async_runtime import AsyncBotRuntime
+from modules.chat_dispatcher import ChatDispatcher, DispatchingTeleBot, DEFAULT_WORKERS
+from modules.webhook_server import WebhookServer
+from modules.session_store import SessionStore, SQLiteSessionBackend
+from modules.callback_router import CallbackRouter
+from modules.telegram_client import TelegramClient
+from modules.photo_ingest import PhotoIngestor, StoredPhoto, telegram_file_url
+from modules.media_group import MediaGroupBuffer
+from modules.email_outbox import EmailOutbox, SMTPSettings
+from modules.work_chat import WorkChatDispatcher, WorkChatPost
+from modules.document_cache import DocumentFileIds, DocumentSender
+from modules.works_search import WorksSearch
+from modules.metrics import METRICS, MetricsServer, process_memory_bytes
+from modules.order_trace import OrderTracer, new_trace_id
+from modules.update_recorder import UpdateRecorder
+from modules.profiling import (HandlerProfiler, ProfileReport, ProfilerBusyError,
+                               MODES as PROFILE_MODES, DEFAULT_SECONDS as PROFILE_SECONDS)
 from modules.admin_panel import AdminPanel
 from modules.navigation_manager import NavigationManager  # ✅ НОВЫЙ ИМПОРТ
+STARTUP.imported('модули бота')
 
 load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -36,6 +51,10 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 DEBUG_MODE = False
 CHAT_ID = "-1003145822387"
 
+# ✅ РЕДАКТИРОВАНИЕ СПИСКОВ ВЫБОРА: edited - запрос к Telegram, skipped - без изменений, без запроса
+SELECTION_EDITS = METRICS.counter('tsm_selection_edits_total', 'Редактирование списков работ и материалов',
+                                  ('result',))
+
 # ✅ КОНКРЕТНЫЕ ИСКЛЮЧЕНИЯ ДЛЯ BOT.PY
 class BotProcessingError(Exception):
     """Базовая ошибка обработки бота"""
@@ -71,11 +90,27 @@ class AccountingError(BotProcessingError):
 
 
 class TruckServiceManagerBot:
-    def __init__(self, token: str) -> None:
-        self.bot = telebot.TeleBot(token)
+    def __init__(self, token: str, runtime: str = 'sync', workers: int = DEFAULT_WORKERS,
+                 fast_start: bool = False, startup: Optional[StartupProfiler] = None) -> None:
+        # ✅ ПРОФИЛЬ ЗАПУСКА; fast_start - ШАГИ, НЕ НУЖНЫЕ ДЛЯ ПЕРВОГО ОБНОВЛЕНИЯ, ИДУТ В ФОНЕ
+        self.startup = startup or StartupProfiler()
+        self.startup.background = fast_start
+        
+        # ✅ ОБНОВЛЕНИЯ ОДНОГО ЧАТА - ПО ОЧЕРЕДИ, РАЗНЫХ ЧАТОВ - ПАРАЛЛЕЛЬНО
+        self.dispatcher = ChatDispatcher(workers)
+        self.dispatcher.on_first_task = self.startup.first_update
+        
+        # ✅ РЕЖИМ РАБОТЫ: sync - TeleBot, async - AsyncTeleBot + asyncio
+        self.runtime: Optional[AsyncBotRuntime] = None
+        if runtime == 'async':
+            self.runtime = AsyncBotRuntime(token, self.dispatcher)
+            self.bot = self.runtime.bot
+        else:
+            self.bot = DispatchingTeleBot(token, self.dispatcher)
+        # Прием обновлений: к нему подключается запись для воспроизведения (start_update_recording)
+        self.receiver = self.runtime or self.bot
         self.excel_processor = ExcelProcessor()
         self.document_factory = DocumentFactory(self.excel_processor)
-        self.user_sessions: Dict[int, Dict[str, Any]] = {}
         self.chat_id = CHAT_ID
         
         # ✅ КОНСТАНТЫ СИСТЕМЫ
@@ -83,23 +118,77 @@ class TruckServiceManagerBot:
         self.MATERIALS_PER_PAGE = 8
         self.MAX_RETRIES = 3
         self.RETRY_DELAY = 1
+        self.WORK_PICK_PREFIX = "➕ Работа: "
+        
+        # ✅ ОТПРАВКИ В TELEGRAM - С ОГРАНИЧЕНИЕМ СКОРОСТИ И ПОВТОРАМИ (429, сеть, 5xx)
+        self.bot = TelegramClient(self.bot, max_retries=self.MAX_RETRIES, retry_delay=self.RETRY_DELAY)
+        
+        # ✅ ИНДЕКСЫ ПОИСКА РАБОТ ДЛЯ INLINE-РЕЖИМА (@бот фрагмент названия)
+        self.works_search = WorksSearch()
+        
+        with self.startup.step('папки и логирование'):
+            self.setup_directories()
+            self.setup_logging()
+        
+        # ✅ ТРАССЫ ЗАКАЗОВ: ЭТАПЫ КАЖДОГО ЗАКАЗА В JSONL (ORDER_TRACE=0 - ВЫКЛЮЧЕНО)
+        self.tracer = OrderTracer(self.main_folder / "Логи" / "order_traces.jsonl"
+                                  if os.getenv('ORDER_TRACE', '1') != '0' else None)
+        with self.startup.step('репозитории'):
+            self.setup_repositories()
+        with self.startup.step('хранилище сессий'):
+            self.setup_session_store()
+        with self.startup.step('очередь писем'):
+            self.setup_email_outbox()
+        
+        # ✅ file_id ОТПРАВЛЕННЫХ ДОКУМЕНТОВ - РАБОЧИЙ ЧАТ, РУКОВОДИТЕЛИ И /resend БЕЗ ПОВТОРНОЙ ЗАГРУЗКИ
+        self.document_file_ids = DocumentFileIds(self.main_folder / "cache" / "document_file_ids.json")
+        self.documents = DocumentSender(self.bot, self.document_file_ids)
+        self.supervisor_chat_ids = [int(chat_id) for chat_id in os.getenv('SUPERVISOR_CHAT_IDS', '').split(',')
+                                    if chat_id.strip()]
+        
+        # ✅ ПРОФИЛИРОВАНИЕ ПО КОМАНДЕ /profile - ТОЛЬКО ДЛЯ ADMIN_IDS
+        self.admin_ids = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
+        self.profiler = HandlerProfiler([self.dispatcher], self.main_folder / "Логи" / "profiles",
+                                        on_report=self._send_profile_report)
+        
+        # ✅ КОНВЕЙЕР ЗАВЕРШЕНИЯ ЗАКАЗОВ
+        self.order_pipeline = OrderPipeline(self.document_factory, self.accounting_repository, tracer=self.tracer)
+        
+        # ✅ ФОНОВАЯ ЗАГРУЗКА ФОТО (потоком на диск, имена по хэшу содержимого)
+        self.photo_ingestor = PhotoIngestor(self.bot.get_file, telegram_file_url(self.bot.token),
+                                            max_retries=self.MAX_RETRIES, retry_delay=self.RETRY_DELAY)
+        
+        # ✅ ОЧЕРЕДЬ ПУБЛИКАЦИЙ В РАБОЧИЙ ЧАТ (один поток, лимит группы Telegram)
+        self.work_chat = WorkChatDispatcher(self.bot, self.chat_id)
+        
+        # ✅ АЛЬБОМ ИЗ НЕСКОЛЬКИХ ФОТО - ОДНА ПАЧКА В ОЧЕРЕДИ ЧАТА
+        self.media_groups = MediaGroupBuffer(
+            lambda chat_id, messages: self.dispatcher.submit(chat_id, self.handle_photo_batch, chat_id, messages)
+        )
         
-        self.setup_directories()
-        self.setup_logging()
-        self.setup_repositories()
-        self.setup_handlers()
-        self.setup_bot_menu()
-        
-        # ✅ СОЗДАЕМ АДМИН-ПАНЕЛЬ
-        self.admin_panel = AdminPanel(self.bot)
-        self.admin_panel.excel_processor = self.excel_processor
+        with self.startup.step('обработчики'):
+            self.setup_handlers()
+        # ✅ МЕНЮ КОМАНД - ЗАПРОС К TELEGRAM, ОБНОВЛЕНИЯ МОЖНО ПРИНИМАТЬ И БЕЗ НЕГО
+        self.startup.run('меню бота', self.setup_bot_menu)
         
-        # ✅ ИНИЦИАЛИЗИРУЕМ НОВУЮ НАВИГАЦИЮ
-        self.navigation = NavigationManager(self.bot)
+        with self.startup.step('админ-панель и навигация'):
+            # ✅ СОЗДАЕМ АДМИН-ПАНЕЛЬ
+            self.admin_panel = AdminPanel(self.bot)
+            self.admin_panel.excel_processor = self.excel_processor
+            
+            # ✅ ИНИЦИАЛИЗИРУЕМ НОВУЮ НАВИГАЦИЮ
+            self.navigation = NavigationManager(self.bot)
+            
+            # ✅ ПЕРЕДАЕМ ЗАВИСИМОСТИ В НАВИГАЦИЮ
+            self.navigation.set_dependencies(self.admin_panel, self.excel_processor)
+            self.navigation.set_sections(self.sections)
+            
+            # ✅ МАРШРУТЫ CALLBACK-КНОПОК
+            self.setup_callback_routes()
         
-        # ✅ ПЕРЕДАЕМ ЗАВИСИМОСТИ В НАВИГАЦИЮ
-        self.navigation.set_dependencies(self.admin_panel, self.excel_processor)
-        self.navigation.set_sections(self.sections)
+        self.metrics_server: Optional[MetricsServer] = None
+        self.update_recorder: Optional[UpdateRecorder] = None
+        self.setup_metrics()
         
         print("🤖 TruckService Manager запущен с новой навигацией!")
 
@@ -113,15 +202,133 @@ class TruckServiceManagerBot:
             self.materials_repository: MaterialsRepository = RepositoryFactory.create_materials_repository(
                 self.main_folder
             )
+            # ✅ ФАЙЛЫ УЧЕТА (pandas + Excel) - ОТДЕЛЬНЫМ ШАГОМ, В БЫСТРОМ РЕЖИМЕ В ФОНЕ
             self.accounting_repository: AccountingRepository = RepositoryFactory.create_accounting_repository(
-                self.main_folder, self.sections, self.common_accounting_folder
+                self.main_folder, self.sections, self.common_accounting_folder, initialize=False
             )
+            self.startup.run('файлы учета', self.accounting_repository.ensure_initialized)
             
             print("✅ Репозитории данных инициализированы")
             
         except Exception as e:
             raise BotProcessingError(f"Ошибка инициализации репозиториев: {e}") from e
 
+    def setup_session_store(self) -> None:
+        """Сессии пользователей в SQLite: переживают перезапуск, неактивные удаляются по TTL"""
+        ttl_hours = float(os.getenv('SESSION_TTL_HOURS', 48))
+        memory_limit = int(os.getenv('SESSION_MEMORY_LIMIT', 500))
+        self.user_sessions: SessionStore = SessionStore(
+            SQLiteSessionBackend(self.main_folder / "cache" / "sessions.db"),
+            ttl_seconds=ttl_hours * 3600,
+            max_in_memory=memory_limit,
+            rehydrate=self._rehydrate_session
+        )
+        print(f"✅ Хранилище сессий: TTL {ttl_hours:g} ч, в памяти до {memory_limit}")
+
+    def setup_email_outbox(self) -> None:
+        """Очередь писем на диске и фоновый отправитель с одним SMTP-соединением"""
+        self.email_outbox: Optional[EmailOutbox] = None
+        email_from = os.getenv('EMAIL_FROM')
+        email_password = os.getenv('EMAIL_PASSWORD')
+        if not all([os.getenv('EMAIL_TO'), email_from, email_password]):
+            print("⚠️ Email настройки не заданы в .env - отправка по email отключена")
+            return
+        
+        settings = SMTPSettings(
+            host=os.getenv('EMAIL_SMTP_HOST', 'smtp.mail.ru'),
+            port=int(os.getenv('EMAIL_SMTP_PORT', 587)),
+            username=email_from,
+            password=email_password,
+        )
+        self.email_outbox = EmailOutbox(self.main_folder / "cache" / "outbox", settings,
+                                        max_retries=int(os.getenv('EMAIL_MAX_RETRIES', 8)), tracer=self.tracer)
+        pending = len(self.email_outbox.pending())
+        print(f"✅ Очередь писем: {settings.host}:{settings.port}" + (f", ожидают отправки: {pending}" if pending else ""))
+
+    def setup_metrics(self) -> None:
+        """Состояние очередей, сессий и кэшей - снимается при запросе /metrics"""
+        METRICS.collect('tsm_sessions', 'Сессии пользователей (в памяти и в SQLite)',
+                        lambda: len(self.user_sessions))
+        METRICS.collect('tsm_sessions_in_memory', 'Сессии пользователей в памяти',
+                        self.user_sessions.memory_size)
+        METRICS.collect('tsm_process_resident_memory_bytes', 'Резидентная память процесса', process_memory_bytes)
+        METRICS.collect('tsm_dispatcher_queued', 'Обновления в очередях чатов',
+                        lambda: self.dispatcher.stats()['queued'])
+        METRICS.collect('tsm_dispatcher_active_chats', 'Чаты с обновлениями в обработке',
+                        lambda: self.dispatcher.stats()['active_chats'])
+        METRICS.collect('tsm_dispatcher_processed_total', 'Обработанные задачи диспетчера чатов',
+                        lambda: self.dispatcher.stats()['processed'], kind='counter')
+        METRICS.collect('tsm_email_outbox_pending', 'Письма в очереди на отправку',
+                        lambda: len(self.email_outbox.pending()) if self.email_outbox else 0)
+        METRICS.collect('tsm_email_outbox_total', 'События очереди писем',
+                        lambda: dict(self.email_outbox.stats) if self.email_outbox else {},
+                        kind='counter', label='event')
+        METRICS.collect('tsm_work_chat_pending', 'Публикации в очереди рабочего чата', self.work_chat.pending)
+        METRICS.collect('tsm_telegram_api_total', 'Вызовы Telegram API, повторы и ограничения скорости',
+                        lambda: dict(self.bot.stats), kind='counter', label='event')
+        METRICS.collect('tsm_render_cache_total', 'Обращения к кэшу тел документов',
+                        lambda: ({key: value for key, value in self.document_factory.render_cache.stats().items()
+                                  if key != 'entries'} if self.document_factory.render_cache is not None else {}),
+                        kind='counter', label='result')
+        METRICS.collect('tsm_document_file_ids_total', 'Отправки документов: загрузки и повторное использование file_id',
+                        lambda: dict(self.documents.stats), kind='counter', label='event')
+        METRICS.collect('tsm_photo_ingest_total', 'Загрузка фото: скачано, дубликаты, ошибки',
+                        lambda: dict(self.photo_ingestor.stats), kind='counter', label='event')
+
+    def start_metrics_server(self, host: str = '127.0.0.1', port: int = 9100) -> None:
+        """GET /metrics в формате Prometheus на локальном порту"""
+        self.metrics_server = MetricsServer(METRICS, host, port)
+        self.metrics_server.start()
+        print(f"📈 Метрики: {self.metrics_server.url}")
+
+    def start_update_recording(self, path: Optional[pathlib.Path] = None) -> pathlib.Path:
+        """Запись входящих сообщений и нажатий кнопок без личных данных (utils/replay_updates.py)"""
+        path = path or (self.main_folder / "Логи" / "updates" /
+                        f"updates_{datetime.datetime.now():%Y%m%d_%H%M%S}.jsonl")
+        # Выбор работы из inline-поиска - название из справочника, не личные данные
+        self.update_recorder = UpdateRecorder(path, keep_text=lambda text: text.startswith(self.WORK_PICK_PREFIX))
+        self.receiver.recorder = self.update_recorder
+        print(f"📼 Запись обновлений: {path}")
+        return path
+
+    def _rehydrate_session(self, session: Dict[str, Any]) -> None:
+        """Список работ не сохраняется в сессии - загружается заново из репозиториев"""
+        section_id = session.get('section')
+        if not section_id or 'works' in session:
+            return
+        if section_id.startswith('custom_'):
+            session['works'] = self.admin_panel.load_works_from_custom_list(session['custom_list'])
+        else:
+            session['works'] = self.works_repository.get_works(section_id)
+
+    def shutdown(self) -> None:
+        """Остановка фоновых пулов и сохранение сессий"""
+        if self.profiler.active:
+            self.profiler.stop()
+        self.media_groups.flush_all()
+        # ✅ ОБРАБОТЧИКИ В ОЧЕРЕДЯХ ЧАТОВ ДОРАБАТЫВАЮТ: ДОПИСЫВАЮТ СЕССИИ, СТАВЯТ ЗАКАЗЫ
+        self.dispatcher.join(timeout=30)
+        # Продолжения после загрузки фото - снова задачи чатов
+        self.photo_ingestor.shutdown(wait=True)
+        self.dispatcher.join(timeout=30)
+        self.order_pipeline.shutdown(wait=True)
+        self.work_chat.stop()
+        # Сессия aiohttp и цикл событий закрываются после всех отправок
+        if self.runtime:
+            self.runtime.stop()
+        else:
+            self.dispatcher.shutdown(wait=True)
+        self.user_sessions.close()
+        if self.email_outbox:
+            self.email_outbox.stop()
+        self.tracer.close()
+        if self.update_recorder:
+            self.receiver.recorder = None
+            self.update_recorder.close()
+        self.startup.shutdown()
+        if self.metrics_server:
+            self.metrics_server.stop()
+
     def setup_logging(self) -> None:
         """Настраивает расширенное логирование"""
         log_file = self.main_folder / "bot_log.txt"
@@ -141,6 +348,7 @@ class TruckServiceManagerBot:
         menu_commands = [
             types.BotCommand("start", "Запустить бота"),
             types.BotCommand("new_order", "Создать новый заказ-наряд"),
+            types.BotCommand("resend", "Повторно получить документы заказа"),
             types.BotCommand("help", "Помощь по боту")
         ]
         try:
@@ -220,10 +428,26 @@ class TruckServiceManagerBot:
             except Exception as e:
                 self._handle_critical_error(message.chat.id, f"Ошибка при показе помощи: {e}")
 
+        @self.bot.message_handler(commands=['resend'])
+        def resend_documents(message: types.Message) -> None:
+            try:
+                self.resend_order_documents(message)
+            except Exception as e:
+                self._handle_critical_error(message.chat.id, f"Ошибка повторной отправки: {e}")
+
+        @self.bot.message_handler(commands=['profile'])
+        def profile_command(message: types.Message) -> None:
+            try:
+                self.handle_profile_command(message)
+            except Exception as e:
+                self._handle_critical_error(message.chat.id, f"Ошибка профилирования: {e}")
+
         @self.bot.message_handler(commands=['new_order'])
         def start_new_order(message: types.Message) -> None:
             try:
                 chat_id = message.chat.id
+                # ✅ ФОТО ПРЕДЫДУЩЕГО НЕЗАВЕРШЕННОГО ЗАКАЗА НЕ ПОПАДАЮТ В НОВЫЙ
+                self.photo_ingestor.discard(chat_id)
                 if chat_id in self.user_sessions and 'section' in self.user_sessions[chat_id]:
                     self.user_sessions[chat_id].update({
                         'step': 'license_plate',
@@ -244,73 +468,10 @@ class TruckServiceManagerBot:
 
         @self.bot.message_handler(content_types=['photo'])
         def handle_photos(message: types.Message) -> None:
-            try:
-                chat_id = message.chat.id
-                
-                if chat_id not in self.user_sessions:
-                    return
-                    
-                session = self.user_sessions[chat_id]
-                
-                if session.get('step') == 'waiting_photos':
-                    if 'processing' in session and session['processing']:
-                        return
-                    
-                    session['processing'] = True
-                    
-                    try:
-                        if 'photo_file_ids' not in session:
-                            session['photo_file_ids'] = []
-                        
-                        file_id = message.photo[-1].file_id
-                        
-                        if file_id not in session['photo_file_ids']:
-                            session['photo_file_ids'].append(file_id)
-                            
-                            file_info = self.bot.get_file(file_id)
-                            downloaded_file = self.bot.download_file(file_info.file_path)
-                            
-                            photo_index = len(session['photo_file_ids'])
-                            
-                            # ✅ ОПРЕДЕЛЯЕМ ПАПКУ РАЗДЕЛА
-                            if session['section'].startswith('custom_'):
-                                section_folder = pathlib.Path("Пользовательские_списки") / session['custom_list']
-                            else:
-                                section_folder = self.sections[session['section']]['folder']
-
-                            photos_folder = section_folder / "Фото"
-                            
-                            photo_filename = f"{session['license_plate']}_{session.get('order_number', '000')}_{photo_index}.jpg"
-                            photo_path = photos_folder / photo_filename
-                            
-                            with open(photo_path, 'wb') as new_file:
-                                new_file.write(downloaded_file)
-                            
-                            print(f"✅ Фото {photo_index} сохранено: {photo_filename}")
-                        
-                        current_count = len(session['photo_file_ids'])
-                        
-                        photo_names = ["СПЕРЕДИ", "СПРАВА", "СЛЕВА"]
-                        
-                        if current_count < 3:
-                            self.bot.send_message(
-                                chat_id,
-                                f"✅ Фото {current_count} ({photo_names[current_count-1]}) получено!\nОтправьте фото {current_count + 1} ({photo_names[current_count]}):"
-                            )
-                        else:
-                            self.bot.send_message(chat_id, "✅ Все 3 фото получены! Создаю заказ...")
-                            time.sleep(1)
-                            self.finalize_order_with_photos(chat_id)
-                            
-                    except Exception as e:
-                        raise PhotoProcessingError(f"Ошибка обработки фото: {e}") from e
-                    finally:
-                        session['processing'] = False
-                        
-            except PhotoProcessingError as e:
-                self._handle_photo_error(message.chat.id, str(e))
-            except Exception as e:
-                self._handle_critical_error(message.chat.id, f"Критическая ошибка обработки фото: {e}")
+            # ✅ ЧАСТИ АЛЬБОМА СОБИРАЮТСЯ И ОБРАБАТЫВАЮТСЯ ОДНОЙ ПАЧКОЙ
+            if self.media_groups.add(message):
+                return
+            self.handle_photo_batch(message.chat.id, [message])
 
         # ✅ УНИФИЦИРОВАННЫЙ ОБРАБОТЧИК ДЛЯ ТЕКСТА И ДОКУМЕНТОВ
         @self.bot.message_handler(content_types=['text', 'document'])
@@ -373,36 +534,15 @@ class TruckServiceManagerBot:
             except Exception as e:
                 self._handle_critical_error(message.chat.id, f"Ошибка обработки сообщения: {e}")
 
-        # ✅ НОВЫЙ ОБРАБОТЧИК ДЛЯ НАВИГАЦИОННЫХ CALLBACK
-        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('nav:'))
-        def handle_navigation_callbacks(call: types.CallbackQuery) -> None:
-            """Обработчик навигационных callback (новая система)"""
+        # ✅ INLINE-ПОИСК РАБОТ
+        @self.bot.inline_handler(func=lambda query: True)
+        def handle_inline_query(query: types.InlineQuery) -> None:
             try:
-                chat_id = call.message.chat.id
-                action = call.data.replace('nav:', '')
-                
-                print(f"🔍 DEBUG: Навигационный callback: {action} от chat_id={chat_id}")
-                
-                if action == 'back':
-                    self.navigation.handle_back(chat_id)
-                elif action == 'main_menu':
-                    self.navigation.show_main_menu(chat_id)
-                elif action == 'sections_menu':  # ← ДОБАВИТЬ ЭТУ СТРОКУ
-                    self.navigation.show_sections_menu(chat_id)
-                elif action == 'diagnostics':
-                    self.navigation.show_diagnostics_menu(chat_id)
-                elif action == 'help':
-                    self.navigation.show_help(chat_id)
-                else:
-                    self.bot.send_message(chat_id, f"❌ Неизвестное действие: {action}")
-                
-                # Подтверждаем обработку callback
-                self.bot.answer_callback_query(call.id)
-                
+                self.handle_works_inline_query(query)
             except Exception as e:
-                self._handle_critical_error(call.message.chat.id, f"Ошибка навигации: {e}")
+                self.logger.error(f"❌ Ошибка inline-поиска работ: {e}")
 
-        # ✅ СТАРЫЕ ОБРАБОТЧИКИ ОСТАЮТСЯ ДЛЯ ОБРАТНОЙ СОВМЕСТИМОСТИ
+        # ✅ ВСЕ CALLBACK-КНОПКИ - ЧЕРЕЗ МАРШРУТИЗАТОР
         @self.bot.callback_query_handler(func=lambda call: True)
         def handle_callback(call: types.CallbackQuery) -> None:
             try:
@@ -410,32 +550,37 @@ class TruckServiceManagerBot:
             except Exception as e:
                 self._handle_critical_error(call.message.chat.id, f"Ошибка обработки callback: {e}")
 
-    def _send_order_by_email(self, excel_file_path: str, session: Dict[str, Any]) -> bool:
-        """Отправка заказ-наряда по email"""
+    def _send_order_by_email(self, excel_file_path: str, order: OrderSnapshot) -> bool:
+        """Заказ-наряд по email: письмо ставится в очередь, отправка и повторы - в фоне"""
         try:
+            if self.email_outbox is None:
+                print("❌ Email настройки не заданы в .env")
+                return False
+            
             email_to = os.getenv('EMAIL_TO')
             email_from = os.getenv('EMAIL_FROM')
-            email_password = os.getenv('EMAIL_PASSWORD')
             
-            if not all([email_to, email_from, email_password]):
-                print("❌ Email настройки не заданы в .env")
-                return False
+            # ✅ email.mime НУЖЕН ТОЛЬКО ПРИ ОТПРАВКЕ ПИСЬМА
+            from email.mime.multipart import MIMEMultipart
+            from email.mime.base import MIMEBase
+            from email.mime.text import MIMEText
+            from email import encoders
             
             # Создаем сообщение
             msg = MIMEMultipart()
             msg['From'] = email_from
             msg['To'] = email_to
-            msg['Subject'] = f"Заказ-наряд №{session.get('order_number', '000')}"
+            msg['Subject'] = f"Заказ-наряд №{order.order_number}"
             
             # Текст письма
             body = f"""
             Заказ-наряд создан через TruckService Manager
             
             Данные заказа:
-            🚗 Госномер: {session['license_plate']}
-            📅 Дата: {session['date'].strftime('%d.%m.%Y')}
-            🔢 Номер ЗН: {session.get('order_number', '000')}
-            👥 Исполнители: {session['workers']}
+            🚗 Госномер: {order.license_plate}
+            📅 Дата: {order.date_text}
+            🔢 Номер ЗН: {order.order_number}
+            👥 Исполнители: {order.workers}
             
             Файл во вложении.
             """
@@ -463,14 +608,10 @@ class TruckServiceManagerBot:
             
             msg.attach(part)
             
-            # Отправляем через mail.ru
-            server = smtplib.SMTP('smtp.mail.ru', 587)
-            server.starttls()
-            server.login(email_from, email_password)
-            server.send_message(msg)
-            server.quit()
+            # ✅ В ОЧЕРЕДЬ НА ДИСКЕ - ПИСЬМО НЕ ТЕРЯЕТСЯ ПРИ ОШИБКЕ SMTP ИЛИ ПЕРЕЗАПУСКЕ
+            self.email_outbox.enqueue(msg, trace_id=order.trace_id)
             
-            print(f"✅ Заказ отправлен на email: {email_to}")
+            print(f"✅ Заказ поставлен в очередь на email: {email_to}")
             return True
             
         except Exception as e:
@@ -517,7 +658,7 @@ class TruckServiceManagerBot:
         
         self.bot.send_message(
             chat_id,
-            "📸 Прикрепить фотографии автомобиля?\n\n• Да - отправить 3 фото по одному (спереди, справа, слева)\n• Нет - отправить заказ без фото",
+            "📸 Прикрепить фотографии автомобиля?\n\n• Да - отправить 3 фото (спереди, справа, слева) по одному или одним альбомом\n• Нет - отправить заказ без фото",
             reply_markup=markup
         )
 
@@ -525,49 +666,120 @@ class TruckServiceManagerBot:
         session = self.user_sessions[chat_id]
         session['step'] = 'waiting_photos'
         session['photo_file_ids'] = []
-        session['processing'] = False
         
         self.bot.send_message(
             chat_id,
-            "📸 Отправьте 3 фото автомобиля ПО ОДНОМУ в порядке:\n\n1. 📷 СПЕРЕДИ\n2. 📷 СПРАВА\n3. 📷 СЛЕВА\n\nОтправьте первое фото (СПЕРЕДИ):"
+            "📸 Отправьте 3 фото автомобиля ПО ОДНОМУ или ОДНИМ АЛЬБОМОМ в порядке:\n\n1. 📷 СПЕРЕДИ\n2. 📷 СПРАВА\n3. 📷 СЛЕВА\n\nОтправьте первое фото (СПЕРЕДИ):"
         )
 
-    def finalize_order_with_photos(self, chat_id: int) -> None:
-        self._finalize_order_common(chat_id, has_photos=True)
-
-    def _finalize_order_common(self, chat_id: int, has_photos: bool = False) -> None:
-        """УЛУЧШЕННАЯ ОБРАБОТКА ЗАВЕРШЕНИЯ ЗАКАЗА - ТЕПЕРЬ С РАЗДЕЛЕНИЕМ"""
+    def handle_photo_batch(self, chat_id: int, messages: List[types.Message]) -> None:
+        """Фото заказа: одно сообщение или весь альбом сразу. Одно подтверждение на пачку"""
         try:
-            if not self._validate_session(chat_id):
+            if chat_id not in self.user_sessions:
                 return
                 
             session = self.user_sessions[chat_id]
             
-            if not self._validate_order_data(session, chat_id):
+            if session.get('step') != 'waiting_photos':
                 return
             
-            session['order_finalized'] = True
-            
-            if not self._validate_calculations(session, chat_id):
-                return
-            
-            # ✅ СОЗДАНИЕ ФАЙЛОВ ЧЕРЕЗ ФАБРИКУ ДОКУМЕНТОВ
-            success = self._create_order_files_with_factory(session, chat_id, "ДА" if has_photos else "НЕТ")
-            
-            if success:
-                # ОТПРАВКА В ЧАТ
-                self._send_to_work_chat(session, has_photos)
-                self._show_order_result(chat_id, session, "прикреплены (3 фото)" if has_photos else "не прикреплены")
-            else:
-                self.bot.send_message(chat_id, "❌ Не удалось создать файлы заказа")
-            
-            # ОЧИСТКА СЕССИИ ДАЖЕ ПРИ ОШИБКАХ
-            self.cleanup_session(chat_id)
-            
+            # ✅ ФОТО ОДНОГО ЧАТА ОБРАБАТЫВАЮТСЯ ПО ОЧЕРЕДИ (ChatDispatcher)
+            try:
+                if 'photo_file_ids' not in session:
+                    session['photo_file_ids'] = []
+                
+                photos_folder = self._get_section_folder(session['section'], session.get('custom_list')) / "Фото"
+                added = 0
+                
+                for message in messages:
+                    file_id = message.photo[-1].file_id
+                    if file_id in session['photo_file_ids'] or len(session['photo_file_ids']) >= 3:
+                        continue
+                    session['photo_file_ids'].append(file_id)
+                    added += 1
+                    
+                    photo_index = len(session['photo_file_ids'])
+                    photo_filename = f"{session['license_plate']}_{session.get('order_number', '000')}_{photo_index}.jpg"
+                    
+                    # ✅ СКАЧИВАНИЕ В ФОНОВОМ ПУЛЕ (параллельно) - ОБРАБОТЧИК НЕ ЖДЕТ
+                    self.photo_ingestor.submit(chat_id, file_id, photos_folder, photo_filename)
+                
+                current_count = len(session['photo_file_ids'])
+                
+                photo_names = ["СПЕРЕДИ", "СПРАВА", "СЛЕВА"]
+                
+                if current_count < 3:
+                    if added > 1:
+                        received = ", ".join(photo_names[current_count - added:current_count])
+                        text = f"✅ Получено фото: {added} ({received})!\n"
+                    else:
+                        text = f"✅ Фото {current_count} ({photo_names[current_count-1]}) получено!\n"
+                    self.bot.send_message(
+                        chat_id,
+                        text + f"Отправьте фото {current_count + 1} ({photo_names[current_count]}):"
+                    )
+                else:
+                    session['step'] = 'photos_received'
+                    self.bot.send_message(chat_id, "✅ Все 3 фото получены! Создаю заказ...")
+                    # ✅ ЗАВЕРШЕНИЕ - ПРОДОЛЖЕНИЕ ПОСЛЕ СОХРАНЕНИЯ ВСЕХ ФОТО, В ОЧЕРЕДИ ЭТОГО ЧАТА
+                    trace_id, started = session.get('trace_id'), time.perf_counter()
+                    
+                    def on_stored(results: List[Union[StoredPhoto, Exception]]) -> None:
+                        self.tracer.record(trace_id, 'photo_download', time.perf_counter() - started, photos=len(results))
+                        self.dispatcher.submit(chat_id, self._on_photos_stored, chat_id, results)
+                    
+                    self.photo_ingestor.when_done(chat_id, on_stored)
+                    
+            except Exception as e:
+                raise PhotoProcessingError(f"Ошибка обработки фото: {e}") from e
+                
+        except PhotoProcessingError as e:
+            self._handle_photo_error(chat_id, str(e))
         except Exception as e:
-            print(f"❌ Критическая ошибка завершения заказа: {e}")
-            self.bot.send_message(chat_id, "❌ Произошла ошибка при создании заказа. Попробуйте еще раз.")
-            self.cleanup_session(chat_id)
+            self._handle_critical_error(chat_id, f"Критическая ошибка обработки фото: {e}")
+
+    def _on_photos_stored(self, chat_id: int, results: List[Union[StoredPhoto, Exception]]) -> None:
+        """Все фото заказа скачаны (или не удалось) - создаем заказ"""
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.error(f"Фото не сохранено на диск, chat_id {chat_id}: {result}")
+            else:
+                print(f"✅ Фото сохранено: {result.path.name}{' (уже было)' if result.duplicate else ''}")
+        self.finalize_order_with_photos(chat_id)
+
+    def finalize_order_with_photos(self, chat_id: int) -> None:
+        self._finalize_order_common(chat_id, has_photos=True)
+
+    def _finalize_order_common(self, chat_id: int, has_photos: bool = False) -> None:
+        """УЛУЧШЕННАЯ ОБРАБОТКА ЗАВЕРШЕНИЯ ЗАКАЗА - ТЕПЕРЬ С РАЗДЕЛЕНИЕМ"""
+        with self.tracer.span(self._session_trace_id(chat_id), '_finalize_order_common'):
+            try:
+                if not self._validate_session(chat_id):
+                    return
+                
+                session = self.user_sessions[chat_id]
+                
+                if not self._validate_order_data(session, chat_id):
+                    return
+                
+                session['order_finalized'] = True
+                
+                # ✅ СНИМОК ЗАКАЗА: СЧИТАЕТСЯ ОДИН РАЗ И НЕ ЗАВИСИТ ОТ ДАЛЬНЕЙШИХ ИЗМЕНЕНИЙ СЕССИИ
+                order = self._build_order_snapshot(session, has_photos)
+                
+                if not self._validate_calculations(order, chat_id):
+                    return
+                
+                # ✅ СОЗДАНИЕ И ДОСТАВКА ДОКУМЕНТОВ В ФОНОВОМ КОНВЕЙЕРЕ
+                self._submit_order_pipeline(order, chat_id, "прикреплены (3 фото)" if has_photos else "не прикреплены")
+                
+                # ОЧИСТКА СЕССИИ ДАЖЕ ПРИ ОШИБКАХ (конвейер работает со снимком)
+                self.cleanup_session(chat_id)
+                
+            except Exception as e:
+                print(f"❌ Критическая ошибка завершения заказа: {e}")
+                self.bot.send_message(chat_id, "❌ Произошла ошибка при создании заказа. Попробуйте еще раз.")
+                self.cleanup_session(chat_id)
 
     def _validate_session(self, chat_id: int) -> bool:
         """Проверяет валидность сессии"""
@@ -592,14 +804,23 @@ class TruckServiceManagerBot:
                 return False
         return True
 
-    def _validate_calculations(self, session: Dict[str, Any], chat_id: int) -> bool:
+    def _build_order_snapshot(self, session: Dict[str, Any], has_photos: bool) -> OrderSnapshot:
+        """Снимок заказа с именами раздела и шаблона шапки"""
+        if session['section'].startswith('custom_'):
+            section_name = f"📁 {session['custom_list']}"
+        else:
+            section_name = self.sections[session['section']]['name']
+        
+        template_id = session.get('header_template', 'bridge_town')
+        template = self.excel_processor.header_manager.get_template(template_id)
+        template_name = template['name'] if template else "Бриджтаун Фудс"
+        
+        return OrderSnapshot.from_session(session, section_name, template_name, has_photos)
+
+    def _validate_calculations(self, order: OrderSnapshot, chat_id: int) -> bool:
         """Проверяет корректность расчетов сумм"""
         try:
-            works_total = sum(hours for _, hours in session['selected_works']) * 2500
-            materials_total = 375 + 95 + 210 + 120  # Пока оставляем по умолчанию
-            total_amount = works_total + materials_total
-            
-            if total_amount <= 0:
+            if order.total_amount <= 0:
                 raise ValueError("Некорректная сумма заказа")
                 
             return True
@@ -609,167 +830,181 @@ class TruckServiceManagerBot:
             return False
 
     def cleanup_session(self, chat_id: int) -> None:
-        """Очистка сессии пользователя"""
+        """Очистка сессии пользователя и ее незавершенных загрузок фото"""
+        self.photo_ingestor.discard(chat_id)
         if chat_id in self.user_sessions:
             del self.user_sessions[chat_id]
             print(f"✅ Сессия очищена для chat_id: {chat_id}")
 
-    def _send_to_work_chat(self, session: Dict[str, Any], has_photos: bool) -> None:
-        """Отправляет заказ в рабочий чат"""
+    def _send_to_work_chat(self, order: OrderSnapshot) -> None:
+        """Ставит заказ в очередь рабочего чата - доставка не ждет Telegram"""
         try:
             # ✅ ИСПОЛЬЗУЕМ ОБЩИЙ МЕТОД ДЛЯ ОТПРАВКИ В ЧАТ
-            self._send_order_to_work_chat(session, has_photos)
+            started = time.perf_counter()
+            future = self._send_order_to_work_chat(order)
+            future.add_done_callback(lambda done: self._on_work_chat_posted(order, done, started))
         except Exception as e:
             print(f"⚠️ Ошибка отправки в чат: {e}")
             # НЕ ПРЕРЫВАЕМ ВЫПОЛНЕНИЕ ИЗ-ЗА ОШИБКИ ОТПРАВКИ
 
-    def _send_order_to_work_chat(self, session: Dict[str, Any], has_photos: bool) -> None:
-        """ОБЩИЙ МЕТОД ДЛЯ ОТПРАВКИ ЗАКАЗА В РАБОЧИЙ ЧАТ - С ФОТО ИЛИ БЕЗ"""
-        try:
-            # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА
-            if session['section'].startswith('custom_'):
-                section_name = f"📁 {session['custom_list']}"
-            else:
-                section_name = self.sections[session['section']]['name']
+    def _on_work_chat_posted(self, order: OrderSnapshot, future, started: float) -> None:
+        error = future.exception()
+        # Ожидание в очереди рабочего чата + отправка
+        self.tracer.record(order.trace_id, 'work_chat_post', time.perf_counter() - started,
+                           error=type(error).__name__ if error else None)
+        if error:
+            print(f"⚠️ Не удалось отправить заказ №{order.order_number} в чат: {error}")
+        else:
+            photo_status = "прикреплены" if order.has_photos else "не прикреплены"
+            print(f"✅ Заказ отправлен в рабочий чат {self.chat_id}, фото: {photo_status}")
 
-            selected_count = len(session['selected_works'])
-            materials_count = len(session.get('selected_materials', []))
-            total_hours = sum(hours for _, hours in session['selected_works'])
-            
-            # ✅ ПОЛУЧАЕМ ИМЯ ШАБЛОНА ШАПКИ
-            template_id = session.get('header_template', 'bridge_town')
-            template = self.excel_processor.header_manager.get_template(template_id)
-            template_name = template['name'] if template else "Бриджтаун Фудс"
-            
-            # ОТПРАВКА ФОТО ЕСЛИ ЕСТЬ
-            if has_photos:
-                photo_file_ids = session.get('photo_file_ids', [])
-                if photo_file_ids:
-                    print(f"✅ Отправляем {len(photo_file_ids)} фото в чат")
-                    
-                    media = []
-                    for file_id in photo_file_ids[:3]:
-                        media.append(types.InputMediaPhoto(file_id))
-                    
-                    if media:
-                        self.bot.send_media_group(self.chat_id, media)
-                        print(f"✅ Отправлено {len(media)} фото в чат")
-            
-            # ОБЩАЯ ИНФОРМАЦИЯ О ЗАКАЗЕ
-            text_content = self.create_draft_content(session)
-            photo_status = "прикреплены" if has_photos else "не прикреплены"
-            
-            chat_message = f"""
-📋 ЗАКАЗ-НАРЯД №{session.get('order_number', '000')}
+    def _send_order_to_work_chat(self, order: OrderSnapshot):
+        """ОБЩИЙ МЕТОД ДЛЯ ОТПРАВКИ ЗАКАЗА В РАБОЧИЙ ЧАТ - С ФОТО ИЛИ БЕЗ.
+        Фото и текст уходят одним альбомом с подписью, если текст помещается в подпись"""
+        photo_file_ids = tuple(order.photo_file_ids[:3]) if order.has_photos else ()
+        photo_status = "прикреплены" if order.has_photos else "не прикреплены"
+        
+        # ОБЩАЯ ИНФОРМАЦИЯ О ЗАКАЗЕ
+        chat_message = f"""
+📋 ЗАКАЗ-НАРЯД №{order.order_number}
 
-{text_content}
+{order.draft_text}
 
-🏗️ Раздел: {section_name}
-🏢 Шаблон: {template_name}
-📊 Работ: {selected_count}
-📦 Материалов: {materials_count}
-⏱️ Время: {total_hours:.1f} н/ч
+🏗️ Раздел: {order.section_name}
+🏢 Шаблон: {order.template_name}
+📊 Работ: {order.works_count}
+📦 Материалов: {order.materials_count}
+⏱️ Время: {order.total_hours:.1f} н/ч
 📸 Фото: {photo_status}
 
 ✅ Создан через @TSM_Auto_bot
             """
-            
-            self.bot.send_message(self.chat_id, chat_message)
-            print(f"✅ Заказ отправлен в рабочий чат {self.chat_id}, фото: {photo_status}")
-            
-        except Exception as e:
-            print(f"⚠️ Не удалось отправить заказ в чат: {e}")
-            raise  # Пробрасываем исключение для обработки в вызывающем коде
-
-        # ОТПРАВКА СООБЩЕНИЯ 
-        #self.bot.send_message(1364203895, f"✅ Заказ №{session.get('order_number', '000')} создан!")
-
-    def _create_order_files_with_factory(self, session: Dict[str, Any], chat_id: int, photos_text: str) -> bool:
-        """СОЗДАНИЕ ФАЙЛОВ ЧЕРЕЗ ФАБРИКУ ДОКУМЕНТОВ - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
-        try:
-            # ✅ ОПРЕДЕЛЯЕМ ПУТЬ ДЛЯ СОХРАНЕНИЯ: стандартный раздел ИЛИ пользовательский список
-            if session['section'].startswith('custom_'):
-                # Пользовательский список - используем его папку
-                list_name = session['custom_list']
-                section_folder = pathlib.Path("Пользовательские_списки") / list_name
-            else:
-                # Стандартный раздел
-                section_id = session['section']
-                section_folder = self.sections[section_id]['folder']
-            
-            # ✅ ИСПОЛЬЗУЕМ ФАБРИКУ ДЛЯ СОЗДАНИЯ ВСЕХ ДОКУМЕНТОВ
-            documents = self.document_factory.create_all(session, section_folder)
-            
-            if not documents:
-                raise DocumentCreationError("Не удалось создать документы через фабрику")
-            
-            # ✅ ПОЛУЧАЕМ ИМЕНА ФАЙЛОВ ДЛЯ УЧЕТА
-            excel_filename = documents.get('excel', pathlib.Path()).name
-            draft_filename = documents.get('text', pathlib.Path()).name
-            
-            # ✅ СОХРАНЯЕМ ИМЯ ЧЕРНОВИКА В СЕССИИ ДЛЯ УЧЕТА
-            session['draft_filename'] = draft_filename
-            
-            # ✅ СОХРАНЯЕМ В УЧЕТ С ПРАВИЛЬНЫМИ ИМЕНАМИ ФАЙЛОВ
-            accounting_success = self.accounting_repository.save_order(session, excel_filename, photos_text)
-            
-            # Отправляем созданные документы пользователю
-            for doc_type, doc_path in documents.items():
-                try:
-                    with open(doc_path, 'rb') as doc_file:
-                        caption = f"📄 {doc_type.upper()} документ"
-                        self.bot.send_document(chat_id, doc_file, caption=caption)
-                        print(f"✅ {doc_type} документ отправлен пользователю: {doc_path}")
-                except Exception as e:
-                    print(f"⚠️ Не удалось отправить {doc_type} документ: {e}")
-            
-            # Отправка на email
-            excel_path = documents.get('excel')
-            if excel_path and os.path.exists(excel_path):
-                self._send_order_by_email(str(excel_path), session)
+        
+        title = f"📋 ЗАКАЗ-НАРЯД №{order.order_number}\n🚗 Госномер: {order.license_plate}"
+        # Документы уже загружены при отправке пользователю - в чат уходят по file_id
+        document_file_ids = tuple(self.document_file_ids.documents(order.base_filename).values())
+        return self.work_chat.submit(WorkChatPost(chat_message, photo_file_ids, title, document_file_ids))
 
-            return True
-            
-        except DocumentCreationError as e:
-            print(f"❌ Ошибка создания документов через фабрику: {e}")
-            self.bot.send_message(chat_id, f"❌ Ошибка создания документов: {e}")
-            return False
-        except Exception as e:
-            print(f"❌ Неожиданная ошибка создания файлов: {e}")
-            self.bot.send_message(chat_id, f"❌ Неожиданная ошибка создания файлов: {e}")
-            return False
+    def _send_documents_to_supervisors(self, order: OrderSnapshot) -> None:
+        """Копии документов руководителям (SUPERVISOR_CHAT_IDS) по file_id"""
+        for supervisor_id in self.supervisor_chat_ids:
+            try:
+                self.documents.resend(supervisor_id, order.base_filename)
+            except Exception as e:
+                print(f"⚠️ Документы заказа №{order.order_number} не отправлены руководителю {supervisor_id}: {e}")
 
-    def _show_order_result(self, chat_id: int, session: Dict[str, Any], photo_status: str) -> None:
-        selected_count = len(session['selected_works'])
-        materials_count = len(session.get('selected_materials', []))
-        total_hours = sum(hours for _, hours in session['selected_works'])
+    def resend_order_documents(self, message: types.Message) -> None:
+        """/resend [номер ЗН] - документы заказа техника по file_id (без номера - последний заказ)"""
+        chat_id = message.chat.id
+        parts = (message.text or '').split(maxsplit=1)
+        order_number = parts[1].strip().lstrip('№') if len(parts) > 1 else None
+        
+        order_keys = self.document_file_ids.find(order_number, owner=chat_id)
+        if not order_keys:
+            target = f"заказа №{order_number}" if order_number else "ваших заказов"
+            self.bot.send_message(chat_id, f"❌ Документы {target} не найдены")
+            return
+        
+        sent = self.documents.resend(chat_id, order_keys[0])
+        print(f"✅ /resend: {sent} документ(ов) заказа {order_keys[0]} для chat_id={chat_id}")
 
-        # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
-        if session['section'].startswith('custom_'):
-            section_name = f"📁 {session['custom_list']}"  # Имя пользовательского списка
-        else:
-            section_name = self.sections[session['section']]['name']
+    def handle_profile_command(self, message: types.Message) -> None:
+        """/profile start [секунд] [cprofile|sample] | /profile stop - окно профилирования обработчиков"""
+        chat_id = message.chat.id
+        if message.from_user is None or message.from_user.id not in self.admin_ids:
+            self.bot.send_message(chat_id, "⛔ Команда доступна только администраторам")
+            return
         
-        # ✅ ПОЛУЧАЕМ ИМЯ ШАБЛОна ШАПКИ
-        template_id = session.get('header_template', 'bridge_town')
-        template = self.excel_processor.header_manager.get_template(template_id)
-        template_name = template['name'] if template else "Бриджтаун Фудс"
+        args = (message.text or '').split()[1:]
+        action = args[0].lower() if args else ''
+        if action == 'start':
+            seconds = next((float(arg) for arg in args[1:] if arg.replace('.', '', 1).isdigit()), PROFILE_SECONDS)
+            mode = next((arg.lower() for arg in args[1:] if arg.lower() in PROFILE_MODES), 'cprofile')
+            try:
+                seconds = self.profiler.start(mode, seconds, owner=chat_id)
+            except ProfilerBusyError as e:
+                self.bot.send_message(chat_id, f"⚠️ {e}. Остановить: /profile stop")
+                return
+            self.bot.send_message(chat_id, f"🔬 Профилирование {mode} запущено на {seconds:g} с.\n"
+                                           f"Отчет придет сюда. Остановить раньше: /profile stop")
+        elif action == 'stop':
+            if self.profiler.stop() is None:
+                self.bot.send_message(chat_id, "ℹ️ Профилирование не запущено")
+        else:
+            state = f"идет ({self.profiler.mode})" if self.profiler.active else "выключено"
+            self.bot.send_message(chat_id, f"🔬 Профилирование: {state}\n\n"
+                                           f"/profile start [секунд] [{'|'.join(PROFILE_MODES)}]\n/profile stop")
+
+    def _send_profile_report(self, report: ProfileReport, chat_id: int) -> None:
+        """Топ функций и файл pstats - администратору, запустившему профилирование"""
+        if chat_id is None:
+            return
+        text = report.text if len(report.text) <= 4000 else report.text[:4000] + "\n..."
+        self.bot.send_message(chat_id, text)
+        if report.path:
+            with open(report.path, 'rb') as file:
+                self.bot.send_document(chat_id, file, caption=f"📊 {report.path.name} (python -m pstats)")
+        print(f"✅ Отчет профилирования отправлен: chat_id={chat_id}")
+
+    def _get_order_section_folder(self, order: OrderSnapshot) -> pathlib.Path:
+        """Папка раздела: стандартный раздел ИЛИ пользовательский список"""
+        return self._get_section_folder(order.section, order.custom_list)
+
+    def _get_section_folder(self, section: str, custom_list: Optional[str] = None) -> pathlib.Path:
+        if section.startswith('custom_'):
+            return pathlib.Path("Пользовательские_списки") / custom_list
+        return self.sections[section]['folder']
+
+    def _submit_order_pipeline(self, order: OrderSnapshot, chat_id: int, photo_status: str):
+        """Рендеринг -> учет -> параллельная доставка (пользователю, email, рабочий чат)"""
+        
+        order_key = order.base_filename
+        
+        def send_document(doc_type: str, doc_path: pathlib.Path) -> None:
+            # Первая отправка загружает файл, file_id запоминается для рабочего чата и /resend
+            self.documents.send(chat_id, order_key, doc_type, doc_path, caption=f"📄 {doc_type.upper()} документ",
+                                order_number=order.order_number, owner=chat_id)
+            print(f"✅ {doc_type} документ отправлен пользователю: {doc_path}")
+        
+        def send_email(documents: Dict[str, pathlib.Path]) -> None:
+            excel_path = documents.get('excel')
+            if excel_path and os.path.exists(excel_path):
+                self._send_order_by_email(str(excel_path), order)
         
+        def on_complete(result: Dict[str, Any]) -> None:
+            if result['success']:
+                self._show_order_result(chat_id, order, photo_status)
+            else:
+                self.bot.send_message(chat_id, f"❌ Ошибка создания документов: {'; '.join(result['errors'])}")
+        
+        return self.order_pipeline.submit(
+            order,
+            self._get_order_section_folder(order),
+            on_document=send_document,
+            deliveries={'email': send_email},
+            on_complete=on_complete,
+            document_deliveries={
+                'work_chat': lambda documents: self._send_to_work_chat(order),
+                'supervisors': lambda documents: self._send_documents_to_supervisors(order),
+            }
+        )
+
+    def _show_order_result(self, chat_id: int, order: OrderSnapshot, photo_status: str) -> None:
         result_text = f"""✅ Заказ-наряд успешно создан!
 
-🏗️ {section_name}
-🏢 Шаблон: {template_name}
+🏗️ {order.section_name}
+🏢 Шаблон: {order.template_name}
 
 Данные заказа:
-🚗 Госномер: {session['license_plate']}
-📅 Дата: {session['date'].strftime('%d.%m.%Y')}
-🔢 Номер ЗН: {session.get('order_number', '000')}
-👥 Исполнители: {session['workers']}
+🚗 Госномер: {order.license_plate}
+📅 Дата: {order.date_text}
+🔢 Номер ЗН: {order.order_number}
+👥 Исполнители: {order.workers}
 
 Статистика:
-📊 Выбрано работ: {selected_count}
-📦 Выбрано материалов: {materials_count}
-⏱️ Общее время: {total_hours:.1f} н/ч
+📊 Выбрано работ: {order.works_count}
+📦 Выбрано материалов: {order.materials_count}
+⏱️ Общее время: {order.total_hours:.1f} н/ч
 📸 Фото: {photo_status}
 
 💬 Заказ отправлен в рабочий чат
@@ -908,11 +1143,13 @@ class TruckServiceManagerBot:
             'license_plate': self._handle_license_plate_input,
             'date': self._handle_date_input, 
             'order_number': self._handle_order_number_input,
-            'workers': self._handle_workers_input
+            'workers': self._handle_workers_input,
+            'selecting_works': self._handle_works_search_pick
         }
         
         if current_step in step_handlers:
-            step_handlers[current_step](message, session)
+            with self.tracer.span(session.get('trace_id'), f"message:{current_step}"):
+                step_handlers[current_step](message, session)
         else:
             self.bot.send_message(chat_id, "Неизвестный шаг. Начните с /start")
 
@@ -959,6 +1196,71 @@ class TruckServiceManagerBot:
         else:
             self.bot.send_message(message.chat.id, result)
 
+    def _works_catalog_key(self, session: Dict[str, Any]) -> str:
+        if session['section'].startswith('custom_'):
+            return f"custom:{session['custom_list']}"
+        return session['section']
+
+    def handle_works_inline_query(self, query: types.InlineQuery) -> None:
+        """Inline-поиск по списку работ текущего заказа: "@бот накладка лев" """
+        session = self.user_sessions.get(query.from_user.id)
+        if not session or session.get('step') != 'selecting_works' or not session.get('works'):
+            self.bot.answer_inline_query(
+                query.id, [], cache_time=0, is_personal=True,
+                button=types.InlineQueryResultsButton("📋 Сначала начните заказ-наряд", start_parameter="new_order")
+            )
+            return
+        
+        works = session['works']
+        offset = int(query.offset) if query.offset.isdigit() else 0
+        work_ids, next_offset = self.works_search.search(self._works_catalog_key(session), works, query.query, offset)
+        
+        results = []
+        for work_id in work_ids:
+            name, hours = works[work_id]
+            icon = "✅ " if (name, hours) in session['selected_works'] else ""
+            results.append(types.InlineQueryResultArticle(
+                id=str(work_id),
+                title=name,
+                description=f"{icon}⏱️ {hours} н/ч - {hours * 2500:,.0f} руб.",
+                input_message_content=types.InputTextMessageContent(f"{self.WORK_PICK_PREFIX}{name}")
+            ))
+        # Выбор зависит от пользователя - ответы не кэшируются
+        self.bot.answer_inline_query(query.id, results, cache_time=0, is_personal=True,
+                                     next_offset=str(next_offset) if next_offset else "")
+
+    def _handle_works_search_pick(self, message: types.Message, session: Dict[str, Any]) -> None:
+        """Работа, выбранная в inline-поиске, добавляется к заказу"""
+        chat_id = message.chat.id
+        text = message.text or ''
+        if not text.startswith(self.WORK_PICK_PREFIX):
+            self.bot.send_message(chat_id, "🛠️ Выберите работы кнопками или через 🔍 Поиск работ")
+            return
+        
+        name = text[len(self.WORK_PICK_PREFIX):].strip()
+        work = next((work for work in session.get('works', []) if work[0] == name), None)
+        if work is None:
+            self.bot.send_message(chat_id, f"❌ Работа не найдена в текущем списке: {name}")
+            return
+        if work not in session['selected_works']:
+            session['selected_works'].append(work)
+        
+        # Служебное сообщение с выбранной работой не нужно - отметка появится в списке работ
+        try:
+            self.bot.delete_message(chat_id, message.message_id)
+        except Exception:
+            pass
+        
+        works_message_id = session.get('works_message_id')
+        if works_message_id:
+            text, markup = self._build_works_view(session, session.get('current_page', 0))
+            works_message = types.Message.de_json({
+                'message_id': works_message_id, 'date': 1, 'chat': {'id': chat_id, 'type': 'private'}
+            })
+            if self._edit_selection_message(works_message, text, markup):
+                return
+        self.show_works_selection(chat_id, session.get('current_page', 0))
+
     def ask_license_plate(self, chat_id: int) -> None:
         """Запрос госномера после выбора шапки"""
         # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
@@ -1023,13 +1325,13 @@ class TruckServiceManagerBot:
             for template in templates:
                 markup.add(types.InlineKeyboardButton(
                     template['name'],
-                    callback_data=f"header_{template['id']}"
+                    callback_data=f"header:{template['id']}"
                 ))
             
             # Кнопка "По умолчанию" для обратной совместимости
             markup.add(types.InlineKeyboardButton(
                 "🏢 Бриджтаун Фудс (по умолчанию)",
-                callback_data="header_bridge_town"
+                callback_data="header:bridge_town"
             ))
             
             self.bot.send_message(
@@ -1060,76 +1362,15 @@ class TruckServiceManagerBot:
             )
             return
         
-        # ✅ ИСПОЛЬЗУЕМ КОНСТАНТУ
-        start_index = page * self.WORKS_PER_PAGE
-        end_index = start_index + self.WORKS_PER_PAGE
-        current_works = works[start_index:end_index]
-        
-        selected_count = len(session['selected_works'])
-        total_hours = sum(hours for _, hours in session['selected_works'])
-        total_cost = total_hours * 2500
-        total_pages = (len(works) + self.WORKS_PER_PAGE - 1) // self.WORKS_PER_PAGE
-        
-        # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
-        if session['section'].startswith('custom_'):
-            section_name = f"📁 {session['custom_list']}"  # Имя пользовательского списка
-        else:
-            section_name = self.sections[session['section']]['name']
-        
-        text = f"🏗️ {section_name}\n\n"
-        text += f"📋 Выбор работ (стр. {page + 1}/{total_pages})\n\n"
-        text += f"✅ Выбрано: {selected_count} работ\n"
-        text += f"⏱️ Время: {total_hours:.1f} н/ч\n"
-        text += f"💰 Стоимость работ: {total_cost:,.0f} руб.\n\n"
-        text += "🛠️ Выберите работы:\n"
-        
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        
-        for i, (name, hours) in enumerate(current_works):
-            global_index = start_index + i
-            is_selected = (name, hours) in session['selected_works']
-            icon = "✅" if is_selected else "⚪"
-            cost = hours * 2500
-            short_name = name[:35] + "..." if len(name) > 38 else name
-            button_text = f"{icon} {short_name} ({hours}ч - {cost:,.0f}р)"
-            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"work_{global_index}"))
-        
-        navigation_buttons = []
-        if page > 0:
-            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page_works_{page-1}"))
-        
-        navigation_buttons.append(types.InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="current_page"))
-        
-        if page < total_pages - 1:
-            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page_works_{page+1}"))
-        
-        if navigation_buttons:
-            markup.row(*navigation_buttons)
-        
-        action_buttons = []
-        if selected_count > 0:
-            # ✅ УБРАНА КНОПКА "Выбрать шапку" - шапка выбирается раньше
-            action_buttons.append(types.InlineKeyboardButton("📦 К материалам", callback_data="select_materials"))
-            action_buttons.append(types.InlineKeyboardButton("🔄 Сбросить работы", callback_data="reset_works"))
-        else:
-            # ✅ УБРАНА КНОПКА "Выбрать шапку" - шапка выбирается раньше
-            action_buttons.append(types.InlineKeyboardButton("📦 К материалам", callback_data="select_materials"))
-        
-        markup.row(*action_buttons)
-        
-        self.bot.send_message(chat_id, text, reply_markup=markup)        
+        text, markup = self._build_works_view(session, page)
+        works_message = self.bot.send_message(chat_id, text, reply_markup=markup)
+        # Работы, выбранные через поиск, отмечаются в этом же сообщении
+        session['works_message_id'] = getattr(works_message, 'message_id', None)
 
     def show_materials_selection(self, chat_id: int, page: int = 0) -> None:
         """ИНТЕРФЕИС ВЫБОРА МАТЕРИАЛОВ"""
         session = self.user_sessions[chat_id]
-        
-        # Загружаем материалы если еще не загружены
-        if 'materials' not in session:
-            # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
-            materials = self.materials_repository.get_materials()
-            session['materials'] = materials
-        else:
-            materials = session['materials']
+        materials = self._get_session_materials(session)
         
         if not materials:
             # Если материалов нет, пропускаем этот шаг
@@ -1139,64 +1380,45 @@ class TruckServiceManagerBot:
         
         session['current_materials_page'] = page
         
-        # ✅ ИСПОЛЬЗУЕМ КОНСТАНТУ
-        start_index = page * self.MATERIALS_PER_PAGE
-        end_index = start_index + self.MATERIALS_PER_PAGE
-        current_materials = materials[start_index:end_index]
+        text, markup = self._build_materials_view(session, page)
+        self.bot.send_message(chat_id, text, reply_markup=markup)
+
+    def update_works_message(self, message: types.Message, session: Dict[str, Any], page: Optional[int] = None) -> None:
+        """Перерисовка списка работ в том же сообщении (переключение работы или страницы)"""
+        if page is None:
+            page = session.get('current_page', 0)
+        session['current_page'] = page
         
-        selected_count = len(session.get('selected_materials', []))
-        total_pages = (len(materials) + self.MATERIALS_PER_PAGE - 1) // self.MATERIALS_PER_PAGE
+        text, markup = self._build_works_view(session, page)
+        self._edit_selection_message(message, text, markup)
+
+    def update_materials_message(self, message: types.Message, session: Dict[str, Any], page: Optional[int] = None) -> None:
+        """Перерисовка списка материалов в том же сообщении (переключение материала или страницы)"""
+        if page is None:
+            page = session.get('current_materials_page', 0)
+        session['current_materials_page'] = page
         
+        self._get_session_materials(session)
+        text, markup = self._build_materials_view(session, page)
+        self._edit_selection_message(message, text, markup)
+
+    def _get_session_materials(self, session: Dict[str, Any]) -> List[str]:
+        # Загружаем материалы если еще не загружены
+        if 'materials' not in session:
+            # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
+            session['materials'] = self.materials_repository.get_materials()
+        return session['materials']
+
+    def _get_section_display_name(self, session: Dict[str, Any]) -> str:
         # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
         if session['section'].startswith('custom_'):
-            section_name = f"📁 {session['custom_list']}"  # Имя пользовательского списка
-        else:
-            section_name = self.sections[session['section']]['name']
-        
-        text = f"🏗️ {section_name}\n\n"
-        text += f"📦 Выбор материалов (стр. {page + 1}/{total_pages})\n\n"
-        text += f"✅ Выбрано: {selected_count} материалов\n\n"
-        text += "🎯 Выберите материалы (опционально):\n"
-        
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        
-        for i, material_name in enumerate(current_materials):
-            global_index = start_index + i
-            is_selected = material_name in session.get('selected_materials', [])
-            icon = "✅" if is_selected else "⚪"
-            short_name = material_name[:35] + "..." if len(material_name) > 38 else material_name
-            button_text = f"{icon} {short_name}"
-            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"material_{global_index}"))
-        
-        navigation_buttons = []
-        if page > 0:
-            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page_materials_{page-1}"))
-        
-        navigation_buttons.append(types.InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="current_page"))
-        
-        if page < total_pages - 1:
-            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page_materials_{page+1}"))
-        
-        if navigation_buttons:
-            markup.row(*navigation_buttons)
-        
-        action_buttons = []
-        if selected_count > 0:
-            action_buttons.append(types.InlineKeyboardButton("📸 Далее к фото", callback_data="create_order"))
-            action_buttons.append(types.InlineKeyboardButton("🔄 Сбросить материалы", callback_data="reset_materials"))
-        else:
-            action_buttons.append(types.InlineKeyboardButton("⏭️ Пропустить материалы", callback_data="skip_materials"))
-            action_buttons.append(types.InlineKeyboardButton("📸 Далее к фото", callback_data="create_order"))
-        
-        markup.row(*action_buttons)
-        
-        self.bot.send_message(chat_id, text, reply_markup=markup)
+            return f"📁 {session['custom_list']}"  # Имя пользовательского списка
+        return self.sections[session['section']]['name']
 
-    def update_works_message(self, message: types.Message, session: Dict[str, Any]) -> None:
-        chat_id = message.chat.id
-        page = session.get('current_page', 0)
-        
+    def _build_works_view(self, session: Dict[str, Any], page: int) -> Tuple[str, types.InlineKeyboardMarkup]:
+        """Текст и клавиатура страницы выбора работ"""
         works = session.get('works', [])
+        
         # ✅ ИСПОЛЬЗУЕМ КОНСТАНТУ
         start_index = page * self.WORKS_PER_PAGE
         end_index = start_index + self.WORKS_PER_PAGE
@@ -1207,13 +1429,7 @@ class TruckServiceManagerBot:
         total_cost = total_hours * 2500
         total_pages = (len(works) + self.WORKS_PER_PAGE - 1) // self.WORKS_PER_PAGE
         
-        # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
-        if session['section'].startswith('custom_'):
-            section_name = f"📁 {session['custom_list']}"  # Имя пользовательского списка
-        else:
-            section_name = self.sections[session['section']]['name']
-        
-        text = f"🏗️ {section_name}\n\n"
+        text = f"🏗️ {self._get_section_display_name(session)}\n\n"
         text += f"📋 Выбор работ (стр. {page + 1}/{total_pages})\n\n"
         text += f"✅ Выбрано: {selected_count} работ\n"
         text += f"⏱️ Время: {total_hours:.1f} н/ч\n"
@@ -1229,20 +1445,22 @@ class TruckServiceManagerBot:
             cost = hours * 2500
             short_name = name[:35] + "..." if len(name) > 38 else name
             button_text = f"{icon} {short_name} ({hours}ч - {cost:,.0f}р)"
-            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"work_{global_index}"))
+            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"work:{global_index}"))
         
         navigation_buttons = []
         if page > 0:
-            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page_works_{page-1}"))
+            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page:works:{page-1}"))
         
         navigation_buttons.append(types.InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="current_page"))
         
         if page < total_pages - 1:
-            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page_works_{page+1}"))
+            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page:works:{page+1}"))
         
         if navigation_buttons:
             markup.row(*navigation_buttons)
         
+        markup.row(types.InlineKeyboardButton("🔍 Поиск работ", switch_inline_query_current_chat=""))
+        
         action_buttons = []
         if selected_count > 0:
             # ✅ УБРАНА КНОПКА "Выбрать шапку" - шапка выбирается раньше
@@ -1253,18 +1471,12 @@ class TruckServiceManagerBot:
             action_buttons.append(types.InlineKeyboardButton("📦 К материалам", callback_data="select_materials"))
         
         markup.row(*action_buttons)
-        
-        try:
-            self.bot.edit_message_text(text, chat_id, message.message_id, reply_markup=markup)
-        except Exception as e:
-            if "message is not modified" not in str(e):
-                print(f"⚠️ Ошибка обновления сообщения: {e}")
+        return text, markup
 
-    def update_materials_message(self, message: types.Message, session: Dict[str, Any]) -> None:
-        chat_id = message.chat.id
-        page = session.get('current_materials_page', 0)
-        
+    def _build_materials_view(self, session: Dict[str, Any], page: int) -> Tuple[str, types.InlineKeyboardMarkup]:
+        """Текст и клавиатура страницы выбора материалов"""
         materials = session.get('materials', [])
+        
         # ✅ ИСПОЛЬЗУЕМ КОНСТАНТУ
         start_index = page * self.MATERIALS_PER_PAGE
         end_index = start_index + self.MATERIALS_PER_PAGE
@@ -1273,13 +1485,7 @@ class TruckServiceManagerBot:
         selected_count = len(session.get('selected_materials', []))
         total_pages = (len(materials) + self.MATERIALS_PER_PAGE - 1) // self.MATERIALS_PER_PAGE
         
-        # ✅ ОПРЕДЕЛЯЕМ ИМЯ РАЗДЕЛА: стандартный ИЛИ пользовательский
-        if session['section'].startswith('custom_'):
-            section_name = f"📁 {session['custom_list']}"  # Имя пользовательского списка
-        else:
-            section_name = self.sections[session['section']]['name']
-        
-        text = f"🏗️ {section_name}\n\n"
+        text = f"🏗️ {self._get_section_display_name(session)}\n\n"
         text += f"📦 Выбор материалов (стр. {page + 1}/{total_pages})\n\n"
         text += f"✅ Выбрано: {selected_count} материалов\n\n"
         text += "🎯 Выберите материалы (опционально):\n"
@@ -1292,16 +1498,16 @@ class TruckServiceManagerBot:
             icon = "✅" if is_selected else "⚪"
             short_name = material_name[:35] + "..." if len(material_name) > 38 else material_name
             button_text = f"{icon} {short_name}"
-            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"material_{global_index}"))
+            markup.add(types.InlineKeyboardButton(button_text, callback_data=f"material:{global_index}"))
         
         navigation_buttons = []
         if page > 0:
-            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page_materials_{page-1}"))
+            navigation_buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"page:materials:{page-1}"))
         
         navigation_buttons.append(types.InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="current_page"))
         
         if page < total_pages - 1:
-            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page_materials_{page+1}"))
+            navigation_buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"page:materials:{page+1}"))
         
         if navigation_buttons:
             markup.row(*navigation_buttons)
@@ -1315,303 +1521,398 @@ class TruckServiceManagerBot:
             action_buttons.append(types.InlineKeyboardButton("📸 Далее к фото", callback_data="create_order"))
         
         markup.row(*action_buttons)
+        return text, markup
+
+    def _edit_selection_message(self, message: types.Message, text: str,
+                                markup: types.InlineKeyboardMarkup) -> bool:
+        """Редактирование сообщения на месте. Неизменный текст/клавиатура не отправляются в Telegram"""
+        # Telegram хранит текст без завершающих пробелов и переводов строк.
+        # У недоступных (старых) сообщений текста и клавиатуры нет - редактируем всегда
+        current_text = getattr(message, 'text', None)
+        current_markup = getattr(message, 'reply_markup', None)
+        text_changed = current_text is None or current_text != text.strip()
+        current_markup = current_markup.to_dict() if current_markup else None
+        markup_changed = current_markup != markup.to_dict()
+        
+        if not text_changed and not markup_changed:
+            SELECTION_EDITS.inc(result='skipped')
+            return False
         
         try:
-            self.bot.edit_message_text(text, chat_id, message.message_id, reply_markup=markup)
+            if text_changed:
+                self.bot.edit_message_text(text, message.chat.id, message.message_id, reply_markup=markup)
+            else:
+                self.bot.edit_message_reply_markup(message.chat.id, message.message_id, reply_markup=markup)
+            SELECTION_EDITS.inc(result='edited')
+            return True
         except Exception as e:
             if "message is not modified" not in str(e):
                 print(f"⚠️ Ошибка обновления сообщения: {e}")
+            return False
 
     def create_draft_content(self, session: Dict[str, Any]) -> str:
-        content = []
-        content.append(f"{session['license_plate']} / {session['date'].strftime('%d.%m.%Y')}")
-        content.append(session['workers'])
-        content.append("")
-        
-        content.append("РАБОТЫ:")
-        for name, hours in session['selected_works']:
-            content.append(f"• {name}")
-        
-        if session.get('selected_materials'):
-            content.append("")
-            content.append("МАТЕРИАЛЫ:")
-            for material in session['selected_materials']:
-                content.append(f"• {material}")
-        
-        return '\n'.join(content)
+        return build_draft_text(session['license_plate'], session['date'], session['workers'],
+                                session['selected_works'], session.get('selected_materials', []))
+
+    def setup_callback_routes(self) -> None:
+        """Таблица маршрутов callback-кнопок: "префикс:данные" -> обработчик"""
+        router = CallbackRouter(fallback=self._handle_unknown_callback)
+        
+        # ✅ АДМИН-ПАНЕЛЬ: кнопка -> (ответ на нажатие, действие)
+        admin_routes = {
+            'admin_panel': ("Открываю админ-панель...", lambda call: self.admin_panel.show_admin_panel_sync(call)),
+            'admin_add_list': ("Добавляем новый список...", lambda call: self.admin_panel.handle_add_list_start_sync(call)),
+            'admin_back': ("Возвращаемся...", lambda call: self.navigation.show_main_menu(call.message.chat.id)),
+            'admin_manage_templates': ("Управление шаблонами...", lambda call: self.admin_panel.show_templates_management_sync(call)),
+            'admin_add_template': ("Добавляем новый шаблон...", lambda call: self.admin_panel.handle_add_template_start_sync(call)),
+            'admin_refresh_templates': ("Обновляем список шаблонов...", lambda call: self.admin_panel.show_templates_management_sync(call)),
+            'admin_back_to_main': ("Возвращаемся...", lambda call: self.admin_panel.show_admin_panel_sync(call)),
+            'admin_manage_lists': ("Управление списками...", lambda call: self.admin_panel.show_lists_management_sync(call)),
+            'admin_refresh_lists': ("Обновляем списки...", lambda call: self.admin_panel.show_lists_management_sync(call)),
+        }
+        for data, (answer, action) in admin_routes.items():
+            router.exact(data, self._admin_route(answer, action))
+        
+        admin_prefix_routes = {
+            'admin_view_template': ("Загружаем информацию о шаблоне...", self.admin_panel.handle_view_template_sync),
+            'admin_delete_template': ("Удаляем шаблон...", self.admin_panel.handle_delete_template_sync),
+            'admin_edit_template': ("Редактирование шаблона...", lambda call, template_id: self.bot.send_message(
+                call.message.chat.id, "✏️ Редактирование шаблонов - в разработке 🚧")),
+            'admin_view_list': ("Загружаем информацию о списке...", self.admin_panel.handle_view_list_sync),
+            'admin_delete_list': ("Удаляем список...", self.admin_panel.handle_delete_list_sync),
+        }
+        for prefix, (answer, action) in admin_prefix_routes.items():
+            router.prefix(prefix, self._admin_route(answer, action, with_payload=True))
+        
+        # ✅ НАВИГАЦИЯ И НАЧАЛО ЗАКАЗА
+        router.prefix('nav', self._on_navigation)
+        router.prefix('section', self._on_section_selected, legacy_prefix='section_')
+        router.prefix('custom_list', self._on_custom_list_selected, legacy_prefix='custom_list_')
+        router.prefix('header', self._on_header_selected, legacy_prefix='header_')
+        
+        # ✅ ВЫБОР РАБОТ, МАТЕРИАЛОВ И ЗАВЕРШЕНИЕ (нужна сессия)
+        router.prefix('work', self._session_route(self._on_work_toggled), legacy_prefix='work_')
+        router.prefix('material', self._session_route(self._on_material_toggled), legacy_prefix='material_')
+        router.prefix('page', self._session_route(self._on_page_selected), legacy_prefix='page_')
+        router.exact('reset_works', self._session_route(self._on_reset_works))
+        router.exact('reset_materials', self._session_route(self._on_reset_materials))
+        router.exact('select_materials', self._session_route(self._on_select_materials))
+        router.exact('create_order', self._session_route(self._on_create_order))
+        router.exact('skip_materials', self._session_route(self._on_skip_materials))
+        router.exact('add_photos_yes', self._session_route(self._on_add_photos_yes))
+        router.exact('add_photos_no', self._session_route(self._on_add_photos_no))
+        router.exact('current_page', lambda call, payload: self.bot.answer_callback_query(call.id))
+        
+        self.callback_router = router
 
     def handle_button_click(self, call: types.CallbackQuery) -> None:
-        chat_id = call.message.chat.id
-        data = call.data
+        print(f"🔍 DEBUG: Нажата кнопка с data='{call.data}', chat_id={call.message.chat.id}")
+        if not self.tracer.enabled:
+            self.callback_router.dispatch(call)
+            return
         
-        print(f"🔍 DEBUG: Нажата кнопка с data='{data}', chat_id={chat_id}")
+        # ✅ ЭТАП ТРАССЫ: ДО КНОПКИ СЕССИЯ МОЖЕТ НЕ СУЩЕСТВОВАТЬ (ВЫБОР РАЗДЕЛА), ПОСЛЕ - УЖЕ НЕ СУЩЕСТВОВАТЬ
+        chat_id = call.message.chat.id
+        trace_id = self._session_trace_id(chat_id)
+        started = time.perf_counter()
+        try:
+            self.callback_router.dispatch(call)
+        finally:
+            route = self.callback_router.resolve(call.data or '')[0] or 'unknown'
+            self.tracer.record(trace_id or self._session_trace_id(chat_id), f"handle_button_click:{route}",
+                               time.perf_counter() - started)
+
+    def _session_trace_id(self, chat_id: int) -> Optional[str]:
+        session = self.user_sessions.get(chat_id)
+        return session.get('trace_id') if session else None
+
+    def _admin_route(self, answer: str, action: Callable, with_payload: bool = False) -> Callable:
+        def handler(call: types.CallbackQuery, payload: str) -> None:
+            self.bot.answer_callback_query(call.id, answer)
+            if with_payload:
+                action(call, payload)
+            else:
+                action(call)
+        return handler
 
-        # ✅ ОБРАБОТЧИКИ АДМИН-ПАНЕЛИ (ВСЕ ВМЕСТЕ В НАЧАЛЕ)
-        if data == 'admin_panel':
-            self.bot.answer_callback_query(call.id, "Открываю админ-панель...")
-            self.admin_panel.show_admin_panel_sync(call)
-            return
+    def _session_route(self, handler: Callable) -> Callable:
+        """Маршрут, которому нужна активная сессия: handler(call, payload, session)"""
+        def route(call: types.CallbackQuery, payload: str) -> None:
+            chat_id = call.message.chat.id
+            if chat_id not in self.user_sessions:
+                self.bot.answer_callback_query(call.id, "Сессия устарела. Начните с /start")
+                return
+            handler(call, payload, self.user_sessions[chat_id])
+        return route
 
-        if data == 'admin_add_list':
-            self.bot.answer_callback_query(call.id, "Добавляем новый список...")
-            self.admin_panel.handle_add_list_start_sync(call)
-            return
+    def _handle_unknown_callback(self, call: types.CallbackQuery, data: str) -> None:
+        print(f"⚠️ Неизвестная кнопка: '{data}'")
+        self.bot.answer_callback_query(call.id)
 
-        if data == 'admin_back':
-            self.bot.answer_callback_query(call.id, "Возвращаемся...")
+    def _on_navigation(self, call: types.CallbackQuery, action: str) -> None:
+        """Обработчик навигационных callback (новая система)"""
+        chat_id = call.message.chat.id
+        print(f"🔍 DEBUG: Навигационный callback: {action} от chat_id={chat_id}")
+        
+        if action == 'back':
+            self.navigation.handle_back(chat_id)
+        elif action == 'main_menu':
             self.navigation.show_main_menu(chat_id)
-            return
-
-        # ✅ ОБРАБОТЧИКИ ДЛЯ УПРАВЛЕНИЯ ШАБЛОНАМИ
-        if data == 'admin_manage_templates':
-            self.bot.answer_callback_query(call.id, "Управление шаблонами...")
-            self.admin_panel.show_templates_management_sync(call)
-            return
-
-        if data == 'admin_add_template':
-            print(f"🔍 DEBUG: Вызываем handle_add_template_start_sync для admin_add_template")
-            self.bot.answer_callback_query(call.id, "Добавляем новый шаблон...")
-            self.admin_panel.handle_add_template_start_sync(call)
-            return
-
-        if data == 'admin_refresh_templates':
-            self.bot.answer_callback_query(call.id, "Обновляем список шаблонов...")
-            self.admin_panel.show_templates_management_sync(call)
-            return
-
-        if data == 'admin_back_to_main':
-            self.bot.answer_callback_query(call.id, "Возвращаемся...")
-            self.admin_panel.show_admin_panel_sync(call)
-            return
-
-        # ✅ ОБРАБОТЧИКИ ДЛЯ ПРОСМОТРА И УДАЛЕНИЯ ШАБЛОНОВ
-        if data.startswith('admin_view_template:'):
-            template_id = data.replace('admin_view_template:', '')
-            self.bot.answer_callback_query(call.id, "Загружаем информацию о шаблоне...")
-            self.admin_panel.handle_view_template_sync(call, template_id)
-            return
-
-        if data.startswith('admin_delete_template:'):
-            template_id = data.replace('admin_delete_template:', '')
-            self.bot.answer_callback_query(call.id, "Удаляем шаблон...")
-            self.admin_panel.handle_delete_template_sync(call, template_id)
-            return
-
-        if data.startswith('admin_edit_template:'):
-            template_id = data.replace('admin_edit_template:', '')
-            self.bot.answer_callback_query(call.id, "Редактирование шаблона...")
-            self.bot.send_message(chat_id, "✏️ Редактирование шаблонов - в разработке 🚧")
-            return
-
-        # ✅ ОБРАБОТЧИКИ ДЛЯ УПРАВЛЕНИЯ СПИСКАМИ
-        if data == 'admin_manage_lists':
-            self.bot.answer_callback_query(call.id, "Управление списками...")
-            self.admin_panel.show_lists_management_sync(call)
-            return
-
-        if data.startswith('admin_view_list:'):
-            list_name = data.replace('admin_view_list:', '')
-            self.bot.answer_callback_query(call.id, "Загружаем информацию о списке...")
-            self.admin_panel.handle_view_list_sync(call, list_name)
-            return
-
-        if data.startswith('admin_delete_list:'):
-            list_name = data.replace('admin_delete_list:', '')
-            self.bot.answer_callback_query(call.id, "Удаляем список...")
-            self.admin_panel.handle_delete_list_sync(call, list_name)
-            return
+        elif action == 'sections_menu':
+            self.navigation.show_sections_menu(chat_id)
+        elif action == 'diagnostics':
+            self.navigation.show_diagnostics_menu(chat_id)
+        elif action == 'help':
+            self.navigation.show_help(chat_id)
+        else:
+            self.bot.send_message(chat_id, f"❌ Неизвестное действие: {action}")
+        
+        # Подтверждаем обработку callback
+        self.bot.answer_callback_query(call.id)
 
-        if data == 'admin_refresh_lists':
-            self.bot.answer_callback_query(call.id, "Обновляем списки...")
-            self.admin_panel.show_lists_management_sync(call)
+    def _on_header_selected(self, call: types.CallbackQuery, template_id: str) -> None:
+        """ОБРАБОТЧИК ВЫБОРА КОНКРЕТНОГО ШАБЛОНА ШАПКИ"""
+        chat_id = call.message.chat.id
+        if chat_id not in self.user_sessions:
+            self.bot.answer_callback_query(call.id, "❌ Сессия устарела. Начните с /start")
             return
-
-        # ✅ ОБРАБОТЧИК ВЫБОРА ШАПКИ - УДАЛЕН ИЗ ИНТЕРФЕЙСА РАБОТ
-        # if data == 'select_header':  # ❌ УДАЛЕНО - шапка выбирается раньше
-
-        # ✅ ОБРАБОТЧИК ВЫБОРА КОНКРЕТНОГО ШАБЛОНА ШАПКИ
-        if data.startswith('header_'):
-            template_id = data.replace('header_', '')
             
-            if chat_id not in self.user_sessions:
-                self.bot.answer_callback_query(call.id, "❌ Сессия устарела. Начните с /start")
-                return
-                
-            session = self.user_sessions[chat_id]
-            session['header_template'] = template_id
-            session['step'] = 'license_plate'  # ✅ УСТАНАВЛИВАЕМ ШАГ ДЛЯ ОБРАБОТКИ ВВОДА
-            
-            template = self.excel_processor.header_manager.get_template(template_id)
-            template_name = template['name'] if template else "Бриджтаун Фудс"
-            
-            self.bot.answer_callback_query(call.id, f"✅ Выбрано: {template_name}")
-            
-            # ✅ ПОСЛЕ ВЫБОРА ШАПКИ - ПЕРЕХОД К ВВОДУ ДАННЫХ ЗАКАЗА
-            self.ask_license_plate(chat_id)
-            return
+        session = self.user_sessions[chat_id]
+        session['header_template'] = template_id
+        session['step'] = 'license_plate'  # ✅ УСТАНАВЛИВАЕМ ШАГ ДЛЯ ОБРАБОТКИ ВВОДА
+        
+        template = self.excel_processor.header_manager.get_template(template_id)
+        template_name = template['name'] if template else "Бриджтаун Фудс"
+        
+        self.bot.answer_callback_query(call.id, f"✅ Выбрано: {template_name}")
+        
+        # ✅ ПОСЛЕ ВЫБОРА ШАПКИ - ПЕРЕХОД К ВВОДУ ДАННЫХ ЗАКАЗА
+        self.ask_license_plate(chat_id)
 
-        # ✅ ОБРАБОТЧИК ПОЛЬЗОВАТЕЛЬСКИХ СПИСКОВ
-        elif data.startswith('custom_list_'):
-            list_name = data.replace('custom_list_', '')
-            print(f"🔍 DEBUG: Обрабатываем список '{list_name}'")
+    def _on_custom_list_selected(self, call: types.CallbackQuery, list_name: str) -> None:
+        """ОБРАБОТЧИК ПОЛЬЗОВАТЕЛЬСКИХ СПИСКОВ"""
+        chat_id = call.message.chat.id
+        print(f"🔍 DEBUG: Обрабатываем список '{list_name}'")
+        
+        self.bot.answer_callback_query(call.id, f"Выбран список: {list_name}")
+        
+        works = self.admin_panel.load_works_from_custom_list(list_name)
+        
+        if works:
+            self.photo_ingestor.discard(chat_id)
+            self.user_sessions[chat_id] = {
+                'section': f'custom_{list_name}',
+                'trace_id': new_trace_id(),  # ✅ ТРАССА ЗАКАЗА - С ВЫБОРА СПИСКА
+                'custom_list': list_name,
+                'step': 'selecting_header',  # ✅ НОВЫЙ ШАГ - выбор шапки
+                'selected_works': [],
+                'selected_materials': [],
+                'current_page': 0,
+                'works': works
+            }
             
-            self.bot.answer_callback_query(call.id, f"Выбран список: {list_name}")
+            # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
+            materials = self.materials_repository.get_materials()
+            self.user_sessions[chat_id]['materials'] = materials
             
-            works = self.admin_panel.load_works_from_custom_list(list_name)
+            print(f"🔍 DEBUG: Создана сессия для списка '{list_name}'")
+            print(f"🔍 DEBUG: Работ в сессии: {len(works)}")
+            print(f"🔍 DEBUG: Материалов в сессии: {len(materials)}")
             
-            if works:
-                self.user_sessions[chat_id] = {
-                    'section': f'custom_{list_name}',
-                    'custom_list': list_name,
-                    'step': 'selecting_header',  # ✅ НОВЫЙ ШАГ - выбор шапки
-                    'selected_works': [],
-                    'selected_materials': [],
-                    'current_page': 0,
-                    'works': works
-                }
-                
-                # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
-                materials = self.materials_repository.get_materials()
-                self.user_sessions[chat_id]['materials'] = materials
-                
-                print(f"🔍 DEBUG: Создана сессия для списка '{list_name}'")
-                print(f"🔍 DEBUG: Работ в сессии: {len(works)}")
-                print(f"🔍 DEBUG: Материалов в сессии: {len(materials)}")
-                
-                # ✅ ПОСЛЕ ВЫБОРА СПИСКА - СРАЗУ ПЕРЕХОД К ВЫБОРУ ШАПКИ
-                self.ask_header_selection(chat_id)
-            else:
-                self.bot.send_message(
-                    chat_id,
-                    f"❌ В списке '{list_name}' нет работ или файл поврежден"
-                )
-            return        
-        
-        # ✅ ОБРАБОТЧИК ВЫБОРА РАЗДЕЛА
-        elif data.startswith('section_'):
-            section_id = data.split('_')[1]
-            if section_id in self.sections:
-                self.bot.answer_callback_query(call.id, f"Выбран раздел: {self.sections[section_id]['name']}")
-                
-                self.user_sessions[chat_id] = {
-                    'section': section_id,
-                    'step': 'selecting_header',  # ✅ НОВЫЙ ШАГ - выбор шапки перед данными
-                    'selected_works': [],
-                    'selected_materials': [],
-                    'current_page': 0
-                }
-                
-                # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
-                works = self.works_repository.get_works(section_id)
-                if not works:
-                    self.bot.send_message(
-                        chat_id,
-                        "⚠️ Список работ для этого раздела пуст.\nПожалуйста, добавьте работы в файл Excel или обратитесь к администратору."
-                    )
-                    return
-                
-                self.user_sessions[chat_id]['works'] = works
-                
-                # ✅ ПОСЛЕ ВЫБОРА РАЗДЕЛА - СРАЗУ ПЕРЕХОД К ВЫБОРУ ШАПКИ
-                self.ask_header_selection(chat_id)
-            return
-        
-        # ✅ ТЕПЕРЬ ПРОВЕРКА СЕССИИ - только для work_, page_, create_order и т.д.
-        if chat_id not in self.user_sessions:
-            self.bot.answer_callback_query(call.id, "Сессия устарела. Начните с /start")
+            # ✅ ПОСЛЕ ВЫБОРА СПИСКА - СРАЗУ ПЕРЕХОД К ВЫБОРУ ШАПКИ
+            self.ask_header_selection(chat_id)
+        else:
+            self.bot.send_message(
+                chat_id,
+                f"❌ В списке '{list_name}' нет работ или файл поврежден"
+            )
+
+    def _on_section_selected(self, call: types.CallbackQuery, section_id: str) -> None:
+        """ОБРАБОТЧИК ВЫБОРА РАЗДЕЛА"""
+        chat_id = call.message.chat.id
+        if section_id not in self.sections:
+            self.bot.answer_callback_query(call.id)
             return
         
-        session = self.user_sessions[chat_id]
+        self.bot.answer_callback_query(call.id, f"Выбран раздел: {self.sections[section_id]['name']}")
+        
+        # ✅ НОВЫЙ ЗАКАЗ: ЗАГРУЗКИ ФОТО ПРЕДЫДУЩЕГО ЗАБЫВАЮТСЯ
+        self.photo_ingestor.discard(chat_id)
+        self.user_sessions[chat_id] = {
+            'section': section_id,
+            'trace_id': new_trace_id(),  # ✅ ТРАССА ЗАКАЗА - С ВЫБОРА РАЗДЕЛА
+            'step': 'selecting_header',  # ✅ НОВЫЙ ШАГ - выбор шапки перед данными
+            'selected_works': [],
+            'selected_materials': [],
+            'current_page': 0
+        }
         
-        if data.startswith('work_'):
-            work_index = int(data.split('_')[1])
-            works = session.get('works', [])
-            if work_index < len(works):
-                work = works[work_index]
-                
-                if work in session['selected_works']:
-                    session['selected_works'].remove(work)
-                    self.bot.answer_callback_query(call.id, f"❌ Удалено: {work[0]}")
-                else:
-                    session['selected_works'].append(work)
-                    self.bot.answer_callback_query(call.id, f"✅ Добавлено: {work[0]}")
-                
-                self.update_works_message(call.message, session)
+        # ✅ ИСПОЛЬЗУЕМ РЕПОЗИТОРИЙ ВМЕСТО СТАРОГО МЕТОДА
+        works = self.works_repository.get_works(section_id)
+        if not works:
+            self.bot.send_message(
+                chat_id,
+                "⚠️ Список работ для этого раздела пуст.\nПожалуйста, добавьте работы в файл Excel или обратитесь к администратору."
+            )
+            return
         
-        elif data.startswith('material_'):
-            material_index = int(data.split('_')[1])
-            materials = session.get('materials', [])
-            if material_index < len(materials):
-                material = materials[material_index]
-                
-                if material in session['selected_materials']:
-                    session['selected_materials'].remove(material)
-                    self.bot.answer_callback_query(call.id, f"❌ Удалено: {material}")
-                else:
-                    session['selected_materials'].append(material)
-                    self.bot.answer_callback_query(call.id, f"✅ Добавлено: {material}")
-                
-                self.update_materials_message(call.message, session)
+        self.user_sessions[chat_id]['works'] = works
         
-        elif data.startswith('page_'):
-            page_type = data.split('_')[1]
-            page = int(data.split('_')[2])
-            try:
-                self.bot.delete_message(chat_id, call.message.message_id)
-            except Exception as e:
-                print(f"⚠️ Не удалось удалить сообщение: {e}")
-            
-            if page_type == 'works':
-                self.show_works_selection(chat_id, page)
-            elif page_type == 'materials':
-                self.show_materials_selection(chat_id, page)
-        
-        elif data == 'reset_works':
-            session['selected_works'] = []
-            self.bot.answer_callback_query(call.id, "Выбор работ сброшен")
-            self.update_works_message(call.message, session)
-            
-        elif data == 'reset_materials':
-            session['selected_materials'] = []
-            self.bot.answer_callback_query(call.id, "Выбор материалов сброшен")
-            self.update_materials_message(call.message, session)
-            
-        elif data == 'select_materials':
-            self.bot.answer_callback_query(call.id, "Переходим к выбору материалов...")
-            self.show_materials_selection(chat_id)
-            
-        elif data == 'create_order':
-            if not session['selected_works']:
-                self.bot.answer_callback_query(call.id, "❌ Выберите хотя бы одну работу")
-                return
+        # ✅ ПОСЛЕ ВЫБОРА РАЗДЕЛА - СРАЗУ ПЕРЕХОД К ВЫБОРУ ШАПКИ
+        self.ask_header_selection(chat_id)
+
+    def _on_work_toggled(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        work_index = int(payload)
+        works = session.get('works', [])
+        if work_index < len(works):
+            work = works[work_index]
             
-            self.bot.answer_callback_query(call.id, "Создаю заказ-наряд...")
-            self.ask_about_photos(chat_id)
+            if work in session['selected_works']:
+                session['selected_works'].remove(work)
+                self.bot.answer_callback_query(call.id, f"❌ Удалено: {work[0]}")
+            else:
+                session['selected_works'].append(work)
+                self.bot.answer_callback_query(call.id, f"✅ Добавлено: {work[0]}")
             
-        elif data == 'skip_materials':
-            self.bot.answer_callback_query(call.id, "Использую материалы по умолчанию")
-            session['selected_materials'] = []
-            self.ask_about_photos(chat_id)
+            self.update_works_message(call.message, session)
+
+    def _on_material_toggled(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        material_index = int(payload)
+        materials = self._get_session_materials(session)
+        if material_index < len(materials):
+            material = materials[material_index]
             
-        elif data == 'add_photos_yes':
-            self.bot.answer_callback_query(call.id, "Отлично! Отправьте фото по одному...")
-            self.request_photos(chat_id)
+            if material in session['selected_materials']:
+                session['selected_materials'].remove(material)
+                self.bot.answer_callback_query(call.id, f"❌ Удалено: {material}")
+            else:
+                session['selected_materials'].append(material)
+                self.bot.answer_callback_query(call.id, f"✅ Добавлено: {material}")
             
-        elif data == 'add_photos_no':
-            self.bot.answer_callback_query(call.id, "Создаю заказ без фото...")
-            self._finalize_order_common(chat_id, has_photos=False)            
+            self.update_materials_message(call.message, session)
+
+    def _on_page_selected(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        # "works:2" (новые кнопки) или "works_2" (старые)
+        page_type, page = re.split('[:_]', payload, maxsplit=1)
+        page = int(page)
+        self.bot.answer_callback_query(call.id)
+        
+        # ✅ ЛИСТАЕМ В ТОМ ЖЕ СООБЩЕНИИ - БЕЗ УДАЛЕНИЯ И ПОВТОРНОЙ ОТПРАВКИ
+        if page_type == 'works':
+            self.update_works_message(call.message, session, page)
+        elif page_type == 'materials':
+            self.update_materials_message(call.message, session, page)
+
+    def _on_reset_works(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        session['selected_works'] = []
+        self.bot.answer_callback_query(call.id, "Выбор работ сброшен")
+        self.update_works_message(call.message, session)
+
+    def _on_reset_materials(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        session['selected_materials'] = []
+        self.bot.answer_callback_query(call.id, "Выбор материалов сброшен")
+        self.update_materials_message(call.message, session)
+
+    def _on_select_materials(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        self.bot.answer_callback_query(call.id, "Переходим к выбору материалов...")
+        self.show_materials_selection(call.message.chat.id)
+
+    def _on_create_order(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        if not session['selected_works']:
+            self.bot.answer_callback_query(call.id, "❌ Выберите хотя бы одну работу")
+            return
+        
+        self.bot.answer_callback_query(call.id, "Создаю заказ-наряд...")
+        self.ask_about_photos(call.message.chat.id)
+
+    def _on_skip_materials(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        self.bot.answer_callback_query(call.id, "Использую материалы по умолчанию")
+        session['selected_materials'] = []
+        self.ask_about_photos(call.message.chat.id)
+
+    def _on_add_photos_yes(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        self.bot.answer_callback_query(call.id, "Отлично! Отправьте фото по одному или альбомом...")
+        self.request_photos(call.message.chat.id)
+
+    def _on_add_photos_no(self, call: types.CallbackQuery, payload: str, session: Dict[str, Any]) -> None:
+        self.bot.answer_callback_query(call.id, "Создаю заказ без фото...")
+        self._finalize_order_common(call.message.chat.id, has_photos=False)
 
     def run(self) -> None:
         print("🔄 Запускаю TruckService Manager...")
+        self.startup.ready()
+        if self.runtime:
+            print("⚡ Асинхронный режим (AsyncTeleBot)")
+            self.runtime.run_polling(timeout=30, request_timeout=60)
+            return
+        
+        # ✅ ПЕРЕЗАПУСК В ЦИКЛЕ (без рекурсии и роста стека)
+        while True:
+            try:
+                self.bot.infinity_polling(timeout=60, long_polling_timeout=30)
+                return
+            except Exception as e:
+                print(f"⚠️ Перезапуск бота из-за ошибки: {e}")
+                time.sleep(self.RETRY_DELAY)
+
+    def run_webhook(self, host: str = '127.0.0.1', port: int = 8080, path: str = '/telegram',
+                    public_url: Optional[str] = None, secret_token: Optional[str] = None) -> None:
+        """Режим webhook: обновления принимает встроенный HTTP-сервер"""
+        print("🔄 Запускаю TruckService Manager (webhook)...")
+        process_updates = self.runtime.process_updates_nowait if self.runtime else self.bot.process_new_updates
+        server = WebhookServer(process_updates, host, port, path, secret_token)
+        
+        # Публичный адрес (reverse proxy / туннель) регистрируется в Telegram
+        if public_url:
+            self.bot.set_webhook(url=public_url, secret_token=secret_token)
+            print(f"✅ Webhook зарегистрирован: {public_url}")
+        
+        print(f"✅ Webhook сервер слушает {server.url}")
+        self.startup.ready()
         try:
-            self.bot.infinity_polling(timeout=60, long_polling_timeout=30)
-        except Exception as e:
-            print(f"⚠️ Перезапуск бота из-за ошибки: {e}")
-            self.run()
+            server.serve_forever()
+        finally:
+            server.stop()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TruckService Manager Bot")
+    parser.add_argument('--runtime', choices=['sync', 'async'], default=os.getenv('BOT_RUNTIME', 'sync'),
+                        help="sync - TeleBot (по умолчанию), async - AsyncTeleBot + asyncio")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BOT_WORKERS', DEFAULT_WORKERS)),
+                        help="Потоков обработки обновлений (разные чаты параллельно)")
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=os.getenv('BOT_MODE', 'polling'),
+                        help="Получение обновлений: long polling или webhook")
+    parser.add_argument('--webhook-host', default=os.getenv('WEBHOOK_HOST', '127.0.0.1'))
+    parser.add_argument('--webhook-port', type=int, default=int(os.getenv('WEBHOOK_PORT', 8080)))
+    parser.add_argument('--webhook-path', default=os.getenv('WEBHOOK_PATH', '/telegram'))
+    parser.add_argument('--webhook-url', default=os.getenv('WEBHOOK_URL'),
+                        help="Публичный HTTPS адрес для setWebhook (без него сервер только слушает)")
+    parser.add_argument('--fast-start', action='store_true', default=os.getenv('BOT_FAST_START') == '1',
+                        help="Меню бота и файлы учета - в фоне, прием обновлений начинается сразу")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Время импорта и шагов запуска, время до первого обновления")
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', 0)),
+                        help="Порт метрик Prometheus (GET /metrics на 127.0.0.1), 0 - выключено")
+    parser.add_argument('--record-updates', action='store_true', default=os.getenv('RECORD_UPDATES') == '1',
+                        help="Писать входящие обновления без личных данных в Логи/updates (utils/replay_updates.py)")
+    args = parser.parse_args()
+    
     if BOT_TOKEN:
-        bot = TruckServiceManagerBot(BOT_TOKEN)
-        bot.run()
+        STARTUP.enabled = args.profile_startup
+        bot = TruckServiceManagerBot(BOT_TOKEN, runtime=args.runtime, workers=args.workers,
+                                     fast_start=args.fast_start, startup=STARTUP)
+        STARTUP.save_path = bot.main_folder / "cache" / "startup_profile.jsonl"
+        if args.metrics_port:
+            bot.start_metrics_server(os.getenv('METRICS_HOST', '127.0.0.1'), args.metrics_port)
+        if args.record_updates:
+            bot.start_update_recording()
+        try:
+            if args.mode == 'webhook':
+                bot.run_webhook(args.webhook_host, args.webhook_port, args.webhook_path,
+                                args.webhook_url, os.getenv('WEBHOOK_SECRET'))
+            else:
+                bot.run()
+        finally:
+            bot.shutdown()
     else:
         print("❌ Токен бота не найден! Создай файл .env с BOT_TOKEN=твой_токен")
\ No newline at end of file
@@ -1,10 +1,11 @@
 import pathlib
 import logging
-import json
 import re  # ✅ ДОБАВЛЯЕМ ДЛЯ ВАЛИДАЦИИ ID ШАБЛОНОВ
 from typing import Dict, List, Tuple
 from telebot import types
 
+from modules.template_store import HeaderTemplateStore
+
 logger = logging.getLogger(__name__)
 
 class AdminPanel:
@@ -13,6 +14,8 @@ class AdminPanel:
         self.custom_lists_path.mkdir(exist_ok=True)
         self.header_templates_path = pathlib.Path("Шаблоны") / "header_templates"
         self.header_templates_path.mkdir(parents=True, exist_ok=True)
+        # ✅ ОБЩЕЕ С БОТОМ ХРАНИЛИЩЕ ШАБЛОНОВ ШАПОК
+        self.template_store = HeaderTemplateStore.shared(self.header_templates_path)
         self.awaiting_input_users: Dict[int, str] = {}  # user_id -> тип ожидаемого ввода
         self.bot = bot_instance
         print("✅ AdminPanel инициализирован")
@@ -184,32 +187,13 @@ class AdminPanel:
             self.bot.answer_callback_query(call.id, f"❌ Ошибка удаления: {e}")
 
     def _load_header_templates(self) -> Dict[str, Dict]:
-        """Загрузка всех шаблонов шапок"""
-        templates = {}
-        try:
-            template_files = list(self.header_templates_path.glob("*.json"))
-            for template_file in template_files:
-                try:
-                    with open(template_file, 'r', encoding='utf-8') as f:
-                        template_data = json.load(f)
-                        templates[template_data['id']] = template_data
-                except Exception as e:
-                    print(f"❌ Ошибка загрузки шаблона {template_file}: {e}")
-        except Exception as e:
-            print(f"❌ Ошибка загрузки шаблонов: {e}")
-        
-        return templates
+        """Все шаблоны шапок из общего хранилища (с проверкой изменений файлов)"""
+        self.template_store.refresh()
+        return self.template_store.all()
 
     def _save_header_template(self, template_data: Dict) -> bool:
         """Сохранение шаблона шапки"""
-        try:
-            template_file = self.header_templates_path / f"{template_data['id']}.json"
-            with open(template_file, 'w', encoding='utf-8') as f:
-                json.dump(template_data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"❌ Ошибка сохранения шаблона: {e}")
-            return False
+        return self.template_store.save(template_data)
 
     def handle_add_template_start_sync(self, call):
         """Начало добавления нового шаблона"""
@@ -370,10 +354,7 @@ class AdminPanel:
             if chat_id in self.awaiting_input_users:
                 del self.awaiting_input_users[chat_id]
             
-            # ✅ ПЕРЕЗАГРУЗИТЬ ШАБЛОНЫ В ОСНОВНОМ БОТЕ
-            if hasattr(self, 'excel_processor'):
-                print("🔄 Вызываем reload_templates...")
-                self.excel_processor.header_manager.reload_templates()
+            # ✅ ОСНОВНОЙ БОТ ПОЛУЧАЕТ НОВЫЙ ШАБЛОН ЧЕРЕЗ ОБЩЕЕ ХРАНИЛИЩЕ
             
             # ✅ ОТПРАВИТЬ СООБЩЕНИЕ О УСПЕХЕ
             self.bot.send_message(
@@ -467,14 +448,9 @@ Email: {contractor['email']}
             self.bot.answer_callback_query(call.id, "❌ Шаблон не найден")
             return
 
-        # Удаляем файл шаблона
-        template_file = self.header_templates_path / f"{template_id}.json"
+        # Удаляем файл шаблона (хранилище уведомит основной бот)
         try:
-            template_file.unlink(missing_ok=True)
-            
-            # ✅ ПЕРЕЗАГРУЗИТЬ ШАБЛОНЫ В ОСНОВНОМ БОТЕ
-            if hasattr(self, 'excel_processor'):
-                self.excel_processor.header_manager.reload_templates()
+            self.template_store.delete(template_id)
             
             self.bot.answer_callback_query(call.id, f"✅ Шаблон '{template['name']}' удален")
             self.show_templates_management_sync(call)
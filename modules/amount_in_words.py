@@ -0,0 +1,98 @@
+"""
+🚀 СУММА ПРОПИСЬЮ (РУБЛИ И КОПЕЙКИ)
+ТАБЛИЧНАЯ РЕАЛИЗАЦИЯ БЕЗ num2words - ВЫВОД СОВПАДАЕТ С num2words(..., lang='ru')
+"""
+
+from functools import lru_cache
+from typing import List, Tuple
+
+UNITS_MASCULINE = ['', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять']
+UNITS_FEMININE = ['', 'одна', 'две', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять']
+TEENS = ['десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать',
+         'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать']
+TENS = ['', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят',
+        'восемьдесят', 'девяносто']
+HUNDREDS = ['', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот',
+            'восемьсот', 'девятьсот']
+
+# ✅ РАЗРЯДЫ: (одна форма, две формы, пять форм, женский род)
+SCALES: List[Tuple[str, str, str, bool]] = [
+    ('', '', '', False),
+    ('тысяча', 'тысячи', 'тысяч', True),
+    ('миллион', 'миллиона', 'миллионов', False),
+    ('миллиард', 'миллиарда', 'миллиардов', False),
+    ('триллион', 'триллиона', 'триллионов', False),
+    ('квадриллион', 'квадриллиона', 'квадриллионов', False),
+]
+
+RUBLE_FORMS = ('рубль', 'рубля', 'рублей')
+
+# Индекс формы по последней цифре: 1 -> "рубль", 2-4 -> "рубля", остальные -> "рублей"
+_PLURAL_BY_LAST_DIGIT = [2, 0, 1, 1, 1, 2, 2, 2, 2, 2]
+
+
+def _build_triplet_table(units: List[str]) -> List[str]:
+    """Пропись всех чисел 0..999 для заданного рода"""
+    table = []
+    for number in range(1000):
+        hundreds, rest = divmod(number, 100)
+        tens, ones = divmod(rest, 10)
+        words = [HUNDREDS[hundreds]]
+        if tens == 1:
+            words.append(TEENS[ones])
+        else:
+            words.append(TENS[tens])
+            words.append(units[ones])
+        table.append(' '.join(word for word in words if word))
+    return table
+
+
+_TRIPLETS_MASCULINE = _build_triplet_table(UNITS_MASCULINE)
+_TRIPLETS_FEMININE = _build_triplet_table(UNITS_FEMININE)
+
+MAX_NUMBER = 1000 ** len(SCALES) - 1
+
+
+def plural_form(number: int) -> int:
+    """Индекс формы существительного для числа (0 - один, 1 - два, 2 - пять)"""
+    if 11 <= number % 100 <= 19:
+        return 2
+    return _PLURAL_BY_LAST_DIGIT[number % 10]
+
+
+def number_in_words(number: int) -> str:
+    """Целое неотрицательное число прописью (мужской род)"""
+    if number < 0:
+        raise ValueError("Число не может быть отрицательным")
+    if number > MAX_NUMBER:
+        raise ValueError(f"Число слишком большое: {number}")
+    if number == 0:
+        return 'ноль'
+
+    parts = []
+    scale_index = 0
+    while number:
+        number, triplet = divmod(number, 1000)
+        if triplet:
+            one, two, five, feminine = SCALES[scale_index]
+            table = _TRIPLETS_FEMININE if feminine else _TRIPLETS_MASCULINE
+            scale_word = (one, two, five)[plural_form(triplet)] if scale_index else ''
+            parts.append(f"{table[triplet]} {scale_word}".rstrip())
+        scale_index += 1
+
+    return ' '.join(reversed(parts))
+
+
+@lru_cache(maxsize=4096)
+def _rubles_in_words_cached(total_kopecks: int) -> str:
+    rubles, kopecks = divmod(total_kopecks, 100)
+    ruble_word = RUBLE_FORMS[plural_form(rubles)]
+    return f"{number_in_words(rubles).capitalize()} {ruble_word} {kopecks:02d} коп."
+
+
+def rubles_in_words(amount: float) -> str:
+    """Сумма прописью в формате заказ-наряда: 'Три тысячи рублей 00 коп.'"""
+    total_kopecks = round(amount * 100)  # Точное вычисление через целые копейки
+    if total_kopecks < 0:
+        raise ValueError("Сумма не может быть отрицательной")
+    return _rubles_in_words_cached(total_kopecks)
@@ -0,0 +1,121 @@
+"""
+🚀 АСИНХРОННЫЙ РЕЖИМ РАБОТЫ БОТА (AsyncTeleBot + asyncio)
+СЕТЕВЫЕ ЗАПРОСЫ К TELEGRAM ВЫПОЛНЯЮТСЯ В ЦИКЛЕ СОБЫТИЙ (aiohttp),
+ОБРАБОТЧИКИ (pandas, openpyxl, файлы, SMTP) - В ПУЛЕ ПОТОКОВ ДИСПЕТЧЕРА ЧАТОВ
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Coroutine
+
+from modules.chat_dispatcher import ChatDispatcher, chat_key, timed_update
+
+# Декораторы регистрации обработчиков, которые нужно адаптировать под синхронные функции
+HANDLER_DECORATORS = frozenset({
+    'message_handler', 'edited_message_handler', 'channel_post_handler',
+    'edited_channel_post_handler', 'callback_query_handler', 'inline_handler',
+    'chosen_inline_handler', 'my_chat_member_handler', 'chat_member_handler',
+})
+
+
+class AsyncBotRuntime:
+    """Цикл событий в отдельном потоке + AsyncTeleBot + диспетчер чатов для обработчиков"""
+
+    def __init__(self, token: str, dispatcher: ChatDispatcher):
+        from telebot.async_telebot import AsyncTeleBot
+
+        self.logger = logging.getLogger('AsyncBotRuntime')
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._run_loop, name='asyncio-loop', daemon=True)
+        self._loop_thread.start()
+
+        self.async_bot = AsyncTeleBot(token)
+        self.dispatcher = dispatcher
+        # ✅ ЗАПИСЬ ПРИНЯТЫХ ОБНОВЛЕНИЙ (modules/update_recorder.py): И ИЗ POLLING, И ИЗ WEBHOOK
+        self.recorder = None
+        process_new_updates = self.async_bot.process_new_updates
+
+        async def _recorded_updates(updates: list) -> None:
+            if self.recorder is not None:
+                self.recorder.record_all(updates)
+            await process_new_updates(updates)
+
+        self.async_bot.process_new_updates = _recorded_updates
+        # ✅ СИНХРОННЫЙ ИНТЕРФЕЙС ДЛЯ СУЩЕСТВУЮЩЕГО КОДА (bot.py, AdminPanel, NavigationManager)
+        self.bot = SyncBotBridge(self)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def call(self, coroutine: Coroutine) -> Any:
+        """Выполнить корутину в цикле событий и дождаться результата из рабочего потока"""
+        if threading.current_thread() is self._loop_thread:
+            coroutine.close()
+            raise RuntimeError("Синхронный вызов Telegram API из цикла событий заблокирует его")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def wrap_handler(self, handler: Callable[[Any], None]) -> Callable[[Any], Coroutine]:
+        """Синхронный обработчик -> корутина, выполняющая его в очереди чата"""
+        if inspect.iscoroutinefunction(handler):
+            return handler
+
+        async def _async_handler(update: Any) -> None:
+            await asyncio.wrap_future(self.dispatcher.submit(chat_key(update), timed_update, handler, update))
+
+        _async_handler.__name__ = getattr(handler, '__name__', 'handler')
+        return _async_handler
+
+    def run_polling(self, timeout: int = 30, request_timeout: int = 60) -> None:
+        """Long polling до остановки (ошибки сети AsyncTeleBot обрабатывает сам)"""
+        self.call(self.async_bot.infinity_polling(timeout=timeout, request_timeout=request_timeout))
+
+    def process_updates_nowait(self, updates: list) -> None:
+        """Передать обновления (например, из webhook) в цикл событий, не дожидаясь обработки"""
+        asyncio.run_coroutine_threadsafe(self.async_bot.process_new_updates(updates), self.loop)
+
+    def stop(self) -> None:
+        """Дождаться обработчиков (они вызывают API через цикл), закрыть сессию aiohttp и цикл событий.
+        Повторный вызов - без действий"""
+        if not self._loop_thread.is_alive():
+            return
+        self.dispatcher.shutdown(wait=True)
+        try:
+            self.call(self.async_bot.close_session())
+        except Exception as e:
+            self.logger.warning(f"⚠️ Ошибка закрытия сессии aiohttp: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join(timeout=5)
+
+
+class SyncBotBridge:
+    """Объект с интерфейсом telebot.TeleBot поверх AsyncTeleBot"""
+
+    def __init__(self, runtime: AsyncBotRuntime):
+        self._runtime = runtime
+
+    def __getattr__(self, name: str) -> Any:
+        if name in HANDLER_DECORATORS:
+            return self._handler_decorator(name)
+
+        attr = getattr(self._runtime.async_bot, name)
+        if inspect.iscoroutinefunction(attr):
+            def _call(*args, **kwargs):
+                return self._runtime.call(attr(*args, **kwargs))
+            _call.__name__ = name
+            return _call
+        return attr
+
+    def _handler_decorator(self, name: str) -> Callable:
+        register = getattr(self._runtime.async_bot, name)
+
+        def decorator_factory(*args, **kwargs):
+            decorator = register(*args, **kwargs)
+
+            def decorator_sync(handler: Callable) -> Callable:
+                decorator(self._runtime.wrap_handler(handler))
+                return handler
+            return decorator_sync
+        return decorator_factory
@@ -0,0 +1,106 @@
+"""
+🚀 МАРШРУТИЗАТОР CALLBACK-КНОПОК
+СХЕМА ДАННЫХ "префикс:данные" РАЗБИРАЕТСЯ ОДИН РАЗ, ОБРАБОТЧИК НАХОДИТСЯ ПО СЛОВАРЮ
+СТАРЫЕ КНОПКИ ВИДА "префикс_данные" (В ОТПРАВЛЕННЫХ РАНЕЕ СООБЩЕНИЯХ) ПОДДЕРЖИВАЮТСЯ
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from modules.metrics import METRICS
+
+# Обработчик: handler(call, payload). Для точных маршрутов payload = ''
+RouteHandler = Callable[[Any, str], None]
+
+CALLBACK_SECONDS = METRICS.histogram('tsm_callback_seconds', 'Время обработки callback-кнопки по маршруту', ('route',))
+
+
+class CallbackRouter:
+    """Точные маршруты, маршруты по префиксу и старые префиксы с '_'"""
+
+    def __init__(self, fallback: Optional[RouteHandler] = None):
+        self.fallback = fallback
+        self.logger = logging.getLogger('CallbackRouter')
+        self._exact: Dict[str, RouteHandler] = {}
+        self._prefix: Dict[str, RouteHandler] = {}
+        # Первая часть до '_' -> (полный старый префикс, маршрут, обработчик)
+        self._legacy: Dict[str, Tuple[str, str, RouteHandler]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    # ✅ РЕГИСТРАЦИЯ
+    def exact(self, data: str, handler: RouteHandler) -> None:
+        self._exact[data] = handler
+
+    def prefix(self, prefix: str, handler: RouteHandler, legacy_prefix: Optional[str] = None) -> None:
+        """Маршрут "prefix:payload". legacy_prefix - старая форма кнопок, например "work_" """
+        self._prefix[prefix] = handler
+        if legacy_prefix:
+            head = legacy_prefix.split('_', 1)[0]
+            self._legacy[head] = (legacy_prefix, prefix, handler)
+
+    # ✅ РАЗБОР И ВЫЗОВ
+    def resolve(self, data: str) -> Tuple[Optional[str], Optional[RouteHandler], str]:
+        """(имя маршрута, обработчик, payload). Не больше трех обращений к словарям"""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler, ''
+
+        prefix, separator, payload = data.partition(':')
+        if separator:
+            handler = self._prefix.get(prefix)
+            if handler is not None:
+                return prefix, handler, payload
+
+        head = data.partition('_')[0]
+        legacy = self._legacy.get(head)
+        if legacy is not None and data.startswith(legacy[0]):
+            legacy_prefix, route, handler = legacy
+            return route, handler, data[len(legacy_prefix):]
+
+        return None, None, data
+
+    def dispatch(self, call: Any) -> bool:
+        """Вызвать обработчик кнопки. False - маршрут не найден (вызван fallback)"""
+        route, handler, payload = self.resolve(call.data or '')
+        if handler is None:
+            if self.fallback:
+                self.fallback(call, payload)
+            return False
+
+        started = time.perf_counter()
+        try:
+            handler(call, payload)
+        finally:
+            self._record(route, time.perf_counter() - started)
+        return True
+
+    def _record(self, route: str, seconds: float) -> None:
+        CALLBACK_SECONDS.observe(seconds, route=route)
+        with self._stats_lock:
+            stats = self._stats.setdefault(route, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{маршрут: {count, avg_ms, max_ms, total_ms}}"""
+        with self._stats_lock:
+            return {
+                route: {
+                    'count': stats['count'],
+                    'avg_ms': stats['total'] / stats['count'] * 1000 if stats['count'] else 0.0,
+                    'max_ms': stats['max'] * 1000,
+                    'total_ms': stats['total'] * 1000,
+                }
+                for route, stats in self._stats.items()
+            }
+
+    def routes(self) -> Dict[str, str]:
+        """Список зарегистрированных маршрутов (для отладки)"""
+        table = {data: 'exact' for data in self._exact}
+        table.update({f"{prefix}:*": 'prefix' for prefix in self._prefix})
+        table.update({f"{legacy_prefix}*": f"legacy -> {route}" for legacy_prefix, route, _ in self._legacy.values()})
+        return table
@@ -0,0 +1,187 @@
+"""
+🚀 ДИСПЕТЧЕР ОБНОВЛЕНИЙ ПО ЧАТАМ
+ОБНОВЛЕНИЯ ОДНОГО ЧАТА ВЫПОЛНЯЮТСЯ СТРОГО ПО ОЧЕРЕДИ, РАЗНЫЕ ЧАТЫ - ПАРАЛЛЕЛЬНО В ПУЛЕ ПОТОКОВ
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import telebot
+from telebot import types
+
+from modules.metrics import METRICS
+
+# Размер пула по умолчанию - как у ThreadPoolExecutor (обработчики в основном ждут сеть)
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+UPDATE_SECONDS = METRICS.histogram('tsm_update_seconds', 'Время обработки обновления по типу', ('type',))
+
+
+def chat_key(update: Any) -> Optional[int]:
+    """ID чата обновления: сообщение, callback, inline-запрос или types.Update целиком"""
+    if isinstance(update, types.Update):
+        for field in ('message', 'edited_message', 'callback_query', 'inline_query',
+                      'chosen_inline_result', 'channel_post', 'edited_channel_post'):
+            inner = getattr(update, field, None)
+            if inner is not None:
+                return chat_key(inner)
+        return None
+
+    chat = getattr(update, 'chat', None)
+    if chat is not None:
+        return chat.id
+    message = getattr(update, 'message', None)
+    if message is not None and getattr(message, 'chat', None) is not None:
+        return message.chat.id
+    from_user = getattr(update, 'from_user', None)
+    return from_user.id if from_user is not None else None
+
+
+def update_type(update: Any) -> str:
+    """Тип обновления для метрик: command, text, photo, document, callback, inline_query..."""
+    if isinstance(update, types.Update):
+        for field in ('message', 'edited_message', 'callback_query', 'inline_query',
+                      'chosen_inline_result', 'channel_post', 'edited_channel_post'):
+            inner = getattr(update, field, None)
+            if inner is not None:
+                return update_type(inner)
+        return 'other'
+    if isinstance(update, types.CallbackQuery):
+        return 'callback'
+    if isinstance(update, types.InlineQuery):
+        return 'inline_query'
+    content_type = getattr(update, 'content_type', None)
+    if content_type == 'text' and (getattr(update, 'text', None) or '').startswith('/'):
+        return 'command'
+    return content_type or 'other'
+
+
+def timed_update(handler: Callable[[Any], Any], update: Any) -> Any:
+    """Обработать обновление с замером времени (гистограмма по типу обновления)"""
+    started = time.perf_counter()
+    try:
+        return handler(update)
+    finally:
+        UPDATE_SECONDS.observe(time.perf_counter() - started, type=update_type(update))
+
+
+class ChatDispatcher:
+    """Очередь задач на каждый чат + общий пул потоков"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self.logger = logging.getLogger('ChatDispatcher')
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat')
+        self._queues: Dict[Any, Deque[Tuple[Future, Callable, tuple]]] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._processed = 0
+        # Вызывается один раз при первой задаче (профиль запуска: время до первого обновления)
+        self.on_first_task: Optional[Callable[[], None]] = None
+        # Окно профилирования (HandlerProfiler): задачи вызываются через profiler.call
+        self.profiler: Optional[Any] = None
+
+    def submit(self, key: Any, func: Callable, *args) -> Future:
+        """Поставить задачу в очередь чата key. Задачи с key=None выполняются без упорядочивания"""
+        if self.on_first_task is not None:
+            callback, self.on_first_task = self.on_first_task, None
+            callback()
+        future: Future = Future()
+        with self._lock:
+            if key is None:
+                self._pool.submit(self._run, future, func, args)
+                return future
+
+            queue = self._queues.get(key)
+            if queue is not None:
+                # Чат уже обрабатывается - задача выполнится после предыдущих
+                queue.append((future, func, args))
+                return future
+
+            self._queues[key] = deque([(future, func, args)])
+        self._pool.submit(self._drain, key)
+        return future
+
+    def _drain(self, key: Any) -> None:
+        """Выполнить одну задачу чата и, если очередь не пуста, снова встать в общий пул (честность между чатами)"""
+        with self._lock:
+            future, func, args = self._queues[key][0]
+
+        self._run(future, func, args)
+
+        with self._lock:
+            queue = self._queues[key]
+            queue.popleft()
+            if not queue:
+                del self._queues[key]
+                self._idle.notify_all()
+                return
+        self._pool.submit(self._drain, key)
+
+    def _run(self, future: Future, func: Callable, args: tuple) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        profiler = self.profiler
+        try:
+            future.set_result(profiler.call(func, *args) if profiler is not None else func(*args))
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка обработки обновления: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._processed += 1
+
+    def pending(self, key: Any = None) -> int:
+        """Задачи чата key (None - всех чатов) в очереди, включая выполняемую"""
+        with self._lock:
+            if key is None:
+                return sum(len(queue) for queue in self._queues.values())
+            return len(self._queues.get(key, ()))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'active_chats': len(self._queues),
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'processed': self._processed,
+            }
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться, пока очереди всех чатов опустеют. False - не успели за timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queues, timeout=timeout)
+
+    def shutdown(self, wait: bool = True, timeout: float = 30.0) -> None:
+        """wait - сначала дорабатывают очереди чатов (задача чата после выполнения снова встает в пул)"""
+        if wait:
+            self.join(timeout)
+        self._pool.shutdown(wait=wait)
+
+
+class DispatchingTeleBot(telebot.TeleBot):
+    """TeleBot, который передает каждое обновление в очередь его чата"""
+
+    def __init__(self, token: str, dispatcher: ChatDispatcher, **kwargs):
+        # Обработчики выполняются в потоке диспетчера, собственный пул TeleBot не нужен
+        super().__init__(token, threaded=False, **kwargs)
+        self.dispatcher = dispatcher
+        # Запись принятых обновлений (modules/update_recorder.py), None - выключена
+        self.recorder = None
+
+    def process_new_updates(self, updates) -> None:
+        if self.recorder is not None:
+            self.recorder.record_all(updates)
+        for update in updates:
+            # offset для следующего getUpdates сдвигается сразу, в потоке polling
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            self.dispatcher.submit(chat_key(update), timed_update, self._process_update, update)
+
+    def _process_update(self, update: types.Update) -> None:
+        super().process_new_updates([update])
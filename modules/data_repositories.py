@@ -3,8 +3,10 @@
 ПАТТЕРН REPOSITORY ДЛЯ АБСТРАКЦИИ ДОСТУПА К ДАННЫМ
 """
 
-import pandas as pd
+from __future__ import annotations
+
 import pickle
+import threading
 import time
 import pathlib
 from typing import List, Tuple, Optional, Dict, Any
@@ -12,6 +14,16 @@ from abc import ABC, abstractmethod
 import logging
 import datetime
 
+from modules.metrics import METRICS
+from modules.order_snapshot import OrderSnapshot
+from modules.startup import lazy_module
+
+# ✅ pandas ЗАГРУЖАЕТСЯ ПРИ ПЕРВОМ ЧТЕНИИ EXCEL, А НЕ ПРИ ЗАПУСКЕ БОТА
+pd = lazy_module('pandas')
+
+CACHE_LOOKUPS = METRICS.counter('tsm_repository_cache_total', 'Обращения к кэшу репозиториев', ('cache', 'result'))
+ACCOUNTING_WRITE_SECONDS = METRICS.histogram('tsm_accounting_write_seconds', 'Время записи заказа в файлы учета')
+
 # ✅ БАЗОВЫЕ ИСКЛЮЧЕНИЯ ДЛЯ РЕПОЗИТОРИЕВ
 class RepositoryError(Exception):
     """Базовая ошибка репозитория"""
@@ -42,9 +54,11 @@ class BaseRepository(ABC):
                     cached_data = pickle.load(f)
                 if time.time() - cached_data['timestamp'] < self.cache_ttl:
                     self.logger.info(f"✅ Загружено из кэша: {cache_key}")
+                    CACHE_LOOKUPS.inc(cache=cache_key, result='hit')
                     return cached_data['data']
         except Exception as e:
             self.logger.warning(f"⚠️ Ошибка загрузки кэша {cache_key}: {e}")
+        CACHE_LOOKUPS.inc(cache=cache_key, result='miss')
         return None
     
     def _save_to_cache(self, data: Any, cache_key: str, cache_file: pathlib.Path) -> None:
@@ -89,7 +103,8 @@ class AccountingRepository(BaseRepository):
     """Репозиторий для учета заказов"""
     
     @abstractmethod
-    def save_order(self, session: Dict[str, Any], excel_filename: str, has_photos: str) -> bool:
+    def save_order(self, order: OrderSnapshot, excel_filename: str, has_photos: str,
+                   draft_filename: str = '') -> bool:
         """Сохранить заказ в учет"""
         pass
     
@@ -258,14 +273,25 @@ class ExcelMaterialsRepository(MaterialsRepository):
 class ExcelAccountingRepository(AccountingRepository):
     """Реализация репозитория учета для Excel"""
     
-    def __init__(self, main_folder: pathlib.Path, sections_config: Dict[str, Any], common_accounting_folder: pathlib.Path):
+    def __init__(self, main_folder: pathlib.Path, sections_config: Dict[str, Any], common_accounting_folder: pathlib.Path,
+                 initialize: bool = True):
         super().__init__()
         self.main_folder = main_folder
         self.sections_config = sections_config
         self.common_accounting_folder = common_accounting_folder
+        self._init_lock = threading.Lock()
+        self._initialized = False
         
-        # Инициализируем файлы учета
-        self._initialize_accounting_files()
+        # Инициализируем файлы учета (initialize=False - позже, через ensure_initialized)
+        if initialize:
+            self.ensure_initialized()
+
+    def ensure_initialized(self) -> None:
+        """Файлы учета создаются один раз - при запуске или перед первым заказом"""
+        with self._init_lock:
+            if not self._initialized:
+                self._initialize_accounting_files()
+                self._initialized = True
 
     # ✅ ДОБАВИТЬ ЭТОТ МЕТОД ПРЯМО ЗДЕСЬ - после __init__ и перед save_order
     def _safe_dataframe_concat(self, df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
@@ -296,16 +322,19 @@ class ExcelAccountingRepository(AccountingRepository):
             else:
                 return pd.DataFrame()
 
-    def save_order(self, session: Dict[str, Any], excel_filename: str, has_photos: str) -> bool:
+    def save_order(self, order: OrderSnapshot, excel_filename: str, has_photos: str,
+                   draft_filename: str = '') -> bool:
         """Сохранить заказ в учет"""
+        started = time.perf_counter()
         try:
-            section_id = session['section']
+            self.ensure_initialized()
+            section_id = order.section
             
-            # ✅ ВЫЧИСЛЯЕМ section_name ПЕРВЫМ ДЕЛОМ
-            if section_id.startswith('custom_'):
-                section_name = f"📁 {session['custom_list']}"
-            else:
-                section_name = self.sections_config[section_id]['name']
+            # ✅ ИМЯ РАЗДЕЛА УЖЕ ВЫЧИСЛЕНО В СНИМКЕ ЗАКАЗА
+            section_name = order.section_name
+            if not section_name:
+                section_name = (f"📁 {order.custom_list}" if section_id.startswith('custom_')
+                                else self.sections_config[section_id]['name'])
             
             # ✅ ПОТОМ перезаписываем section_id для учета
             if section_id.startswith('custom_'):
@@ -333,20 +362,17 @@ class ExcelAccountingRepository(AccountingRepository):
             # Добавляем новую запись
             now = datetime.datetime.now()
             order_id = len(df_section) + 1 if not df_section.empty else 1
-            selected_count = len(session['selected_works'])
-            total_hours = sum(hours for _, hours in session['selected_works'])
-            
             new_record = pd.DataFrame([{
                 'ID': order_id,
-                'Дата создания': session['date'].strftime('%d.%m.%Y'),
+                'Дата создания': order.date_text,
                 'Время создания': now.strftime('%H:%M:%S'),
-                'Номер ЗН': session.get('order_number', '000'),
-                'Госномер': session['license_plate'],
-                'Исполнители': session['workers'],
-                'Кол-во работ': selected_count,
-                'Общее время': total_hours,
+                'Номер ЗН': order.order_number,
+                'Госномер': order.license_plate,
+                'Исполнители': order.workers,
+                'Кол-во работ': order.works_count,
+                'Общее время': order.total_hours,
                 'Файл Excel': excel_filename,
-                'Файл черновика': session.get('draft_filename', ''),
+                'Файл черновика': draft_filename,
                 'Фото добавлены': has_photos
             }])
             
@@ -377,14 +403,14 @@ class ExcelAccountingRepository(AccountingRepository):
             
             new_common_record = pd.DataFrame([{
                 'ID': len(df_common) + 1 if not df_common.empty else 1,
-                'Дата создания': session['date'].strftime('%d.%m.%Y'),
+                'Дата создания': order.date_text,
                 'Время создания': now.strftime('%H:%M:%S'),
                 'Раздел': section_name,  # ✅ Теперь правильное имя раздела
-                'Номер ЗН': session.get('order_number', '000'),
-                'Госномер': session['license_plate'],
-                'Исполнители': session['workers'],
-                'Кол-во работ': selected_count,
-                'Общее время': total_hours,
+                'Номер ЗН': order.order_number,
+                'Госномер': order.license_plate,
+                'Исполнители': order.workers,
+                'Кол-во работ': order.works_count,
+                'Общее время': order.total_hours,
                 'Файл Excel': excel_filename,
                 'Фото добавлены': has_photos
             }])
@@ -401,6 +427,8 @@ class ExcelAccountingRepository(AccountingRepository):
         except Exception as e:
             self.logger.error(f"❌ Ошибка сохранения в учет: {e}")
             return False
+        finally:
+            ACCOUNTING_WRITE_SECONDS.observe(time.perf_counter() - started)
     
     def get_order_statistics(self, section: Optional[str] = None) -> Dict[str, Any]:
         """Получить статистику заказов (заглушка для будущей реализации)"""
@@ -502,5 +530,6 @@ class RepositoryFactory:
         return ExcelMaterialsRepository(main_folder)
     
     @staticmethod
-    def create_accounting_repository(main_folder: pathlib.Path, sections_config: Dict[str, Any], common_accounting_folder: pathlib.Path) -> AccountingRepository:
-        return ExcelAccountingRepository(main_folder, sections_config, common_accounting_folder)
\ No newline at end of file
+    def create_accounting_repository(main_folder: pathlib.Path, sections_config: Dict[str, Any], common_accounting_folder: pathlib.Path,
+                                     initialize: bool = True) -> AccountingRepository:
+        return ExcelAccountingRepository(main_folder, sections_config, common_accounting_folder, initialize)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+🚀 ПОВТОРНАЯ ОТПРАВКА ДОКУМЕНТОВ ПО file_id
+ПЕРВАЯ ОТПРАВКА ДОКУМЕНТА ЗАГРУЖАЕТ ФАЙЛ В TELEGRAM, ЕГО file_id СОХРАНЯЕТСЯ В НЕБОЛЬШОЙ
+JSON-КАРТЕ "ЗАКАЗ -> ДОКУМЕНТЫ". РАБОЧИЙ ЧАТ, РУКОВОДИТЕЛИ И /resend ПОЛУЧАЮТ ДОКУМЕНТ
+ПО file_id БЕЗ ПОВТОРНОЙ ЗАГРУЗКИ ФАЙЛА. ВМЕСТЕ С file_id ХРАНИТСЯ ХЭШ ФАЙЛА: ЗАКАЗ, СОЗДАННЫЙ
+ЗАНОВО С ТЕМИ ЖЕ НОМЕРОМ, ДАТОЙ И ГОСНОМЕРОМ, ПЕРЕЗАПИСЫВАЕТ ФАЙЛ - И ЗАГРУЖАЕТСЯ ЗАНОВО
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from telebot.apihelper import ApiTelegramException
+
+MAX_ORDERS = 2000
+
+
+def file_sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentFileIds:
+    """Постоянная карта {ключ заказа: {meta, documents: {тип: {file_id, path, sha256}}}} в JSON-файле"""
+
+    def __init__(self, path: pathlib.Path, max_orders: int = MAX_ORDERS):
+        self.path = pathlib.Path(path)
+        self.max_orders = max_orders
+        self.logger = logging.getLogger('DocumentFileIds')
+        self._lock = threading.Lock()
+        self._orders: Dict[str, Dict[str, Any]] = self._load()
+
+    def get(self, order_key: str, doc_type: str) -> Optional[str]:
+        with self._lock:
+            document = self._orders.get(order_key, {}).get('documents', {}).get(doc_type)
+            return document['file_id'] if document else None
+
+    def documents(self, order_key: str) -> Dict[str, str]:
+        """{тип документа: file_id} в порядке отправки"""
+        with self._lock:
+            documents = self._orders.get(order_key, {}).get('documents', {})
+            return {doc_type: document['file_id'] for doc_type, document in documents.items()}
+
+    def document_path(self, order_key: str, doc_type: str) -> Optional[pathlib.Path]:
+        """Путь к файлу документа - для повторной загрузки, если file_id отклонен"""
+        with self._lock:
+            document = self._orders.get(order_key, {}).get('documents', {}).get(doc_type)
+            return pathlib.Path(document['path']) if document and document.get('path') else None
+
+    def document_hash(self, order_key: str, doc_type: str) -> Optional[str]:
+        """Хэш файла, загруженного под сохраненным file_id"""
+        with self._lock:
+            document = self._orders.get(order_key, {}).get('documents', {}).get(doc_type)
+            return document.get('sha256') if document else None
+
+    def record(self, order_key: str, doc_type: str, file_id: str, path: str = '', sha256: str = '',
+               **meta: Any) -> None:
+        """Запомнить file_id документа и хэш файла. meta - данные для поиска заказа (order_number, owner)"""
+        with self._lock:
+            order = self._orders.pop(order_key, None) or {'created': time.time(), 'documents': {}}
+            order.update(meta)
+            order['documents'][doc_type] = {'file_id': file_id, 'path': str(path), 'sha256': sha256}
+            # Последний записанный заказ - в конце, самые старые вытесняются
+            self._orders[order_key] = order
+            while len(self._orders) > self.max_orders:
+                self._orders.pop(next(iter(self._orders)))
+            self._save()
+
+    def forget(self, order_key: str, doc_type: str) -> None:
+        """file_id больше не принимается Telegram - следующая отправка загрузит файл заново"""
+        with self._lock:
+            documents = self._orders.get(order_key, {}).get('documents', {})
+            if documents.pop(doc_type, None) is not None:
+                self._save()
+
+    def find(self, order_number: Optional[str] = None, owner: Optional[int] = None) -> List[str]:
+        """Ключи заказов по номеру и/или чату техника, новые первыми"""
+        with self._lock:
+            return [
+                order_key for order_key, order in reversed(self._orders.items())
+                if (order_number is None or order.get('order_number') == order_number)
+                and (owner is None or order.get('owner') == owner)
+                and order.get('documents')
+            ]
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"⚠️ Карта file_id не прочитана, начинаем с пустой: {e}")
+            return {}
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        temp_path.write_text(json.dumps(self._orders, ensure_ascii=False), encoding='utf-8')
+        os.replace(temp_path, self.path)
+
+
+class DocumentSender:
+    """send_document, который загружает файл один раз и дальше отправляет по file_id"""
+
+    def __init__(self, bot: Any, file_ids: DocumentFileIds):
+        self.bot = bot
+        self.file_ids = file_ids
+        self.logger = logging.getLogger('DocumentSender')
+        self.stats = {'uploads': 0, 'reused': 0, 'stale': 0, 'changed': 0}
+
+    def send(self, chat_id: Any, order_key: str, doc_type: str, path: Optional[pathlib.Path] = None,
+             caption: Optional[str] = None, **meta: Any) -> Any:
+        """Отправить документ заказа: по сохраненному file_id или загрузкой файла path"""
+        file_id = self.file_ids.get(order_key, doc_type)
+        sha256 = file_sha256(path) if path is not None and os.path.exists(path) else ''
+        if file_id and sha256 and self.file_ids.document_hash(order_key, doc_type) != sha256:
+            # Файл перезаписан (заказ создан заново, перерендерен) - старый file_id не отправляем
+            self.stats['changed'] += 1
+            self.file_ids.forget(order_key, doc_type)
+            file_id = None
+        if file_id:
+            try:
+                message = self.bot.send_document(chat_id, file_id, caption=caption)
+                self.stats['reused'] += 1
+                return message
+            except ApiTelegramException as e:
+                if e.error_code != 400 or path is None:
+                    raise
+                # file_id устарел или отклонен - загружаем файл заново
+                self.stats['stale'] += 1
+                self.logger.warning(f"⚠️ file_id документа {order_key}/{doc_type} отклонен: {e.description}")
+                self.file_ids.forget(order_key, doc_type)
+
+        if path is None:
+            raise FileNotFoundError(f"Документ {order_key}/{doc_type} не загружался и файла нет")
+
+        with open(path, 'rb') as document_file:
+            message = self.bot.send_document(chat_id, document_file, caption=caption)
+        self.stats['uploads'] += 1
+        document = getattr(message, 'document', None)
+        if document is not None:
+            self.file_ids.record(order_key, doc_type, document.file_id, str(pathlib.Path(path).resolve()),
+                                 sha256 or file_sha256(path), **meta)
+        return message
+
+    def resend(self, chat_id: Any, order_key: str) -> int:
+        """Повторить все документы заказа по file_id. Возвращает число отправленных"""
+        documents = self.file_ids.documents(order_key)
+        for doc_type in documents:
+            path = self.file_ids.document_path(order_key, doc_type)
+            self.send(chat_id, order_key, doc_type, path if path and path.exists() else None,
+                      caption=f"📄 {doc_type.upper()} документ")
+        return len(documents)
@@ -4,11 +4,26 @@
 """
 
 import pathlib
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Callable, Union
 from abc import ABC, abstractmethod
 import logging
+import hashlib
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
+from modules.metrics import METRICS
+from modules.order_snapshot import OrderSnapshot, calculate_totals
+
+# ✅ ВЕРСИЯ РАЗМЕТКИ ДОКУМЕНТА - УВЕЛИЧИВАТЬ ПРИ ИЗМЕНЕНИИ create_professional_order
+RENDER_VERSION = 1
+MANIFESTS_FOLDER = "manifests"
+
+DOCUMENT_RENDER_SECONDS = METRICS.histogram('tsm_document_render_seconds', 'Время создания документа заказа', ('type',))
+
 # ✅ БАЗОВЫЕ ИСКЛЮЧЕНИЯ ДЛЯ ДОКУМЕНТОВ
 class DocumentError(Exception):
     """Базовая ошибка создания документов"""
@@ -27,17 +42,19 @@ class DocumentValidationError(DocumentError):
 class Document(ABC):
     """Базовый класс для всех типов документов"""
     
-    def __init__(self, session: Dict[str, Any]):
-        self.session = session
+    def __init__(self, order: Union[OrderSnapshot, Dict[str, Any]]):
         self.logger = logging.getLogger('Document')
-        self._validate_session()
+        self.order = self._to_snapshot(order)
     
-    def _validate_session(self) -> None:
-        """Валидация обязательных данных сессии"""
-        required_fields = ['license_plate', 'date', 'order_number', 'workers', 'selected_works']
-        for field in required_fields:
-            if field not in self.session or not self.session[field]:
-                raise DocumentValidationError(f"Отсутствует обязательное поле: {field}")
+    @staticmethod
+    def _to_snapshot(order: Union[OrderSnapshot, Dict[str, Any]]) -> OrderSnapshot:
+        """Снимок заказа (словарь сессии проходит валидацию обязательных полей)"""
+        if isinstance(order, OrderSnapshot):
+            return order
+        try:
+            return OrderSnapshot.from_session(order)
+        except ValueError as e:
+            raise DocumentValidationError(str(e)) from e
     
     @abstractmethod
     def create(self, output_path: pathlib.Path) -> bool:
@@ -51,29 +68,35 @@ class Document(ABC):
     
     def _get_base_filename(self) -> str:
         """Базовое имя файла для всех документов"""
-        order_number = self.session.get('order_number', '000')
-        date_str = self.session['date'].strftime('%d.%m.%Y')
-        license_plate = self.session['license_plate']
-        return f"№{order_number} {date_str} {license_plate}"
+        return self.order.base_filename
 
 
 # ✅ КОНКРЕТНЫЕ РЕАЛИЗАЦИИ ДОКУМЕНТОВ
 class ExcelDocument(Document):
     """Excel заказ-наряд"""
     
-    def __init__(self, session: Dict[str, Any], excel_processor):
-        super().__init__(session)
+    def __init__(self, order: Union[OrderSnapshot, Dict[str, Any]], excel_processor,
+                 render_cache: Optional['RenderCache'] = None, body_key: Optional[str] = None,
+                 session: Optional[Dict[str, Any]] = None):
+        super().__init__(order)
+        # Словарь в формате сессии для ExcelProcessor
+        self.session = session if session is not None else self.order.to_session()
         self.excel_processor = excel_processor
+        self.render_cache = render_cache
+        self.body_key = body_key
     
     def create(self, output_path: pathlib.Path) -> bool:
         """Создание Excel документа"""
         try:
-            template_path = output_path.parent.parent / "Шаблоны" / "template_autoservice.xlsx"
-            success = self.excel_processor.create_professional_order(
-                self.session, 
-                str(template_path), 
-                str(output_path)
-            )
+            if self.render_cache is not None and self.body_key:
+                success = self._create_from_cache(output_path)
+            else:
+                template_path = output_path.parent.parent / "Шаблоны" / "template_autoservice.xlsx"
+                success = self.excel_processor.create_professional_order(
+                    self.session, 
+                    str(template_path), 
+                    str(output_path)
+                )
             
             if success and output_path.exists():
                 self.logger.info(f"✅ Excel документ создан: {output_path}")
@@ -87,6 +110,18 @@ class ExcelDocument(Document):
     def get_filename(self) -> str:
         """Получение имени Excel файла"""
         return f"{self._get_base_filename()}.xlsx"
+    
+    def _create_from_cache(self, output_path: pathlib.Path) -> bool:
+        """Тело документа из кэша + подстановка полей шапки конкретного заказа"""
+        body = self.render_cache.get(self.body_key)
+        if body is None:
+            body = self.excel_processor.render_body(self.session)
+            self.render_cache.put(self.body_key, body)
+        
+        data = self.excel_processor.patch_order_fields(body, self.excel_processor.get_order_fields(self.session))
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(data)
+        return output_path.stat().st_size > 0
 
 
 class TextDocument(Document):
@@ -95,7 +130,7 @@ class TextDocument(Document):
     def create(self, output_path: pathlib.Path) -> bool:
         """Создание текстового документа"""
         try:
-            content = self._create_draft_content()
+            content = self.order.draft_text
             
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(content)
@@ -113,68 +148,124 @@ class TextDocument(Document):
         """Получение имени текстового файла"""
         return f"{self._get_base_filename()}.txt"
     
-    def _create_draft_content(self) -> str:
-        """Создание содержимого текстового черновика"""
-        content = []
-        content.append(f"{self.session['license_plate']} / {self.session['date'].strftime('%d.%m.%Y')}")
-        content.append(self.session['workers'])
-        content.append("")
-        
-        content.append("РАБОТЫ:")
-        for name, hours in self.session['selected_works']:
-            content.append(f"• {name}")
-        
-        if self.session.get('selected_materials'):
-            content.append("")
-            content.append("МАТЕРИАЛЫ:")
-            for material in self.session['selected_materials']:
-                content.append(f"• {material}")
-        
-        return '\n'.join(content)
+    @staticmethod
+    def parse_draft(draft_path: pathlib.Path) -> Dict[str, Any]:
+        """Разбор ранее созданного черновика: исполнители и материалы"""
+        lines = draft_path.read_text(encoding='utf-8').split('\n')
+        materials = []
+        if "МАТЕРИАЛЫ:" in lines:
+            start = lines.index("МАТЕРИАЛЫ:") + 1
+            materials = [line[2:] for line in lines[start:] if line.startswith('• ')]
+        return {
+            'workers': lines[1] if len(lines) > 1 else '',
+            'selected_materials': materials
+        }
+
+
+# ✅ КЭШ ОТРЕНДЕРЕННЫХ ТЕЛ ДОКУМЕНТОВ
+class RenderCache:
+    """LRU-кэш тел xlsx по хэшу входных данных (без полей конкретного заказа)"""
+    
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+    
+    def put(self, key: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
 
 
 # ✅ ФАБРИКА ДОКУМЕНТОВ
 class DocumentFactory:
     """Фабрика для создания документов заказ-нарядов"""
     
-    def __init__(self, excel_processor):
+    def __init__(self, excel_processor, render_cache_size: int = 64):
         self.excel_processor = excel_processor
         self.logger = logging.getLogger('DocumentFactory')
+        self.render_cache = RenderCache(render_cache_size) if render_cache_size > 0 else None
+        
+        # ✅ ТЕЛА ДОКУМЕНТОВ УСТАРЕВАЮТ ПРИ ИЗМЕНЕНИИ ШАБЛОНОВ ШАПОК
+        if self.render_cache is not None:
+            self.excel_processor.header_manager.store.subscribe(lambda changed_ids: self.render_cache.clear())
     
-    def create_all(self, session: Dict[str, Any], section_folder: pathlib.Path) -> Dict[str, pathlib.Path]:
-        """Создание всех типов документов для заказа"""
+    def create_all(self, order: Union[OrderSnapshot, Dict[str, Any]], section_folder: pathlib.Path,
+                   on_document: Optional[Callable[[str, pathlib.Path], None]] = None) -> Dict[str, pathlib.Path]:
+        """Создание всех типов документов для заказа. on_document(тип, путь) - сразу после создания каждого"""
         try:
+            order = Document._to_snapshot(order)
+            session = order.to_session()
             orders_folder = section_folder / "Заказы"
             orders_folder.mkdir(parents=True, exist_ok=True)
             
             documents = {}
             
             # Создаем Excel документ
-            excel_doc = ExcelDocument(session, self.excel_processor)
+            excel_doc = self._make_excel_document(order, session)
             excel_filename = excel_doc.get_filename()
             excel_path = orders_folder / excel_filename
             
-            if excel_doc.create(excel_path):
+            with DOCUMENT_RENDER_SECONDS.time(type='excel'):
+                excel_created = excel_doc.create(excel_path)
+            if excel_created:
                 documents['excel'] = excel_path
+                if on_document:
+                    on_document('excel', excel_path)
             
             # Создаем текстовый документ
-            text_doc = TextDocument(session)
+            text_doc = TextDocument(order)
             text_filename = text_doc.get_filename()
             text_path = orders_folder / text_filename
             
-            if text_doc.create(text_path):
+            with DOCUMENT_RENDER_SECONDS.time(type='text'):
+                text_created = text_doc.create(text_path)
+            if text_created:
                 documents['text'] = text_path
+                if on_document:
+                    on_document('text', text_path)
             
-            self.logger.info(f"✅ Создано документов: {len(documents)}")
+            # ✅ МАНИФЕСТ ДЛЯ ПОСЛЕДУЮЩЕЙ ПЕРЕГЕНЕРАЦИИ
+            self._write_manifest(session, orders_folder, excel_path.stem)
+            
+            if self.render_cache is not None:
+                cache_stats = self.render_cache.stats()
+                self.logger.info(f"✅ Создано документов: {len(documents)} "
+                                 f"(кэш: {cache_stats['hits']} попаданий, {cache_stats['misses']} промахов)")
+            else:
+                self.logger.info(f"✅ Создано документов: {len(documents)}")
             return documents
             
         except Exception as e:
             raise DocumentCreationError(f"Ошибка создания документов через фабрику: {e}") from e
     
-    def create_excel(self, session: Dict[str, Any], section_folder: pathlib.Path) -> Optional[pathlib.Path]:
+    def create_excel(self, order: Union[OrderSnapshot, Dict[str, Any]], section_folder: pathlib.Path) -> Optional[pathlib.Path]:
         """Создание только Excel документа"""
         try:
-            excel_doc = ExcelDocument(session, self.excel_processor)
+            order = Document._to_snapshot(order)
+            excel_doc = self._make_excel_document(order, order.to_session())
             orders_folder = section_folder / "Заказы"
             orders_folder.mkdir(parents=True, exist_ok=True)
             
@@ -189,10 +280,10 @@ class DocumentFactory:
             self.logger.error(f"❌ Ошибка создания Excel документа: {e}")
             return None
     
-    def create_text(self, session: Dict[str, Any], section_folder: pathlib.Path) -> Optional[pathlib.Path]:
+    def create_text(self, order: Union[OrderSnapshot, Dict[str, Any]], section_folder: pathlib.Path) -> Optional[pathlib.Path]:
         """Создание только текстового документа"""
         try:
-            text_doc = TextDocument(session)
+            text_doc = TextDocument(order)
             orders_folder = section_folder / "Заказы"
             orders_folder.mkdir(parents=True, exist_ok=True)
             
@@ -208,6 +299,201 @@ class DocumentFactory:
             return None
 
 
+    def _make_excel_document(self, order: OrderSnapshot, session: Dict[str, Any]) -> ExcelDocument:
+        if self.render_cache is None:
+            return ExcelDocument(order, self.excel_processor, session=session)
+        return ExcelDocument(order, self.excel_processor, self.render_cache,
+                             self.compute_body_hash(session), session=session)
+    
+    def _get_template_version(self, session: Dict[str, Any]) -> str:
+        template_id = session.get('header_template') or 'bridge_town'
+        return self.excel_processor.header_manager.get_compiled_template(template_id).version
+    
+    @staticmethod
+    def _hash_payload(payload: Dict[str, Any]) -> str:
+        canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def compute_body_hash(self, session: Dict[str, Any]) -> str:
+        """Хэш тела документа: шаблон шапки, работы, материалы и итоги (без полей заказа)"""
+        totals = DocumentUtils.calculate_totals(session)
+        return self._hash_payload({
+            'render_version': RENDER_VERSION,
+            'template_version': self._get_template_version(session),
+            'works': [[name, float(hours)] for name, hours in session['selected_works']],
+            'materials': list(session.get('selected_materials', [])),
+            'totals': totals,
+        })
+    
+    # ✅ ПАКЕТНАЯ ПЕРЕГЕНЕРАЦИЯ ЗАКАЗОВ
+    def compute_render_hash(self, session: Dict[str, Any]) -> str:
+        """Канонический хэш всех входных данных рендеринга (тело + поля заказа + исполнители)"""
+        return self._hash_payload({
+            'body': self.compute_body_hash(session),
+            'fields': self.excel_processor.get_order_fields(session),
+            'workers': session['workers'],
+        })
+    
+    def _write_manifest(self, session: Dict[str, Any], orders_folder: pathlib.Path, base_filename: str) -> None:
+        """Сохраняет входные данные заказа рядом с документами"""
+        try:
+            manifests_folder = orders_folder / MANIFESTS_FOLDER
+            manifests_folder.mkdir(parents=True, exist_ok=True)
+            manifest = {
+                'section': session.get('section'),
+                'custom_list': session.get('custom_list'),
+                'header_template': session.get('header_template') or 'bridge_town',
+                'license_plate': session['license_plate'],
+                'date': session['date'].strftime('%Y-%m-%d'),
+                'order_number': str(session.get('order_number', '000')),
+                'workers': session['workers'],
+                'selected_works': [[name, float(hours)] for name, hours in session['selected_works']],
+                'selected_materials': list(session.get('selected_materials', [])),
+                'render_hash': self.compute_render_hash(session),
+            }
+            manifest_path = manifests_folder / f"{base_filename}.json"
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            # Манифест не критичен для выдачи документов
+            self.logger.warning(f"⚠️ Не удалось сохранить манифест заказа: {e}")
+    
+    def find_orders(self, section_folders: Dict[str, pathlib.Path],
+                    date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                    section: Optional[str] = None, header_template: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Поиск ранее созданных заказов по фильтру (даты включительно)"""
+        orders = []
+        
+        for section_id, section_folder in section_folders.items():
+            if section and section not in (section_id, section_folder.name):
+                continue
+            
+            orders_folder = section_folder / "Заказы"
+            if not orders_folder.exists():
+                continue
+            
+            for excel_path in sorted(orders_folder.glob("*.xlsx")):
+                try:
+                    session = self._load_order_session(excel_path, section_id)
+                except Exception as e:
+                    self.logger.warning(f"⚠️ Пропущен заказ {excel_path.name}: {e}")
+                    continue
+                
+                if date_from and session['date'] < date_from:
+                    continue
+                if date_to and session['date'] > date_to:
+                    continue
+                if header_template and session.get('header_template') != header_template:
+                    continue
+                
+                orders.append({'session': session, 'section_folder': section_folder, 'excel_path': excel_path})
+        
+        return orders
+    
+    def _load_order_session(self, excel_path: pathlib.Path, section_id: str) -> Dict[str, Any]:
+        """Данные заказа из манифеста или, для старых заказов, из самих документов"""
+        manifest_path = excel_path.parent / MANIFESTS_FOLDER / f"{excel_path.stem}.json"
+        
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            session = dict(manifest)
+            session['date'] = datetime.strptime(manifest['date'], '%Y-%m-%d')
+            session['selected_works'] = [(name, hours) for name, hours in manifest['selected_works']]
+            return session
+        
+        session = self.excel_processor.read_order_inputs(excel_path)
+        session['section'] = section_id
+        session['workers'] = ''
+        
+        draft_path = excel_path.with_suffix('.txt')
+        if draft_path.exists():
+            session.update(TextDocument.parse_draft(draft_path))
+        
+        if not session['workers']:
+            raise DocumentValidationError("не найдены исполнители (нет черновика)")
+        if not session.get('header_template'):
+            raise DocumentValidationError("шаблон шапки заказчика не найден")
+        
+        session['render_hash'] = None
+        return session
+    
+    def rerender_orders(self, orders: List[Dict[str, Any]], workers: int = 4, force: bool = False,
+                        progress: Optional[Callable[[int, int, float], None]] = None) -> Dict[str, Any]:
+        """Пакетная перегенерация заказов с пропуском неизменившихся по хэшу"""
+        started = time.perf_counter()
+        stats = {'total': len(orders), 'rendered': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        
+        jobs = []
+        for order in orders:
+            session = order['session']
+            if not force and session.get('render_hash') == self.compute_render_hash(session) \
+                    and order['excel_path'].exists():
+                stats['skipped'] += 1
+                continue
+            jobs.append((session, order['section_folder']))
+        
+        done = stats['skipped']
+        if progress:
+            progress(done, stats['total'], time.perf_counter() - started)
+        
+        def _account(result: Tuple[bool, str]) -> None:
+            nonlocal done
+            success, message = result
+            if success:
+                stats['rendered'] += 1
+            else:
+                stats['failed'] += 1
+                stats['errors'].append(message)
+            done += 1
+            if progress:
+                progress(done, stats['total'], time.perf_counter() - started)
+        
+        if workers <= 1 or len(jobs) <= 1:
+            for session, section_folder in jobs:
+                _account(_rerender_one(self, session, section_folder))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_rerender_worker) as pool:
+                futures = [pool.submit(_rerender_worker, session, section_folder) for session, section_folder in jobs]
+                for future in as_completed(futures):
+                    try:
+                        _account(future.result())
+                    except Exception as e:
+                        _account((False, str(e)))
+        
+        stats['elapsed'] = time.perf_counter() - started
+        stats['throughput'] = stats['rendered'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+        self.logger.info(
+            f"✅ Перегенерация: {stats['rendered']} создано, {stats['skipped']} без изменений, "
+            f"{stats['failed']} ошибок за {stats['elapsed']:.1f} c"
+        )
+        return stats
+
+
+# ✅ ФУНКЦИИ ПРОЦЕССОВ-ИСПОЛНИТЕЛЕЙ (должны быть на уровне модуля для pickle)
+_worker_factory: Optional[DocumentFactory] = None
+
+
+def _init_rerender_worker() -> None:
+    """Инициализация фабрики в процессе-исполнителе"""
+    global _worker_factory
+    from modules.excel_processor import ExcelProcessor
+    _worker_factory = DocumentFactory(ExcelProcessor())
+
+
+def _rerender_worker(session: Dict[str, Any], section_folder: pathlib.Path) -> Tuple[bool, str]:
+    return _rerender_one(_worker_factory, session, section_folder)
+
+
+def _rerender_one(factory: DocumentFactory, session: Dict[str, Any], section_folder: pathlib.Path) -> Tuple[bool, str]:
+    """Перегенерация одного заказа. Возвращает (успех, описание)"""
+    try:
+        documents = factory.create_all(session, section_folder)
+        return True, str(documents.get('excel', ''))
+    except Exception as e:
+        return False, f"№{session.get('order_number', '000')} {session.get('license_plate', '')}: {e}"
+
+
 # ✅ УТИЛИТЫ ДЛЯ РАБОТЫ С ДОКУМЕНТАМИ
 class DocumentUtils:
     """Утилиты для работы с документами"""
@@ -221,24 +507,4 @@ class DocumentUtils:
     @staticmethod
     def calculate_totals(session: Dict[str, Any]) -> Dict[str, float]:
         """Расчет итоговых сумм для документов"""
-        works_total = sum(hours for _, hours in session['selected_works']) * 2500
-        
-        materials_data = {
-            "ВД-40": 375,
-            "Перчатки": 95, 
-            "Смазка": 210,
-            "Диск отрезной": 120
-        }
-        
-        selected_materials = session.get('selected_materials', [])
-        if not selected_materials:
-            selected_materials = list(materials_data.keys())
-        
-        materials_total = sum(materials_data.get(material, 0) for material in selected_materials)
-        total_amount = works_total + materials_total
-        
-        return {
-            'works_total': works_total,
-            'materials_total': materials_total,
-            'total_amount': total_amount
-        }
\ No newline at end of file
+        return calculate_totals(session['selected_works'], session.get('selected_materials', []))
\ No newline at end of file
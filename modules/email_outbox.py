@@ -0,0 +1,280 @@
+"""
+🚀 ИСХОДЯЩАЯ ПОЧТА ЧЕРЕЗ ОЧЕРЕДЬ НА ДИСКЕ
+ПИСЬМА СОХРАНЯЮТСЯ В ПАПКУ ОЧЕРЕДИ (ПЕРЕЖИВАЮТ ПЕРЕЗАПУСК) И ОТПРАВЛЯЮТСЯ ФОНОВЫМ ПОТОКОМ
+ПАЧКАМИ ЧЕРЕЗ ОДНО ДОЛГОЖИВУЩЕЕ SMTP-СОЕДИНЕНИЕ (STARTTLS + LOGIN ОДИН РАЗ),
+ВРЕМЕННЫЕ ОШИБКИ ПОВТОРЯЮТСЯ С ЭКСПОНЕНЦИАЛЬНОЙ ПАУЗОЙ, ОКОНЧАТЕЛЬНЫЕ - В ПАПКУ failed
+"""
+
+import json
+import logging
+import os
+import pathlib
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from email.message import Message
+from email.utils import getaddresses
+from typing import Any, Dict, List, Optional
+
+MAX_BACKOFF = 15 * 60
+
+
+@dataclass(frozen=True)
+class SMTPSettings:
+    """Параметры SMTP-сервера"""
+    host: str = 'smtp.mail.ru'
+    port: int = 587
+    username: Optional[str] = None
+    password: Optional[str] = None
+    starttls: bool = True
+    timeout: float = 30.0
+
+
+class SMTPConnection:
+    """Одно SMTP-соединение, которое переиспользуется между письмами и закрывается при простое"""
+
+    def __init__(self, settings: SMTPSettings, idle_timeout: float = 60.0):
+        self.settings = settings
+        self.idle_timeout = idle_timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def get(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout / 2:
+            # Сервер мог закрыть простаивающее соединение - проверяем перед отправкой
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.settings.host, self.settings.port, timeout=self.settings.timeout)
+            try:
+                smtp.ehlo()
+                if self.settings.starttls:
+                    smtp.starttls()
+                    smtp.ehlo()
+                if self.settings.username and self.settings.password:
+                    smtp.login(self.settings.username, self.settings.password)
+            except BaseException:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self.connects += 1
+        self._last_used = time.monotonic()
+        return self._smtp
+
+    def close_if_idle(self) -> None:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+
+class EmailOutbox:
+    """Очередь писем на диске + фоновый отправитель"""
+
+    def __init__(self, spool_dir: pathlib.Path, settings: SMTPSettings, batch_size: int = 20,
+                 max_retries: int = 5, retry_delay: float = 30.0, idle_timeout: float = 60.0,
+                 start: bool = True, tracer: Optional[Any] = None):
+        self.spool_dir = pathlib.Path(spool_dir)
+        self.pending_dir = self.spool_dir / "pending"
+        self.failed_dir = self.spool_dir / "failed"
+        self.pending_dir.mkdir(parents=True, exist_ok=True)
+        self.failed_dir.mkdir(parents=True, exist_ok=True)
+
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.connection = SMTPConnection(settings, idle_timeout)
+        self.logger = logging.getLogger('EmailOutbox')
+        self.stats = {'queued': 0, 'sent': 0, 'retries': 0, 'failed': 0}
+        # OrderTracer: отправка письма - этап smtp в трассе заказа
+        self.tracer = tracer
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    # ✅ ПОСТАНОВКА В ОЧЕРЕДЬ
+    def enqueue(self, message: Message, to_addrs: Optional[List[str]] = None, trace_id: str = '') -> str:
+        """Сохранить письмо в очередь. Возвращает id письма; отправка - в фоне"""
+        from_addr = message['From']
+        if to_addrs is None:
+            fields = message.get_all('To', []) + message.get_all('Cc', []) + message.get_all('Bcc', [])
+            to_addrs = [address for _, address in getaddresses(fields) if address]
+        if not from_addr or not to_addrs:
+            raise ValueError("У письма должны быть отправитель и получатели")
+
+        # Имя начинается со времени - письма отправляются в порядке постановки
+        message_id = f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+        meta = {'from': from_addr, 'to': to_addrs, 'attempts': 0, 'next_attempt': 0.0, 'last_error': '',
+                'trace': trace_id, 'queued_at': time.time()}
+        self._write_atomic(self.pending_dir / f"{message_id}.eml", message.as_bytes())
+        self._write_meta(message_id, meta)
+
+        self.stats['queued'] += 1
+        self._wakeup.set()
+        return message_id
+
+    def pending(self) -> List[str]:
+        return sorted(path.stem for path in self.pending_dir.glob('*.json'))
+
+    def failed(self) -> List[str]:
+        return sorted(path.stem for path in self.failed_dir.glob('*.json'))
+
+    # ✅ ФОНОВАЯ ОТПРАВКА
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Остановить отправителя. Неотправленные письма остаются в очереди на диске"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self.connection.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                wait = self.drain()
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка очереди писем: {e}")
+                wait = self.retry_delay
+            self.connection.close_if_idle()
+            self._wakeup.wait(timeout=min(wait, self.connection.idle_timeout))
+            self._wakeup.clear()
+
+    def drain(self) -> float:
+        """Отправить письма, срок которых наступил. Возвращает паузу до следующей попытки"""
+        next_wait = float('inf')
+        while not self._stop.is_set():
+            now = time.time()
+            due = []
+            for message_id in self.pending():
+                meta = self._read_meta(message_id)
+                if meta is None:
+                    continue
+                if meta['next_attempt'] <= now:
+                    due.append((message_id, meta))
+                    if len(due) >= self.batch_size:
+                        break
+                else:
+                    next_wait = min(next_wait, meta['next_attempt'] - now)
+            if not due:
+                return next_wait
+            if not self._send_batch(due):
+                return min(next_wait, self.retry_delay)
+        return next_wait
+
+    def _send_batch(self, batch: List[tuple]) -> bool:
+        """Пачка писем через одно соединение. False - соединение недоступно"""
+        try:
+            smtp = self.connection.get()
+        except (smtplib.SMTPException, OSError) as e:
+            self.logger.warning(f"⚠️ SMTP-сервер недоступен: {e}")
+            for message_id, meta in batch:
+                self._schedule_retry(message_id, meta, e)
+            return False
+
+        for message_id, meta in batch:
+            data = (self.pending_dir / f"{message_id}.eml").read_bytes()
+            started = time.perf_counter()
+            try:
+                refused = smtp.sendmail(meta['from'], meta['to'], data)
+            except smtplib.SMTPRecipientsRefused as e:
+                # Временный отказ (450/451 - greylisting) - повтор позже, постоянные адреса исключаются
+                temporary = [address for address, (code, _) in e.recipients.items() if 400 <= code < 500]
+                if temporary:
+                    if len(temporary) < len(e.recipients):
+                        self.logger.warning(f"⚠️ Письмо {message_id}: отклонены адреса "
+                                            f"{[address for address in e.recipients if address not in temporary]}")
+                    meta['to'] = temporary
+                    self._schedule_retry(message_id, meta, e)
+                else:
+                    self._fail(message_id, meta, e)
+                continue
+            except smtplib.SMTPResponseException as e:
+                if 400 <= e.smtp_code < 500:
+                    self._schedule_retry(message_id, meta, e)
+                else:
+                    self._fail(message_id, meta, e)
+                continue
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPException, OSError, socket.timeout) as e:
+                # Соединение потеряно - письмо и остаток пачки повторяем позже на новом соединении
+                self.connection.close()
+                self._schedule_retry(message_id, meta, e)
+                return False
+
+            if refused:
+                self.logger.warning(f"⚠️ Письмо {message_id}: отклонены адреса {list(refused)}")
+            self._remove(message_id)
+            self.stats['sent'] += 1
+            if self.tracer and meta.get('trace'):
+                self.tracer.record(meta['trace'], 'smtp', time.perf_counter() - started, attempts=meta['attempts'] + 1,
+                                   queued_s=round(time.time() - meta.get('queued_at', time.time()), 1))
+            self.logger.info(f"✅ Письмо отправлено: {', '.join(meta['to'])}")
+        return True
+
+    def _schedule_retry(self, message_id: str, meta: Dict[str, Any], error: Exception) -> None:
+        meta['attempts'] += 1
+        meta['last_error'] = str(error)
+        if meta['attempts'] > self.max_retries:
+            self._fail(message_id, meta, error)
+            return
+        delay = min(MAX_BACKOFF, self.retry_delay * (2 ** (meta['attempts'] - 1)))
+        meta['next_attempt'] = time.time() + delay
+        self._write_meta(message_id, meta)
+        self.stats['retries'] += 1
+
+    def _fail(self, message_id: str, meta: Dict[str, Any], error: Exception) -> None:
+        meta['last_error'] = str(error)
+        self._write_meta(message_id, meta)
+        for suffix in ('.eml', '.json'):
+            os.replace(self.pending_dir / f"{message_id}{suffix}", self.failed_dir / f"{message_id}{suffix}")
+        self.stats['failed'] += 1
+        self.logger.error(f"❌ Письмо {message_id} не отправлено: {error}")
+
+    # ✅ ФАЙЛЫ ОЧЕРЕДИ
+    def _remove(self, message_id: str) -> None:
+        for suffix in ('.json', '.eml'):
+            (self.pending_dir / f"{message_id}{suffix}").unlink(missing_ok=True)
+
+    def _read_meta(self, message_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self.pending_dir / f"{message_id}.json").read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, message_id: str, meta: Dict[str, Any]) -> None:
+        # .json пишется после .eml - письмо без метаданных в очередь не попадает
+        self._write_atomic(self.pending_dir / f"{message_id}.json",
+                           json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def _write_atomic(path: pathlib.Path, data: bytes) -> None:
+        temp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
@@ -3,16 +3,37 @@
 ФИНАЛЬНАЯ ВЕРСИЯ С ПОДДЕРЖКОЙ ШАБЛОНОВ ШАПОК
 """
 
-import openpyxl
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from openpyxl.utils import get_column_letter
-from num2words import num2words
 import os
 import logging
 from typing import Dict, Any, Optional, Tuple, List
-import json
 import pathlib
+import datetime
+import io
+import threading
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
+
+from modules.amount_in_words import rubles_in_words
+from modules.template_store import HeaderTemplateStore, CompiledHeaderTemplate, header_style
+from modules.startup import lazy_import
+
+# ✅ openpyxl ЗАГРУЖАЕТСЯ ПРИ ПЕРВОМ ДОКУМЕНТЕ, А НЕ ПРИ ЗАПУСКЕ БОТА
+Workbook = lazy_import('openpyxl', 'Workbook')
+load_workbook = lazy_import('openpyxl', 'load_workbook')
+Font = lazy_import('openpyxl.styles', 'Font')
+PatternFill = lazy_import('openpyxl.styles', 'PatternFill')
+Border = lazy_import('openpyxl.styles', 'Border')
+Side = lazy_import('openpyxl.styles', 'Side')
+Alignment = lazy_import('openpyxl.styles', 'Alignment')
+
+# ✅ МЕТКИ ПОЛЕЙ ЗАКАЗА В КЭШИРУЕМОМ ТЕЛЕ ДОКУМЕНТА
+ORDER_FIELD_PLACEHOLDERS = {
+    'order_number': '__TSM_ORDER_NUMBER__',
+    'date': '__TSM_ORDER_DATE__',
+    'license_plate': '__TSM_LICENSE_PLATE__',
+}
+# Строки хранятся либо в таблице общих строк, либо прямо в листе (inlineStr) - зависит от версии openpyxl
+TEXT_PARTS = ('xl/sharedStrings.xml', 'xl/worksheets/')
 
 # ✅ КОНКРЕТНЫЕ ИСКЛЮЧЕНИЯ ДЛЯ EXCEL ПРОЦЕССОРА
 class ExcelProcessingError(Exception):
@@ -40,33 +61,27 @@ class FormattingError(ExcelProcessingError):
     pass
 
 class HeaderTemplateManager:
-    """Менеджер шаблонов шапок документов"""
+    """Менеджер шаблонов шапок документов (поверх общего HeaderTemplateStore)"""
     
     def __init__(self, templates_path: pathlib.Path):
         self.templates_path = templates_path
-        self.templates = {}
+        self.store = HeaderTemplateStore.shared(templates_path)
         self._load_templates()
     
+    @property
+    def templates(self) -> Dict[str, Dict[str, Any]]:
+        return self.store.all()
+    
     def _load_templates(self) -> None:
         """Загрузка всех шаблонов шапок из папки"""
         try:
-            # Создаем папку если не существует
-            self.templates_path.mkdir(parents=True, exist_ok=True)
-            
-            template_files = list(self.templates_path.glob("*.json"))
-            for template_file in template_files:
-                try:
-                    with open(template_file, 'r', encoding='utf-8') as f:
-                        template_data = json.load(f)
-                        self.templates[template_data['id']] = template_data
-                    print(f"✅ Загружен шаблон: {template_data['name']}")
-                except Exception as e:
-                    print(f"❌ Ошибка загрузки шаблона {template_file}: {e}")
+            for template_data in self.templates.values():
+                print(f"✅ Загружен шаблон: {template_data['name']}")
             
-            print(f"✅ Всего загружено шаблонов шапок: {len(self.templates)}")
+            print(f"✅ Всего загружено шаблонов шапок: {len(self.store)}")
             
             # Если нет шаблонов, создаем базовые
-            if not self.templates:
+            if not len(self.store):
                 self._create_default_templates()
                 
         except Exception as e:
@@ -75,9 +90,8 @@ class HeaderTemplateManager:
     def reload_templates(self) -> None:
         """ПЕРЕЗАГРУЗИТЬ ШАБЛОНЫ ИЗ ФАЙЛОВОЙ СИСТЕМЫ"""
         print("🔄 Перезагружаем шаблоны шапок...")
-        self.templates = {}  # Очищаем кэш
-        self._load_templates()  # Загружаем заново
-        print(f"✅ Шаблоны перезагружены. Доступно: {len(self.templates)}")            
+        self.store.refresh(force=True)
+        print(f"✅ Шаблоны перезагружены. Доступно: {len(self.store)}")            
     
     def _create_default_templates(self) -> None:
         """Создание шаблонов по умолчанию"""
@@ -119,21 +133,22 @@ class HeaderTemplateManager:
         ]
         
         for template_data in default_templates:
-            template_file = self.templates_path / f"{template_data['id']}.json"
-            try:
-                with open(template_file, 'w', encoding='utf-8') as f:
-                    json.dump(template_data, f, ensure_ascii=False, indent=2)
-                self.templates[template_data['id']] = template_data
+            if self.store.save(template_data):
                 print(f"✅ Создан шаблон по умолчанию: {template_data['name']}")
-            except Exception as e:
-                print(f"❌ Ошибка создания шаблона {template_data['id']}: {e}")
+            else:
+                print(f"❌ Ошибка создания шаблона {template_data['id']}")
     
     def get_template(self, template_id: str) -> Dict[str, Any]:
         """Получить шаблон по ID"""
-        return self.templates.get(template_id)
+        return self.store.get(template_id)
+    
+    def get_compiled_template(self, template_id: str) -> Optional[CompiledHeaderTemplate]:
+        """Шаблон с готовым планом строк шапки; неизвестный ID -> шаблон по умолчанию"""
+        return self.store.get_compiled(template_id) or self.store.get_compiled('bridge_town')
     
     def get_available_templates(self) -> List[Dict[str, str]]:
         """Получить список доступных шаблонов"""
+        self.store.refresh()
         return [
             {'id': template_id, 'name': template_data['name']}
             for template_id, template_data in self.templates.items()
@@ -142,50 +157,29 @@ class HeaderTemplateManager:
 class ExcelProcessor:
     def __init__(self):
         self.rate_per_hour = 2500
-        # ✅ ДОБАВЛЯЕМ МЕНЕДЖЕР ШАБЛОНОВ
-        self.header_manager = HeaderTemplateManager(
-            pathlib.Path("Шаблоны") / "header_templates"
-        )
-        # ✅ ДОБАВЛЯЕМ ОТЛАДКУ ЗАГРУЗКИ ШАБЛОНОВ
-        print("🔍 DEBUG: Загружены шаблоны шапок:")
-        templates = self.header_manager.get_available_templates()
-        for template in templates:
-            print(f"   - {template['name']} (ID: {template['id']})")
-        print(f"🔍 DEBUG: Всего загружено шаблонов: {len(templates)}")
+        self._header_manager: Optional[HeaderTemplateManager] = None
+        self._header_manager_lock = threading.Lock()
+
+    @property
+    def header_manager(self) -> HeaderTemplateManager:
+        """✅ МЕНЕДЖЕР ШАБЛОНОВ - СОЗДАЕТСЯ ПРИ ПЕРВОМ ОБРАЩЕНИИ (НЕ ЗАМЕДЛЯЕТ ЗАПУСК)"""
+        if self._header_manager is None:
+            with self._header_manager_lock:
+                if self._header_manager is None:
+                    manager = HeaderTemplateManager(pathlib.Path("Шаблоны") / "header_templates")
+                    # ✅ ДОБАВЛЯЕМ ОТЛАДКУ ЗАГРУЗКИ ШАБЛОНОВ
+                    print("🔍 DEBUG: Загружены шаблоны шапок:")
+                    templates = manager.get_available_templates()
+                    for template in templates:
+                        print(f"   - {template['name']} (ID: {template['id']})")
+                    print(f"🔍 DEBUG: Всего загружено шаблонов: {len(templates)}")
+                    self._header_manager = manager
+        return self._header_manager
 
     def create_professional_order(self, session: Dict[str, Any], template_path: str, output_path: str) -> bool:
         """СОЗДАЕМ ПРОФЕССИОНАЛЬНЫЙ ЗАКАЗ-НАРЯД С ЧЕТКОЙ СТРУКТУРОЙ И УЛУЧШЕННОЙ ОБРАБОТКОЙ ОШИБОК"""
         try:
-            # Создаем новую рабочую книгу
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Заказ-наряд"
-            
-            # БЛОК 1: ШАПКА ДОКУМЕНТА
-            header_end_row = self._create_header_block(ws, session)
-            
-            # БЛОК 2: РАБОТЫ
-            works_start_row = header_end_row + 1  # Начинаем после шапки
-            works_end_row = self._create_works_block(ws, session, works_start_row)
-            
-            # БЛОК 3: МАТЕРИАЛЫ
-            materials_start_row = works_end_row + 2  # Отступ после работ
-            materials_end_row = self._create_materials_block(ws, session, materials_start_row)
-            
-            # БЛОК 4: ИТОГИ И СУММИРОВАНИЕ
-            totals_start_row = materials_end_row + 2  # Отступ после материалов
-            totals_end_row = self._create_totals_block(ws, works_start_row, works_end_row, 
-                                                     materials_start_row, materials_end_row, 
-                                                     totals_start_row, session)
-            
-            # БЛОК 5: ПОДПИСИ И КОММЕНТАРИИ
-            footer_start_row = totals_end_row + 2
-            self._create_footer_block(ws, footer_start_row)
-            
-            # ПРИМЕНЯЕМ ФОРМАТИРОВАНИЕ
-            self._apply_professional_formatting(ws, works_start_row, works_end_row, 
-                                              materials_start_row, materials_end_row,
-                                              totals_start_row, footer_start_row)
+            wb = self.build_workbook(session)
             
             # Сохраняем файл
             self._save_workbook_safely(wb, output_path)
@@ -199,6 +193,83 @@ class ExcelProcessor:
             # Обертываем неожиданные ошибки в конкретное исключение
             raise ExcelGenerationError(f"Неожиданная ошибка при создании Excel: {e}") from e
     
+    def build_workbook(self, session: Dict[str, Any], fields: Optional[Dict[str, str]] = None) -> Workbook:
+        """Сборка рабочей книги заказ-наряда. fields - строки полей конкретного заказа (номер, дата, госномер)"""
+        if fields is None:
+            fields = self.get_order_fields(session)
+        
+        # Создаем новую рабочую книгу
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Заказ-наряд"
+        
+        # БЛОК 1: ШАПКА ДОКУМЕНТА
+        header_end_row = self._create_header_block(ws, session, fields)
+        
+        # БЛОК 2: РАБОТЫ
+        works_start_row = header_end_row + 1  # Начинаем после шапки
+        works_end_row = self._create_works_block(ws, session, works_start_row)
+        
+        # БЛОК 3: МАТЕРИАЛЫ
+        materials_start_row = works_end_row + 2  # Отступ после работ
+        materials_end_row = self._create_materials_block(ws, session, materials_start_row, fields)
+        
+        # БЛОК 4: ИТОГИ И СУММИРОВАНИЕ
+        totals_start_row = materials_end_row + 2  # Отступ после материалов
+        totals_end_row = self._create_totals_block(ws, works_start_row, works_end_row, 
+                                                 materials_start_row, materials_end_row, 
+                                                 totals_start_row, session)
+        
+        # БЛОК 5: ПОДПИСИ И КОММЕНТАРИИ
+        footer_start_row = totals_end_row + 2
+        self._create_footer_block(ws, footer_start_row)
+        
+        # ПРИМЕНЯЕМ ФОРМАТИРОВАНИЕ
+        self._apply_professional_formatting(ws, works_start_row, works_end_row, 
+                                          materials_start_row, materials_end_row,
+                                          totals_start_row, footer_start_row)
+        return wb
+    
+    # ✅ КЭШИРУЕМОЕ ТЕЛО ДОКУМЕНТА: ПОЛЯ ЗАКАЗА ЗАМЕНЯЮТСЯ МЕТКАМИ И ПОДСТАВЛЯЮТСЯ ПОТОМ
+    @staticmethod
+    def get_order_fields(session: Dict[str, Any]) -> Dict[str, str]:
+        """Строковые поля, уникальные для каждого заказа"""
+        return {
+            'order_number': str(session.get('order_number', '000')),
+            'date': session['date'].strftime('%d.%m.%Y'),
+            'license_plate': session['license_plate'],
+        }
+    
+    def render_body(self, session: Dict[str, Any]) -> bytes:
+        """Рендеринг xlsx с метками вместо полей заказа (для кэша тел документов)"""
+        try:
+            buffer = io.BytesIO()
+            self.build_workbook(session, dict(ORDER_FIELD_PLACEHOLDERS)).save(buffer)
+            return buffer.getvalue()
+        except ExcelProcessingError:
+            raise
+        except Exception as e:
+            raise ExcelGenerationError(f"Ошибка рендеринга тела документа: {e}") from e
+    
+    @staticmethod
+    def patch_order_fields(body: bytes, fields: Dict[str, str]) -> bytes:
+        """Подстановка полей заказа в строки готового xlsx без повторной сборки книги"""
+        try:
+            source = zipfile.ZipFile(io.BytesIO(body))
+            output = io.BytesIO()
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+                for item in source.infolist():
+                    data = source.read(item.filename)
+                    if item.filename.startswith(TEXT_PARTS):
+                        text = data.decode('utf-8')
+                        for field, placeholder in ORDER_FIELD_PLACEHOLDERS.items():
+                            text = text.replace(placeholder, xml_escape(fields[field]))
+                        data = text.encode('utf-8')
+                    target.writestr(item, data)
+            return output.getvalue()
+        except Exception as e:
+            raise ExcelGenerationError(f"Ошибка подстановки полей заказа: {e}") from e
+    
     def _save_workbook_safely(self, wb: Workbook, output_path: str) -> None:
         """Безопасное сохранение рабочей книги с обработкой ошибок"""
         try:
@@ -223,118 +294,27 @@ class ExcelProcessor:
         except OSError as e:
             raise FileSaveError(f"Ошибка файловой системы при сохранении: {output_path}") from e
     
-    def _create_header_block(self, ws, session: Dict[str, Any]) -> int:
-        """БЛОК 1: ШАПКА ДОКУМЕНТА С ПОДДЕРЖКОЙ ШАБЛОНОВ"""
+    def _create_header_block(self, ws, session: Dict[str, Any], fields: Dict[str, str]) -> int:
+        """БЛОК 1: ШАПКА ДОКУМЕНТА - КОПИЯ ЗАРАНЕЕ СКОМПИЛИРОВАННОГО БЛОКА ШАБЛОНА"""
         try:
-            current_row = 1
-            
             # ✅ ПОЛУЧАЕМ ВЫБРАННЫЙ ШАБЛОН ИЛИ ИСПОЛЬЗУЕМ ПО УМОЛЧАНИЮ
             template_id = session.get('header_template', 'bridge_town')
-            template = self.header_manager.get_template(template_id)
-            
-            if not template:
-                # Резервный шаблон если выбранный не найден
-                template = self.header_manager.get_template('bridge_town')
-            
-            # ДАННЫЕ ИСПОЛНИТЕЛЯ (всегда одинаковые)
-            contractor = template['contractor']
-            customer = template['customer']
-            
-            # ШАПКА ДОКУМЕНТА С ДАННЫМИ ИЗ ШАБЛОНА
-            ws.merge_cells(f'A{current_row}:F{current_row}')
-            ws[f'A{current_row}'] = f"ИНДИВИДУАЛЬНЫЙ ПРЕДПРИНИМАТЕЛЬ {contractor['company'].split('ИП ')[1]}"
-            ws[f'A{current_row}'].font = Font(bold=True, size=12)
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'A{current_row}:F{current_row}')
-            ws[f'A{current_row}'] = f"ИНН: {contractor['inn']} ОГРНИП: {contractor['ogrnip']}"
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'A{current_row}:F{current_row}')
-            ws[f'A{current_row}'] = contractor['address']
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'A{current_row}:F{current_row}')
-            ws[f'A{current_row}'] = f"{contractor['email']} {contractor['phone']}"
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            # Пустая строка
-            current_row += 1
-            
-            # Номер заказ-наряда
-            order_number = session.get('order_number', '000')
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = f"ЗАКАЗ – НАРЯД №{order_number}"
-            ws[f'B{current_row}'].font = Font(bold=True, size=14)
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            # Даты
-            date_str = session['date'].strftime('%d.%m.%Y')
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = f"Дата и время приема заказа: {date_str} г."
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = f"Дата и время окончания работ: {date_str} г."
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            # ЗАКАЗЧИК ИЗ ШАБЛОНА
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = "Заказчик"
-            ws[f'B{current_row}'].font = Font(bold=True)
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = customer['company']
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = f"Адрес: {customer['address']}"
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            # Данные автомобиля
-            default_vehicle = template.get('default_vehicle', 'Автомобиль')
-            ws.merge_cells(f'B{current_row}:D{current_row}')
-            ws[f'B{current_row}'] = f"Марка, модель: {default_vehicle}"
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-            ws[f'E{current_row}'] = "Двигатель №"
-            ws[f'E{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'B{current_row}:D{current_row}')
-            license_plate = session['license_plate']
-            ws[f'B{current_row}'] = f"Государственный рег. номер: {license_plate}"
-            ws[f'B{current_row}'].font = Font(bold=True)
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-            ws[f'E{current_row}'] = "Шасси №"
-            ws[f'E{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            ws.merge_cells(f'B{current_row}:D{current_row}')
-            ws[f'B{current_row}'] = "VIN"
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-            ws[f'E{current_row}'] = "Кузов №"
-            ws[f'E{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            current_row += 1
-            
-            # Заголовок раздела работ
-            ws.merge_cells(f'B{current_row}:F{current_row}')
-            ws[f'B{current_row}'] = f"Выполненные работы по заказ-наряду №{order_number}"
-            ws[f'B{current_row}'].font = Font(bold=True)
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            
-            print(f"✅ Блок 1: Шапка документа создана (шаблон: {template['name']})")
-            return current_row
+            compiled = self.header_manager.get_compiled_template(template_id)
+            
+            for header_cell in compiled.cells:
+                if header_cell.merge_range:
+                    ws.merge_cells(header_cell.merge_range)
+                cell = ws[header_cell.coordinate]
+                if header_cell.field:
+                    cell.value = f"{header_cell.text}{fields[header_cell.field]}{header_cell.suffix}"
+                else:
+                    cell.value = header_cell.text
+                if header_cell.font is not None:
+                    cell.font = header_style(header_cell.font)
+                cell.alignment = header_style(header_cell.alignment)
+            
+            print(f"✅ Блок 1: Шапка документа создана (шаблон: {compiled.data['name']})")
+            return compiled.end_row
             
         except Exception as e:
             raise ExcelGenerationError(f"Ошибка создания шапки документа: {e}") from e
@@ -406,12 +386,12 @@ class ExcelProcessor:
         except Exception as e:
             raise ExcelGenerationError(f"Ошибка создания блока работ: {e}") from e
     
-    def _create_materials_block(self, ws, session: Dict[str, Any], start_row: int) -> int:
+    def _create_materials_block(self, ws, session: Dict[str, Any], start_row: int, fields: Dict[str, str]) -> int:
         """БЛОК 3: МАТЕРИАЛЫ - ТОЛЬКО ВЫБРАННЫЕ С ОБРАБОТКОЙ ОШИБОК"""
         try:
             current_row = start_row
             
-            order_number = session.get('order_number', '000')
+            order_number = fields['order_number']
             
             # Заголовок раздела материалов
             ws.merge_cells(f"B{current_row}:F{current_row}")
@@ -648,40 +628,76 @@ class ExcelProcessor:
         except Exception as e:
             raise FormattingError(f"Ошибка применения форматирования: {e}") from e
     
+    def read_order_inputs(self, excel_path: pathlib.Path) -> Dict[str, Any]:
+        """ЧТЕНИЕ ДАННЫХ ЗАКАЗА ИЗ РАНЕЕ СОЗДАННОГО EXCEL (обратная операция к create_professional_order)
+
+        Используется для пакетной перегенерации старых заказов, у которых нет манифеста.
+        Исполнители в Excel не сохраняются - их нужно брать из текстового черновика.
+        """
+        try:
+            wb = load_workbook(excel_path, read_only=True)
+            ws = wb.active
+
+            order_data: Dict[str, Any] = {'selected_works': [], 'selected_materials': []}
+            customer_company = None
+            block = None
+            expect_customer = False
+
+            for row in ws.iter_rows(min_col=1, max_col=3, values_only=True):
+                number, name, extra = (list(row) + [None, None, None])[:3]
+                text = str(name).strip() if name is not None else ''
+
+                if text.startswith('ЗАКАЗ – НАРЯД №'):
+                    order_data['order_number'] = text.replace('ЗАКАЗ – НАРЯД №', '').strip()
+                elif text.startswith('Дата и время приема заказа:'):
+                    date_str = text.replace('Дата и время приема заказа:', '').replace('г.', '').strip()
+                    order_data['date'] = datetime.datetime.strptime(date_str, '%d.%m.%Y')
+                elif text == 'Заказчик':
+                    expect_customer = True
+                    continue
+                elif expect_customer:
+                    customer_company = text
+                elif text.startswith('Государственный рег. номер:'):
+                    order_data['license_plate'] = text.replace('Государственный рег. номер:', '').strip()
+                elif text == 'Наименование работ':
+                    block = 'works'
+                elif text == 'Наименование' and extra == 'Единица измерения':
+                    block = 'materials'
+                elif text.startswith('Итого'):
+                    block = None
+                elif block == 'works' and isinstance(number, (int, float)):
+                    order_data['selected_works'].append((text, float(extra)))
+                elif block == 'materials' and isinstance(number, (int, float)):
+                    order_data['selected_materials'].append(text)
+
+                expect_customer = False
+
+            wb.close()
+
+            # ✅ ОПРЕДЕЛЯЕМ ШАБЛОН ШАПКИ ПО КОМПАНИИ ЗАКАЗЧИКА
+            order_data['header_template'] = None
+            for template_id, template_data in self.header_manager.templates.items():
+                if template_data['customer']['company'] == customer_company:
+                    order_data['header_template'] = template_id
+                    break
+
+            missing = [field for field in ('order_number', 'date', 'license_plate') if field not in order_data]
+            if missing:
+                raise ExcelProcessingError(f"В файле нет данных: {', '.join(missing)}")
+
+            return order_data
+
+        except ExcelProcessingError:
+            raise
+        except Exception as e:
+            raise ExcelProcessingError(f"Ошибка чтения заказа {excel_path}: {e}") from e
+
     def _get_amount_in_words(self, amount: float) -> str:
-        """✅ ИСПРАВЛЕННЫЙ МЕТОД: Конвертирует сумму в пропись без ошибок округления"""
+        """✅ Конвертирует сумму в пропись (встроенная таблица склонений с LRU-кэшем)"""
         try:
-            # ✅ ИСПРАВЛЕНИЕ: Используем точное вычисление через целые числа
-            total_cents = round(amount * 100)  # Переводим всю сумму в копейки
-            rubles = total_cents // 100        # Целая часть - рубли
-            kopecks = total_cents % 100        # Остаток - копейки
-            
-            if rubles < 0:
-                raise AmountConversionError("Сумма не может быть отрицательной")
-            
-            rubles_words = num2words(rubles, lang='ru')
-            
-            # Определяем правильное склонение для рублей
-            last_digit = rubles % 10
-            last_two_digits = rubles % 100
-            
-            if 11 <= last_two_digits <= 19:
-                ruble_word = "рублей"
-            elif last_digit == 1:
-                ruble_word = "рубль"
-            elif 2 <= last_digit <= 4:
-                ruble_word = "рубля"
-            else:
-                ruble_word = "рублей"
-            
-            # Форматируем копейки всегда двумя цифрами
-            kopecks_text = f"{kopecks:02d}"
-            
-            result = f"{rubles_words.capitalize()} {ruble_word} {kopecks_text} коп."
-            print(f"💰 Сумма прописью: {result}")
-            return result
+            return rubles_in_words(amount)
             
         except Exception as e:
             error_msg = f"Ошибка конвертации суммы {amount}: {e}"
             print(f"❌ {error_msg}")
-            raise AmountConversionError(error_msg) from e
\ No newline at end of file
+            raise AmountConversionError(error_msg) from e
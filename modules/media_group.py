@@ -0,0 +1,65 @@
+"""
+🚀 БУФЕР АЛЬБОМОВ (MEDIA GROUP)
+TELEGRAM ДОСТАВЛЯЕТ АЛЬБОМ ОТДЕЛЬНЫМИ ОБНОВЛЕНИЯМИ С ОБЩИМ media_group_id.
+СООБЩЕНИЯ СОБИРАЮТСЯ, ПОКА ИДУТ ЧАСТИ АЛЬБОМА, И ПЕРЕДАЮТСЯ В ОБРАБОТКУ ОДНОЙ ПАЧКОЙ
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+# Пауза после последней части альбома, после которой альбом считается полным
+MEDIA_GROUP_DELAY = 0.5
+
+
+class MediaGroupBuffer:
+    """Сбор частей альбома: on_group(chat_id, messages) вызывается один раз на альбом"""
+
+    def __init__(self, on_group: Callable[[int, List[Any]], None], delay: float = MEDIA_GROUP_DELAY):
+        self.on_group = on_group
+        self.delay = delay
+        self.logger = logging.getLogger('MediaGroupBuffer')
+        self._groups: Dict[Tuple[int, str], List[Any]] = {}
+        self._timers: Dict[Tuple[int, str], threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def add(self, message: Any) -> bool:
+        """Взять сообщение в буфер. False - сообщение не из альбома, обрабатывается как обычно"""
+        group_id = getattr(message, 'media_group_id', None)
+        if not group_id:
+            return False
+
+        key = (message.chat.id, group_id)
+        with self._lock:
+            self._groups.setdefault(key, []).append(message)
+            # Каждая новая часть откладывает отправку альбома
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            timer = threading.Timer(self.delay, self._flush, args=(key,))
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+        return True
+
+    def _flush(self, key: Tuple[int, str]) -> None:
+        with self._lock:
+            self._timers.pop(key, None)
+            messages = self._groups.pop(key, [])
+        if not messages:
+            return
+        messages.sort(key=lambda message: message.message_id)
+        try:
+            self.on_group(key[0], messages)
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка обработки альбома {key[1]}: {e}")
+
+    def flush_all(self) -> None:
+        """Отправить все собранные альбомы сразу (остановка бота)"""
+        with self._lock:
+            keys = list(self._groups)
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        for key in keys:
+            self._flush(key)
@@ -0,0 +1,267 @@
+"""
+🚀 МЕТРИКИ БОТА В ФОРМАТЕ PROMETHEUS
+ГИСТОГРАММЫ И СЧЕТЧИКИ ЗАПОЛНЯЮТ МОДУЛИ (ОБРАБОТЧИКИ, ЭТАПЫ ЗАКАЗА, РЕНДЕРИНГ, УЧЕТ, КЭШИ),
+СОСТОЯНИЕ ОЧЕРЕДЕЙ И СЕССИЙ СНИМАЕТСЯ В МОМЕНТ ЗАПРОСА. /metrics ОТДАЕТ ЛОКАЛЬНЫЙ HTTP-СЕРВЕР
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Границы корзин, секунды: от быстрых обработчиков до рендеринга больших заказов
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Значение снимаемой метрики: число или {значение метки: число}
+CollectedValue = Union[float, Dict[str, float]]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labels}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Монотонный счетчик событий"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Histogram(_Metric):
+    """Распределение длительностей: корзины, сумма и количество для каждого набора меток"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики корзин (без +Inf), сумма, количество]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Collected(_Metric):
+    """Значение, которое снимается при запросе /metrics: длина очереди, число сессий, stats модулей"""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], CollectedValue],
+                 kind: str = 'gauge', label: Optional[str] = None):
+        super().__init__(name, documentation, (label,) if label else ())
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        value = self.collect()
+        if isinstance(value, dict):
+            samples = [((str(key),), number) for key, number in sorted(value.items())]
+        else:
+            samples = [((), value)]
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {_format_value(number)}"
+                                for key, number in samples]
+
+
+class MetricsRegistry:
+    """Реестр метрик. Повторная регистрация имени возвращает уже созданную метрику"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('MetricsRegistry')
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Collected):
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+                return existing
+            # Снимаемые значения заменяются: новый экземпляр бота - новые очереди
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_add(Histogram(name, documentation, labels, buckets))
+
+    def collect(self, name: str, documentation: str, collect: Callable[[], CollectedValue],
+                kind: str = 'gauge', label: Optional[str] = None) -> Collected:
+        """Снимаемая метрика: collect() -> число или {значение метки: число}"""
+        return self._get_or_add(Collected(name, documentation, collect, kind, label))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Одна сломанная метрика не должна ломать весь ответ
+                self.logger.warning(f"⚠️ Метрика {metric.name} не собрана: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# ✅ ОБЩИЙ РЕЕСТР ПРОЦЕССА - МОДУЛИ РЕГИСТРИРУЮТ МЕТРИКИ ПРИ ИМПОРТЕ
+METRICS = MetricsRegistry()
+
+
+def process_memory_bytes() -> int:
+    """Резидентная память процесса (RSS). Linux - /proc, иначе пик из resource"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+class MetricsServer:
+    """HTTP-сервер метрик: GET /metrics. По умолчанию слушает только localhost"""
+
+    def __init__(self, registry: MetricsRegistry = METRICS, host: str = '127.0.0.1', port: int = 9100,
+                 path: str = '/metrics'):
+        self.registry = registry
+        self.path = path
+        self.logger = logging.getLogger('MetricsServer')
+        self._thread: Optional[threading.Thread] = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (при port=0 выбирается свободный)"""
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.httpd.server_address[0]}:{self.port}{self.path}"
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?', 1)[0] != server.path:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                server.logger.debug(format % args)
+
+        return _Handler
+
+    def start(self) -> None:
+        """Запуск в фоновом потоке"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        self.logger.info(f"✅ Метрики: {self.url}")
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -68,7 +68,7 @@ class NavigationManager:
                 for section_id, section_data in self.sections.items():
                     markup.add(types.InlineKeyboardButton(
                         section_data['name'],
-                        callback_data=f"section_{section_id}"
+                        callback_data=f"section:{section_id}"
                     ))
             
             # Пользовательские списки
@@ -77,7 +77,7 @@ class NavigationManager:
                 for list_name in custom_lists:
                     markup.add(types.InlineKeyboardButton(
                         f"📁 {list_name}",
-                        callback_data=f"custom_list_{list_name}"
+                        callback_data=f"custom_list:{list_name}"
                     ))
             
             markup.add(types.InlineKeyboardButton("🔙 НАЗАД", callback_data="nav:main_menu"))
@@ -128,6 +128,7 @@ class NavigationManager:
 Основные команды:
 /start - начать работу с ботом
 /new_order - создать новый заказ-наряд
+/resend [номер ЗН] - повторно получить документы заказа
 /help - показать эту справку
 
 Для начала работы используйте /start
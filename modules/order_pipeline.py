@@ -0,0 +1,205 @@
+"""
+🚀 КОНВЕЙЕР ЗАВЕРШЕНИЯ ЗАКАЗА
+ЭТАПЫ: РЕНДЕРИНГ -> ЗАПИСЬ В УЧЕТ -> ПАРАЛЛЕЛЬНАЯ ДОСТАВКА (ДОКУМЕНТЫ, EMAIL, РАБОЧИЙ ЧАТ).
+ДОСТАВКИ ИЗ document_deliveries ЗАПУСКАЮТСЯ ПОСЛЕ ОТПРАВКИ ДОКУМЕНТОВ ПОЛЬЗОВАТЕЛЮ
+(ИСПОЛЬЗУЮТ file_id ЗАГРУЖЕННЫХ ДОКУМЕНТОВ)
+"""
+
+import logging
+import pathlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from modules.metrics import METRICS
+from modules.order_snapshot import OrderSnapshot
+from modules.order_trace import OrderTracer, TOTAL_STAGE
+
+# Доставка документа пользователю: (тип документа, путь)
+DocumentCallback = Callable[[str, pathlib.Path], None]
+# Прочие доставки получают словарь созданных документов
+DeliveryCallback = Callable[[Dict[str, pathlib.Path]], Any]
+
+ORDER_STAGE_SECONDS = METRICS.histogram('tsm_order_stage_seconds', 'Длительность этапов завершения заказа', ('stage',))
+
+
+class StageTimings:
+    """Статистика длительности этапов конвейера"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        ORDER_STAGE_SECONDS.observe(seconds, stage=stage)
+        with self._lock:
+            stats = self._stats.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['last'] = seconds
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{этап: {count, avg, max, last}}"""
+        with self._lock:
+            return {
+                stage: {
+                    'count': stats['count'],
+                    'avg': stats['total'] / stats['count'] if stats['count'] else 0.0,
+                    'max': stats['max'],
+                    'last': stats['last'],
+                }
+                for stage, stats in self._stats.items()
+            }
+
+
+class OrderPipeline:
+    """Асинхронное завершение заказа: обработчик Telegram только ставит заказ в очередь"""
+
+    def __init__(self, document_factory, accounting_repository,
+                 order_workers: int = 2, delivery_workers: int = 8, tracer: Optional[OrderTracer] = None):
+        self.document_factory = document_factory
+        self.accounting_repository = accounting_repository
+        self.logger = logging.getLogger('OrderPipeline')
+        self.timings = StageTimings()
+        # Этапы каждого заказа - в трассу заказа (order.trace_id)
+        self.tracer = tracer
+        # Отдельные пулы: задачи заказа ждут доставки и не должны занимать их потоки
+        self._orders = ThreadPoolExecutor(max_workers=order_workers, thread_name_prefix='order')
+        self._deliveries = ThreadPoolExecutor(max_workers=delivery_workers, thread_name_prefix='delivery')
+        # Файлы учета - read-modify-write, заказы записываются по одному
+        self._persist_lock = threading.Lock()
+        # Заказы в конвейере (до завершения on_complete)
+        self._pending: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+
+    def submit(self, order: OrderSnapshot, section_folder: pathlib.Path,
+               on_document: Optional[DocumentCallback] = None,
+               deliveries: Optional[Dict[str, DeliveryCallback]] = None,
+               on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+               document_deliveries: Optional[Dict[str, DeliveryCallback]] = None) -> 'Future[Dict[str, Any]]':
+        """Поставить заказ в конвейер. on_complete(result) вызывается после всех доставок"""
+        future = self._orders.submit(self.run, order, section_folder, on_document, deliveries, on_complete,
+                                     document_deliveries)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_order_done)
+        return future
+
+    def pending(self) -> int:
+        """Заказы, еще не прошедшие конвейер"""
+        with self._pending_lock:
+            return len(self._pending)
+
+    def _on_order_done(self, future: Future) -> None:
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def run(self, order: OrderSnapshot, section_folder: pathlib.Path,
+            on_document: Optional[DocumentCallback] = None,
+            deliveries: Optional[Dict[str, DeliveryCallback]] = None,
+            on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+            document_deliveries: Optional[Dict[str, DeliveryCallback]] = None) -> Dict[str, Any]:
+        """Выполнить конвейер для заказа. Возвращает {success, documents, timings, errors}"""
+        result: Dict[str, Any] = {'success': False, 'documents': {}, 'timings': {}, 'errors': [],
+                                  'trace_id': order.trace_id}
+        started = time.perf_counter()
+        futures: List[Future] = []
+        previous_document: Optional[Future] = None
+
+        def _deliver_document(doc_type: str, doc_path: pathlib.Path) -> None:
+            # Документ уходит пользователю сразу после рендеринга, порядок документов сохраняется
+            nonlocal previous_document
+            if on_document is None:
+                return
+            previous_document = self._deliveries.submit(
+                self._chained, previous_document, self._timed_call, result,
+                'deliver_documents', on_document, doc_type, doc_path
+            )
+            futures.append(previous_document)
+
+        try:
+            # ЭТАП 1: РЕНДЕРИНГ
+            with self._stage(result, 'render'):
+                documents = self.document_factory.create_all(order, section_folder, on_document=_deliver_document)
+            result['documents'] = documents
+
+            # ЭТАП 2: УЧЕТ (параллельно с доставкой)
+            futures.append(self._deliveries.submit(self._persist, order, documents, result))
+
+            # ЭТАП 3: ДОСТАВКИ
+            for name, delivery in (deliveries or {}).items():
+                futures.append(self._deliveries.submit(self._timed_call, result, name, delivery, documents))
+            for name, delivery in (document_deliveries or {}).items():
+                futures.append(self._deliveries.submit(
+                    self._chained, previous_document, self._timed_call, result, name, delivery, documents
+                ))
+
+            wait(futures)
+            result['success'] = True
+
+        except Exception as e:
+            wait(futures)
+            result['errors'].append(f"render: {e}")
+            self.logger.error(f"❌ Ошибка конвейера заказа №{order.order_number}: {e}")
+
+        total = time.perf_counter() - started
+        result['timings'][TOTAL_STAGE] = total
+        self.timings.record(TOTAL_STAGE, total)
+        if self.tracer:
+            self.tracer.record(order.trace_id, TOTAL_STAGE, total, order_number=order.order_number,
+                               success=result['success'])
+        self.logger.info(
+            f"⏱️ Заказ №{order.order_number}: " +
+            ", ".join(f"{stage} {seconds:.3f} c" for stage, seconds in result['timings'].items())
+        )
+
+        if on_complete:
+            try:
+                on_complete(result)
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка обработчика завершения заказа: {e}")
+        return result
+
+    def _persist(self, order: OrderSnapshot, documents: Dict[str, pathlib.Path], result: Dict[str, Any]) -> None:
+        with self._stage(result, 'persist', reraise=False):
+            excel_filename = documents.get('excel', pathlib.Path()).name
+            draft_filename = documents.get('text', pathlib.Path()).name
+            with self._persist_lock:
+                if not self.accounting_repository.save_order(order, excel_filename, order.photos_text, draft_filename):
+                    raise RuntimeError("заказ не сохранен в учет")
+
+    def _timed_call(self, result: Dict[str, Any], stage: str, func: Callable, *args) -> None:
+        with self._stage(result, stage, reraise=False):
+            func(*args)
+
+    @staticmethod
+    def _chained(previous: Optional[Future], func: Callable, *args) -> None:
+        if previous is not None:
+            wait([previous])
+        func(*args)
+
+    @contextmanager
+    def _stage(self, result: Dict[str, Any], stage: str, reraise: bool = True) -> Iterator[None]:
+        """Замер этапа. Ошибки доставок записываются в result и не прерывают остальные этапы"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if reraise:
+                raise
+            result['errors'].append(f"{stage}: {e}")
+            self.logger.warning(f"⚠️ Этап {stage} завершился с ошибкой: {e}")
+        finally:
+            seconds = time.perf_counter() - started
+            # Несколько документов - суммарное время этапа
+            result['timings'][stage] = result['timings'].get(stage, 0.0) + seconds
+            self.timings.record(stage, seconds)
+            if self.tracer:
+                self.tracer.record(result['trace_id'], stage, seconds)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._orders.shutdown(wait=wait)
+        self._deliveries.shutdown(wait=wait)
@@ -0,0 +1,160 @@
+"""
+🚀 НЕИЗМЕНЯЕМЫЙ СНИМОК ЗАКАЗА
+СОЗДАЕТСЯ ОДИН РАЗ ПРИ ЗАВЕРШЕНИИ ЗАКАЗА И ПЕРЕДАЕТСЯ ВСЕМ ПОТРЕБИТЕЛЯМ:
+ДОКУМЕНТЫ, УЧЕТ, РАБОЧИЙ ЧАТ, EMAIL, ИТОГОВОЕ СООБЩЕНИЕ
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+# ✅ РАСЦЕНКИ ДЛЯ ИТОГОВ ЗАКАЗА
+HOURLY_RATE = 2500
+MATERIAL_PRICES = {
+    "ВД-40": 375,
+    "Перчатки": 95,
+    "Смазка": 210,
+    "Диск отрезной": 120
+}
+
+REQUIRED_FIELDS = ('license_plate', 'date', 'order_number', 'workers', 'selected_works')
+
+
+def calculate_totals(selected_works: Iterable[Tuple[str, float]], selected_materials: Sequence[str]) -> Dict[str, float]:
+    """Итоговые суммы заказа (без выбранных материалов считаются все материалы)"""
+    works_total = sum(hours for _, hours in selected_works) * HOURLY_RATE
+    materials = selected_materials or list(MATERIAL_PRICES.keys())
+    materials_total = sum(MATERIAL_PRICES.get(material, 0) for material in materials)
+    return {
+        'works_total': works_total,
+        'materials_total': materials_total,
+        'total_amount': works_total + materials_total
+    }
+
+
+def build_draft_text(license_plate: str, date: datetime, workers: str,
+                     selected_works: Iterable[Tuple[str, float]], selected_materials: Sequence[str]) -> str:
+    """Текст черновика заказ-наряда"""
+    content = []
+    content.append(f"{license_plate} / {date.strftime('%d.%m.%Y')}")
+    content.append(workers)
+    content.append("")
+
+    content.append("РАБОТЫ:")
+    for name, hours in selected_works:
+        content.append(f"• {name}")
+
+    if selected_materials:
+        content.append("")
+        content.append("МАТЕРИАЛЫ:")
+        for material in selected_materials:
+            content.append(f"• {material}")
+
+    return '\n'.join(content)
+
+
+@dataclass(frozen=True)
+class OrderSnapshot:
+    """Данные завершенного заказа с заранее посчитанными итогами и текстом черновика"""
+    __slots__ = (
+        'section', 'section_name', 'custom_list', 'header_template', 'template_name',
+        'license_plate', 'date', 'order_number', 'workers',
+        'selected_works', 'selected_materials', 'photo_file_ids', 'has_photos',
+        'works_count', 'materials_count', 'total_hours',
+        'works_total', 'materials_total', 'total_amount', 'draft_text', 'trace_id',
+    )
+
+    section: str
+    section_name: str
+    custom_list: Optional[str]
+    header_template: str
+    template_name: str
+    license_plate: str
+    date: datetime
+    order_number: str
+    workers: str
+    selected_works: Tuple[Tuple[str, float], ...]
+    selected_materials: Tuple[str, ...]
+    photo_file_ids: Tuple[str, ...]
+    has_photos: bool
+    works_count: int
+    materials_count: int
+    total_hours: float
+    works_total: float
+    materials_total: float
+    total_amount: float
+    draft_text: str
+    trace_id: str  # Трасса заказа (order_trace): присваивается при выборе раздела
+
+    @classmethod
+    def from_session(cls, session: Dict[str, Any], section_name: str = '', template_name: str = '',
+                     has_photos: bool = False) -> 'OrderSnapshot':
+        """Снимок сессии пользователя. Списки копируются - дальнейшие изменения сессии не влияют на снимок"""
+        for field in REQUIRED_FIELDS:
+            if field not in session or not session[field]:
+                raise ValueError(f"Отсутствует обязательное поле: {field}")
+
+        selected_works = tuple((name, hours) for name, hours in session['selected_works'])
+        selected_materials = tuple(session.get('selected_materials') or ())
+        totals = calculate_totals(selected_works, selected_materials)
+        license_plate = session['license_plate']
+        workers = session['workers']
+
+        return cls(
+            section=session.get('section', 'base'),
+            section_name=section_name,
+            custom_list=session.get('custom_list'),
+            header_template=session.get('header_template') or 'bridge_town',
+            template_name=template_name,
+            license_plate=license_plate,
+            date=session['date'],
+            order_number=str(session.get('order_number', '000')),
+            workers=workers,
+            selected_works=selected_works,
+            selected_materials=selected_materials,
+            photo_file_ids=tuple(session.get('photo_file_ids') or ()),
+            has_photos=has_photos,
+            works_count=len(selected_works),
+            materials_count=len(selected_materials),
+            total_hours=sum(hours for _, hours in selected_works),
+            works_total=totals['works_total'],
+            materials_total=totals['materials_total'],
+            total_amount=totals['total_amount'],
+            draft_text=build_draft_text(license_plate, session['date'], workers, selected_works, selected_materials),
+            trace_id=session.get('trace_id') or '',
+        )
+
+    @property
+    def date_text(self) -> str:
+        return self.date.strftime('%d.%m.%Y')
+
+    @property
+    def photos_text(self) -> str:
+        """Значение колонки 'Фото добавлены' в учете"""
+        return "ДА" if self.has_photos else "НЕТ"
+
+    @property
+    def base_filename(self) -> str:
+        """Базовое имя файлов документов заказа"""
+        return f"№{self.order_number} {self.date_text} {self.license_plate}"
+
+    def totals(self) -> Dict[str, float]:
+        return {
+            'works_total': self.works_total,
+            'materials_total': self.materials_total,
+            'total_amount': self.total_amount
+        }
+
+    def to_session(self) -> Dict[str, Any]:
+        """Новый словарь в формате сессии для ExcelProcessor и хэшей рендеринга"""
+        return {
+            'section': self.section,
+            'custom_list': self.custom_list,
+            'header_template': self.header_template,
+            'license_plate': self.license_plate,
+            'date': self.date,
+            'order_number': self.order_number,
+            'workers': self.workers,
+            'selected_works': list(self.selected_works),
+            'selected_materials': list(self.selected_materials),
+        }
@@ -0,0 +1,161 @@
+"""
+🚀 ТРАССИРОВКА ЗАКАЗОВ
+ПРИ ВЫБОРЕ РАЗДЕЛА ЗАКАЗУ ПРИСВАИВАЕТСЯ trace_id. КАЖДЫЙ ЭТАП (КНОПКИ, ВВОД ДАННЫХ, ЗАВЕРШЕНИЕ,
+РЕНДЕРИНГ, УЧЕТ, ОТПРАВКИ В TELEGRAM, SMTP) ЗАПИСЫВАЕТСЯ СТРОКОЙ JSONL: {ts, trace, stage, ms, ...}.
+АНАЛИЗ: ПЕРЦЕНТИЛИ ПО ЭТАПАМ И САМЫЕ МЕДЛЕННЫЕ ЗАКАЗЫ (utils/trace_report.py)
+"""
+
+import json
+import logging
+import math
+import pathlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Этап, по которому считается полное время заказа (конвейер завершения)
+TOTAL_STAGE = 'total'
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class OrderTracer:
+    """Запись этапов заказов в JSONL. Без пути или без trace_id запись не ведется"""
+
+    def __init__(self, path: Optional[pathlib.Path]):
+        self.path = pathlib.Path(path) if path else None
+        self.logger = logging.getLogger('OrderTracer')
+        self._lock = threading.Lock()
+        self._file = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(self, trace_id: Optional[str], stage: str, seconds: float, **attrs: Any) -> None:
+        if not trace_id or self.path is None:
+            return
+        span = {'ts': round(time.time(), 3), 'trace': trace_id, 'stage': stage, 'ms': round(seconds * 1000, 2)}
+        span.update({key: value for key, value in attrs.items() if value is not None})
+        line = json.dumps(span, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+            except OSError as e:
+                self.logger.warning(f"⚠️ Этап {stage} заказа {trace_id} не записан: {e}")
+
+    @contextmanager
+    def span(self, trace_id: Optional[str], stage: str, **attrs: Any) -> Iterator[None]:
+        """Замер этапа. Ошибка записывается в этап и пробрасывается дальше"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(trace_id, stage, time.perf_counter() - started, **attrs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ✅ АНАЛИЗ ТРАСС
+def load_spans(paths: Iterable[pathlib.Path]) -> List[Dict[str, Any]]:
+    """Этапы из файлов трасс. Поврежденные строки (обрыв записи) пропускаются"""
+    spans = []
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(span, dict) and 'trace' in span and 'stage' in span:
+                    spans.append(span)
+    return spans
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу: значение, не меньше которого q% выборки"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def stage_summary(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """{этап: {count, p50, p95, p99, max}} в миллисекундах"""
+    durations: Dict[str, List[float]] = {}
+    for span in spans:
+        durations.setdefault(span['stage'], []).append(float(span['ms']))
+    return {
+        stage: {
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': max(values),
+        }
+        for stage, values in durations.items()
+    }
+
+
+def order_summaries(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Заказы от самого медленного: время конвейера, время от выбора раздела, самый долгий этап"""
+    orders: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        order = orders.setdefault(span['trace'], {
+            'trace': span['trace'], 'order_number': None, 'pipeline_ms': 0.0,
+            'first_ts': span['ts'], 'last_ts': span['ts'], 'stages': {},
+        })
+        if span.get('order_number'):
+            order['order_number'] = span['order_number']
+        order['first_ts'] = min(order['first_ts'], span['ts'] - span['ms'] / 1000)
+        order['last_ts'] = max(order['last_ts'], span['ts'])
+        if span['stage'] == TOTAL_STAGE:
+            order['pipeline_ms'] = max(order['pipeline_ms'], float(span['ms']))
+        else:
+            order['stages'][span['stage']] = order['stages'].get(span['stage'], 0.0) + float(span['ms'])
+
+    result = []
+    for order in orders.values():
+        slowest = max(order['stages'].items(), key=lambda item: item[1]) if order['stages'] else ('', 0.0)
+        result.append({
+            'trace': order['trace'],
+            'order_number': order['order_number'],
+            'pipeline_ms': order['pipeline_ms'],
+            'wall_ms': round((order['last_ts'] - order['first_ts']) * 1000, 1),
+            'slowest_stage': slowest[0],
+            'slowest_ms': slowest[1],
+        })
+    return sorted(result, key=lambda order: (order['pipeline_ms'], order['wall_ms']), reverse=True)
+
+
+def format_report(spans: List[Dict[str, Any]], slowest: int = 10) -> str:
+    summary = stage_summary(spans)
+    orders = order_summaries(spans)
+    lines = [f"📊 ЭТАПЫ ЗАКАЗОВ: {len(orders)} заказов, {len(spans)} этапов", "",
+             f"{'этап':<40} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}"]
+    for stage, stats in sorted(summary.items(), key=lambda item: item[1]['p95'], reverse=True):
+        lines.append(f"{stage:<40} {stats['count']:>7} {stats['p50']:>9.1f} {stats['p95']:>9.1f} "
+                     f"{stats['p99']:>9.1f} {stats['max']:>9.1f}")
+
+    lines += ["", "🐢 САМЫЕ МЕДЛЕННЫЕ ЗАКАЗЫ (конвейер завершения):",
+              f"{'trace':<14} {'№ ЗН':<8} {'конвейер, мс':>13} {'всего, с':>9}  самый долгий этап"]
+    for order in orders[:slowest]:
+        lines.append(f"{order['trace']:<14} {str(order['order_number'] or '-'):<8} {order['pipeline_ms']:>13.1f} "
+                     f"{order['wall_ms'] / 1000:>9.1f}  {order['slowest_stage']} ({order['slowest_ms']:.1f} мс)")
+    return "\n".join(lines)
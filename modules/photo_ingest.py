@@ -0,0 +1,184 @@
+"""
+🚀 ФОНОВАЯ ЗАГРУЗКА ФОТОГРАФИЙ
+ФОТО СКАЧИВАЮТСЯ В ПУЛЕ ВВОДА-ВЫВОДА ПОТОКОМ (ПО ЧАСТЯМ, БЕЗ ЗАГРУЗКИ В ПАМЯТЬ ЦЕЛИКОМ),
+ХРАНЯТСЯ ПОД ИМЕНЕМ ПО ХЭШУ СОДЕРЖИМОГО (ОДИНАКОВЫЕ ФОТО - ОДИН ФАЙЛ), ЧИТАЕМОЕ ИМЯ - ЖЕСТКАЯ ССЫЛКА.
+КОГДА ВСЕ ФОТО ЗАКАЗА СОХРАНЕНЫ, ВЫЗЫВАЕТСЯ ПРОДОЛЖЕНИЕ (when_done) - ОБРАБОТЧИКУ НЕ НУЖНО ЖДАТЬ
+"""
+
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Union
+
+import requests
+from telebot import apihelper
+
+DEFAULT_FILE_URL = "https://api.telegram.org/file/bot{0}/{1}"
+CHUNK_SIZE = 64 * 1024
+# Папка с файлами по хэшу внутри папки "Фото"
+OBJECTS_DIR = ".objects"
+
+
+@dataclass(frozen=True)
+class StoredPhoto:
+    """Сохраненное фото: файл по хэшу и читаемое имя заказа"""
+    file_id: str
+    sha256: str
+    size: int
+    object_path: pathlib.Path
+    path: pathlib.Path
+    duplicate: bool
+
+
+def telegram_file_url(token: str) -> Callable[[str], str]:
+    """URL файла Telegram (учитывает apihelper.FILE_URL - локальный Bot API, тесты)"""
+    def file_url(file_path: str) -> str:
+        return (apihelper.FILE_URL or DEFAULT_FILE_URL).format(token, file_path)
+    return file_url
+
+
+class PhotoIngestor:
+    """Пул загрузки фото. Фото группируются по ключу (chat_id) до вызова when_done"""
+
+    def __init__(self, get_file: Callable[[str], Any], file_url: Callable[[str], str],
+                 workers: int = 4, chunk_size: int = CHUNK_SIZE, timeout: float = 60.0,
+                 max_retries: int = 2, retry_delay: float = 1.0):
+        self.get_file = get_file
+        self.file_url = file_url
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.logger = logging.getLogger('PhotoIngestor')
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='photo-io')
+        self._session = requests.Session()
+        self._batches: Dict[Hashable, List[Future]] = {}
+        self._inflight: Set[Future] = set()
+        self._lock = threading.Lock()
+        self.stats = {'downloaded': 0, 'duplicates': 0, 'failed': 0, 'bytes': 0}
+
+    # ✅ ОЧЕРЕДЬ ЗАГРУЗОК
+    def submit(self, key: Hashable, file_id: str, folder: pathlib.Path, name: str) -> Future:
+        """Скачать фото в folder/name в фоне. Результат - StoredPhoto"""
+        future = self._executor.submit(self._ingest, file_id, pathlib.Path(folder), name)
+        with self._lock:
+            self._batches.setdefault(key, []).append(future)
+            self._inflight.add(future)
+        future.add_done_callback(self._on_downloaded)
+        return future
+
+    def pending(self) -> int:
+        """Загрузки, которые еще не завершились"""
+        with self._lock:
+            return len(self._inflight)
+
+    def _on_downloaded(self, future: Future) -> None:
+        with self._lock:
+            self._inflight.discard(future)
+
+    def when_done(self, key: Hashable, callback: Callable[[List[Union[StoredPhoto, Exception]]], None]) -> None:
+        """Вызвать callback(результаты), когда завершатся все загрузки ключа (в потоке пула)"""
+        with self._lock:
+            futures = self._batches.pop(key, [])
+        if not futures:
+            callback([])
+            return
+
+        remaining = [len(futures)]
+        remaining_lock = threading.Lock()
+
+        def on_future_done(_: Future) -> None:
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            results = [f.exception() or f.result() for f in futures]
+            try:
+                callback(results)
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка продолжения после загрузки фото: {e}")
+
+        for future in futures:
+            future.add_done_callback(on_future_done)
+
+    def discard(self, key: Hashable) -> None:
+        """Забыть загрузки ключа (заказ отменен); уже начатые файлы дописываются"""
+        with self._lock:
+            self._batches.pop(key, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self._session.close()
+
+    # ✅ ЗАГРУЗКА
+    def _ingest(self, file_id: str, folder: pathlib.Path, name: str) -> StoredPhoto:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._download(file_id, folder, name)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                self.logger.warning(f"⚠️ Повтор загрузки фото {file_id}: {e}")
+                time.sleep(self.retry_delay * (2 ** attempt))
+            except Exception:
+                self._count('failed')
+                raise
+
+    def _download(self, file_id: str, folder: pathlib.Path, name: str) -> StoredPhoto:
+        file_info = self.get_file(file_id)
+        objects_folder = folder / OBJECTS_DIR
+        objects_folder.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        temp_path = objects_folder / f"{uuid.uuid4().hex}.part"
+        try:
+            with self._session.get(self.file_url(file_info.file_path), stream=True,
+                                   timeout=self.timeout, proxies=apihelper.proxy) as response:
+                response.raise_for_status()
+                with open(temp_path, 'wb') as temp_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        temp_file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            suffix = pathlib.Path(file_info.file_path).suffix or '.jpg'
+            object_path = objects_folder / f"{sha256}{suffix}"
+            duplicate = object_path.exists()
+            if duplicate:
+                temp_path.unlink()
+            else:
+                os.replace(temp_path, object_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        path = folder / name
+        self._link(object_path, path)
+
+        self._count('duplicates' if duplicate else 'downloaded')
+        self._count('bytes', size)
+        return StoredPhoto(file_id, sha256, size, object_path, path, duplicate)
+
+    @staticmethod
+    def _link(object_path: pathlib.Path, path: pathlib.Path) -> None:
+        """Читаемое имя заказа - жесткая ссылка на файл по хэшу (копия, если ссылки не поддерживаются)"""
+        path.unlink(missing_ok=True)
+        try:
+            os.link(object_path, path)
+        except OSError:
+            shutil.copyfile(object_path, path)
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
@@ -0,0 +1,289 @@
+"""
+🚀 ПРОФИЛИРОВАНИЕ ПО КОМАНДЕ АДМИНИСТРАТОРА
+ОКНО ОГРАНИЧЕНО ПО ВРЕМЕНИ: cProfile ДЛЯ ОБРАБОТЧИКОВ ОБНОВЛЕНИЙ (ПОТОКИ ДИСПЕТЧЕРА ЧАТОВ) ИЛИ
+СЭМПЛИРОВАНИЕ СТЕКОВ ВСЕХ ЗАНЯТЫХ ПОТОКОВ ПУЛОВ (ВКЛЮЧАЯ КОНВЕЙЕР ЗАКАЗА). РЕЗУЛЬТАТ - ТОП ФУНКЦИЙ
+И ФАЙЛ pstats. ПОКА ПРОФИЛИРОВАНИЕ ВЫКЛЮЧЕНО, ДИСПЕТЧЕР ПРОВЕРЯЕТ ОДИН АТРИБУТ НА ЗАДАЧУ
+"""
+
+import cProfile
+import datetime
+import logging
+import os
+import pathlib
+import pstats
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MODES = ('cprofile', 'sample')
+DEFAULT_SECONDS = 60
+MAX_SECONDS = 600
+SAMPLE_INTERVAL = 0.01
+TOP_FUNCTIONS = 10
+
+# Функция в pstats: (файл, строка, имя)
+FunctionKey = Tuple[str, int, str]
+
+# Рамка задачи ThreadPoolExecutor: выше нее в стеке - только сам пул
+_POOL_TASK_FILE = os.path.join('concurrent', 'futures', 'thread.py')
+
+
+class ProfilerBusyError(Exception):
+    """Профилирование уже запущено"""
+    pass
+
+
+@dataclass
+class ProfileReport:
+    """Итог окна профилирования"""
+    mode: str
+    seconds: float
+    tasks: int               # cprofile - задачи обработчиков, sample - снимки стеков
+    text: str                # топ функций для сообщения администратору
+    path: Optional[pathlib.Path] = None
+
+
+class _SampledStats:
+    """Снимки стеков в формате, который принимает pstats.Stats (как у cProfile.Profile)"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        # функция -> [в скольких снимках в стеке, в скольких на вершине, {вызывающая: снимков}]
+        self._functions: Dict[FunctionKey, List[Any]] = {}
+        self.stats: Dict[FunctionKey, Tuple] = {}
+
+    def add_stack(self, frames: List[FunctionKey]) -> None:
+        """frames - от корня задачи к текущей функции"""
+        self.samples += 1
+        seen = set()
+        caller: Optional[FunctionKey] = None
+        for key in frames:
+            entry = self._functions.setdefault(key, [0, 0, {}])
+            if key not in seen:
+                # Рекурсия: функция считается один раз на снимок
+                seen.add(key)
+                entry[0] += 1
+                if caller is not None:
+                    entry[2][caller] = entry[2].get(caller, 0) + 1
+            caller = key
+        self._functions[frames[-1]][1] += 1
+
+    def create_stats(self) -> None:
+        interval = self.interval
+        self.stats = {
+            key: (inclusive, inclusive, own * interval, inclusive * interval,
+                  {caller: (count, count, 0.0, count * interval) for caller, count in callers.items()})
+            for key, (inclusive, own, callers) in self._functions.items()
+        }
+
+
+def _task_stack(frame) -> Optional[List[FunctionKey]]:
+    """Стек задачи пула от корня; None - поток простаивает или это не поток пула"""
+    stack: List[FunctionKey] = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'run' and code.co_filename.endswith(_POOL_TASK_FILE):
+            return stack[::-1] or None
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return None
+
+
+def _short_name(key: FunctionKey) -> str:
+    filename, line, name = key
+    if filename == '~':
+        return name  # встроенные функции: {method 'read' of ...}
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def format_top(stats: pstats.Stats, limit: int = TOP_FUNCTIONS, count_title: str = 'вызовы') -> str:
+    """Топ по суммарному и собственному времени (мс). Для сэмплирования count - число снимков"""
+    entries = stats.stats  # type: ignore[attr-defined]
+    lines = []
+    for title, index in (("🔝 Суммарное время (с вложенными вызовами):", 3), ("🔥 Собственное время:", 2)):
+        lines.append(title)
+        top = sorted(entries.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+        for key, (_, calls, own, total, _) in top:
+            lines.append(f"{total * 1000:9.1f} {own * 1000:9.1f} {calls:7d}  {_short_name(key)}")
+        lines.append("")
+    lines.insert(1, f"{'сумм, мс':>9} {'собств.':>9} {count_title:>7}  функция")
+    return "\n".join(lines).rstrip()
+
+
+class HandlerProfiler:
+    """Окно профилирования. targets - объекты с атрибутом profiler (ChatDispatcher), через которые
+    задачи обработчиков вызываются под cProfile"""
+
+    def __init__(self, targets: List[Any], output_folder: pathlib.Path,
+                 on_report: Optional[Callable[[ProfileReport, Any], None]] = None,
+                 sample_interval: float = SAMPLE_INTERVAL):
+        self.targets = targets
+        self.output_folder = output_folder
+        self.on_report = on_report
+        self.sample_interval = sample_interval
+        self.logger = logging.getLogger('HandlerProfiler')
+        self.mode: Optional[str] = None
+        self.owner: Any = None          # кто запустил (chat_id администратора)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._started = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._stop_sampling = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._sampled: Optional[_SampledStats] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._local = threading.local()
+        self._generation = 0
+        self._running = 0
+        self._tasks = 0
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = 'cprofile', seconds: float = DEFAULT_SECONDS, owner: Any = None) -> float:
+        """Начать окно. Через seconds оно закроется само и отчет уйдет в on_report. Возвращает длительность окна"""
+        if mode not in MODES:
+            raise ValueError(f"Режим профилирования: {', '.join(MODES)}")
+        seconds = max(1.0, min(float(seconds), MAX_SECONDS))
+        with self._lock:
+            if self.mode is not None:
+                raise ProfilerBusyError(f"Профилирование ({self.mode}) уже запущено")
+            self.mode = mode
+            self.owner = owner
+            self._started = time.perf_counter()
+            self._generation += 1
+            self._profiles = []
+            self._tasks = 0
+
+        if mode == 'cprofile':
+            for target in self.targets:
+                target.profiler = self
+        else:
+            self._sampled = _SampledStats(self.sample_interval)
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+            self._sampler.start()
+
+        self._timer = threading.Timer(seconds, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+        self.logger.info(f"🔬 Профилирование {mode} на {seconds:g} с")
+        return seconds
+
+    def call(self, func: Callable, *args) -> Any:
+        """Задача обработчика под cProfile (вызывает ChatDispatcher, пока окно открыто)"""
+        with self._lock:
+            if self.mode != 'cprofile':
+                profile = None
+            else:
+                self._running += 1
+                profile = getattr(self._local, 'profile', None)
+                if profile is None or self._local.generation != self._generation:
+                    # Свой профиль на поток: cProfile замеряет только поток, в котором включен
+                    profile = cProfile.Profile()
+                    self._local.profile = profile
+                    self._local.generation = self._generation
+                    self._profiles.append(profile)
+                self._tasks += 1
+        if profile is None:
+            return func(*args)
+        self._local.in_call = True
+        try:
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: в процессе активен один профилировщик - задача выполняется без замера
+                with self._lock:
+                    self._tasks -= 1
+                return func(*args)
+            try:
+                return func(*args)
+            finally:
+                profile.disable()
+        finally:
+            self._local.in_call = False
+            with self._lock:
+                self._running -= 1
+                self._idle.notify_all()
+
+    def stop(self) -> Optional[ProfileReport]:
+        """Закрыть окно досрочно. None - профилирование не запущено"""
+        with self._lock:
+            if self.mode is None:
+                return None
+            mode, self.mode = self.mode, None
+            owner = self.owner
+        if self._timer:
+            self._timer.cancel()
+        seconds = time.perf_counter() - self._started
+
+        if mode == 'cprofile':
+            for target in self.targets:
+                target.profiler = None
+            # /profile stop сам выполняется в задаче обработчика - ее не ждем
+            own = 1 if getattr(self._local, 'in_call', False) else 0
+            with self._lock:
+                # Задачи, начатые в окне, дописывают свои профили
+                self._idle.wait_for(lambda: self._running <= own, timeout=5)
+                profiles, tasks = list(self._profiles), self._tasks
+            stats = self._merge(profiles)
+        else:
+            self._stop_sampling.set()
+            if self._sampler:
+                self._sampler.join(timeout=5)
+            sampled = self._sampled
+            tasks = sampled.samples if sampled else 0
+            stats = pstats.Stats(sampled) if sampled and sampled.samples else None
+
+        report = self._report(mode, seconds, tasks, stats)
+        self.logger.info(f"🔬 Профилирование {mode} завершено: {seconds:.1f} с, {tasks}")
+        if self.on_report:
+            try:
+                self.on_report(report, owner)
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка отправки отчета профилирования: {e}")
+        return report
+
+    def _expire(self) -> None:
+        self.stop()
+
+    @staticmethod
+    def _merge(profiles: List[cProfile.Profile]) -> Optional[pstats.Stats]:
+        stats: Optional[pstats.Stats] = None
+        for profile in profiles:
+            # Профиль, который ни разу не включился (3.12+), пуст - pstats его не принимает
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+    def _sample_loop(self) -> None:
+        sampled = self._sampled
+        own_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = _task_stack(frame)
+                if stack:
+                    sampled.add_stack(stack)
+
+    def _report(self, mode: str, seconds: float, tasks: int, stats: Optional[pstats.Stats]) -> ProfileReport:
+        unit = 'задач обработчиков' if mode == 'cprofile' else 'снимков стеков'
+        header = f"🔬 ПРОФИЛЬ {mode}: {seconds:.1f} с, {tasks} {unit}"
+        if stats is None:
+            return ProfileReport(mode, seconds, tasks, f"{header}\n\nЗа время окна обработчики не выполнялись")
+
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        path = self.output_folder / f"profile_{mode}_{datetime.datetime.now():%Y%m%d_%H%M%S}.pstats"
+        stats.dump_stats(str(path))
+        top = format_top(stats, count_title='вызовы' if mode == 'cprofile' else 'снимки')
+        return ProfileReport(mode, seconds, tasks, f"{header}\n\n{top}", path)
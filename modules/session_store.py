@@ -0,0 +1,302 @@
+"""
+🚀 ХРАНИЛИЩЕ СЕССИЙ ПОЛЬЗОВАТЕЛЕЙ
+СЕССИИ ПЕРЕЖИВАЮТ ПЕРЕЗАПУСК (SQLite ПО УМОЛЧАНИЮ), ИЗМЕНЕННЫЕ СЕССИИ ЗАПИСЫВАЮТСЯ ОТЛОЖЕННО,
+НЕАКТИВНЫЕ УДАЛЯЮТСЯ ПО TTL, В ПАМЯТИ ДЕРЖИТСЯ НЕ БОЛЬШЕ max_in_memory СЕССИЙ (LRU)
+"""
+
+import logging
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, MutableMapping, Optional, Set, Tuple
+
+# Ключи, которые не сохраняются: восстанавливаются из репозиториев при загрузке
+TRANSIENT_KEYS = ('works', 'materials')
+# Неизмененная сессия перезаписывается не чаще, чтобы обновить время активности для TTL
+ACCESS_REFRESH_SECONDS = 60.0
+
+
+class SessionBackend(ABC):
+    """Постоянное хранилище сериализованных сессий"""
+
+    @abstractmethod
+    def load(self, key: int) -> Optional[Tuple[bytes, float]]:
+        """(данные, время последней активности) или None"""
+        pass
+
+    @abstractmethod
+    def save_many(self, items: Iterable[Tuple[int, bytes, float]]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: int) -> None:
+        pass
+
+    @abstractmethod
+    def purge_older_than(self, cutoff: float) -> int:
+        """Удалить сессии без активности с момента cutoff, вернуть количество"""
+        pass
+
+    @abstractmethod
+    def keys(self) -> Set[int]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Сессии в одной таблице SQLite"""
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+
+    def load(self, key: int) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, last_access FROM sessions WHERE chat_id = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save_many(self, items: Iterable[Tuple[int, bytes, float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (chat_id, data, last_access) VALUES (?, ?, ?)", list(items)
+            )
+
+    def delete(self, key: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE chat_id = ?", (key,))
+
+    def purge_older_than(self, cutoff: float) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,)).rowcount
+
+    def keys(self) -> Set[int]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT chat_id FROM sessions")}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class MemorySessionBackend(SessionBackend):
+    """Без сохранения на диск (тесты, временный режим)"""
+
+    def __init__(self):
+        self._data: Dict[int, Tuple[bytes, float]] = {}
+
+    def load(self, key: int) -> Optional[Tuple[bytes, float]]:
+        return self._data.get(key)
+
+    def save_many(self, items: Iterable[Tuple[int, bytes, float]]) -> None:
+        for key, data, last_access in items:
+            self._data[key] = (data, last_access)
+
+    def delete(self, key: int) -> None:
+        self._data.pop(key, None)
+
+    def purge_older_than(self, cutoff: float) -> int:
+        expired = [key for key, (_, last_access) in self._data.items() if last_access < cutoff]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def keys(self) -> Set[int]:
+        return set(self._data)
+
+
+class SessionStore(MutableMapping):
+    """Словарь chat_id -> сессия (совместим с прежним user_sessions)"""
+
+    def __init__(self, backend: SessionBackend, ttl_seconds: float = 48 * 3600,
+                 max_in_memory: int = 500, flush_interval: float = 5.0,
+                 rehydrate: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_in_memory = max(1, max_in_memory)
+        self.rehydrate = rehydrate
+        self.logger = logging.getLogger('SessionStore')
+
+        self._sessions: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._last_access: Dict[int, float] = {}
+        self._written: Dict[int, Tuple[bytes, float]] = {}  # последняя запись - для пропуска неизменных
+        self._touched: Set[int] = set()        # сессии, которые могли измениться с последней записи
+        self._lock = threading.RLock()
+        self.stats = {'loads': 0, 'writes': 0, 'skipped_writes': 0, 'evicted_lru': 0, 'expired': 0}
+
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                             name='session-flush', daemon=True)
+            self._flusher.start()
+
+    # ✅ ИНТЕРФЕЙС СЛОВАРЯ
+    def __getitem__(self, key: int) -> Dict[str, Any]:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._load(key)
+                if session is None:
+                    raise KeyError(key)
+            self._mark_used(key)
+            return session
+
+    def __setitem__(self, key: int, session: Dict[str, Any]) -> None:
+        with self._lock:
+            self._sessions[key] = session
+            self._mark_used(key)
+            self._enforce_memory_cap()
+
+    def __delitem__(self, key: int) -> None:
+        with self._lock:
+            existed = key in self._sessions or self.backend.load(key) is not None
+            self._sessions.pop(key, None)
+            self._last_access.pop(key, None)
+            self._written.pop(key, None)
+            self._touched.discard(key)
+            self.backend.delete(key)
+            if not existed:
+                raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            return iter(set(self._sessions) | self.backend.keys())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(set(self._sessions) | self.backend.keys())
+
+    # ✅ ВНУТРЕННЯЯ ЛОГИКА
+    def _mark_used(self, key: int) -> None:
+        self._sessions.move_to_end(key)
+        self._last_access[key] = time.time()
+        self._touched.add(key)
+
+    def _load(self, key: int) -> Optional[Dict[str, Any]]:
+        row = self.backend.load(key)
+        if row is None:
+            return None
+        data, last_access = row
+        if time.time() - last_access > self.ttl_seconds:
+            self.backend.delete(key)
+            self.stats['expired'] += 1
+            return None
+
+        session = pickle.loads(data)
+        if self.rehydrate:
+            try:
+                self.rehydrate(session)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Не удалось восстановить данные сессии {key}: {e}")
+        self._sessions[key] = session
+        self._written[key] = (data, last_access)
+        self.stats['loads'] += 1
+        self._enforce_memory_cap()
+        return session
+
+    @staticmethod
+    def _serialize(session: Dict[str, Any]) -> bytes:
+        compact = {k: v for k, v in session.items() if k not in TRANSIENT_KEYS}
+        return pickle.dumps(compact, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _enforce_memory_cap(self) -> None:
+        # Вытесняется только сохраненная сессия: если самая старая сейчас меняется - следующая по давности
+        for key in list(self._sessions):
+            if len(self._sessions) <= self.max_in_memory:
+                return
+            if key not in self._write([key]):
+                continue
+            self._sessions.pop(key, None)
+            self._written.pop(key, None)
+            self.stats['evicted_lru'] += 1
+
+    def _write(self, keys: Iterable[int]) -> Set[int]:
+        """Записать сессии. Возвращает ключи, чье текущее состояние сохранено в хранилище"""
+        items = []
+        saved: Set[int] = set()
+        for key in keys:
+            session = self._sessions.get(key)
+            if session is None:
+                continue
+            try:
+                data = self._serialize(session)
+            except RuntimeError:
+                # Сессия меняется прямо сейчас - запишем при следующем сбросе
+                continue
+            except Exception as e:
+                # Несериализуемое значение в сессии - ошибка не должна дойти до обработчика
+                self.logger.error(f"❌ Сессия {key} не сохраняется: {e}")
+                continue
+            saved.add(key)
+            self._touched.discard(key)
+            last_access = self._last_access.get(key, time.time())
+            written = self._written.get(key)
+            if written and written[0] == data and last_access - written[1] < ACCESS_REFRESH_SECONDS:
+                self.stats['skipped_writes'] += 1
+                continue
+            self._written[key] = (data, last_access)
+            items.append((key, data, last_access))
+        if items:
+            self.backend.save_many(items)
+            self.stats['writes'] += len(items)
+        return saved
+
+    def flush(self) -> None:
+        """Записать измененные сессии и удалить просроченные"""
+        with self._lock:
+            self.expire()
+            self._write(list(self._touched))
+
+    def expire(self) -> int:
+        """Удаление сессий без активности дольше TTL"""
+        with self._lock:
+            cutoff = time.time() - self.ttl_seconds
+            expired = [key for key, last_access in self._last_access.items() if last_access < cutoff]
+            for key in expired:
+                self._sessions.pop(key, None)
+                self._last_access.pop(key, None)
+                self._written.pop(key, None)
+                self._touched.discard(key)
+            removed = self.backend.purge_older_than(cutoff)
+            self.stats['expired'] += len(expired)
+            return len(expired) + removed
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка сохранения сессий: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher:
+            self._flusher.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+    def memory_size(self) -> int:
+        return len(self._sessions)
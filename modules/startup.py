@@ -0,0 +1,196 @@
+"""
+🚀 БЫСТРЫЙ ЗАПУСК И ПРОФИЛЬ ЗАПУСКА
+ТЯЖЕЛЫЕ БИБЛИОТЕКИ (pandas, openpyxl) ИМПОРТИРУЮТСЯ ПРИ ПЕРВОМ ИСПОЛЬЗОВАНИИ, ДОЛГИЕ ШАГИ
+ИНИЦИАЛИЗАЦИИ МОГУТ ВЫПОЛНЯТЬСЯ В ФОНЕ. StartupProfiler ЗАМЕРЯЕТ ИМПОРТ, ШАГИ И ГЛАВНУЮ
+МЕТРИКУ - ВРЕМЯ ДО ПЕРВОГО ОБНОВЛЕНИЯ
+"""
+
+import importlib
+import json
+import logging
+import pathlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к атрибуту (потокобезопасно)"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = 'загружен' if self._module is not None else 'не загружен'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+class LazyAttribute:
+    """Класс или функция модуля, которые импортируются при первом вызове: Font = lazy_import(...)"""
+
+    def __init__(self, module: str, attr: str):
+        self._module = LazyModule(module)
+        self._attr = attr
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return getattr(self._module, self._attr)(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<LazyAttribute {self._module._name}.{self._attr}>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def lazy_import(module: str, attr: str) -> LazyAttribute:
+    return LazyAttribute(module, attr)
+
+
+class StartupProfiler:
+    """Замеры запуска: импорт, шаги инициализации (в том числе фоновые), время до первого обновления"""
+
+    def __init__(self, started: Optional[float] = None, background: bool = False, enabled: bool = False,
+                 save_path: Optional[pathlib.Path] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.background = background   # True - фоновые шаги выполняются параллельно
+        self.enabled = enabled         # True - отчет печатается и сохраняется в save_path
+        self.save_path = save_path
+        self.logger = logging.getLogger('StartupProfiler')
+        self.steps: List[Dict[str, Any]] = []
+        self.ready_at: Optional[float] = None
+        self.first_update_at: Optional[float] = None
+        self._pending: Dict[str, Future] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._mark = self.started
+
+    def now(self) -> float:
+        """Секунды с начала запуска"""
+        return time.perf_counter() - self.started
+
+    def record(self, name: str, seconds: float, kind: str = 'init') -> None:
+        with self._lock:
+            self.steps.append({'name': name, 'kind': kind, 'seconds': seconds})
+
+    def imported(self, name: str) -> None:
+        """Отметить конец группы импортов: время с предыдущей отметки"""
+        now = time.perf_counter()
+        self.record(name, now - self._mark, kind='import')
+        self._mark = now
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def run(self, name: str, func: Callable[[], Any]) -> Future:
+        """Шаг, который не нужен для первого обновления: в фоне в быстром режиме, иначе сразу
+        (обычный режим: ошибка шага пробрасывается, как при прямом вызове)"""
+        def _timed() -> Any:
+            started = time.perf_counter()
+            try:
+                return func()
+            except Exception as e:
+                self.logger.error(f"❌ Шаг запуска {name} завершился с ошибкой: {e}")
+                raise
+            finally:
+                self.record(name, time.perf_counter() - started, kind='background' if self.background else 'init')
+
+        if not self.background:
+            future: Future = Future()
+            future.set_result(_timed())
+            return future
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='startup')
+            future = self._pool.submit(_timed)
+            self._pending[name] = future
+        return future
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Дождаться фоновых шагов (остановка бота, тесты)"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def ready(self) -> None:
+        """Бот начинает принимать обновления"""
+        if self.ready_at is None:
+            self.ready_at = self.now()
+            if self.enabled:
+                print(self.report())
+
+    def first_update(self) -> None:
+        """Получено первое обновление - главная метрика запуска"""
+        with self._lock:
+            if self.first_update_at is not None:
+                return
+            self.first_update_at = self.now()
+        if self.enabled:
+            print(f"📩 Первое обновление через {self.first_update_at * 1000:.0f} мс после запуска")
+            if self.save_path:
+                self.save(self.save_path)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = list(self.steps)
+        return {
+            'timestamp': time.time(),
+            'background': self.background,
+            'steps': steps,
+            'ready_ms': round(self.ready_at * 1000, 1) if self.ready_at is not None else None,
+            'first_update_ms': round(self.first_update_at * 1000, 1) if self.first_update_at is not None else None,
+        }
+
+    def report(self) -> str:
+        kinds = {'import': 'импорт', 'init': 'шаг', 'background': 'фон'}
+        lines = ["⏱️ ПРОФИЛЬ ЗАПУСКА" + (" (быстрый режим)" if self.background else "")]
+        with self._lock:
+            steps = list(self.steps)
+        for step in steps:
+            lines.append(f"   {kinds[step['kind']]:<7} {step['name']:<28} {step['seconds'] * 1000:8.1f} мс")
+        if self.ready_at is not None:
+            lines.append(f"   🚀 Готов к приему обновлений: {self.ready_at * 1000:.0f} мс")
+        with self._lock:
+            running = [name for name, future in self._pending.items() if not future.done()]
+        if running:
+            lines.append(f"   ⏳ Еще выполняются в фоне: {', '.join(running)}")
+        return "\n".join(lines)
+
+    def save(self, path: pathlib.Path) -> None:
+        """Дописать замер в JSONL - история запусков для сравнения"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(self.summary(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.logger.warning(f"⚠️ Профиль запуска не сохранен: {e}")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool = self._pool
+        if pool:
+            pool.shutdown(wait=True)
@@ -0,0 +1,271 @@
+"""
+🚀 КЛИЕНТ TELEGRAM API С ОГРАНИЧЕНИЕМ СКОРОСТИ И ПОВТОРАМИ
+ОБОРАЧИВАЕТ TeleBot / SyncBotBridge: ОБЩИЙ И ПО-ЧАТОВЫЙ TOKEN BUCKET, ОЖИДАНИЕ retry_after ПРИ 429,
+ЭКСПОНЕНЦИАЛЬНАЯ ПАУЗА ПРИ СЕТЕВЫХ ОШИБКАХ И 5xx, ПОДРЯД ИДУЩИЕ ПРАВКИ ОДНОГО СООБЩЕНИЯ СКЛЕИВАЮТСЯ
+"""
+
+import inspect
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+import telebot
+from telebot import apihelper
+
+# Методы, на которые действуют лимиты Telegram (сообщения в чат)
+RATE_LIMITED_METHODS = frozenset({
+    'send_message', 'send_document', 'send_photo', 'send_media_group', 'send_video',
+    'forward_message', 'copy_message', 'delete_message',
+    'edit_message_text', 'edit_message_reply_markup', 'edit_message_caption', 'edit_message_media',
+})
+# Правки, которые можно склеить: пока правка ждет очереди, более новая заменяет ее аргументы
+COALESCED_METHODS = frozenset({
+    'edit_message_text', 'edit_message_reply_markup', 'edit_message_caption', 'edit_message_media',
+})
+# Без лимитов, но с повторами при сетевых ошибках
+RETRY_ONLY_METHODS = frozenset({'answer_callback_query', 'get_file', 'download_file'})
+
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат, 20/мин в группу
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 5
+MAX_BACKOFF = 30.0
+MAX_CHAT_BUCKETS = 10000
+
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def _async_errors() -> Tuple[tuple, tuple]:
+    """(таймауты, HTTP-ошибки) asyncio_helper. Модуль тянет aiohttp - импортирует его только
+    асинхронный режим; если он не загружен, его исключения возникнуть не могут"""
+    asyncio_helper = sys.modules.get('telebot.asyncio_helper')
+    if asyncio_helper is None:
+        return (), ()
+    return (asyncio_helper.RequestTimeout,), (asyncio_helper.ApiHTTPException,)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Занять токен. Возвращает, сколько секунд нужно подождать перед запросом"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Telegram вернул retry_after - все запросы через этот bucket ждут"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def idle(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            refilled = self._tokens + (now - self._updated) * self.rate
+            return refilled >= self.capacity and now >= self._blocked_until
+
+
+class TelegramClient:
+    """Объект с интерфейсом TeleBot: отправки идут через лимиты и повторы, остальное - напрямую"""
+
+    def __init__(self, bot: Any, max_retries: int = 3, retry_delay: float = 1.0,
+                 global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, chat_burst: float = CHAT_BURST,
+                 group_rate: float = GROUP_RATE, group_burst: float = GROUP_BURST):
+        self._bot = bot
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.logger = logging.getLogger('TelegramClient')
+
+        self._global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+
+        self._pending_edits: Dict[Tuple[str, Any, Any], Dict[str, Any]] = {}
+        self._edits_lock = threading.Lock()
+        self._wrapped: Dict[str, Callable] = {}
+        self._signatures: Dict[str, Optional[inspect.Signature]] = {}
+
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'coalesced': 0,
+                      'failed': 0, 'throttled_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def set_rate_limits(self, global_rate: float, chat_rate: float, chat_burst: float,
+                        group_rate: float, group_burst: float) -> None:
+        """Другие лимиты (нагрузочный тест с локальным Bot API). Очереди чатов создаются заново"""
+        with self._buckets_lock:
+            self.chat_rate, self.chat_burst = chat_rate, chat_burst
+            self.group_rate, self.group_burst = group_rate, group_burst
+            self._global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+            self._chat_buckets.clear()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._bot, name)
+        if name not in RATE_LIMITED_METHODS and name not in RETRY_ONLY_METHODS:
+            return attr
+
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            def wrapped(*args, **kwargs):
+                return self._call(name, args, kwargs)
+            wrapped.__name__ = name
+            self._wrapped[name] = wrapped
+        return wrapped
+
+    # ✅ ВЫЗОВ С ЛИМИТАМИ И ПОВТОРАМИ
+    def _call(self, name: str, args: tuple, kwargs: dict) -> Any:
+        arguments = self._bind(name, args, kwargs)
+        chat_id = arguments.get('chat_id')
+
+        if name in COALESCED_METHODS and arguments.get('message_id') is not None:
+            return self._call_coalesced(name, chat_id, arguments['message_id'], args, kwargs)
+        return self._call_with_retries(name, chat_id, args, kwargs)
+
+    def _call_coalesced(self, name: str, chat_id: Any, message_id: Any, args: tuple, kwargs: dict) -> Any:
+        key = (name, chat_id, message_id)
+        with self._edits_lock:
+            pending = self._pending_edits.get(key)
+            if pending is not None:
+                # Правка этого сообщения уже ждет очереди - она отправит последние данные
+                pending['args'], pending['kwargs'] = args, kwargs
+                self._count('coalesced')
+                return None
+            pending = {'args': args, 'kwargs': kwargs}
+            self._pending_edits[key] = pending
+
+        try:
+            self._throttle(name, chat_id)
+        finally:
+            with self._edits_lock:
+                self._pending_edits.pop(key, None)
+                args, kwargs = pending['args'], pending['kwargs']
+        return self._call_with_retries(name, chat_id, args, kwargs, throttled=True)
+
+    def _call_with_retries(self, name: str, chat_id: Any, args: tuple, kwargs: dict,
+                           throttled: bool = False) -> Any:
+        method = getattr(self._bot, name)
+        file_positions = self._file_positions(args, kwargs)
+
+        for attempt in range(self.max_retries + 1):
+            if not throttled:
+                self._throttle(name, chat_id)
+            throttled = False
+            self._count('calls')
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, chat_id)
+                if delay is None or attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                self._count('retries')
+                self.logger.warning(f"⚠️ {name}: {e} - повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с")
+                time.sleep(delay)
+                for file, position in file_positions:
+                    file.seek(position)
+
+    def _retry_delay(self, error: Exception, attempt: int, chat_id: Any) -> Optional[float]:
+        """Пауза перед повтором или None, если ошибку повторять бессмысленно"""
+        backoff = min(MAX_BACKOFF, self.retry_delay * (2 ** attempt))
+        error_code = getattr(error, 'error_code', None)
+
+        if error_code == 429:
+            self._count('rate_limited')
+            parameters = (getattr(error, 'result_json', None) or {}).get('parameters') or {}
+            retry_after = float(parameters.get('retry_after', backoff))
+            # Ждут все запросы в этот чат (или все запросы бота, если чат неизвестен)
+            bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global_bucket
+            bucket.pause(retry_after)
+            return retry_after
+        if error_code is not None:
+            return backoff if error_code >= 500 else None
+        async_timeouts, async_http_errors = _async_errors()
+        if isinstance(error, (apihelper.ApiHTTPException,) + async_http_errors):
+            status = getattr(getattr(error, 'result', None), 'status_code', 500)
+            return backoff if status >= 500 else None
+        if isinstance(error, TRANSIENT_ERRORS + async_timeouts):
+            return backoff
+        return None
+
+    # ✅ ЛИМИТЫ
+    def _throttle(self, name: str, chat_id: Any) -> None:
+        if name not in RATE_LIMITED_METHODS:
+            return
+        wait = self._global_bucket.reserve()
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            with self._stats_lock:
+                self.stats['throttled_seconds'] += wait
+            time.sleep(wait)
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                    self._chat_buckets = {key: b for key, b in self._chat_buckets.items() if not b.idle()}
+                # Группы и каналы (отрицательный id или @username) - лимит 20 сообщений в минуту
+                is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+                bucket = (TokenBucket(self.group_rate, self.group_burst) if is_group
+                          else TokenBucket(self.chat_rate, self.chat_burst))
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    # ✅ ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ
+    def _bind(self, name: str, args: tuple, kwargs: dict) -> Dict[str, Any]:
+        """Именованные аргументы вызова по сигнатуре TeleBot (chat_id, message_id)"""
+        if name not in self._signatures:
+            method = getattr(telebot.TeleBot, name, None)
+            self._signatures[name] = inspect.signature(method) if method else None
+        signature = self._signatures[name]
+        if signature is None:
+            return dict(kwargs)
+        try:
+            return signature.bind_partial(None, *args, **kwargs).arguments
+        except TypeError:
+            return dict(kwargs)
+
+    @staticmethod
+    def _file_positions(args: tuple, kwargs: dict) -> list:
+        """Открытые файлы аргументов - перед повтором загрузки их нужно перемотать"""
+        positions = []
+        for value in (*args, *kwargs.values()):
+            items = value if isinstance(value, (list, tuple)) else [value]
+            for item in items:
+                file = getattr(item, 'media', item)
+                if hasattr(file, 'seek') and hasattr(file, 'tell'):
+                    try:
+                        positions.append((file, file.tell()))
+                    except (OSError, ValueError):
+                        pass
+        return positions
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
@@ -0,0 +1,254 @@
+"""
+🚀 ХРАНИЛИЩЕ ШАБЛОНОВ ШАПОК ДОКУМЕНТОВ
+ЕДИНЫЙ ИНДЕКС В ПАМЯТИ ДЛЯ БОТА И АДМИН-ПАНЕЛИ + ЗАРАНЕЕ СКОМПИЛИРОВАННЫЕ БЛОКИ ШАПКИ
+"""
+
+import hashlib
+import json
+import logging
+import pathlib
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from modules.startup import lazy_module
+
+# openpyxl нужен только при создании документа - не при загрузке шаблонов
+openpyxl_styles = lazy_module('openpyxl.styles')
+
+# ✅ ОБЩИЕ СТИЛИ ЯЧЕЕК ШАПКИ: ключ -> параметры (объекты openpyxl создаются один раз при первом документе)
+FONT_TITLE = 'font_title'
+FONT_ORDER = 'font_order'
+FONT_BOLD = 'font_bold'
+ALIGN_CENTER = 'align_center'
+ALIGN_LEFT = 'align_left'
+
+HEADER_STYLES = {
+    FONT_TITLE: ('Font', {'bold': True, 'size': 12}),
+    FONT_ORDER: ('Font', {'bold': True, 'size': 14}),
+    FONT_BOLD: ('Font', {'bold': True}),
+    ALIGN_CENTER: ('Alignment', {'horizontal': 'center', 'vertical': 'center'}),
+    ALIGN_LEFT: ('Alignment', {'horizontal': 'left', 'vertical': 'center'}),
+}
+
+
+@lru_cache(maxsize=None)
+def header_style(key: str) -> Any:
+    """Объект стиля openpyxl по ключу HeaderCell.font / HeaderCell.alignment"""
+    style_class, params = HEADER_STYLES[key]
+    return getattr(openpyxl_styles, style_class)(**params)
+
+
+class HeaderCell(NamedTuple):
+    """Ячейка скомпилированной шапки. Если field задан - значение: text + поле заказа + suffix"""
+    coordinate: str
+    merge_range: Optional[str]
+    text: str
+    field: Optional[str]
+    suffix: str
+    font: Optional[str]       # ключ HEADER_STYLES
+    alignment: str
+
+
+class CompiledHeaderTemplate(NamedTuple):
+    """Шаблон шапки с версией и готовым планом строк/объединений"""
+    template_id: str
+    data: Dict[str, Any]
+    version: str
+    cells: Tuple[HeaderCell, ...]
+    end_row: int
+
+
+def template_version(template: Dict[str, Any]) -> str:
+    """Версия шаблона - хэш его содержимого"""
+    canonical = json.dumps(template, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def compile_header_block(template: Dict[str, Any]) -> Tuple[Tuple[HeaderCell, ...], int]:
+    """Компиляция шапки заказ-наряда: все строки, объединения и стили вычисляются один раз на шаблон"""
+    contractor = template['contractor']
+    customer = template['customer']
+    default_vehicle = template.get('default_vehicle', 'Автомобиль')
+
+    def cell(coordinate, merge_range, text, font=None, alignment=ALIGN_CENTER, field=None, suffix=''):
+        return HeaderCell(coordinate, merge_range, text, field, suffix, font, alignment)
+
+    cells = (
+        # ДАННЫЕ ИСПОЛНИТЕЛЯ
+        cell('A1', 'A1:F1', f"ИНДИВИДУАЛЬНЫЙ ПРЕДПРИНИМАТЕЛЬ {contractor['company'].split('ИП ')[1]}", FONT_TITLE),
+        cell('A2', 'A2:F2', f"ИНН: {contractor['inn']} ОГРНИП: {contractor['ogrnip']}"),
+        cell('A3', 'A3:F3', contractor['address']),
+        cell('A4', 'A4:F4', f"{contractor['email']} {contractor['phone']}"),
+        # Строка 5 пустая
+        cell('B6', 'B6:F6', "ЗАКАЗ – НАРЯД №", FONT_ORDER, field='order_number'),
+        cell('B7', 'B7:F7', "Дата и время приема заказа: ", field='date', suffix=" г."),
+        cell('B8', 'B8:F8', "Дата и время окончания работ: ", field='date', suffix=" г."),
+        # ЗАКАЗЧИК
+        cell('B9', 'B9:F9', "Заказчик", FONT_BOLD),
+        cell('B10', 'B10:F10', customer['company']),
+        cell('B11', 'B11:F11', f"Адрес: {customer['address']}"),
+        # ДАННЫЕ АВТОМОБИЛЯ
+        cell('B12', 'B12:D12', f"Марка, модель: {default_vehicle}", alignment=ALIGN_LEFT),
+        cell('E12', None, "Двигатель №"),
+        cell('B13', 'B13:D13', "Государственный рег. номер: ", FONT_BOLD, ALIGN_LEFT, field='license_plate'),
+        cell('E13', None, "Шасси №"),
+        cell('B14', 'B14:D14', "VIN", alignment=ALIGN_LEFT),
+        cell('E14', None, "Кузов №"),
+        # Заголовок раздела работ
+        cell('B15', 'B15:F15', "Выполненные работы по заказ-наряду №", FONT_BOLD, field='order_number'),
+    )
+    return cells, 15
+
+
+class HeaderTemplateStore:
+    """Единое хранилище шаблонов шапок: индекс в памяти, проверка изменений по mtime, подписчики"""
+
+    _instances: Dict[pathlib.Path, 'HeaderTemplateStore'] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, templates_path: pathlib.Path) -> 'HeaderTemplateStore':
+        """Общий экземпляр для папки шаблонов (один на процесс)"""
+        key = pathlib.Path(templates_path).resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(templates_path)
+            return cls._instances[key]
+
+    def __init__(self, templates_path: pathlib.Path):
+        self.templates_path = pathlib.Path(templates_path)
+        self.logger = logging.getLogger('HeaderTemplateStore')
+        self._index: Dict[str, CompiledHeaderTemplate] = {}
+        self._file_ids: Dict[pathlib.Path, str] = {}
+        self._file_stamps: Dict[pathlib.Path, Tuple[float, int]] = {}
+        self._listeners: List[Callable[[Set[str]], None]] = []
+        self._lock = threading.RLock()
+        self.refresh()
+
+    # ✅ ЧТЕНИЕ
+    def get(self, template_id: str) -> Optional[Dict[str, Any]]:
+        compiled = self._index.get(template_id)
+        return compiled.data if compiled else None
+
+    def get_compiled(self, template_id: str) -> Optional[CompiledHeaderTemplate]:
+        return self._index.get(template_id)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return {template_id: compiled.data for template_id, compiled in self._index.items()}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # ✅ ПОДПИСКА НА ИЗМЕНЕНИЯ
+    def subscribe(self, listener: Callable[[Set[str]], None]) -> None:
+        """listener(changed_ids) вызывается после любого изменения набора шаблонов"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, changed_ids: Set[str]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(changed_ids)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Ошибка подписчика шаблонов: {e}")
+
+    # ✅ СИНХРОНИЗАЦИЯ С ФАЙЛАМИ
+    def refresh(self, force: bool = False) -> bool:
+        """Перечитать только изменившиеся файлы. Возвращает True если набор шаблонов изменился"""
+        with self._lock:
+            try:
+                self.templates_path.mkdir(parents=True, exist_ok=True)
+                current_files = {path: path.stat() for path in self.templates_path.glob("*.json")}
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка чтения папки шаблонов: {e}")
+                return False
+
+            index = dict(self._index)
+            changed_ids: Set[str] = set()
+
+            # Удаленные файлы
+            for path in list(self._file_stamps):
+                if path not in current_files:
+                    template_id = self._file_ids.pop(path, None)
+                    self._file_stamps.pop(path, None)
+                    if template_id and index.pop(template_id, None):
+                        changed_ids.add(template_id)
+
+            # Новые и измененные файлы
+            for path, stat in current_files.items():
+                stamp = (stat.st_mtime, stat.st_size)
+                if not force and self._file_stamps.get(path) == stamp:
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        template_data = json.load(f)
+                    compiled = self._compile(template_data)
+                except Exception as e:
+                    print(f"❌ Ошибка загрузки шаблона {path}: {e}")
+                    continue
+
+                previous_id = self._file_ids.get(path)
+                if previous_id and previous_id != compiled.template_id:
+                    index.pop(previous_id, None)
+                    changed_ids.add(previous_id)
+
+                self._file_stamps[path] = stamp
+                self._file_ids[path] = compiled.template_id
+                if compiled.template_id not in index or index[compiled.template_id].version != compiled.version:
+                    changed_ids.add(compiled.template_id)
+                index[compiled.template_id] = compiled
+
+            if not changed_ids:
+                return False
+
+            self._index = index
+
+        self._notify(changed_ids)
+        return True
+
+    def save(self, template_data: Dict[str, Any]) -> bool:
+        """Сохранить шаблон в файл и обновить индекс"""
+        try:
+            compiled = self._compile(template_data)
+            template_file = self.templates_path / f"{compiled.template_id}.json"
+            with self._lock:
+                self.templates_path.mkdir(parents=True, exist_ok=True)
+                with open(template_file, 'w', encoding='utf-8') as f:
+                    json.dump(template_data, f, ensure_ascii=False, indent=2)
+                stat = template_file.stat()
+                self._file_stamps[template_file] = (stat.st_mtime, stat.st_size)
+                self._file_ids[template_file] = compiled.template_id
+                index = dict(self._index)
+                index[compiled.template_id] = compiled
+                self._index = index
+            self._notify({compiled.template_id})
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка сохранения шаблона: {e}")
+            return False
+
+    def delete(self, template_id: str) -> bool:
+        """Удалить шаблон (файл и запись индекса)"""
+        template_file = self.templates_path / f"{template_id}.json"
+        with self._lock:
+            template_file.unlink(missing_ok=True)
+            self._file_stamps.pop(template_file, None)
+            self._file_ids.pop(template_file, None)
+            index = dict(self._index)
+            removed = index.pop(template_id, None)
+            self._index = index
+        if removed:
+            self._notify({template_id})
+        return removed is not None
+
+    @staticmethod
+    def _compile(template_data: Dict[str, Any]) -> CompiledHeaderTemplate:
+        cells, end_row = compile_header_block(template_data)
+        return CompiledHeaderTemplate(
+            template_id=template_data['id'],
+            data=template_data,
+            version=template_version(template_data),
+            cells=cells,
+            end_row=end_row,
+        )
@@ -0,0 +1,172 @@
+"""
+🚀 ЗАПИСЬ ВХОДЯЩИХ ОБНОВЛЕНИЙ ДЛЯ ВОСПРОИЗВЕДЕНИЯ
+СООБЩЕНИЯ И НАЖАТИЯ КНОПОК ПИШУТСЯ В JSONL: {ts, update} В МОМЕНТ ПРИЕМА. ЛИЧНЫЕ ДАННЫЕ УДАЛЯЮТСЯ:
+id ЧАТОВ И ПОЛЬЗОВАТЕЛЕЙ И file_id - ПСЕВДОНИМЫ, ИМЕНА, КОНТАКТЫ, ГЕОПОЗИЦИЯ, ЦИТАТЫ - НЕ ПИШУТСЯ,
+БУКВЫ ТЕКСТА ЗАМЕНЯЮТСЯ (ЦИФРЫ, ЗНАКИ И ДЛИНА СОХРАНЯЮТСЯ - ГОСНОМЕР И ДАТА ОСТАЮТСЯ ДОПУСТИМЫМИ).
+ВОСПРОИЗВЕДЕНИЕ НА ЛОКАЛЬНОМ BOT API - utils/replay_updates.py
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from telebot import types
+
+# Поля сообщения, которые переносятся в запись как есть (без личных данных)
+KEPT_MESSAGE_FIELDS = ('message_id', 'media_group_id')
+# Первый псевдоним: личный чат и его пользователь получают один и тот же id, группы - отрицательный
+FIRST_PSEUDO_ID = 1_000_001
+
+
+def mask_text(text: str) -> str:
+    """Буквы -> А/а (кириллица) и X/x (латиница). Цифры, знаки, эмодзи и длина сохраняются.
+    Команда (/new_order) остается, маскируются только ее аргументы"""
+    command, rest = '', text
+    if text.startswith('/'):
+        command, _, rest = text.partition(' ')
+        rest = ' ' + rest if rest else ''
+    masked = []
+    for char in rest:
+        if not char.isalpha():
+            masked.append(char)
+        elif 'а' <= char.lower() <= 'я' or char in 'Ёё':
+            masked.append('А' if char.isupper() else 'а')
+        else:
+            masked.append('X' if char.isupper() else 'x')
+    return command + ''.join(masked)
+
+
+class UpdateScrubber:
+    """Очистка обновлений от личных данных. Псевдонимы одинаковы в пределах одной записи"""
+
+    def __init__(self, keep_text: Optional[Callable[[str], bool]] = None):
+        # Тексты, которые пишутся без маскировки (например, выбор работы из inline-поиска)
+        self.keep_text = keep_text or (lambda text: False)
+        self._ids: Dict[int, int] = {}
+        self._next_id = itertools.count(FIRST_PSEUDO_ID)
+
+    def scrub(self, update: types.Update) -> Optional[Dict[str, Any]]:
+        """Обновление -> словарь для записи. Кроме сообщений и нажатий кнопок - None"""
+        if update.message is not None:
+            return {'message': self._message(update.message.json)}
+        if update.callback_query is not None:
+            return {'callback_query': self._callback(update.callback_query.json)}
+        return None
+
+    def pseudo_id(self, real_id: int) -> int:
+        pseudo = self._ids.get(real_id)
+        if pseudo is None:
+            pseudo = self._ids[real_id] = next(self._next_id)
+        return -pseudo if real_id < 0 else pseudo
+
+    def _message(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        chat = raw.get('chat') or {}
+        message: Dict[str, Any] = {field: raw[field] for field in KEPT_MESSAGE_FIELDS if field in raw}
+        message['date'] = raw.get('date', 0)
+        message['chat'] = {'id': self.pseudo_id(chat.get('id', 0)), 'type': chat.get('type', 'private')}
+        if raw.get('from'):
+            message['from'] = self._user(raw['from'])
+
+        for field in ('text', 'caption'):
+            if raw.get(field) is not None:
+                text = raw[field]
+                message[field] = text if self.keep_text(text) else mask_text(text)
+        for field in ('entities', 'caption_entities'):
+            if raw.get(field):
+                message[field] = [{'type': e['type'], 'offset': e['offset'], 'length': e['length']}
+                                  for e in raw[field] if e.get('type') in ('bot_command', 'hashtag')]
+        if raw.get('photo'):
+            message['photo'] = [self._file(size, ('width', 'height', 'file_size')) for size in raw['photo']]
+        if raw.get('document'):
+            document = raw['document']
+            extension = pathlib.PurePath(document.get('file_name') or '').suffix
+            message['document'] = {**self._file(document, ('mime_type', 'file_size')),
+                                   'file_name': f"document{extension}"}
+        return message
+
+    def _callback(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        # Текст сообщения с кнопкой - ответ бота, при воспроизведении он будет свой
+        message = raw.get('message') or {}
+        chat = message.get('chat') or {}
+        callback: Dict[str, Any] = {'from': self._user(raw['from']), 'data': raw.get('data', '')}
+        if message:
+            callback['message'] = {'message_id': message.get('message_id'),
+                                   'chat': {'id': self.pseudo_id(chat.get('id', 0)),
+                                            'type': chat.get('type', 'private')}}
+        return callback
+
+    def _user(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        return {'id': self.pseudo_id(raw.get('id', 0)), 'is_bot': raw.get('is_bot', False), 'first_name': 'User'}
+
+    @staticmethod
+    def _file(raw: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+        # Одинаковые файлы остаются одинаковыми (дубликаты фото), но id Telegram не раскрывается
+        unique = raw.get('file_unique_id') or raw.get('file_id', '')
+        pseudo = "file-" + hashlib.sha256(unique.encode('utf-8')).hexdigest()[:16]
+        scrubbed = {'file_id': pseudo, 'file_unique_id': pseudo}
+        scrubbed.update({field: raw[field] for field in fields if field in raw})
+        return scrubbed
+
+
+class UpdateRecorder:
+    """Запись принятых обновлений в JSONL. Вызывается из потока приема (polling/webhook)"""
+
+    def __init__(self, path: pathlib.Path, keep_text: Optional[Callable[[str], bool]] = None):
+        self.path = pathlib.Path(path)
+        self.scrubber = UpdateScrubber(keep_text)
+        self.logger = logging.getLogger('UpdateRecorder')
+        self.stats = {'recorded': 0, 'skipped': 0}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, update: types.Update) -> None:
+        received = round(time.time(), 3)
+        try:
+            scrubbed = self.scrubber.scrub(update)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Обновление {update.update_id} не записано: {e}")
+            scrubbed = None
+        with self._lock:
+            if scrubbed is None:
+                self.stats['skipped'] += 1
+                return
+            line = json.dumps({'ts': received, 'update': scrubbed}, ensure_ascii=False) + "\n"
+            try:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+                self.stats['recorded'] += 1
+            except OSError as e:
+                self.logger.warning(f"⚠️ Обновление {update.update_id} не записано: {e}")
+
+    def record_all(self, updates: List[types.Update]) -> None:
+        for update in updates:
+            self.record(update)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_recording(path: pathlib.Path) -> List[Dict[str, Any]]:
+    """Записи {ts, update} по времени приема. Поврежденные строки (обрыв записи) пропускаются"""
+    records = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get('update'), dict) and 'ts' in record:
+                records.append(record)
+    records.sort(key=lambda record: record['ts'])
+    return records
@@ -0,0 +1,116 @@
+"""
+🚀 ПРИЕМ ОБНОВЛЕНИЙ TELEGRAM ЧЕРЕЗ WEBHOOK
+ВСТРОЕННЫЙ HTTP-СЕРВЕР: ПРИНИМАЕТ ОБНОВЛЕНИЕ ИЛИ ПАЧКУ ОБНОВЛЕНИЙ, СРАЗУ ОТВЕЧАЕТ 200
+И ПЕРЕДАЕТ ИХ В ОЧЕРЕДИ ДИСПЕТЧЕРА ЧАТОВ
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from telebot import types
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+class WebhookServer:
+    """HTTP-сервер webhook. process_updates должен только ставить обновления в очередь"""
+
+    def __init__(self, process_updates: Callable[[List[types.Update]], None],
+                 host: str = '127.0.0.1', port: int = 8080, path: str = '/telegram',
+                 secret_token: Optional[str] = None):
+        self.process_updates = process_updates
+        self.path = path
+        self.secret_token = secret_token
+        self.logger = logging.getLogger('WebhookServer')
+        self.stats: Dict[str, int] = {'requests': 0, 'updates': 0, 'rejected': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (при port=0 выбирается свободный)"""
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        host = self.httpd.server_address[0]
+        return f"http://{host}:{self.port}{self.path}"
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                server._count('requests')
+                if self.path != server.path:
+                    server._count('rejected')
+                    self._reply(404)
+                    return
+                if server.secret_token and self.headers.get(SECRET_HEADER) != server.secret_token:
+                    server._count('rejected')
+                    self._reply(403)
+                    return
+
+                length = int(self.headers.get('Content-Length', 0))
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    server._count('rejected')
+                    self._reply(400)
+                    return
+
+                try:
+                    payload = json.loads(self.rfile.read(length).decode('utf-8'))
+                except ValueError:
+                    server._count('rejected')
+                    self._reply(400)
+                    return
+
+                # ✅ ПОДТВЕРЖДАЕМ СРАЗУ - ОБРАБОТКА ИДЕТ В ОЧЕРЕДЯХ ДИСПЕТЧЕРА
+                self._reply(200)
+                server._dispatch(payload if isinstance(payload, list) else [payload])
+
+            def _reply(self, status: int) -> None:
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args) -> None:
+                server.logger.debug(format % args)
+
+        return _Handler
+
+    def _dispatch(self, raw_updates: list) -> None:
+        try:
+            updates = [types.Update.de_json(raw) for raw in raw_updates if isinstance(raw, dict)]
+            if updates:
+                self._count('updates', len(updates))
+                self.process_updates(updates)
+        except Exception as e:
+            self._count('errors')
+            self.logger.error(f"❌ Ошибка обработки webhook: {e}")
+
+    def start(self) -> None:
+        """Запуск в фоновом потоке"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='webhook', daemon=True)
+        self._thread.start()
+        self.logger.info(f"✅ Webhook сервер запущен: {self.url}")
+
+    def serve_forever(self) -> None:
+        self.logger.info(f"✅ Webhook сервер запущен: {self.url}")
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -0,0 +1,148 @@
+"""
+🚀 ОЧЕРЕДЬ ПУБЛИКАЦИЙ В РАБОЧИЙ ЧАТ
+ЗАКАЗЫ ОТ ВСЕХ ТЕХНИКОВ ПУБЛИКУЮТСЯ ОДНИМ ПОТОКОМ ПО ОЧЕРЕДИ С ОГРАНИЧЕНИЕМ СКОРОСТИ
+(ЛИМИТ ГРУППЫ TELEGRAM - 20 СООБЩЕНИЙ В МИНУТУ, КАЖДОЕ ФОТО АЛЬБОМА - ОТДЕЛЬНОЕ СООБЩЕНИЕ).
+ФОТО И ТЕКСТ ЗАКАЗА ОТПРАВЛЯЮТСЯ ОДНИМ АЛЬБОМОМ С ПОДПИСЬЮ, ЕСЛИ ТЕКСТ ПОМЕЩАЕТСЯ В ПОДПИСЬ,
+ДОКУМЕНТЫ - ОТДЕЛЬНЫМ АЛЬБОМОМ ПО file_id (БЕЗ ПОВТОРНОЙ ЗАГРУЗКИ)
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from telebot import types
+
+from modules.telegram_client import TokenBucket
+
+CAPTION_LIMIT = 1024
+GROUP_MESSAGES_PER_MINUTE = 20
+GROUP_BURST = 5
+MAX_PHOTOS = 3
+
+
+@dataclass(frozen=True)
+class WorkChatPost:
+    """Публикация заказа: текст, фото и документы (file_id уже загруженных файлов).
+    title - подпись альбома, если текст не помещается"""
+    text: str
+    photo_file_ids: Tuple[str, ...] = ()
+    title: str = ''
+    document_file_ids: Tuple[str, ...] = ()
+
+
+def _album(media_type: type, file_ids: Tuple[str, ...], caption: Optional[str],
+           caption_index: int = 0) -> Tuple[str, tuple, dict]:
+    if len(file_ids) == 1:
+        method = 'send_photo' if media_type is types.InputMediaPhoto else 'send_document'
+        return (method, (file_ids[0],), {'caption': caption})
+    media = [media_type(file_id, caption=caption if index == caption_index % len(file_ids) else None)
+             for index, file_id in enumerate(file_ids)]
+    return ('send_media_group', (media,), {})
+
+
+def plan_post(post: WorkChatPost) -> List[Tuple[str, tuple, dict]]:
+    """Вызовы Bot API для публикации: [(метод, args, kwargs)]"""
+    text = post.text.strip()
+    photos = post.photo_file_ids[:MAX_PHOTOS]
+    documents = post.document_file_ids
+    fits = len(text) <= CAPTION_LIMIT
+    calls = []
+
+    if photos:
+        calls.append(_album(types.InputMediaPhoto, photos, text if fits else (post.title or text[:CAPTION_LIMIT])))
+        if not fits:
+            calls.append(('send_message', (text,), {}))
+    elif documents and fits:
+        # Без фото текст - подпись под последним документом
+        return [_album(types.InputMediaDocument, documents, text, caption_index=-1)]
+    else:
+        calls.append(('send_message', (text,), {}))
+
+    if documents:
+        calls.append(_album(types.InputMediaDocument, documents, None))
+    return calls
+
+
+def message_units(method: str, args: tuple) -> int:
+    """Сколько сообщений чата занимает вызов (альбом - по сообщению на фото)"""
+    if method == 'send_media_group':
+        return len(args[0])
+    return 1
+
+
+class WorkChatDispatcher:
+    """Один поток публикует заказы в рабочий чат по очереди, соблюдая лимит группы"""
+
+    def __init__(self, bot: Any, chat_id: Any, messages_per_minute: float = GROUP_MESSAGES_PER_MINUTE,
+                 burst: float = GROUP_BURST):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.logger = logging.getLogger('WorkChatDispatcher')
+        self._bucket = TokenBucket(messages_per_minute / 60, burst)
+        self._queue: 'queue.Queue[Optional[Tuple[WorkChatPost, Future]]]' = queue.Queue()
+        self.stats = {'posts': 0, 'api_calls': 0, 'merged': 0, 'failed': 0, 'throttled_seconds': 0.0}
+        self._thread = threading.Thread(target=self._run, name='work-chat', daemon=True)
+        self._thread.start()
+
+    def submit(self, post: WorkChatPost) -> Future:
+        """Поставить публикацию в очередь. Future завершается после отправки"""
+        future: Future = Future()
+        self._queue.put((post, future))
+        return future
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def idle(self) -> bool:
+        """Очередь пуста и публикация не выполняется"""
+        with self._queue.mutex:
+            return self._queue.unfinished_tasks == 0
+
+    def set_rate(self, messages_per_minute: float, burst: float) -> None:
+        """Другой лимит группы (нагрузочный тест с локальным Bot API)"""
+        self._bucket = TokenBucket(messages_per_minute / 60, burst)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Дождаться публикаций, поставленных до остановки, и завершить поток"""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            post, future = item
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                future.set_result(self._publish(post))
+            except Exception as e:
+                self.stats['failed'] += 1
+                self.logger.error(f"❌ Не удалось опубликовать заказ в рабочий чат: {e}")
+                future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _publish(self, post: WorkChatPost) -> List[Any]:
+        calls = plan_post(post)
+        results = []
+        for method, args, kwargs in calls:
+            self._shape(message_units(method, args))
+            results.append(getattr(self.bot, method)(self.chat_id, *args, **kwargs))
+            self.stats['api_calls'] += 1
+        self.stats['posts'] += 1
+        if (post.photo_file_ids or post.document_file_ids) and len(calls) == 1:
+            self.stats['merged'] += 1
+        return results
+
+    def _shape(self, units: int) -> None:
+        wait = max(self._bucket.reserve() for _ in range(units))
+        if wait > 0:
+            self.stats['throttled_seconds'] += wait
+            time.sleep(wait)
@@ -0,0 +1,117 @@
+"""
+🚀 ПОИСК РАБОТ ПО ФРАГМЕНТУ (INLINE-РЕЖИМ)
+ДЛЯ КАЖДОГО СПИСКА РАБОТ ЗАРАНЕЕ СТРОИТСЯ ИНДЕКС ТРИГРАММ (СЛОВА ОТ 3 БУКВ) И ПРЕФИКСОВ
+(1-2 БУКВЫ). ПОИСК - ПЕРЕСЕЧЕНИЕ СПИСКОВ НОМЕРОВ РАБОТ БЕЗ ПРОСМОТРА ВСЕГО КАТАЛОГА.
+ИНДЕКС ПЕРЕСТРАИВАЕТСЯ, КОГДА МЕНЯЕТСЯ СОДЕРЖИМОЕ КАТАЛОГА
+"""
+
+import logging
+import re
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+Work = Tuple[str, float]
+
+MAX_RESULTS = 50  # Лимит Telegram на один ответ inline-запроса
+SHORT_TOKEN = 3
+
+_NOT_WORD = re.compile(r'[^0-9a-zа-я]+')
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, знаки препинания -> пробел"""
+    return _NOT_WORD.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def trigrams(word: str) -> Set[str]:
+    return {word[index:index + 3] for index in range(len(word) - 2)}
+
+
+class WorksIndex:
+    """Индекс одного каталога работ. Номер работы в индексе = номер в списке (work:{номер})"""
+
+    def __init__(self, works: Sequence[Work]):
+        started = time.perf_counter()
+        self.size = len(works)
+        self._names = [normalize(name) for name, _ in works]
+        grams: Dict[str, List[int]] = {}
+        prefixes: Dict[str, List[int]] = {}
+        for work_id, name in enumerate(self._names):
+            words = name.split()
+            for gram in set().union(*(trigrams(word) for word in words)):
+                grams.setdefault(gram, []).append(work_id)
+            for prefix in {word[:length] for word in words for length in range(1, SHORT_TOKEN) if len(word) >= length}:
+                prefixes.setdefault(prefix, []).append(work_id)
+        # Компактные списки номеров: 4 байта на вхождение
+        self._grams = {gram: array('I', ids) for gram, ids in grams.items()}
+        self._prefixes = {prefix: array('I', ids) for prefix, ids in prefixes.items()}
+        self.build_seconds = time.perf_counter() - started
+
+    def search(self, query: str, offset: int = 0, limit: int = MAX_RESULTS) -> Tuple[List[int], Optional[int]]:
+        """Номера работ, содержащих все слова запроса (в порядке каталога) и следующий offset"""
+        tokens = normalize(query).split()
+        ids: Sequence[int] = sorted(self._candidates(tokens)) if tokens else range(self.size)
+        page = list(ids[offset:offset + limit])
+        next_offset = offset + limit if offset + limit < len(ids) else None
+        return page, next_offset
+
+    def _candidates(self, tokens: List[str]) -> Set[int]:
+        candidates: Optional[Set[int]] = None
+        verify = []
+        # Длинные слова дают самые короткие списки - начинаем с них
+        for token in sorted(set(tokens), key=len, reverse=True):
+            if len(token) < SHORT_TOKEN:
+                postings = [self._prefixes.get(token, ())]
+            else:
+                postings = sorted((self._grams.get(gram, ()) for gram in trigrams(token)), key=len)
+                if len(token) > SHORT_TOKEN:
+                    # Все триграммы есть в названии - еще не значит, что слово в нем подряд
+                    verify.append(token)
+            for posting in postings:
+                if candidates is None:
+                    candidates = set(posting)
+                else:
+                    candidates.intersection_update(posting)
+                if not candidates:
+                    return set()
+        if verify:
+            names = self._names
+            candidates = {work_id for work_id in candidates if all(token in names[work_id] for token in verify)}
+        return candidates or set()
+
+
+class WorksSearch:
+    """Индексы по каталогам: {ключ каталога: индекс}. Перестраивается при изменении каталога"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('WorksSearch')
+        self._lock = threading.Lock()
+        # ключ -> (список работ, отпечаток содержимого, индекс)
+        self._indexes: Dict[str, Tuple[Sequence[Work], int, WorksIndex]] = {}
+        self.stats = {'builds': 0, 'queries': 0}
+
+    def index_for(self, catalog_key: str, works: Sequence[Work]) -> WorksIndex:
+        with self._lock:
+            cached = self._indexes.get(catalog_key)
+            # Тот же объект списка - каталог не перечитывался
+            if cached and cached[0] is works and cached[2].size == len(works):
+                return cached[2]
+            # Индекс зависит только от названий и их порядка
+            fingerprint = hash(tuple(name for name, _ in works))
+            if cached and cached[1] == fingerprint:
+                self._indexes[catalog_key] = (works, fingerprint, cached[2])
+                return cached[2]
+
+        index = WorksIndex(works)
+        with self._lock:
+            self._indexes[catalog_key] = (works, fingerprint, index)
+            self.stats['builds'] += 1
+        self.logger.info(f"✅ Индекс поиска {catalog_key}: {index.size} работ за {index.build_seconds * 1000:.0f} мс")
+        return index
+
+    def search(self, catalog_key: str, works: Sequence[Work], query: str,
+               offset: int = 0, limit: int = MAX_RESULTS) -> Tuple[List[int], Optional[int]]:
+        self.stats['queries'] += 1
+        return self.index_for(catalog_key, works).search(query, offset, limit)
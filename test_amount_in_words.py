@@ -0,0 +1,76 @@
+# test_amount_in_words.py - сверка прописи сумм с эталонным файлом
+"""
+🧪 ТЕСТ СУММЫ ПРОПИСЬЮ
+Запуск: python -m pytest test_amount_in_words.py
+Пересоздать эталон (нужен num2words): python test_amount_in_words.py --regenerate
+"""
+
+import sys
+import os
+import random
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.amount_in_words import number_in_words, rubles_in_words
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "amount_in_words_golden.tsv")
+
+
+def golden_numbers():
+    """Эталонная выборка из диапазона 0..10^9: все малые числа, границы разрядов и случайные"""
+    numbers = set(range(0, 2000))
+    for power in range(1, 10):
+        for base in (1, 2, 5, 11, 21):
+            value = base * 10 ** power
+            numbers.update({value - 1, value, value + 1})
+    rng = random.Random(20251019)
+    numbers.update(rng.randrange(0, 10 ** 9 + 1) for _ in range(1500))
+    return sorted(n for n in numbers if 0 <= n <= 10 ** 9)
+
+
+def test_golden_file():
+    """Пропись совпадает с эталоном, полученным из num2words(..., lang='ru')"""
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+
+    assert len(rows) > 3000
+    for number, expected in rows:
+        assert number_in_words(int(number)) == expected, number
+
+
+def test_rubles_format():
+    """Формат суммы совпадает с прежним форматом заказ-наряда"""
+    assert rubles_in_words(0) == "Ноль рублей 00 коп."
+    assert rubles_in_words(1) == "Один рубль 00 коп."
+    assert rubles_in_words(3) == "Три рубля 00 коп."
+    assert rubles_in_words(11) == "Одиннадцать рублей 00 коп."
+    assert rubles_in_words(1234.5) == "Одна тысяча двести тридцать четыре рубля 50 коп."
+    assert rubles_in_words(5800) == "Пять тысяч восемьсот рублей 00 коп."
+    assert rubles_in_words(0.1 + 0.2) == "Ноль рублей 30 коп."
+
+
+def test_negative_amount():
+    try:
+        rubles_in_words(-1)
+        assert False, "Ожидалась ошибка для отрицательной суммы"
+    except ValueError:
+        pass
+
+
+def regenerate():
+    from num2words import num2words
+    with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+        for number in golden_numbers():
+            f.write(f"{number}\t{num2words(number, lang='ru')}\n")
+    print(f"✅ Эталон пересоздан: {GOLDEN_FILE}")
+
+
+if __name__ == "__main__":
+    if '--regenerate' in sys.argv:
+        regenerate()
+    else:
+        test_golden_file()
+        test_rubles_format()
+        test_negative_amount()
+        print("🎉 ТЕСТ ПРОЙДЕН!")
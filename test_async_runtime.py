@@ -0,0 +1,95 @@
+# test_async_runtime.py - асинхронный режим: синхронные обработчики в очереди чата, вызовы API через мост
+"""
+🧪 ТЕСТ АСИНХРОННОГО РЕЖИМА
+Запуск: python -m pytest test_async_runtime.py
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+from modules.async_runtime import AsyncBotRuntime
+from modules.chat_dispatcher import ChatDispatcher
+from utils.fake_bot_api import FakeBotApi
+
+TOKEN = '123:TEST'
+
+
+def text_update(update_id, chat_id, text):
+    return types.Update.de_json({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 1738400000, 'text': text,
+        'chat': {'id': chat_id, 'type': 'private'}, 'from': {'id': chat_id, 'is_bot': False, 'first_name': 'U'},
+    }})
+
+
+def test_sync_handler_runs_in_chat_queue():
+    runtime = AsyncBotRuntime(TOKEN, ChatDispatcher(4))
+    handled = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    @runtime.bot.message_handler(func=lambda message: True)
+    def on_message(message):
+        # Первое сообщение чата обрабатывается дольше - второе все равно после него
+        time.sleep(0.1 if message.text == "1" else 0.0)
+        with lock:
+            handled.append((message.chat.id, message.text, threading.current_thread().name))
+            if len(handled) == 4:
+                done.set()
+
+    try:
+        # Декоратор моста возвращает исходную функцию, в AsyncTeleBot зарегистрирована корутина
+        assert not asyncio.iscoroutinefunction(on_message)
+        assert asyncio.iscoroutinefunction(runtime.async_bot.message_handlers[0]['function'])
+        runtime.process_updates_nowait([text_update(1, 42, "1"), text_update(2, 42, "2"),
+                                        text_update(3, 43, "1"), text_update(4, 43, "2")])
+        assert done.wait(timeout=5)
+    finally:
+        runtime.stop()
+    # Цикл событий остановлен, повторная остановка (bot.shutdown, затем вызывающий код) - без действий
+    runtime.stop()
+    assert not runtime.loop.is_running()
+
+    for chat_id in (42, 43):
+        assert [text for chat, text, _ in handled if chat == chat_id] == ["1", "2"]
+    # Обработчики - в пуле диспетчера, не в цикле событий
+    assert all(thread.startswith('chat') for _, _, thread in handled)
+
+
+def test_bridge_calls_return_results():
+    api = FakeBotApi()
+    api.start()
+    api.use_with_telebot()
+    runtime = AsyncBotRuntime(TOKEN, ChatDispatcher(2))
+    try:
+        assert runtime.bot.get_me().username == 'truckservice_test_bot'
+        sent = runtime.bot.send_message(42, "Выберите раздел")
+        assert isinstance(sent, types.Message) and sent.text == "Выберите раздел"
+        edited = runtime.bot.edit_message_text("Раздел выбран", 42, sent.message_id)
+        assert edited.text == "Раздел выбран"
+        assert [call.method for call in api.chat_calls(42)] == ['sendMessage', 'editMessageText']
+
+        # Синхронный вызов из цикла событий заблокировал бы его - ошибка
+        async def call_from_loop():
+            try:
+                runtime.call(runtime.async_bot.get_me())
+            except RuntimeError as e:
+                return str(e)
+        message = asyncio.run_coroutine_threadsafe(call_from_loop(), runtime.loop).result(timeout=5)
+        assert "цикла событий" in message
+    finally:
+        runtime.stop()
+        api.stop()
+
+
+if __name__ == "__main__":
+    test_sync_handler_runs_in_chat_queue()
+    test_bridge_calls_return_results()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,84 @@
+# test_callback_router.py - разбор callback-данных и таблица маршрутов
+"""
+🧪 ТЕСТ МАРШРУТИЗАТОРА CALLBACK-КНОПОК
+Запуск: python -m pytest test_callback_router.py
+"""
+
+import sys
+import os
+from types import SimpleNamespace
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.callback_router import CallbackRouter
+
+
+def make_router(calls, unknown):
+    router = CallbackRouter(fallback=lambda call, data: unknown.append(data))
+    router.exact('create_order', lambda call, payload: calls.append(('create_order', payload)))
+    router.prefix('work', lambda call, payload: calls.append(('work', payload)), legacy_prefix='work_')
+    router.prefix('custom_list', lambda call, payload: calls.append(('custom_list', payload)),
+                  legacy_prefix='custom_list_')
+    router.prefix('page', lambda call, payload: calls.append(('page', payload)), legacy_prefix='page_')
+    router.prefix('admin_view_list', lambda call, payload: calls.append(('admin_view_list', payload)))
+    return router
+
+
+def press(router, data):
+    return router.dispatch(SimpleNamespace(id='1', data=data))
+
+
+def test_new_and_legacy_buttons():
+    calls, unknown = [], []
+    router = make_router(calls, unknown)
+
+    assert press(router, 'create_order')
+    assert press(router, 'work:12')
+    assert press(router, 'work_7')                    # кнопка из старого сообщения
+    assert press(router, 'custom_list:Кузов_и_рама')
+    assert press(router, 'custom_list_Кузов_и_рама')
+    assert press(router, 'page:works:2')
+    assert press(router, 'admin_view_list:Шины')
+
+    assert calls == [
+        ('create_order', ''),
+        ('work', '12'),
+        ('work', '7'),
+        ('custom_list', 'Кузов_и_рама'),
+        ('custom_list', 'Кузов_и_рама'),
+        ('page', 'works:2'),
+        ('admin_view_list', 'Шины'),
+    ]
+    assert unknown == []
+
+
+def test_unknown_buttons_go_to_fallback():
+    calls, unknown = [], []
+    router = make_router(calls, unknown)
+
+    assert not press(router, 'diagnostics_quick')
+    assert not press(router, 'custom_x')              # совпадает только начало старого префикса
+    assert not press(router, 'unknown:1')
+    assert calls == []
+    assert unknown == ['diagnostics_quick', 'custom_x', 'unknown:1']
+
+
+def test_route_timings():
+    calls, unknown = [], []
+    router = make_router(calls, unknown)
+    for index in range(3):
+        press(router, f'work:{index}')
+    press(router, 'create_order')
+
+    stats = router.stats()
+    assert stats['work']['count'] == 3
+    assert stats['create_order']['count'] == 1
+    assert stats['work']['max_ms'] >= stats['work']['avg_ms'] >= 0
+
+
+if __name__ == "__main__":
+    test_new_and_legacy_buttons()
+    test_unknown_buttons_go_to_fallback()
+    test_route_timings()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
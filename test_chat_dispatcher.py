@@ -0,0 +1,128 @@
+# test_chat_dispatcher.py - диспетчер чатов: порядок внутри чата, параллельность и честность между чатами
+"""
+🧪 ТЕСТ ДИСПЕТЧЕРА ОБНОВЛЕНИЙ ПО ЧАТАМ
+Запуск: python -m pytest test_chat_dispatcher.py
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+from modules.chat_dispatcher import ChatDispatcher, DispatchingTeleBot, chat_key
+
+
+def text_update(update_id, chat_id, text):
+    return types.Update.de_json({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 1738400000, 'text': text,
+        'chat': {'id': chat_id, 'type': 'private'}, 'from': {'id': chat_id, 'is_bot': False, 'first_name': 'U'},
+    }})
+
+
+def test_one_chat_strictly_in_order():
+    dispatcher = ChatDispatcher(8)
+    handled = []
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def handle(number):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        # Ранние задачи дольше поздних - без очереди порядок бы перепутался
+        time.sleep(0.002 * (20 - number))
+        with lock:
+            active['now'] -= 1
+            handled.append(number)
+        return number
+
+    try:
+        futures = [dispatcher.submit(42, handle, number) for number in range(20)]
+        assert [future.result(timeout=10) for future in futures] == list(range(20))
+    finally:
+        dispatcher.shutdown()
+    assert handled == list(range(20)) and active['max'] == 1
+    assert dispatcher.pending(42) == 0 and dispatcher.pending() == 0
+    assert dispatcher.stats()['processed'] == 20 and dispatcher.stats()['active_chats'] == 0
+
+
+def test_different_chats_in_parallel():
+    dispatcher = ChatDispatcher(4)
+    barrier = threading.Barrier(4, timeout=5)
+    try:
+        # Все четыре чата должны оказаться в обработчике одновременно
+        futures = [dispatcher.submit(chat_id, barrier.wait) for chat_id in range(4)]
+        [future.result(timeout=10) for future in futures]
+    finally:
+        dispatcher.shutdown()
+
+
+def test_busy_chat_does_not_starve_others():
+    dispatcher = ChatDispatcher(2)
+    started = time.perf_counter()
+
+    try:
+        # Чаты 1 и 2 заняли оба потока очередями долгих задач, потом пришли задачи чатов 3 и 4
+        busy = [dispatcher.submit(chat_id, time.sleep, 0.02) for _ in range(30) for chat_id in (1, 2)]
+        quick = [dispatcher.submit(chat_id, time.sleep, 0) for chat_id in (3, 4)]
+        [future.result(timeout=10) for future in quick]
+        quick_done = time.perf_counter() - started
+        [future.result(timeout=10) for future in busy]
+    finally:
+        dispatcher.shutdown()
+    # После каждой задачи чат встает в конец общего пула - быстрые чаты не ждут очереди занятых (30 x 20 мс)
+    assert quick_done < 0.3, quick_done
+
+
+def test_shutdown_finishes_queued_tasks():
+    dispatcher = ChatDispatcher(2)
+    handled = []
+    for number in range(5):
+        dispatcher.submit(42, lambda number=number: (time.sleep(0.02), handled.append(number)))
+    # Задачи чата за первой еще в очереди - остановка их дожидается, а не теряет
+    dispatcher.shutdown(wait=True)
+    assert handled == list(range(5)) and dispatcher.pending() == 0
+
+
+def test_errors_isolated_and_dispatching_bot_orders_updates():
+    dispatcher = ChatDispatcher(4)
+    failing = dispatcher.submit(42, lambda: 1 / 0)
+    after = dispatcher.submit(42, lambda: "дальше")
+    assert after.result(timeout=5) == "дальше" and isinstance(failing.exception(timeout=5), ZeroDivisionError)
+
+    bot = DispatchingTeleBot('123:TEST', dispatcher)
+    handled = []
+    done = threading.Event()
+
+    @bot.message_handler(func=lambda message: True)
+    def on_message(message):
+        time.sleep(0.05 if message.text == "1" else 0.0)
+        handled.append((message.chat.id, message.text))
+        if len(handled) == 4:
+            done.set()
+
+    try:
+        bot.process_new_updates([text_update(1, 42, "1"), text_update(2, 43, "1"),
+                                 text_update(3, 42, "2"), text_update(4, 43, "2")])
+        # offset getUpdates сдвигается сразу, до обработки
+        assert bot.last_update_id == 4
+        assert done.wait(timeout=5)
+    finally:
+        dispatcher.shutdown()
+    for chat_id in (42, 43):
+        assert [text for chat, text in handled if chat == chat_id] == ["1", "2"]
+    assert chat_key(text_update(5, -100, "x")) == -100
+
+
+if __name__ == "__main__":
+    test_one_chat_strictly_in_order()
+    test_different_chats_in_parallel()
+    test_busy_chat_does_not_starve_others()
+    test_shutdown_finishes_queued_tasks()
+    test_errors_isolated_and_dispatching_bot_orders_updates()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
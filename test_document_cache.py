@@ -0,0 +1,130 @@
+# test_document_cache.py - повторная отправка документов по file_id без загрузки файла
+"""
+🧪 ТЕСТ КАРТЫ file_id ДОКУМЕНТОВ
+Запуск: python -m pytest test_document_cache.py
+"""
+
+import sys
+import os
+import pathlib
+import tempfile
+from types import SimpleNamespace
+
+from telebot.apihelper import ApiTelegramException
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.document_cache import DocumentFileIds, DocumentSender, file_sha256
+
+ORDER_KEY = "№0001 01.02.2025 А123ВС77"
+
+
+class UploadingBot:
+    """Бот-заглушка: загрузка файла выдает новый file_id, отклоненные file_id - ошибка 400"""
+
+    def __init__(self, rejected=()):
+        self.uploads = []
+        self.by_file_id = []
+        self.rejected = set(rejected)
+
+    def send_document(self, chat_id, document, caption=None):
+        if isinstance(document, str):
+            if document in self.rejected:
+                raise ApiTelegramException('sendDocument', None, {
+                    'error_code': 400, 'description': 'Bad Request: wrong file identifier/HTTP URL specified'
+                })
+            self.by_file_id.append((chat_id, document))
+            return SimpleNamespace(document=SimpleNamespace(file_id=document))
+        self.uploads.append((chat_id, document.read()))
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"file_{len(self.uploads)}"))
+
+
+def make_documents(folder):
+    excel = folder / "№0001 01.02.2025 А123ВС77.xlsx"
+    text = folder / "№0001 01.02.2025 А123ВС77.txt"
+    excel.write_bytes(b'PK\x03\x04' + os.urandom(4096))
+    text.write_text("А123ВС77 / 01.02.2025", encoding='utf-8')
+    return {'excel': excel, 'text': text}
+
+
+def test_documents_uploaded_once_and_reused():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    documents = make_documents(folder)
+    bot = UploadingBot()
+    sender = DocumentSender(bot, DocumentFileIds(folder / "file_ids.json"))
+
+    for doc_type, path in documents.items():
+        sender.send(42, ORDER_KEY, doc_type, path, order_number='0001', owner=42)
+    assert len(bot.uploads) == 2
+
+    # Рабочий чат и руководитель получают документы по file_id
+    assert sender.resend(-100123, ORDER_KEY) == 2
+    assert sender.resend(777, ORDER_KEY) == 2
+    assert len(bot.uploads) == 2
+    assert bot.by_file_id == [(-100123, 'file_1'), (-100123, 'file_2'), (777, 'file_1'), (777, 'file_2')]
+    assert sender.stats == {'uploads': 2, 'reused': 4, 'stale': 0, 'changed': 0}
+
+    # Карта переживает перезапуск и ищется по номеру и технику
+    file_ids = DocumentFileIds(folder / "file_ids.json")
+    assert file_ids.documents(ORDER_KEY) == {'excel': 'file_1', 'text': 'file_2'}
+    assert file_ids.find('0001', owner=42) == [ORDER_KEY]
+    assert file_ids.find('0001', owner=43) == []
+    assert file_ids.find(owner=42) == [ORDER_KEY]
+
+
+def test_rejected_file_id_is_uploaded_again():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    documents = make_documents(folder)
+    file_ids = DocumentFileIds(folder / "file_ids.json")
+    file_ids.record(ORDER_KEY, 'excel', 'expired', str(documents['excel']), file_sha256(documents['excel']),
+                    order_number='0001', owner=42)
+
+    bot = UploadingBot(rejected={'expired'})
+    sender = DocumentSender(bot, file_ids)
+    assert sender.resend(42, ORDER_KEY) == 1
+
+    assert [data for _, data in bot.uploads] == [documents['excel'].read_bytes()]
+    assert file_ids.get(ORDER_KEY, 'excel') == 'file_1'
+    assert sender.stats['stale'] == 1
+
+
+def test_rewritten_document_is_uploaded_again():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    documents = make_documents(folder)
+    bot = UploadingBot()
+    sender = DocumentSender(bot, DocumentFileIds(folder / "file_ids.json"))
+    sender.send(42, ORDER_KEY, 'excel', documents['excel'], order_number='0001', owner=42)
+    sender.send(-100123, ORDER_KEY, 'excel', documents['excel'])
+
+    # Заказ создан заново с тем же номером, датой и госномером - файл перезаписан
+    documents['excel'].write_bytes(b'PK\x03\x04' + b'v2' * 1024)
+    sender.send(42, ORDER_KEY, 'excel', documents['excel'], order_number='0001', owner=42)
+    assert sender.resend(-100123, ORDER_KEY) == 1
+
+    assert [data for _, data in bot.uploads][1] == documents['excel'].read_bytes()
+    assert bot.by_file_id == [(-100123, 'file_1'), (-100123, 'file_2')]
+    assert sender.stats['changed'] == 1 and sender.stats['uploads'] == 2
+    # Запись без хэша (до обновления) - файл загружается заново
+    legacy = DocumentFileIds(folder / "legacy.json")
+    legacy.record(ORDER_KEY, 'text', 'old', str(documents['text']))
+    DocumentSender(bot, legacy).send(42, ORDER_KEY, 'text', documents['text'])
+    assert legacy.get(ORDER_KEY, 'text') == 'file_3'
+
+
+def test_old_orders_are_evicted():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    file_ids = DocumentFileIds(folder / "file_ids.json", max_orders=3)
+    for number in range(5):
+        file_ids.record(f"order_{number}", 'excel', f"file_{number}", order_number=str(number), owner=42)
+
+    assert file_ids.find(owner=42) == ['order_4', 'order_3', 'order_2']
+    assert file_ids.get('order_0', 'excel') is None
+
+
+if __name__ == "__main__":
+    test_documents_uploaded_once_and_reused()
+    test_rejected_file_id_is_uploaded_again()
+    test_rewritten_document_is_uploaded_again()
+    test_old_orders_are_evicted()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,172 @@
+# test_email_outbox.py - очередь писем на диске против локального SMTP (aiosmtpd)
+"""
+🧪 ТЕСТ ОЧЕРЕДИ ПИСЕМ
+Запуск: python -m pytest test_email_outbox.py
+"""
+
+import sys
+import os
+import pathlib
+import socket
+import tempfile
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.email_outbox import EmailOutbox, SMTPSettings
+
+
+class RecordingHandler:
+    """SMTP-сервер-заглушка: запоминает письма и сессии, может отклонять адреса"""
+
+    def __init__(self, refuse=(), greylist=()):
+        self.messages = []
+        self.sessions = set()
+        self.refuse = set(refuse)
+        # Адрес отклоняется временно только при первой попытке (greylisting)
+        self.greylist = set(greylist)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return '550 5.1.1 Mailbox unavailable'
+        if address in self.greylist:
+            self.greylist.discard(address)
+            return '451 4.7.1 Greylisted, try again later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append((envelope.mail_from, list(envelope.rcpt_tos), envelope.content))
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_smtp(port, handler):
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    return controller
+
+
+def make_message(number, to='office@example.com'):
+    message = MIMEMultipart()
+    message['From'] = 'bot@example.com'
+    message['To'] = to
+    message['Subject'] = f"Заказ-наряд №{number}"
+    message.attach(MIMEText(f"🚗 Госномер: А123ВС77\n🔢 Номер ЗН: {number}", 'plain'))
+    return message
+
+
+def make_outbox(spool, port, **kwargs):
+    settings = SMTPSettings(host='127.0.0.1', port=port, starttls=False, timeout=5)
+    return EmailOutbox(spool, settings, retry_delay=0.2, **kwargs)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_batch_is_sent_over_one_connection():
+    port = free_port()
+    handler = RecordingHandler()
+    controller = start_smtp(port, handler)
+    spool = pathlib.Path(tempfile.mkdtemp())
+    outbox = make_outbox(spool, port, start=False)
+    try:
+        for number in range(1, 6):
+            outbox.enqueue(make_message(number))
+        outbox.start()
+
+        assert wait_for(lambda: len(handler.messages) == 5)
+        assert wait_for(lambda: not outbox.pending())
+        assert len(handler.sessions) == 1
+        assert outbox.connection.connects == 1
+        assert all(rcpt == ['office@example.com'] for _, rcpt, _ in handler.messages)
+        assert all(b'Subject:' in content for _, _, content in handler.messages)
+    finally:
+        outbox.stop()
+        controller.stop()
+
+
+def test_messages_survive_restart_and_server_outage():
+    port = free_port()
+    spool = pathlib.Path(tempfile.mkdtemp())
+
+    # Сервер недоступен - письмо остается в очереди и ждет повтора
+    outbox = make_outbox(spool, port)
+    outbox.enqueue(make_message(7))
+    assert wait_for(lambda: outbox.stats['retries'] >= 1)
+    outbox.stop()
+    assert len(outbox.pending()) == 1
+
+    # Перезапуск: новая очередь на той же папке отправляет письмо, когда сервер появился
+    handler = RecordingHandler()
+    controller = start_smtp(port, handler)
+    outbox = make_outbox(spool, port)
+    try:
+        assert wait_for(lambda: len(handler.messages) == 1)
+        assert wait_for(lambda: not outbox.pending())
+    finally:
+        outbox.stop()
+        controller.stop()
+
+
+def test_permanent_failure_goes_to_failed_folder():
+    port = free_port()
+    handler = RecordingHandler(refuse={'nobody@example.com'})
+    controller = start_smtp(port, handler)
+    outbox = make_outbox(pathlib.Path(tempfile.mkdtemp()), port)
+    try:
+        outbox.enqueue(make_message(1, to='nobody@example.com'))
+        outbox.enqueue(make_message(2))
+
+        assert wait_for(lambda: len(outbox.failed()) == 1 and not outbox.pending())
+        assert len(handler.messages) == 1
+        assert outbox.stats['sent'] == 1
+    finally:
+        outbox.stop()
+        controller.stop()
+
+
+def test_greylisted_recipient_is_retried():
+    port = free_port()
+    handler = RecordingHandler(refuse={'nobody@example.com'}, greylist={'office@example.com', 'boss@example.com'})
+    controller = start_smtp(port, handler)
+    outbox = make_outbox(pathlib.Path(tempfile.mkdtemp()), port)
+    try:
+        outbox.enqueue(make_message(1))
+        # Временный и постоянный отказ в одном письме: повтор только на временно отклоненный адрес
+        outbox.enqueue(make_message(2, to='boss@example.com, nobody@example.com'))
+
+        assert wait_for(lambda: len(handler.messages) == 2 and not outbox.pending())
+        assert not outbox.failed()
+        assert sorted(rcpt for _, rcpt, _ in handler.messages) == [['boss@example.com'], ['office@example.com']]
+        assert outbox.stats['retries'] == 2 and outbox.stats['sent'] == 2
+    finally:
+        outbox.stop()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    test_batch_is_sent_over_one_connection()
+    test_messages_survive_restart_and_server_outage()
+    test_permanent_failure_goes_to_failed_folder()
+    test_greylisted_recipient_is_retried()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,132 @@
+# test_fake_bot_api.py - локальный Bot API: обновления, сообщения, файлы, webhook и нагрузочный тест
+"""
+🧪 ТЕСТ ЛОКАЛЬНОГО BOT API
+Запуск: python -m pytest test_fake_bot_api.py
+"""
+
+import sys
+import os
+import subprocess
+import threading
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import telebot
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+from utils.fake_bot_api import FakeBotApi
+from modules.webhook_server import WebhookServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOKEN = '123:TEST'
+
+
+def run_with_api(test):
+    """Тест с TeleBot, направленным на локальный API. stop() восстанавливает адреса Bot API в telebot"""
+    api = FakeBotApi()
+    api.start()
+    api.use_with_telebot()
+    try:
+        test(api, telebot.TeleBot(TOKEN, threaded=False))
+    finally:
+        api.stop()
+
+
+def test_messages_buttons_and_updates():
+    def check(api, bot):
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton("Работа", callback_data="work:0"))
+        sent = bot.send_message(42, "Выберите работы  \n", reply_markup=markup)
+        bot.edit_message_text("Выбрано: 1", 42, sent.message_id, reply_markup=markup)
+        try:
+            bot.edit_message_text("Выбрано: 1", 42, sent.message_id, reply_markup=markup)
+            assert False, "повторное редактирование без изменений"
+        except ApiTelegramException as e:
+            assert "message is not modified" in e.description
+
+        api.send_text(42, "/new_order")
+        callback_id = api.click(42, "work:0", sent.message_id)
+        updates = bot.get_updates(offset=0, timeout=1)
+        assert updates[0].message.text == "/new_order"
+        call = updates[1].callback_query
+        assert (call.id, call.data, call.message.text) == (callback_id, "work:0", "Выбрано: 1")
+        assert call.message.reply_markup.to_dict() == markup.to_dict()
+        bot.answer_callback_query(call.id, "✅ Готово")
+        # Подтвержденные offset-ом обновления больше не приходят
+        api.send_text(42, "А123ВС77")
+        assert [update.message.text for update in bot.get_updates(offset=updates[-1].update_id + 1)] == ["А123ВС77"]
+
+        calls = api.chat_calls(42)
+        assert [c.method for c in calls] == ['sendMessage', 'editMessageText', 'answerCallbackQuery']
+        assert calls[0].text == "Выберите работы" and calls[0].buttons == ["work:0"]
+        position, answer = api.wait_call(42, lambda c: c.method == 'answerCallbackQuery', timeout=1)
+        assert position == 2 and answer.text == "✅ Готово"
+
+    run_with_api(check)
+
+
+def test_documents_media_groups_and_files():
+    def check(api, bot):
+        uploaded = bot.send_document(42, ("order.xlsx", b"excel" * 100), caption="📄 EXCEL")
+        assert uploaded.document.file_name == "order.xlsx" and uploaded.document.file_size == 500
+        again = bot.send_document(-100, uploaded.document.file_id)
+        assert again.document.file_id == uploaded.document.file_id
+        album = bot.send_media_group(-100, [types.InputMediaDocument(uploaded.document.file_id),
+                                            types.InputMediaDocument(("draft.txt", b"draft"))])
+        assert len(album) == 2 and album[1].document.file_name == "draft.txt"
+        assert api.uploaded_bytes == 505
+
+        front, side = api.send_photo(42), api.send_photo(42)
+        content = bot.download_file(bot.get_file(front).file_path)
+        assert content[:2] == b'\xff\xd8' and len(content) == api.photo_size
+        assert content != bot.download_file(bot.get_file(side).file_path)
+        try:
+            bot.get_file("неизвестный")
+            assert False, "неизвестный file_id"
+        except ApiTelegramException as e:
+            assert e.error_code == 400
+
+    run_with_api(check)
+
+
+def test_webhook_delivery():
+    def check(api, bot):
+        received = []
+        delivered = threading.Event()
+        server = WebhookServer(lambda updates: (received.extend(updates), delivered.set()), port=0,
+                               secret_token="s3cret")
+        server.start()
+        try:
+            bot.set_webhook(url=server.url, secret_token="s3cret")
+            api.send_text(7, "А123ВС77")
+            assert delivered.wait(timeout=5)
+            assert received[0].message.text == "А123ВС77"
+            try:
+                bot.get_updates()
+                assert False, "getUpdates при активном webhook"
+            except ApiTelegramException as e:
+                assert e.error_code == 409
+        finally:
+            bot.delete_webhook()
+            server.stop()
+
+    run_with_api(check)
+
+
+def test_load_harness_end_to_end():
+    result = subprocess.run([sys.executable, 'utils/load_test.py', '--technicians', '2', '--orders', '1',
+                             '--no-rate-limit', '--album'],
+                            cwd=ROOT, capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Заказов: 2, ошибок: 0" in result.stdout
+    assert "finalize" in result.stdout and "заказов в минуту" in result.stdout
+
+
+if __name__ == "__main__":
+    test_messages_buttons_and_updates()
+    test_documents_media_groups_and_files()
+    test_webhook_delivery()
+    test_load_harness_end_to_end()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
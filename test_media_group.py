@@ -0,0 +1,70 @@
+# test_media_group.py - части альбома собираются в одну пачку
+"""
+🧪 ТЕСТ БУФЕРА АЛЬБОМОВ
+Запуск: python -m pytest test_media_group.py
+"""
+
+import sys
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.media_group import MediaGroupBuffer
+
+
+def make_photo(message_id, chat_id=42, media_group_id=None):
+    return SimpleNamespace(message_id=message_id, chat=SimpleNamespace(id=chat_id),
+                           media_group_id=media_group_id)
+
+
+def test_album_parts_become_one_batch():
+    batches = []
+    done = threading.Event()
+
+    def on_group(chat_id, messages):
+        batches.append((chat_id, [message.message_id for message in messages]))
+        if len(batches) == 2:
+            done.set()
+
+    buffer = MediaGroupBuffer(on_group, delay=0.2)
+
+    # Части альбома приходят из разных потоков и не по порядку
+    parts = [make_photo(12, media_group_id='alb1'), make_photo(10, media_group_id='alb1'),
+             make_photo(11, media_group_id='alb1'), make_photo(20, chat_id=43, media_group_id='alb2')]
+    threads = [threading.Thread(target=buffer.add, args=(part,)) for part in parts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert done.wait(5)
+    time.sleep(0.3)
+    assert sorted(batches) == [(42, [10, 11, 12]), (43, [20])]
+
+
+def test_single_photo_is_not_buffered():
+    batches = []
+    buffer = MediaGroupBuffer(lambda chat_id, messages: batches.append(messages), delay=0.05)
+    assert not buffer.add(make_photo(1))
+    time.sleep(0.1)
+    assert batches == []
+
+
+def test_flush_all_sends_pending_albums():
+    batches = []
+    buffer = MediaGroupBuffer(lambda chat_id, messages: batches.append(len(messages)), delay=60)
+    buffer.add(make_photo(1, media_group_id='alb1'))
+    buffer.add(make_photo(2, media_group_id='alb1'))
+    buffer.flush_all()
+    assert batches == [2]
+
+
+if __name__ == "__main__":
+    test_album_parts_become_one_batch()
+    test_single_photo_is_not_buffered()
+    test_flush_all_sends_pending_albums()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
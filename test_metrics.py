@@ -0,0 +1,99 @@
+# test_metrics.py - метрики Prometheus: гистограммы, счетчики, снимаемые значения, /metrics
+"""
+🧪 ТЕСТ МЕТРИК
+Запуск: python -m pytest test_metrics.py
+"""
+
+import sys
+import os
+import urllib.request
+import urllib.error
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.metrics import MetricsRegistry, MetricsServer
+from modules.callback_router import CallbackRouter, CALLBACK_SECONDS
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('tsm_test_seconds', 'Тестовая гистограмма', ('stage',), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, stage='render')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP tsm_test_seconds Тестовая гистограмма", "# TYPE tsm_test_seconds histogram"]
+    assert 'tsm_test_seconds_bucket{stage="render",le="0.1"} 1' in lines
+    assert 'tsm_test_seconds_bucket{stage="render",le="1.0"} 3' in lines
+    assert 'tsm_test_seconds_bucket{stage="render",le="+Inf"} 4' in lines
+    assert 'tsm_test_seconds_count{stage="render"} 4' in lines
+    assert 'tsm_test_seconds_sum{stage="render"} 4.25' in lines
+
+    # Повторная регистрация - та же метрика, другие метки - ошибка
+    assert registry.histogram('tsm_test_seconds', 'Тестовая гистограмма', ('stage',)) is histogram
+    try:
+        histogram.observe(1.0, route='x')
+        assert False, "неверные метки должны отклоняться"
+    except ValueError:
+        pass
+
+
+def test_counters_and_collected_values():
+    registry = MetricsRegistry()
+    lookups = registry.counter('tsm_cache_total', 'Обращения к кэшу', ('cache', 'result'))
+    lookups.inc(cache='base_works', result='hit')
+    lookups.inc(2, cache='base_works', result='miss')
+    queue = ['a', 'b', 'c']
+    registry.collect('tsm_queue', 'Длина очереди', lambda: len(queue))
+    registry.collect('tsm_events_total', 'События', lambda: {'sent': 5, 'failed': 1}, kind='counter', label='event')
+    registry.collect('tsm_broken', 'Сломанная метрика', lambda: 1 / 0)
+
+    text = registry.render()
+    assert 'tsm_cache_total{cache="base_works",result="hit"} 1' in text
+    assert 'tsm_cache_total{cache="base_works",result="miss"} 2' in text
+    assert 'tsm_queue 3' in text
+    assert '# TYPE tsm_events_total counter' in text
+    assert 'tsm_events_total{event="failed"} 1' in text and 'tsm_events_total{event="sent"} 5' in text
+    assert 'tsm_broken' not in text
+
+    queue.clear()
+    assert 'tsm_queue 0' in registry.render()
+
+
+def test_callback_routes_are_observed():
+    router = CallbackRouter()
+    router.prefix('metrics_test_route', lambda call, payload: None)
+    before = CALLBACK_SECONDS.count(route='metrics_test_route')
+
+    class Call:
+        data = 'metrics_test_route:1'
+
+    router.dispatch(Call())
+    assert CALLBACK_SECONDS.count(route='metrics_test_route') == before + 1
+
+
+def test_metrics_served_over_http():
+    registry = MetricsRegistry()
+    registry.collect('tsm_sessions', 'Сессии пользователей', lambda: 7)
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'tsm_sessions 7' in response.read().decode('utf-8')
+        try:
+            urllib.request.urlopen(server.url.replace('/metrics', '/other'), timeout=5)
+            assert False, "неизвестный путь должен давать 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    test_histogram_buckets_are_cumulative()
+    test_counters_and_collected_values()
+    test_callback_routes_are_observed()
+    test_metrics_served_over_http()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
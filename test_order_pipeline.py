@@ -0,0 +1,164 @@
+# test_order_pipeline.py - конвейер завершения заказа: порядок документов, доставки, учет, ошибки этапов
+"""
+🧪 ТЕСТ КОНВЕЙЕРА ЗАВЕРШЕНИЯ ЗАКАЗА
+Запуск: python -m pytest test_order_pipeline.py
+"""
+
+import sys
+import os
+import datetime
+import pathlib
+import tempfile
+import threading
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.order_pipeline import OrderPipeline
+from modules.order_snapshot import OrderSnapshot
+
+
+class Factory:
+    """Рендеринг двух документов. fail - ошибка рендеринга"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def create_all(self, order, section_folder, on_document=None):
+        if self.fail:
+            raise ValueError("шаблон поврежден")
+        documents = {}
+        for doc_type, suffix in (('excel', '.xlsx'), ('text', '.txt')):
+            documents[doc_type] = pathlib.Path(section_folder) / f"{order.base_filename}{suffix}"
+            if on_document:
+                on_document(doc_type, documents[doc_type])
+        return documents
+
+
+class Ledger:
+    """Учет: считает одновременные записи"""
+
+    def __init__(self, saved=True):
+        self.saved = saved
+        self.orders = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def save_order(self, order, excel_filename, has_photos, draft_filename=''):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+            self.orders.append((order.order_number, excel_filename, draft_filename))
+        return self.saved
+
+
+def make_order(number='0001'):
+    return OrderSnapshot.from_session({
+        'section': 'base', 'license_plate': 'А123ВС77', 'date': datetime.datetime(2025, 2, 1),
+        'order_number': number, 'workers': 'Иванов', 'selected_works': [("Осмотр ТС", 0.4)],
+    })
+
+
+def test_documents_in_order_before_document_deliveries():
+    events = []
+    lock = threading.Lock()
+
+    def on_document(doc_type, path):
+        # Первый документ загружается дольше второго - порядок все равно сохраняется
+        time.sleep(0.1 if doc_type == 'excel' else 0.0)
+        with lock:
+            events.append(f"upload:{doc_type}")
+
+    def log(name):
+        def delivery(documents):
+            with lock:
+                events.append(name)
+        return delivery
+
+    completed = []
+    pipeline = OrderPipeline(Factory(), Ledger())
+    try:
+        result = pipeline.submit(make_order(), tempfile.mkdtemp(), on_document=on_document,
+                                 deliveries={'email': log('email')},
+                                 document_deliveries={'work_chat': log('work_chat')},
+                                 on_complete=completed.append).result(timeout=10)
+    finally:
+        pipeline.shutdown()
+
+    assert result['success'] and result['errors'] == []
+    uploads = [event for event in events if event.startswith('upload:')]
+    assert uploads == ['upload:excel', 'upload:text']
+    # Рабочий чат использует file_id загруженных документов - только после загрузки
+    assert events.index('work_chat') > events.index('upload:text')
+    assert 'email' in events
+    assert completed == [result]
+    assert set(result['timings']) >= {'render', 'persist', 'deliver_documents', 'email', 'work_chat', 'total'}
+
+
+def test_persist_serialized_between_orders():
+    ledger = Ledger()
+    pipeline = OrderPipeline(Factory(), ledger, order_workers=4)
+    try:
+        futures = [pipeline.submit(make_order(f"{n:04d}"), tempfile.mkdtemp()) for n in range(6)]
+        results = [future.result(timeout=10) for future in futures]
+    finally:
+        pipeline.shutdown()
+    assert all(result['success'] for result in results)
+    assert len(ledger.orders) == 6 and ledger.max_active == 1
+    assert ("0003", "№0003 01.02.2025 А123ВС77.xlsx", "№0003 01.02.2025 А123ВС77.txt") in ledger.orders
+
+
+def test_stage_failures_collected():
+    def broken_delivery(documents):
+        raise ConnectionError("SMTP недоступен")
+
+    def broken_upload(doc_type, path):
+        if doc_type == 'excel':
+            raise RuntimeError("Telegram 500")
+
+    delivered = []
+    completed = []
+    pipeline = OrderPipeline(Factory(), Ledger(saved=False))
+    broken = OrderPipeline(Factory(fail=True), Ledger())
+    try:
+        result = pipeline.run(make_order(), tempfile.mkdtemp(), on_document=broken_upload,
+                              deliveries={'email': broken_delivery, 'work_chat': delivered.append})
+        # Ошибка рендеринга: заказ не выполнен, но on_complete вызывается
+        failed = broken.run(make_order(), tempfile.mkdtemp(), on_complete=completed.append)
+    finally:
+        pipeline.shutdown()
+        broken.shutdown()
+
+    # Ошибки доставок и учета не прерывают остальные этапы
+    assert result['success'] and len(delivered) == 1
+    assert sorted(error.split(':')[0] for error in result['errors']) == ['deliver_documents', 'email', 'persist']
+    assert "persist: заказ не сохранен в учет" in result['errors']
+
+    assert not failed['success'] and failed['errors'] == ["render: шаблон поврежден"]
+    assert completed == [failed]
+
+
+def test_on_complete_error_does_not_break_pipeline():
+    def on_complete(result):
+        raise KeyError("сессия удалена")
+
+    pipeline = OrderPipeline(Factory(), Ledger())
+    try:
+        result = pipeline.submit(make_order(), tempfile.mkdtemp(), on_complete=on_complete).result(timeout=10)
+    finally:
+        pipeline.shutdown()
+    assert result['success']
+    assert pipeline.timings.summary()['total']['count'] == 1
+
+
+if __name__ == "__main__":
+    test_documents_in_order_before_document_deliveries()
+    test_persist_serialized_between_orders()
+    test_stage_failures_collected()
+    test_on_complete_error_does_not_break_pipeline()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
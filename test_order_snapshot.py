@@ -0,0 +1,89 @@
+# test_order_snapshot.py - снимок заказа: итоги, текст черновика, преобразование в сессию и обратно
+"""
+🧪 ТЕСТ СНИМКА ЗАКАЗА
+Запуск: python -m pytest test_order_snapshot.py
+"""
+
+import sys
+import os
+import datetime
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.order_snapshot import OrderSnapshot, build_draft_text, calculate_totals
+
+DATE = datetime.datetime(2025, 2, 1)
+WORKS = [("Осмотр ТС", 0.4), ("Замена масла", 1.5)]
+
+
+def make_session(**fields):
+    session = {
+        'section': 'base', 'header_template': 'company_a', 'license_plate': 'А123ВС77', 'date': DATE,
+        'order_number': '0001', 'workers': 'Иванов, Петров', 'selected_works': list(WORKS),
+        'selected_materials': ["ВД-40", "Смазка"], 'trace_id': 'abc',
+    }
+    session.update(fields)
+    return session
+
+
+def test_calculate_totals():
+    # 1.9 ч x 2500 + (375 + 210)
+    assert calculate_totals(WORKS, ["ВД-40", "Смазка"]) == \
+        {'works_total': 4750.0, 'materials_total': 585, 'total_amount': 5335.0}
+    # Без выбранных материалов считаются все материалы
+    assert calculate_totals(WORKS, [])['materials_total'] == 800
+    # Неизвестный материал - без цены
+    assert calculate_totals([("Осмотр ТС", 1)], ["Неизвестный"]) == \
+        {'works_total': 2500, 'materials_total': 0, 'total_amount': 2500}
+
+
+def test_build_draft_text():
+    assert build_draft_text('А123ВС77', DATE, 'Иванов, Петров', WORKS, ["ВД-40"]) == (
+        "А123ВС77 / 01.02.2025\nИванов, Петров\n\nРАБОТЫ:\n• Осмотр ТС\n• Замена масла\n\nМАТЕРИАЛЫ:\n• ВД-40")
+    assert build_draft_text('А123ВС77', DATE, 'Иванов', WORKS[:1], []) == \
+        "А123ВС77 / 01.02.2025\nИванов\n\nРАБОТЫ:\n• Осмотр ТС"
+
+
+def test_snapshot_from_and_to_session():
+    session = make_session()
+    order = OrderSnapshot.from_session(session, section_name="Типовой", has_photos=True)
+    # Изменения сессии после завершения не влияют на снимок
+    session['selected_works'].append(("Лишняя работа", 10))
+    session['selected_materials'].clear()
+
+    assert (order.works_total, order.materials_total, order.total_amount) == (4750.0, 585, 5335.0)
+    assert order.totals() == calculate_totals(WORKS, ["ВД-40", "Смазка"])
+    assert (order.works_count, order.materials_count, order.total_hours) == (2, 2, 1.9)
+    assert order.draft_text == build_draft_text('А123ВС77', DATE, 'Иванов, Петров', WORKS, ["ВД-40", "Смазка"])
+    assert order.base_filename == "№0001 01.02.2025 А123ВС77"
+    assert (order.photos_text, order.trace_id) == ("ДА", 'abc')
+
+    restored = order.to_session()
+    assert restored == {
+        'section': 'base', 'custom_list': None, 'header_template': 'company_a', 'license_plate': 'А123ВС77',
+        'date': DATE, 'order_number': '0001', 'workers': 'Иванов, Петров',
+        'selected_works': WORKS, 'selected_materials': ["ВД-40", "Смазка"],
+    }
+    assert OrderSnapshot.from_session(restored, section_name="Типовой", has_photos=True) == \
+        OrderSnapshot.from_session(make_session(trace_id=''), section_name="Типовой", has_photos=True)
+
+
+def test_snapshot_requires_fields():
+    for field in ('license_plate', 'date', 'order_number', 'workers', 'selected_works'):
+        try:
+            OrderSnapshot.from_session(make_session(**{field: None}))
+            assert False, field
+        except ValueError as e:
+            assert field in str(e)
+    # Шаблон шапки по умолчанию и номер заказа - строкой
+    order = OrderSnapshot.from_session(make_session(header_template=None, order_number=7))
+    assert (order.header_template, order.order_number, order.photos_text) == ('bridge_town', '7', "НЕТ")
+
+
+if __name__ == "__main__":
+    test_calculate_totals()
+    test_build_draft_text()
+    test_snapshot_from_and_to_session()
+    test_snapshot_requires_fields()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,137 @@
+# test_order_trace.py - трассы заказов: этапы в JSONL, перцентили, самые медленные заказы
+"""
+🧪 ТЕСТ ТРАССИРОВКИ ЗАКАЗОВ
+Запуск: python -m pytest test_order_trace.py
+"""
+
+import sys
+import os
+import datetime
+import json
+import pathlib
+import subprocess
+import tempfile
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.order_trace import OrderTracer, load_spans, percentile, stage_summary, order_summaries, new_trace_id
+from modules.order_pipeline import OrderPipeline
+from modules.order_snapshot import OrderSnapshot
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class SlowFactory:
+    def create_all(self, order, section_folder, on_document=None):
+        time.sleep(0.02)
+        path = pathlib.Path(section_folder) / "order.xlsx"
+        if on_document:
+            on_document('excel', path)
+        return {'excel': path}
+
+
+class Ledger:
+    def save_order(self, order, excel_filename, has_photos, draft_filename=''):
+        time.sleep(0.01)
+        return True
+
+
+def make_order(trace_id, number='0001'):
+    return OrderSnapshot.from_session({
+        'section': 'base', 'license_plate': 'А123ВС77', 'date': datetime.datetime(2025, 2, 1),
+        'order_number': number, 'workers': 'Иванов', 'selected_works': [("Осмотр ТС", 0.4)],
+        'trace_id': trace_id,
+    })
+
+
+def test_pipeline_stages_written_to_trace():
+    path = pathlib.Path(tempfile.mkdtemp()) / "order_traces.jsonl"
+    tracer = OrderTracer(path)
+    pipeline = OrderPipeline(SlowFactory(), Ledger(), tracer=tracer)
+    trace_id = new_trace_id()
+    try:
+        with tracer.span(trace_id, 'handle_button_click:section'):
+            pass
+        result = pipeline.run(make_order(trace_id), tempfile.mkdtemp(),
+                              on_document=lambda doc_type, doc_path: None,
+                              deliveries={'email': lambda documents: None})
+        # Заказ без трассы (сессия до обновления) - не записывается
+        pipeline.run(make_order(''), tempfile.mkdtemp())
+    finally:
+        pipeline.shutdown()
+        tracer.close()
+
+    assert result['success']
+    spans = load_spans([path])
+    assert {span['trace'] for span in spans} == {trace_id}
+    stages = {span['stage']: span for span in spans}
+    assert set(stages) == {'handle_button_click:section', 'render', 'persist', 'deliver_documents', 'email', 'total'}
+    assert stages['render']['ms'] >= 20 and stages['persist']['ms'] >= 10
+    assert stages['total']['order_number'] == '0001' and stages['total']['success'] is True
+
+
+def test_span_records_errors():
+    path = pathlib.Path(tempfile.mkdtemp()) / "order_traces.jsonl"
+    tracer = OrderTracer(path)
+    try:
+        with tracer.span('abc', 'message:date'):
+            raise ValueError("дата")
+    except ValueError:
+        pass
+    tracer.close()
+    assert json.loads(path.read_text(encoding='utf-8'))['error'] == 'ValueError'
+
+    # Без файла трасс - ничего не пишется
+    disabled = OrderTracer(None)
+    disabled.record('abc', 'render', 0.1)
+    assert not disabled.enabled
+
+
+def test_percentiles_and_slowest_orders():
+    values = [float(n) for n in range(1, 101)]
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50.0, 95.0, 99.0)
+    assert percentile([7.0], 99) == 7.0
+
+    spans = []
+    for n in range(20):
+        trace = f"t{n}"
+        spans.append({'ts': 100.0 + n, 'trace': trace, 'stage': 'render', 'ms': 100.0 + n})
+        spans.append({'ts': 100.5 + n, 'trace': trace, 'stage': 'persist', 'ms': 500.0 if n == 7 else 50.0})
+        spans.append({'ts': 101.0 + n, 'trace': trace, 'stage': 'total', 'ms': 1000.0 if n == 7 else 200.0,
+                      'order_number': f"{n:04d}"})
+
+    summary = stage_summary(spans)
+    assert summary['render']['count'] == 20
+    assert summary['render']['p50'] == 109.0 and summary['render']['p99'] == 119.0
+    assert summary['persist']['p95'] == 50.0 and summary['persist']['max'] == 500.0
+
+    slowest = order_summaries(spans)[0]
+    assert (slowest['trace'], slowest['order_number'], slowest['slowest_stage']) == ('t7', '0007', 'persist')
+
+
+def test_report_cli():
+    path = pathlib.Path(tempfile.mkdtemp()) / "order_traces.jsonl"
+    tracer = OrderTracer(path)
+    tracer.record('slow', 'render', 2.0)
+    tracer.record('slow', 'total', 2.5, order_number='0042')
+    tracer.record('fast', 'render', 0.1)
+    tracer.record('fast', 'total', 0.2, order_number='0043')
+    tracer.close()
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('{"ts": 1, "trace": "обрыв записи')
+
+    result = subprocess.run([sys.executable, 'utils/trace_report.py', str(path), '--slowest', '1'],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert "2 заказов, 4 этапов" in result.stdout
+    assert "slow" in result.stdout and "0042" in result.stdout and "0043" not in result.stdout
+
+
+if __name__ == "__main__":
+    test_pipeline_stages_written_to_trace()
+    test_span_records_errors()
+    test_percentiles_and_slowest_orders()
+    test_report_cli()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
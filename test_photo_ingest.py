@@ -0,0 +1,143 @@
+# test_photo_ingest.py - фоновая загрузка фото: потоком на диск, имена по хэшу, продолжение
+"""
+🧪 ТЕСТ ЗАГРУЗКИ ФОТОГРАФИЙ
+Запуск: python -m pytest test_photo_ingest.py
+"""
+
+import sys
+import os
+import contextlib
+import hashlib
+import pathlib
+import tempfile
+import threading
+from types import SimpleNamespace
+
+import telebot
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot import TruckServiceManagerBot
+from modules.photo_ingest import PhotoIngestor, StoredPhoto, OBJECTS_DIR, telegram_file_url
+from utils.fake_bot_api import FakeBotApi
+
+TOKEN = '123:TEST'
+PHOTOS = {
+    'front': b'\xff\xd8' + os.urandom(200 * 1024),
+    'right': b'\xff\xd8' + os.urandom(150 * 1024),
+    'left': b'\xff\xd8' + os.urandom(90 * 1024),
+}
+
+
+@contextlib.contextmanager
+def running_ingestor():
+    """Загрузка фото, как в боте: getFile и скачивание файла - через локальный Bot API"""
+    api = FakeBotApi()
+    api.start()
+    api.use_with_telebot()
+    for file_id, data in PHOTOS.items():
+        api.add_file(file_id, data)
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    ingestor = PhotoIngestor(bot.get_file, telegram_file_url(TOKEN), chunk_size=8 * 1024, retry_delay=0.01)
+    try:
+        yield api, ingestor
+    finally:
+        ingestor.shutdown()
+        api.stop()
+
+
+def test_photos_stored_by_content_hash():
+    folder = pathlib.Path(tempfile.mkdtemp()) / "Фото"
+    with running_ingestor() as (api, ingestor):
+        futures = [ingestor.submit(42, file_id, folder, f"А123ВС77_0001_{index}.jpg")
+                   for index, file_id in enumerate(['front', 'right', 'left'], 1)]
+        results = [future.result(timeout=10) for future in futures]
+
+        for result, data in zip(results, PHOTOS.values()):
+            assert isinstance(result, StoredPhoto)
+            assert result.sha256 == hashlib.sha256(data).hexdigest()
+            assert result.object_path == folder / OBJECTS_DIR / f"{result.sha256}.jpg"
+            assert result.path.read_bytes() == data
+        assert (folder / "А123ВС77_0001_2.jpg").exists()
+        assert not list((folder / OBJECTS_DIR).glob('*.part'))
+
+        # То же фото в другом заказе - новый файл не скачивается в хранилище
+        duplicate = ingestor.submit(43, 'front', folder, "В456ОР99_0002_1.jpg").result(timeout=10)
+        assert duplicate.duplicate
+        assert len(list((folder / OBJECTS_DIR).iterdir())) == 3
+        assert ingestor.stats['duplicates'] == 1
+        assert api.downloaded_bytes == sum(map(len, PHOTOS.values())) + len(PHOTOS['front'])
+
+
+def test_continuation_fires_once_when_all_photos_are_in():
+    folder = pathlib.Path(tempfile.mkdtemp()) / "Фото"
+    done = threading.Event()
+    calls = []
+    with running_ingestor() as (api, ingestor):
+        # 'missing' нет на сервере - getFile отвечает 400
+        for index, file_id in enumerate(['front', 'missing', 'left'], 1):
+            ingestor.submit(42, file_id, folder, f"А123ВС77_0001_{index}.jpg")
+
+        def on_done(results):
+            calls.append(results)
+            done.set()
+
+        ingestor.when_done(42, on_done)
+        assert done.wait(10)
+
+        assert len(calls) == 1
+        results = calls[0]
+        assert [isinstance(result, Exception) for result in results] == [False, True, False]
+        assert ingestor.stats['failed'] == 1
+
+        # Загрузок нет - продолжение вызывается сразу
+        ingestor.when_done(42, calls.append)
+        assert calls[-1] == []
+
+
+def test_new_order_and_cleanup_discard_pending_photos():
+    release = threading.Event()
+
+    def get_file(file_id):
+        release.wait(5)
+        raise ConnectionResetError("заказ отменен")
+
+    ingestor = PhotoIngestor(get_file=get_file, file_url=lambda file_path: file_path, max_retries=0)
+    chat = SimpleNamespace(
+        photo_ingestor=ingestor, user_sessions={42: {'section': 'base'}}, sections={'base': {'name': "Типовой"}},
+        bot=SimpleNamespace(answer_callback_query=lambda *args: None),
+        works_repository=SimpleNamespace(get_works=lambda section: [("Осмотр ТС", 0.4)]),
+        ask_header_selection=lambda chat_id: None,
+    )
+    call = SimpleNamespace(id='1', message=SimpleNamespace(chat=SimpleNamespace(id=42)))
+    folder = pathlib.Path(tempfile.mkdtemp()) / "Фото"
+    calls = []
+    try:
+        # Фото брошенного заказа еще скачиваются - новый заказ их не получает
+        ingestor.submit(42, 'front', folder, "А123ВС77_0001_1.jpg")
+        ingestor.submit(43, 'front', folder, "В456ОР99_0002_1.jpg")
+        TruckServiceManagerBot._on_section_selected(chat, call, 'base')
+        ingestor.when_done(42, calls.append)
+        assert calls == [[]] and chat.user_sessions[42]['step'] == 'selecting_header'
+
+        ingestor.submit(42, 'right', folder, "А123ВС77_0001_2.jpg")
+        TruckServiceManagerBot.cleanup_session(chat, 42)
+        ingestor.when_done(42, calls.append)
+        assert calls == [[], []] and 42 not in chat.user_sessions
+
+        # Загрузки других чатов не затронуты
+        done = threading.Event()
+        ingestor.when_done(43, lambda results: (calls.append(results), done.set()))
+        release.set()
+        assert done.wait(5) and isinstance(calls[-1][0], ConnectionResetError)
+    finally:
+        release.set()
+        ingestor.shutdown()
+
+
+if __name__ == "__main__":
+    test_photos_stored_by_content_hash()
+    test_continuation_fires_once_when_all_photos_are_in()
+    test_new_order_and_cleanup_discard_pending_photos()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
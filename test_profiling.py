@@ -0,0 +1,141 @@
+# test_profiling.py - профилирование по команде: окно cProfile, сэмплирование, автоостановка
+"""
+🧪 ТЕСТ ПРОФИЛИРОВАНИЯ ОБРАБОТЧИКОВ
+Запуск: python -m pytest test_profiling.py
+"""
+
+import sys
+import os
+import pathlib
+import pstats
+import tempfile
+import cProfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.chat_dispatcher import ChatDispatcher
+from modules.profiling import HandlerProfiler, ProfilerBusyError
+
+
+def slow_handler(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(1000))
+    return total
+
+
+def function_names(path):
+    return {name for _, _, name in pstats.Stats(str(path)).stats}
+
+
+def test_cprofile_window_covers_handler_threads():
+    dispatcher = ChatDispatcher(workers=4)
+    profiler = HandlerProfiler([dispatcher], pathlib.Path(tempfile.mkdtemp()))
+    try:
+        dispatcher.submit(1, slow_handler, 0.01).result(timeout=5)
+        profiler.start('cprofile', seconds=30)
+        assert dispatcher.profiler is profiler
+        futures = [dispatcher.submit(chat_id, slow_handler, 0.05) for chat_id in range(1, 4)]
+        for future in futures:
+            assert future.result(timeout=5) > 0
+        report = profiler.stop()
+    finally:
+        dispatcher.shutdown()
+
+    # Выключено - задачи вызываются напрямую
+    assert dispatcher.profiler is None and not profiler.active
+    assert report.tasks == 3
+    assert report.path.exists() and 'slow_handler' in function_names(report.path)
+    assert 'slow_handler' in report.text
+    assert profiler.stop() is None
+
+
+def test_sampling_sees_busy_pool_threads():
+    profiler = HandlerProfiler([], pathlib.Path(tempfile.mkdtemp()), sample_interval=0.005)
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='order')
+    try:
+        profiler.start('sample', seconds=30)
+        pool.submit(slow_handler, 0.3).result(timeout=5)
+        report = profiler.stop()
+    finally:
+        pool.shutdown()
+
+    assert report.tasks > 10
+    assert 'slow_handler' in function_names(report.path)
+    # Простаивающие потоки пула в профиль не попадают
+    assert '_worker' not in function_names(report.path)
+
+
+def test_window_closes_itself_and_reports():
+    reports = []
+    done = threading.Event()
+    profiler = HandlerProfiler([], pathlib.Path(tempfile.mkdtemp()),
+                               on_report=lambda report, owner: (reports.append((report, owner)), done.set()))
+    profiler.start('cprofile', seconds=1, owner=42)
+    try:
+        profiler.start('sample')
+        assert False, "второе окно не должно запускаться"
+    except ProfilerBusyError:
+        pass
+
+    assert done.wait(timeout=5)
+    report, owner = reports[0]
+    assert owner == 42 and report.tasks == 0 and report.path is None
+    assert not profiler.active
+
+
+class ExclusiveProfile(cProfile.Profile):
+    """cProfile как в Python 3.12+: в процессе может быть включен только один профилировщик"""
+    active = None
+    lock = threading.Lock()
+
+    def enable(self, *args, **kwargs):
+        with ExclusiveProfile.lock:
+            if ExclusiveProfile.active not in (None, self):
+                raise ValueError('Another profiling tool is already active')
+            ExclusiveProfile.active = self
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        super().disable()
+        with ExclusiveProfile.lock:
+            if ExclusiveProfile.active is self:
+                ExclusiveProfile.active = None
+
+
+def test_concurrent_handlers_with_single_process_profiler():
+    dispatcher = ChatDispatcher(workers=3)
+    profiler = HandlerProfiler([dispatcher], pathlib.Path(tempfile.mkdtemp()))
+    barrier = threading.Barrier(3, timeout=5)
+
+    def handler(chat_id):
+        barrier.wait()
+        slow_handler(0.05)
+        return chat_id
+
+    try:
+        with mock.patch('modules.profiling.cProfile.Profile', ExclusiveProfile):
+            profiler.start('cprofile', seconds=30)
+            # Три чата одновременно: профилируется одна задача, остальные выполняются без замера, но выполняются
+            futures = [dispatcher.submit(chat_id, handler, chat_id) for chat_id in (1, 2, 3)]
+            assert [future.result(timeout=10) for future in futures] == [1, 2, 3]
+            report = profiler.stop()
+    finally:
+        profiler.stop()
+        dispatcher.shutdown()
+    assert report.tasks == 1
+    assert 'slow_handler' in function_names(report.path)
+
+
+if __name__ == "__main__":
+    test_cprofile_window_covers_handler_threads()
+    test_sampling_sees_busy_pool_threads()
+    test_window_closes_itself_and_reports()
+    test_concurrent_handlers_with_single_process_profiler()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
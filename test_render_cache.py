@@ -0,0 +1,90 @@
+# test_render_cache.py - кэш тел документов: подстановка полей заказа в готовый xlsx
+"""
+🧪 ТЕСТ КЭША ТЕЛ ДОКУМЕНТОВ
+Запуск: python -m pytest test_render_cache.py
+"""
+
+import sys
+import os
+import datetime
+import pathlib
+import tempfile
+
+from openpyxl import load_workbook
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.excel_processor import ExcelProcessor, ORDER_FIELD_PLACEHOLDERS
+from modules.document_factory import DocumentFactory
+
+
+def make_session(number='0001', plate='А123ВС77', works=None, materials=None):
+    return {
+        'section': 'base', 'header_template': 'bridge_town', 'license_plate': plate,
+        'date': datetime.datetime(2025, 2, 1), 'order_number': number, 'workers': 'Иванов',
+        'selected_works': works or [("Осмотр ТС", 0.4), ("Замена масла", 1.5)],
+        'selected_materials': materials or ["ВД-40"],
+    }
+
+
+def sheet_cells(path):
+    """Значения и форматы всех ячеек листа - для сравнения документов"""
+    workbook = load_workbook(path)
+    sheet = workbook.active
+    cells = {(cell.coordinate, cell.value, cell.font.b, cell.number_format)
+             for row in sheet.iter_rows() for cell in row if cell.value is not None}
+    merged = {str(cell_range) for cell_range in sheet.merged_cells.ranges}
+    workbook.close()
+    return cells, merged
+
+
+def test_cached_document_equals_direct_render():
+    processor = ExcelProcessor()
+    cached_factory = DocumentFactory(processor)
+    direct_factory = DocumentFactory(processor, render_cache_size=0)
+    folder = pathlib.Path(tempfile.mkdtemp())
+
+    first = cached_factory.create_excel(make_session('0001'), folder / "cached")
+    # Тело из кэша, поля заказа - свои; спецсимволы XML в госномере экранируются
+    second = cached_factory.create_excel(make_session('0002', plate='А<1&2>ВС77'), folder / "cached")
+    assert cached_factory.render_cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+    direct = direct_factory.create_excel(make_session('0002', plate='А<1&2>ВС77'), folder / "direct")
+    assert sheet_cells(second) == sheet_cells(direct)
+    values = {value for _, value, _, _ in sheet_cells(second)[0]}
+    assert any('А<1&2>ВС77' in str(value) for value in values)
+    assert not any(placeholder in str(value) for value in values for placeholder in ORDER_FIELD_PLACEHOLDERS.values())
+    assert sheet_cells(first) != sheet_cells(second)
+
+
+def test_patch_order_fields_replaces_placeholders():
+    processor = ExcelProcessor()
+    body = processor.render_body(make_session())
+    fields = {'order_number': '0042', 'date': '05.03.2025', 'license_plate': 'В"777"ОР'}
+    path = pathlib.Path(tempfile.mkdtemp()) / "order.xlsx"
+    path.write_bytes(processor.patch_order_fields(body, fields))
+    values = " ".join(str(value) for _, value, _, _ in sheet_cells(path)[0])
+    assert "0042" in values and "05.03.2025" in values and 'В"777"ОР' in values
+    assert "__TSM_" not in values
+
+
+def test_body_hash_changes_with_works_and_materials():
+    factory = DocumentFactory(ExcelProcessor())
+    base = factory.compute_body_hash(make_session())
+    # Поля заказа в тело не входят
+    assert factory.compute_body_hash(make_session('0099', plate='Х999ХХ99')) == base
+    assert factory.compute_body_hash(make_session(works=[("Осмотр ТС", 0.5)])) != base
+    assert factory.compute_body_hash(make_session(materials=["Смазка"])) != base
+
+    folder = pathlib.Path(tempfile.mkdtemp())
+    factory.create_excel(make_session(), folder)
+    factory.create_excel(make_session(materials=["Смазка"]), folder)
+    assert factory.render_cache.stats()['misses'] == 2 and factory.render_cache.stats()['hits'] == 0
+
+
+if __name__ == "__main__":
+    test_cached_document_equals_direct_render()
+    test_patch_order_fields_replaces_placeholders()
+    test_body_hash_changes_with_works_and_materials()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,84 @@
+# test_rerender_orders.py - пакетная перегенерация: старые заказы без манифеста, пропуск по хэшу
+"""
+🧪 ТЕСТ ПАКЕТНОЙ ПЕРЕГЕНЕРАЦИИ ЗАКАЗОВ
+Запуск: python -m pytest test_rerender_orders.py
+"""
+
+import sys
+import os
+import datetime
+import json
+import pathlib
+import shutil
+import subprocess
+import tempfile
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.excel_processor import ExcelProcessor
+from modules.document_factory import DocumentFactory, MANIFESTS_FOLDER
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_session(number='0001', day=1):
+    return {
+        'section': 'base', 'header_template': 'company_a', 'license_plate': 'А123ВС77',
+        'date': datetime.datetime(2025, 2, day), 'order_number': number, 'workers': 'Иванов, Петров',
+        'selected_works': [("Осмотр ТС", 0.4), ("Замена масла", 1.5)], 'selected_materials': ["ВД-40", "Смазка"],
+    }
+
+
+def make_legacy_orders(section_folder):
+    """Заказы, созданные до появления манифестов: только xlsx и txt"""
+    factory = DocumentFactory(ExcelProcessor(), render_cache_size=0)
+    factory.create_all(make_session('0001', 1), section_folder)
+    factory.create_all(make_session('0002', 20), section_folder)
+    shutil.rmtree(section_folder / "Заказы" / MANIFESTS_FOLDER)
+
+
+def test_legacy_order_rerendered_then_skipped():
+    section_folder = pathlib.Path(tempfile.mkdtemp()) / "Типовой_заказ"
+    make_legacy_orders(section_folder)
+    factory = DocumentFactory(ExcelProcessor())
+
+    orders = factory.find_orders({'base': section_folder}, date_to=datetime.datetime(2025, 2, 10))
+    assert len(orders) == 1
+    session = orders[0]['session']
+    assert (session['order_number'], session['license_plate'], session['header_template']) == \
+        ('0001', 'А123ВС77', 'company_a')
+    assert session['workers'] == 'Иванов, Петров' and session['selected_materials'] == ["ВД-40", "Смазка"]
+    assert session['selected_works'] == [("Осмотр ТС", 0.4), ("Замена масла", 1.5)]
+
+    stats = factory.rerender_orders(orders, workers=1)
+    assert (stats['rendered'], stats['skipped'], stats['failed']) == (1, 0, 0)
+    manifest_path = section_folder / "Заказы" / MANIFESTS_FOLDER / "№0001 01.02.2025 А123ВС77.json"
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    assert manifest['render_hash'] == factory.compute_render_hash(session)
+
+    # Повторный запуск: данные из манифеста, хэш совпадает - заказ пропускается
+    again = factory.find_orders({'base': section_folder}, date_to=datetime.datetime(2025, 2, 10))
+    assert factory.rerender_orders(again, workers=1)['skipped'] == 1
+    assert factory.rerender_orders(again, workers=1, force=True)['rendered'] == 1
+
+
+def test_rerender_cli():
+    main_folder = pathlib.Path(tempfile.mkdtemp())
+    make_legacy_orders(main_folder / "Типовой_заказ")
+    command = [sys.executable, 'utils/rerender_orders.py', '--main-folder', str(main_folder), '--workers', '2',
+               '--template', 'company_a']
+
+    first = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert first.returncode == 0, first.stdout + first.stderr
+    assert "Найдено заказов: 2" in first.stdout and "Перегенерировано: 2" in first.stdout
+
+    second = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert second.returncode == 0, second.stdout + second.stderr
+    assert "Перегенерировано: 0" in second.stdout and "Без изменений: 2" in second.stdout
+
+
+if __name__ == "__main__":
+    test_legacy_order_rerendered_then_skipped()
+    test_rerender_cli()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,91 @@
+# test_selection_edit.py - редактирование списков выбора: без изменений - без запроса, только клавиатура - reply_markup
+"""
+🧪 ТЕСТ РЕДАКТИРОВАНИЯ СПИСКОВ РАБОТ И МАТЕРИАЛОВ
+Запуск: python -m pytest test_selection_edit.py
+"""
+
+import sys
+import os
+from types import SimpleNamespace
+
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot import SELECTION_EDITS, TruckServiceManagerBot
+
+
+class EditingBot:
+    """Записывает правки сообщений. not_modified - ответ Telegram 'message is not modified'"""
+
+    def __init__(self, not_modified=False):
+        self.calls = []
+        self.not_modified = not_modified
+
+    def _maybe_fail(self, method):
+        if self.not_modified:
+            raise ApiTelegramException(method, None, {
+                'error_code': 400, 'description': 'Bad Request: message is not modified'})
+
+    def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        self._maybe_fail('editMessageText')
+        self.calls.append(('text', chat_id, message_id, text, reply_markup.to_dict()))
+
+    def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        self._maybe_fail('editMessageReplyMarkup')
+        self.calls.append(('markup', chat_id, message_id, reply_markup.to_dict()))
+
+
+def make_markup(*selected):
+    markup = types.InlineKeyboardMarkup()
+    for index, name in enumerate(("Осмотр ТС", "Замена масла")):
+        mark = "✅ " if index in selected else ""
+        markup.add(types.InlineKeyboardButton(f"{mark}{name}", callback_data=f"work:{index}"))
+    return markup
+
+
+def make_message(text, markup):
+    return types.Message.de_json({
+        'message_id': 7, 'date': 1738400000, 'text': text, 'chat': {'id': 42, 'type': 'private'},
+        'reply_markup': markup.to_dict(),
+    })
+
+
+def edit(bot, message, text, markup):
+    return TruckServiceManagerBot._edit_selection_message(SimpleNamespace(bot=bot), message, text, markup)
+
+
+def test_unchanged_selection_not_sent():
+    bot = EditingBot()
+    skipped = SELECTION_EDITS.value(result='skipped')
+    # Telegram хранит текст без завершающих пробелов - такой текст считается неизменным
+    assert edit(bot, make_message("Выберите работы", make_markup(0)), "Выберите работы\n", make_markup(0)) is False
+    assert bot.calls == [] and SELECTION_EDITS.value(result='skipped') == skipped + 1
+
+
+def test_keyboard_only_change_edits_reply_markup():
+    bot = EditingBot()
+    edited = SELECTION_EDITS.value(result='edited')
+    assert edit(bot, make_message("Выберите работы", make_markup()), "Выберите работы", make_markup(1)) is True
+    assert bot.calls == [('markup', 42, 7, make_markup(1).to_dict())]
+
+    assert edit(bot, make_message("Выберите работы", make_markup()), "Выбрано: 1", make_markup(1)) is True
+    assert bot.calls[-1] == ('text', 42, 7, "Выбрано: 1", make_markup(1).to_dict())
+    assert SELECTION_EDITS.value(result='edited') == edited + 2
+
+
+def test_inaccessible_message_always_edited():
+    # Старое сообщение без текста: сравнить не с чем - редактируется; "not modified" - не ошибка
+    message = types.Message.de_json({'message_id': 7, 'date': 0, 'chat': {'id': 42, 'type': 'private'}})
+    bot = EditingBot()
+    assert edit(bot, message, "Выберите работы", make_markup()) is True and bot.calls[0][0] == 'text'
+    assert edit(EditingBot(not_modified=True), message, "Выберите работы", make_markup()) is False
+
+
+if __name__ == "__main__":
+    test_unchanged_selection_not_sent()
+    test_keyboard_only_change_edits_reply_markup()
+    test_inaccessible_message_always_edited()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,151 @@
+# test_session_store.py - хранилище сессий: перезапуск, TTL, ограничение памяти
+"""
+🧪 ТЕСТ ХРАНИЛИЩА СЕССИЙ
+Запуск: python -m pytest test_session_store.py
+"""
+
+import sys
+import os
+import datetime
+import tempfile
+import pathlib
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.session_store import SessionStore, SQLiteSessionBackend, MemorySessionBackend
+
+WORKS = [("Осмотр ТС", 0.4), ("Замена правой подножки", 1.4)]
+
+
+def make_session():
+    return {
+        'section': 'base',
+        'step': 'selecting_works',
+        'license_plate': 'А123ВС77',
+        'date': datetime.datetime(2025, 10, 1),
+        'selected_works': [WORKS[1]],
+        'selected_materials': [],
+        'works': list(WORKS),
+    }
+
+
+def rehydrate(session):
+    session['works'] = list(WORKS)
+
+
+def test_sessions_survive_restart():
+    db_path = pathlib.Path(tempfile.mkdtemp()) / "sessions.db"
+
+    store = SessionStore(SQLiteSessionBackend(db_path), flush_interval=0, rehydrate=rehydrate)
+    store[42] = make_session()
+    store[42]['step'] = 'waiting_photos'
+    store.close()
+
+    store = SessionStore(SQLiteSessionBackend(db_path), flush_interval=0, rehydrate=rehydrate)
+    assert 42 in store
+    session = store[42]
+    assert session['step'] == 'waiting_photos'
+    assert session['date'] == datetime.datetime(2025, 10, 1)
+    # Кортежи работ сохраняются - проверки "work in selected_works" работают после перезапуска
+    assert WORKS[1] in session['selected_works']
+    assert session['works'] == WORKS
+
+    del store[42]
+    assert 42 not in store
+    store.close()
+
+
+def test_works_list_is_not_persisted():
+    backend = MemorySessionBackend()
+    store = SessionStore(backend, flush_interval=0)
+    store[1] = make_session()
+    store.flush()
+    assert b'\xd0\x9e\xd1\x81\xd0\xbc\xd0\xbe\xd1\x82\xd1\x80' not in backend.load(1)[0]  # "Осмотр"
+
+
+def test_unchanged_sessions_are_not_rewritten():
+    store = SessionStore(MemorySessionBackend(), flush_interval=0)
+    store[1] = make_session()
+    store.flush()
+    store[1]
+    store.flush()
+    assert store.stats['writes'] == 1
+    assert store.stats['skipped_writes'] == 1
+
+
+def test_ttl_eviction():
+    store = SessionStore(MemorySessionBackend(), ttl_seconds=60, flush_interval=0)
+    store[1] = make_session()
+    store.flush()
+    store._last_access[1] -= 120
+    store.backend.save_many([(1, store.backend.load(1)[0], store._last_access[1])])
+
+    assert store.expire() >= 1
+    assert 1 not in store
+
+
+def test_lru_memory_cap():
+    backend = MemorySessionBackend()
+    store = SessionStore(backend, max_in_memory=3, flush_interval=0, rehydrate=rehydrate)
+    for chat_id in range(10):
+        store[chat_id] = make_session()
+
+    assert store.memory_size() == 3
+    assert len(store) == 10
+    # Вытесненная из памяти сессия загружается с диска
+    assert store[0]['license_plate'] == 'А123ВС77'
+    assert store.memory_size() == 3
+
+
+class ChangingValue:
+    """Значение, которое меняется во время сериализации (как сессия, которую правит обработчик)"""
+
+    def __init__(self):
+        self.changing = True
+
+    def __reduce__(self):
+        if self.changing:
+            raise RuntimeError("dictionary changed size during iteration")
+        return (ChangingValue, ())
+
+
+def test_session_changing_during_eviction_is_kept():
+    backend = MemorySessionBackend()
+    store = SessionStore(backend, max_in_memory=2, flush_interval=0, rehydrate=rehydrate)
+    value = ChangingValue()
+    store[1] = dict(make_session(), value=value, license_plate='В777ОР77')
+    store[2] = make_session()
+    store[3] = make_session()
+
+    # Самая старая сессия (1) меняется - вытесняется следующая по давности, состояние 1 не теряется
+    assert store.memory_size() == 2
+    assert backend.load(1) is None and backend.load(2) is not None
+    assert store.stats['evicted_lru'] == 1
+
+    value.changing = False
+    store[4] = make_session()
+    assert backend.load(1) is not None and store.memory_size() == 2
+    restored = SessionStore(backend, flush_interval=0, rehydrate=rehydrate)
+    assert restored[1]['license_plate'] == 'В777ОР77' and isinstance(restored[1]['value'], ChangingValue)
+
+
+def test_unpicklable_session_does_not_break_handler():
+    backend = MemorySessionBackend()
+    store = SessionStore(backend, max_in_memory=1, flush_interval=0)
+    store[1] = dict(make_session(), callback=lambda: None)
+    # Ошибка сериализации не выходит из __setitem__; несохраняемая сессия остается в памяти
+    store[2] = make_session()
+    assert store[1]['section'] == 'base' and backend.load(2) is not None
+    store.close()
+
+
+if __name__ == "__main__":
+    test_sessions_survive_restart()
+    test_works_list_is_not_persisted()
+    test_unchanged_sessions_are_not_rewritten()
+    test_ttl_eviction()
+    test_lru_memory_cap()
+    test_session_changing_during_eviction_is_kept()
+    test_unpicklable_session_does_not_break_handler()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
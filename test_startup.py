@@ -0,0 +1,103 @@
+# test_startup.py - быстрый запуск: отложенный импорт, фоновые шаги, время до первого обновления
+"""
+🧪 ТЕСТ ПРОФИЛЯ ЗАПУСКА
+Запуск: python -m pytest test_startup.py
+"""
+
+import sys
+import os
+import json
+import pathlib
+import subprocess
+import tempfile
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.startup import StartupProfiler, lazy_module, lazy_import
+from modules.chat_dispatcher import ChatDispatcher
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_lazy_module_imported_on_first_use():
+    folder = tempfile.mkdtemp()
+    pathlib.Path(folder, 'heavy_module_for_test.py').write_text("VALUE = 42\ndef double(x):\n    return x * 2\n")
+    sys.path.insert(0, folder)
+    try:
+        module = lazy_module('heavy_module_for_test')
+        double = lazy_import('heavy_module_for_test', 'double')
+        assert 'heavy_module_for_test' not in sys.modules
+
+        assert double(21) == 42
+        assert 'heavy_module_for_test' in sys.modules
+        assert module.VALUE == 42
+    finally:
+        sys.path.remove(folder)
+        sys.modules.pop('heavy_module_for_test', None)
+
+
+def test_bot_import_skips_heavy_libraries():
+    code = ("import sys, bot; "
+            "print('loaded:' + ','.join(m for m in ('pandas', 'openpyxl', 'aiohttp') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'loaded:'
+
+
+def test_background_steps_run_in_parallel():
+    profiler = StartupProfiler(background=True)
+    started = time.perf_counter()
+    first = profiler.run('меню бота', lambda: time.sleep(0.3) or 'menu')
+    second = profiler.run('файлы учета', lambda: time.sleep(0.3) or 'ledgers')
+    assert time.perf_counter() - started < 0.1
+
+    profiler.wait(timeout=5)
+    assert (first.result(), second.result()) == ('menu', 'ledgers')
+    assert time.perf_counter() - started < 0.55
+    assert {step['kind'] for step in profiler.summary()['steps']} == {'background'}
+    profiler.shutdown()
+
+    # Обычный режим: шаг выполняется сразу, ошибка пробрасывается
+    inline = StartupProfiler()
+    assert inline.run('шаг', lambda: 7).result() == 7
+    try:
+        inline.run('ошибка', lambda: 1 / 0)
+        assert False, "ошибка шага должна пробрасываться"
+    except ZeroDivisionError:
+        pass
+
+
+def test_time_to_first_update_recorded_once():
+    save_path = pathlib.Path(tempfile.mkdtemp()) / "startup_profile.jsonl"
+    profiler = StartupProfiler(enabled=True, save_path=save_path)
+    profiler.imported('библиотеки')
+    with profiler.step('репозитории'):
+        time.sleep(0.01)
+    profiler.ready()
+
+    dispatcher = ChatDispatcher(workers=2)
+    dispatcher.on_first_task = profiler.first_update
+    try:
+        dispatcher.submit(1, lambda: None).result(timeout=5)
+        first_update_at = profiler.first_update_at
+        time.sleep(0.02)
+        dispatcher.submit(2, lambda: None).result(timeout=5)
+    finally:
+        dispatcher.shutdown()
+
+    assert first_update_at is not None and profiler.first_update_at == first_update_at
+    assert profiler.ready_at <= first_update_at
+    saved = [json.loads(line) for line in save_path.read_text(encoding='utf-8').splitlines()]
+    assert len(saved) == 1
+    assert [step['name'] for step in saved[0]['steps']] == ['библиотеки', 'репозитории']
+    assert saved[0]['first_update_ms'] == round(first_update_at * 1000, 1)
+
+
+if __name__ == "__main__":
+    test_lazy_module_imported_on_first_use()
+    test_bot_import_skips_heavy_libraries()
+    test_background_steps_run_in_parallel()
+    test_time_to_first_update_recorded_once()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
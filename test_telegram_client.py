@@ -0,0 +1,118 @@
+# test_telegram_client.py - лимиты, повторы и склейка правок на локальном Bot API
+"""
+🧪 ТЕСТ КЛИЕНТА TELEGRAM API
+Запуск: python -m pytest test_telegram_client.py
+"""
+
+import sys
+import os
+import contextlib
+import threading
+import time
+
+import pytest
+import telebot
+from telebot import apihelper
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.telegram_client import TelegramClient
+from utils.fake_bot_api import FakeBotApi
+
+
+@contextlib.contextmanager
+def running_fake_api():
+    fake = FakeBotApi()
+    fake.start()
+    fake.use_with_telebot()
+    try:
+        yield fake
+    finally:
+        fake.stop()
+
+
+@pytest.fixture
+def fake_api():
+    with running_fake_api() as fake:
+        yield fake
+
+
+def request_times(fake_api, method):
+    return [at for name, _, at in fake_api.requests if name == method]
+
+
+def make_client(**kwargs):
+    bot = telebot.TeleBot('123:ABC', threaded=False)
+    return TelegramClient(bot, **kwargs)
+
+
+def test_retry_after_is_honoured(fake_api):
+    fake_api.fail_next('sendMessage', 429, retry_after=1)
+    client = make_client(retry_delay=0.01)
+
+    started = time.monotonic()
+    message = client.send_message(-100500, "📋 ЗАКАЗ-НАРЯД №1")
+    assert message.text == "📋 ЗАКАЗ-НАРЯД №1"
+    assert time.monotonic() - started >= 1.0
+    assert fake_api.methods() == ['sendMessage', 'sendMessage']
+    assert client.stats['rate_limited'] == 1
+
+
+def test_server_errors_back_off_and_client_errors_do_not_retry(fake_api):
+    fake_api.fail_next('sendMessage', 500, times=2)
+    client = make_client(max_retries=3, retry_delay=0.05)
+
+    client.send_message(42, "фото: прикреплены")
+    assert fake_api.methods() == ['sendMessage'] * 3
+    assert client.stats['retries'] == 2
+    # Паузы растут: 0.05, затем 0.1
+    times = request_times(fake_api, 'sendMessage')
+    assert times[2] - times[1] > times[1] - times[0]
+
+    fake_api.fail_next('sendMessage', 400, 'Bad Request: chat not found')
+    with pytest.raises(apihelper.ApiTelegramException):
+        client.send_message(42, "x")
+    assert fake_api.methods().count('sendMessage') == 4
+
+
+def test_per_chat_rate_limit(fake_api):
+    client = make_client(chat_rate=10, chat_burst=1)
+
+    started = time.monotonic()
+    for index in range(6):
+        client.send_message(42, f"сообщение {index}")
+    assert time.monotonic() - started >= 0.45
+    # Другой чат не ждет очереди первого
+    started = time.monotonic()
+    client.send_message(43, "другой чат")
+    assert time.monotonic() - started < 0.2
+
+
+def test_consecutive_edits_are_coalesced(fake_api):
+    client = make_client(chat_rate=2, chat_burst=1)
+    sent = client.send_message(42, "⚪ Осмотр ТС")  # bucket чата пуст - следующая правка ждет
+
+    threads = []
+    for index in range(4):
+        thread = threading.Thread(target=client.edit_message_text, args=(f"правка {index}", 42, sent.message_id))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    edits = [params for method, params, _ in fake_api.requests if method == 'editMessageText']
+    assert len(edits) == 1
+    assert edits[0]['text'] == "правка 3"
+    assert client.stats['coalesced'] == 3
+
+
+if __name__ == "__main__":
+    for test in (test_retry_after_is_honoured,
+                 test_server_errors_back_off_and_client_errors_do_not_retry,
+                 test_per_chat_rate_limit,
+                 test_consecutive_edits_are_coalesced):
+        with running_fake_api() as fake:
+            test(fake)
+    print("🎉 ТЕСТ ПРОЙДЕН!")
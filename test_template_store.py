@@ -0,0 +1,90 @@
+# test_template_store.py - хранилище шаблонов шапок: перечитывание по mtime/размеру, подписчики, удаление
+"""
+🧪 ТЕСТ ХРАНИЛИЩА ШАБЛОНОВ ШАПОК
+Запуск: python -m pytest test_template_store.py
+"""
+
+import sys
+import os
+import copy
+import json
+import pathlib
+import tempfile
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.template_store import HeaderTemplateStore
+
+TEMPLATE = {
+    "id": "test_customer",
+    "name": "🏢 Тестовый заказчик",
+    "customer": {"company": "ООО «Тест»", "address": "г. Владимир"},
+    "contractor": {"company": "ИП Иванов Иван Иванович", "address": "г. Владимир", "inn": "1234",
+                   "ogrnip": "5678", "email": "test@example.com", "phone": "+70000000000"},
+}
+
+
+def write_template(folder, data, name=None):
+    path = folder / f"{name or data['id']}.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+def test_refresh_rereads_only_changed_files():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    path = write_template(folder, TEMPLATE)
+    store = HeaderTemplateStore(folder)
+    notified = []
+    store.subscribe(notified.append)
+
+    compiled = store.get_compiled('test_customer')
+    assert compiled.end_row == 15 and compiled.cells[0].text.endswith("Иванов Иван Иванович")
+    # Файл не менялся - не перечитывается
+    assert store.refresh() is False and notified == []
+
+    changed = copy.deepcopy(TEMPLATE)
+    changed['customer']['company'] = "ООО «Тест и партнеры»"
+    write_template(folder, changed)
+    os.utime(path, (1, 1))    # другой mtime и размер
+    assert store.refresh() is True
+    assert notified == [{'test_customer'}]
+    assert store.get('test_customer')['customer']['company'] == "ООО «Тест и партнеры»"
+    assert store.get_compiled('test_customer').version != compiled.version
+
+    # Новый и удаленный файлы
+    other = dict(TEMPLATE, id='second')
+    write_template(folder, other)
+    path.unlink()
+    assert store.refresh() is True
+    assert notified[-1] == {'test_customer', 'second'} and set(store.all()) == {'second'}
+
+    # Поврежденный файл пропускается, остальные шаблоны остаются
+    (folder / "broken.json").write_text("{", encoding='utf-8')
+    assert store.refresh() is False and len(store) == 1
+
+
+def test_save_delete_and_shared_instance():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    store = HeaderTemplateStore.shared(folder)
+    assert HeaderTemplateStore.shared(pathlib.Path(str(folder) + "/")) is store
+    notified = []
+    store.subscribe(notified.append)
+    # Ошибка подписчика не мешает остальным
+    store.subscribe(lambda changed_ids: 1 / 0)
+
+    assert store.save(TEMPLATE)
+    assert (folder / "test_customer.json").exists() and notified == [{'test_customer'}]
+    # Сохраненный файл уже учтен - refresh его не перечитывает
+    assert store.refresh() is False
+
+    assert store.delete('test_customer') is True
+    assert not (folder / "test_customer.json").exists() and store.get('test_customer') is None
+    assert notified == [{'test_customer'}, {'test_customer'}]
+    assert store.delete('test_customer') is False and len(notified) == 2
+
+
+if __name__ == "__main__":
+    test_refresh_rereads_only_changed_files()
+    test_save_delete_and_shared_instance()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
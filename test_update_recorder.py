@@ -0,0 +1,171 @@
+# test_update_recorder.py - запись обновлений без личных данных и воспроизведение на локальном Bot API
+"""
+🧪 ТЕСТ ЗАПИСИ И ВОСПРОИЗВЕДЕНИЯ ОБНОВЛЕНИЙ
+Запуск: python -m pytest test_update_recorder.py
+"""
+
+import sys
+import os
+import json
+import pathlib
+import subprocess
+import tempfile
+from types import SimpleNamespace
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import telebot
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+from modules.chat_dispatcher import ChatDispatcher, DispatchingTeleBot
+from modules.update_recorder import UpdateRecorder, load_recording, mask_text
+from utils.fake_bot_api import FakeBotApi
+from utils.replay_updates import ChatReplay, ReplayStats
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PICK_PREFIX = "➕ Работа: "
+
+USER = {'id': 5550123, 'is_bot': False, 'first_name': 'Иван', 'last_name': 'Петров', 'username': 'ivan_petrov'}
+PRIVATE_CHAT = {'id': 5550123, 'type': 'private', 'first_name': 'Иван', 'username': 'ivan_petrov'}
+GROUP_CHAT = {'id': -100777, 'type': 'supergroup', 'title': 'Сервис Петрова'}
+
+
+def message_update(update_id, chat=PRIVATE_CHAT, **fields):
+    message = {'message_id': update_id, 'date': 1738400000, 'chat': chat, 'from': USER, **fields}
+    return types.Update.de_json({'update_id': update_id, 'message': message})
+
+
+def test_scrub_removes_personal_data():
+    path = pathlib.Path(tempfile.mkdtemp()) / "updates.jsonl"
+    recorder = UpdateRecorder(path, keep_text=lambda text: text.startswith(PICK_PREFIX))
+    recorder.record_all([
+        message_update(1, text="/new_order срочно", entities=[{'type': 'bot_command', 'offset': 0, 'length': 10}]),
+        message_update(2, text="А123ВС77"),
+        message_update(3, text="Иванов, Petrov"),
+        message_update(4, text=f"{PICK_PREFIX}Замена масла"),
+        message_update(5, photo=[{'file_id': 'AgACAgIAAxreal', 'file_unique_id': 'AQADreal', 'width': 90,
+                                  'height': 60, 'file_size': 1200}], caption="Иван", media_group_id='1357'),
+        message_update(6, contact={'phone_number': '+79991234567', 'first_name': 'Иван'}),
+        message_update(7, chat=GROUP_CHAT, text="Готово"),
+        types.Update.de_json({'update_id': 8, 'callback_query': {
+            'id': '4242', 'from': USER, 'chat_instance': '99', 'data': 'work:3',
+            'message': {'message_id': 10, 'date': 1738400000, 'chat': PRIVATE_CHAT, 'text': 'Петров А.А.'}}}),
+        types.Update.de_json({'update_id': 9, 'inline_query': {
+            'id': '1', 'from': USER, 'query': 'масло', 'offset': ''}}),
+    ])
+    recorder.close()
+
+    raw = path.read_text(encoding='utf-8')
+    for personal in ('Иван', 'Петров', 'Petrov', 'ivan_petrov', '5550123', '79991234567', 'AgACAgIAAxreal',
+                     'AQADreal', '-100777', 'Сервис'):
+        assert personal not in raw, personal
+    assert recorder.stats == {'recorded': 8, 'skipped': 1}
+
+    updates = [record['update'] for record in load_recording(path)]
+    texts = [update['message'].get('text') for update in updates[:7]]
+    assert texts[:4] == ["/new_order аааааа", "А123АА77", "Аааааа, Xxxxxx", f"{PICK_PREFIX}Замена масла"]
+    photo = updates[4]['message']
+    assert photo['photo'][0]['file_id'].startswith('file-') and photo['photo'][0]['file_size'] == 1200
+    assert (photo['caption'], photo['media_group_id']) == ("Аааа", '1357')
+    assert 'contact' not in updates[5]['message']
+
+    # Личный чат и пользователь - один псевдоним во всех обновлениях, группа - отрицательный id
+    user_id = updates[0]['message']['from']['id']
+    assert {update['message']['chat']['id'] for update in updates[:7] if update['message']['chat']['type'] == 'private'} == {user_id}
+    assert updates[6]['message']['chat']['id'] < 0
+    callback = updates[7]['callback_query']
+    assert (callback['data'], callback['from']['id'], callback['message']['chat']['id']) == ('work:3', user_id, user_id)
+    assert 'text' not in callback['message']
+
+
+def test_mask_text_keeps_shape():
+    assert mask_text("Ёлка 12.10.2025 ✅") == "Аааа 12.10.2025 ✅"
+    assert mask_text("/resend 0042") == "/resend 0042"
+    assert mask_text("ABC-def") == "XXX-xxx"
+
+
+def test_dispatching_bot_records_received_updates():
+    path = pathlib.Path(tempfile.mkdtemp()) / "updates.jsonl"
+    dispatcher = ChatDispatcher(1)
+    bot = DispatchingTeleBot('123:TEST', dispatcher)
+    bot.recorder = UpdateRecorder(path)
+    try:
+        bot.process_new_updates([message_update(1, text="/start"), message_update(2, text="А123ВС77")])
+    finally:
+        dispatcher.shutdown(wait=True)
+        bot.recorder.close()
+    assert [record['update']['message']['text'] for record in load_recording(path)] == ["/start", "А123АА77"]
+    assert bot.last_update_id == 2
+
+
+def test_record_and_replay_end_to_end():
+    folder = pathlib.Path(tempfile.mkdtemp())
+    recording, result_path = folder / "updates.jsonl", folder / "replay.json"
+    recorded = subprocess.run([sys.executable, 'utils/load_test.py', '--technicians', '2', '--orders', '1',
+                               '--no-rate-limit', '--album', '--record', str(recording)],
+                              cwd=ROOT, capture_output=True, text=True, timeout=180)
+    assert recorded.returncode == 0, recorded.stdout + recorded.stderr
+    assert len(load_recording(recording)) > 20
+
+    result = subprocess.run([sys.executable, 'utils/replay_updates.py', str(recording), '--speed', '0',
+                             '--no-rate-limit', '--settle-ms', '100', '--save', str(result_path)],
+                            cwd=ROOT, capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "без ответа: 0, ошибок: 0" in result.stdout
+    saved = json.loads(result_path.read_text(encoding='utf-8'))
+    assert saved['updates'] == len(load_recording(recording))
+    assert {'/new_order', 'callback:section', 'photo', 'text'} <= set(saved['latency_ms'])
+
+
+def test_replay_with_rate_limits_waits_for_documents():
+    # С лимитами Telegram ответ растягивается на секунды: следующее обновление - после всего ответа,
+    # прогон - до отправки документов и публикации в рабочий чат
+    folder = pathlib.Path(tempfile.mkdtemp())
+    recording, result_path = folder / "updates.jsonl", folder / "replay.json"
+    recorded = subprocess.run([sys.executable, 'utils/load_test.py', '--technicians', '1', '--orders', '1',
+                               '--record', str(recording)],
+                              cwd=ROOT, capture_output=True, text=True, timeout=180)
+    assert recorded.returncode == 0, recorded.stdout + recorded.stderr
+
+    result = subprocess.run([sys.executable, 'utils/replay_updates.py', str(recording), '--speed', '0',
+                             '--save', str(result_path)],
+                            cwd=ROOT, capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stdout + result.stderr
+    saved = json.loads(result_path.read_text(encoding='utf-8'))
+    assert saved['updates'] == len(load_recording(recording))
+    assert saved['unanswered'] == {} and saved['errors'] == 0
+    assert saved['api_calls'].get('sendDocument', 0) + saved['api_calls'].get('sendMediaGroup', 0) > 0
+
+
+def test_replay_counts_api_errors():
+    api = FakeBotApi()
+    api.start()
+    api.use_with_telebot()
+    try:
+        bot = telebot.TeleBot('123:TEST', threaded=False)
+        sent = bot.send_message(42, "Выберите работы")
+        for text, message_id in (("Выберите работы", sent.message_id), ("Выбрано: 1", 999)):
+            try:
+                bot.edit_message_text(text, 42, message_id)
+            except ApiTelegramException:
+                pass
+        stats = ReplayStats()
+        chat = ChatReplay(api, None, 42, [], SimpleNamespace(), stats, 0.0)
+        chat.check_errors('callback:work')
+        chat.check_errors('text')
+    finally:
+        api.stop()
+    # "message is not modified" - не ошибка, правка несуществующего сообщения - ошибка, учтенная один раз
+    assert stats.errors == ["чат 42, callback:work: editMessageText 400 Bad Request: message to edit not found"]
+
+
+if __name__ == "__main__":
+    test_scrub_removes_personal_data()
+    test_mask_text_keeps_shape()
+    test_dispatching_bot_records_received_updates()
+    test_record_and_replay_end_to_end()
+    test_replay_with_rate_limits_waits_for_documents()
+    test_replay_counts_api_errors()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,88 @@
+# test_webhook_server.py - прием записанных обновлений через локальный webhook
+"""
+🧪 ТЕСТ WEBHOOK СЕРВЕРА
+Запуск: python -m pytest test_webhook_server.py
+"""
+
+import sys
+import os
+import json
+import threading
+import urllib.error
+import urllib.request
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.webhook_server import WebhookServer, SECRET_HEADER
+
+
+def make_update(update_id, chat_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text
+        }
+    }
+
+
+def post(url, payload, headers=None):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def start_server(**kwargs):
+    received = []
+    done = threading.Event()
+
+    def process_updates(updates):
+        received.extend(updates)
+        done.set()
+
+    server = WebhookServer(process_updates, port=0, **kwargs)
+    server.start()
+    return server, received, done
+
+
+def test_batch_and_single_update():
+    server, received, done = start_server()
+    try:
+        assert post(server.url, [make_update(1, 10, "А123ВС77"), make_update(2, 11, "/start")]) == 200
+        assert done.wait(5)
+        done.clear()
+        assert post(server.url, make_update(3, 10, "01.10.2025")) == 200
+        assert done.wait(5)
+
+        assert [update.update_id for update in received] == [1, 2, 3]
+        assert received[0].message.text == "А123ВС77"
+        assert server.stats['updates'] == 3
+    finally:
+        server.stop()
+
+
+def test_rejected_requests():
+    server, received, done = start_server(secret_token="s3cret")
+    try:
+        assert post(server.url, make_update(1, 10, "x")) == 403
+        assert post(server.url.replace('/telegram', '/other'), make_update(1, 10, "x"), {SECRET_HEADER: "s3cret"}) == 404
+        assert post(server.url, make_update(2, 10, "x"), {SECRET_HEADER: "s3cret"}) == 200
+        assert done.wait(5)
+        assert [update.update_id for update in received] == [2]
+        assert server.stats['rejected'] == 2
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    test_batch_and_single_update()
+    test_rejected_requests()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
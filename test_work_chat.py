@@ -0,0 +1,129 @@
+# test_work_chat.py - публикации в рабочий чат: альбом с подписью, очередь, лимит группы
+"""
+🧪 ТЕСТ ОЧЕРЕДИ РАБОЧЕГО ЧАТА
+Запуск: python -m pytest test_work_chat.py
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.work_chat import WorkChatDispatcher, WorkChatPost, CAPTION_LIMIT
+
+WORK_CHAT = -100123
+
+
+class RecordingBot:
+    """Бот-заглушка: запоминает вызовы Bot API и время отправки"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _record(self, method, chat_id, payload, **kwargs):
+        with self.lock:
+            self.calls.append((method, chat_id, payload, kwargs, time.monotonic()))
+        return method
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._record('send_message', chat_id, text, **kwargs)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        return self._record('send_photo', chat_id, photo, **kwargs)
+
+    def send_media_group(self, chat_id, media, **kwargs):
+        return self._record('send_media_group', chat_id, media, **kwargs)
+
+
+def test_photos_and_summary_go_as_one_album():
+    bot = RecordingBot()
+    dispatcher = WorkChatDispatcher(bot, WORK_CHAT)
+    try:
+        text = "📋 ЗАКАЗ-НАРЯД №0001\n\nА123ВС77 / 01.02.2025\n✅ Создан через @TSM_Auto_bot"
+        dispatcher.submit(WorkChatPost(text, ('front', 'right', 'left'))).result(timeout=5)
+
+        assert len(bot.calls) == 1
+        method, chat_id, media, _, _ = bot.calls[0]
+        assert (method, chat_id) == ('send_media_group', WORK_CHAT)
+        assert [item.media for item in media] == ['front', 'right', 'left']
+        assert media[0].caption == text
+        assert media[1].caption is None and media[2].caption is None
+        assert dispatcher.stats['merged'] == 1
+    finally:
+        dispatcher.stop()
+
+
+def test_long_summary_and_text_only_orders():
+    bot = RecordingBot()
+    dispatcher = WorkChatDispatcher(bot, WORK_CHAT)
+    try:
+        long_text = "📋 ЗАКАЗ-НАРЯД №0002\n" + "\n".join(f"{n}. Замена детали" for n in range(200))
+        assert len(long_text) > CAPTION_LIMIT
+        dispatcher.submit(WorkChatPost(long_text, ('front', 'right'), title="📋 ЗАКАЗ-НАРЯД №0002"))
+        dispatcher.submit(WorkChatPost("📋 ЗАКАЗ-НАРЯД №0003", ('front',)))
+        dispatcher.submit(WorkChatPost("📋 ЗАКАЗ-НАРЯД №0004")).result(timeout=5)
+
+        methods = [call[0] for call in bot.calls]
+        assert methods == ['send_media_group', 'send_message', 'send_photo', 'send_message']
+        assert bot.calls[0][2][0].caption == "📋 ЗАКАЗ-НАРЯД №0002"
+        assert bot.calls[1][2] == long_text
+        assert bot.calls[2][3]['caption'] == "📋 ЗАКАЗ-НАРЯД №0003"
+    finally:
+        dispatcher.stop()
+
+
+def test_documents_are_reused_by_file_id():
+    bot = RecordingBot()
+    dispatcher = WorkChatDispatcher(bot, WORK_CHAT)
+    try:
+        text = "📋 ЗАКАЗ-НАРЯД №0005"
+        dispatcher.submit(WorkChatPost(text, ('front',), document_file_ids=('xlsx_id', 'txt_id')))
+        dispatcher.submit(WorkChatPost(text, document_file_ids=('xlsx_id', 'txt_id'))).result(timeout=5)
+
+        methods = [call[0] for call in bot.calls]
+        assert methods == ['send_photo', 'send_media_group', 'send_media_group']
+        assert [item.media for item in bot.calls[1][2]] == ['xlsx_id', 'txt_id']
+        assert all(item.caption is None for item in bot.calls[1][2])
+        # Без фото текст заказа - подпись последнего документа
+        assert [item.caption for item in bot.calls[2][2]] == [None, text]
+        assert all(item.type == 'document' for item in bot.calls[2][2])
+    finally:
+        dispatcher.stop()
+
+
+def test_burst_from_many_technicians_is_queued_and_paced():
+    bot = RecordingBot()
+    # 600 сообщений в минуту = 10 в секунду, запас - 3 сообщения
+    dispatcher = WorkChatDispatcher(bot, WORK_CHAT, messages_per_minute=600, burst=3)
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda n=n: results.append(
+            dispatcher.submit(WorkChatPost(f"Заказ {n}", ('a', 'b', 'c')))))
+            for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in results:
+            future.result(timeout=10)
+
+        # 4 альбома по 3 фото = 12 сообщений: первые 3 из запаса, остальные 9 - по 0.1 с
+        times = [call[4] for call in bot.calls]
+        assert len(times) == 4
+        assert times[-1] - times[0] >= 0.8
+        assert dispatcher.stats['throttled_seconds'] > 0
+        assert sorted(call[2][0].caption for call in bot.calls) == [f"Заказ {n}" for n in range(4)]
+    finally:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    test_photos_and_summary_go_as_one_album()
+    test_long_summary_and_text_only_orders()
+    test_documents_are_reused_by_file_id()
+    test_burst_from_many_technicians_is_queued_and_paced()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
@@ -0,0 +1,104 @@
+# test_works_search.py - поиск работ по фрагменту: индекс триграмм, перестройка, скорость
+"""
+🧪 ТЕСТ ПОИСКА РАБОТ
+Запуск: python -m pytest test_works_search.py
+"""
+
+import sys
+import os
+import random
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules.works_search import WorksIndex, WorksSearch, MAX_RESULTS
+
+WORKS = [
+    ("Осмотр ТС", 0.4), ("Замена нижней накладки правой фары", 0.6),
+    ("Замена верхней накладки правой фары", 0.8), ("Замена нижней накладки левой фары", 0.6),
+    ("Замена верхней накладки левой фары", 0.8), ("Замена правой подножки", 1.4),
+    ("Замена левой подножки", 1.4), ("Замена накладки правой подножки", 0.2),
+    ("Замена ёмкости омывателя", 0.5), ("Регулировка фар (2 шт.)", 0.3),
+]
+
+
+def make_catalog(size, seed=1):
+    rng = random.Random(seed)
+    actions = ['Замена', 'Ремонт', 'Снятие', 'Установка', 'Регулировка', 'Диагностика', 'Покраска']
+    sides = ['верхней', 'нижней', 'правой', 'левой', 'передней', 'задней']
+    parts = ['накладки фары', 'подножки', 'двери', 'зеркала', 'бампера', 'крыла', 'радиатора',
+             'рессоры', 'тормозного цилиндра', 'ступицы', 'кабины', 'лючка', 'фонаря', 'стартера']
+    return [(f"{rng.choice(actions)} {rng.choice(sides)} {rng.choice(sides)} {rng.choice(parts)} {n}", 0.5)
+            for n in range(size)]
+
+
+def names(index, query):
+    work_ids, _ = index.search(query)
+    return [WORKS[work_id][0] for work_id in work_ids]
+
+
+def test_fragments_find_works():
+    index = WorksIndex(WORKS)
+
+    assert names(index, "верх лев фары") == ["Замена верхней накладки левой фары"]
+    assert names(index, "НАКЛАДКИ ПРАВ") == [
+        "Замена нижней накладки правой фары", "Замена верхней накладки правой фары",
+        "Замена накладки правой подножки",
+    ]
+    # Короткие фрагменты - по началу слова, ё = е, знаки препинания не мешают
+    assert names(index, "по ле") == ["Замена левой подножки"]
+    assert names(index, "емкость") == []
+    assert names(index, "емкост") == ["Замена ёмкости омывателя"]
+    assert names(index, "фар 2") == ["Регулировка фар (2 шт.)"]
+    # Все триграммы слова есть, но не подряд - не совпадение
+    assert names(index, "накладкиправой") == []
+    assert len(names(index, "")) == len(WORKS)
+
+
+def test_results_are_paged_for_telegram():
+    catalog = make_catalog(500)
+    index = WorksIndex(catalog)
+
+    first, next_offset = index.search("замена")
+    assert len(first) == MAX_RESULTS and next_offset == MAX_RESULTS
+    second, _ = index.search("замена", offset=next_offset)
+    assert first[-1] < second[0]
+    assert all(catalog[work_id][0].startswith("Замена") for work_id in first + second)
+
+
+def test_index_rebuilt_only_when_catalog_changes():
+    search = WorksSearch()
+    works = list(WORKS)
+
+    search.search('base', works, "фары")
+    # Тот же каталог, прочитанный заново (другой объект списка) - индекс тот же
+    search.search('base', [tuple(work) for work in WORKS], "фары")
+    assert search.stats['builds'] == 1
+
+    updated = works + [("Замена фары в сборе", 1.0)]
+    work_ids, _ = search.search('base', updated, "фары в сборе")
+    assert [updated[work_id][0] for work_id in work_ids] == ["Замена фары в сборе"]
+    assert search.stats['builds'] == 2
+
+
+def test_lookup_is_fast_on_large_catalog():
+    catalog = make_catalog(12000)
+    index = WorksIndex(catalog)
+    queries = ["замена", "зам", "верх лев фары", "накладки фары", "за ве ле", "л",
+               "замена верхней левой накладки фары 11", "тормоз ступ", "xyz"]
+
+    started = time.perf_counter()
+    for _ in range(10):
+        for query in queries:
+            index.search(query)
+    average = (time.perf_counter() - started) / (10 * len(queries))
+    assert average < 0.010
+
+
+if __name__ == "__main__":
+    test_fragments_find_works()
+    test_results_are_paged_for_telegram()
+    test_index_rebuilt_only_when_catalog_changes()
+    test_lookup_is_fast_on_large_catalog()
+    print("🎉 ТЕСТ ПРОЙДЕН!")
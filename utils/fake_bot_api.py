@@ -0,0 +1,666 @@
+# utils/fake_bot_api.py
+"""
+🚀 ЛОКАЛЬНЫЙ BOT API ДЛЯ ТЕСТОВ И НАГРУЗОЧНЫХ ПРОГОНОВ
+HTTP-СЕРВЕР, ОТВЕЧАЮЩИЙ КАК api.telegram.org: getUpdates (LONG POLLING) И WEBHOOK, sendMessage, editMessage*,
+sendDocument, sendMediaGroup, getFile И СКАЧИВАНИЕ ФАЙЛОВ. ОТВЕТЫ БОТА ЗАПИСЫВАЮТСЯ ПО ЧАТАМ - ПО НИМ
+ИМИТАЦИИ ПОЛЬЗОВАТЕЛЕЙ ЖМУТ КНОПКИ И ЗАМЕРЯЮТ ЗАДЕРЖКИ (utils/load_test.py, utils/replay_updates.py).
+ОШИБКИ TELEGRAM (429 С retry_after, 5xx) ЗАДАЮТСЯ ЗАРАНЕЕ - fail_next. ТОЛЬКО СТАНДАРТНАЯ БИБЛИОТЕКА
+"""
+
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+BOT_USER = {'id': 100, 'is_bot': True, 'first_name': 'TruckService', 'username': 'truckservice_test_bot'}
+
+# Методы без содержательного ответа (result: true)
+ACK_METHODS = frozenset({'answerCallbackQuery', 'answerInlineQuery', 'setMyCommands', 'deleteMyCommands',
+                         'sendChatAction', 'deleteMessage', 'setChatMenuButton', 'close', 'logOut'})
+EDIT_METHODS = frozenset({'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption', 'editMessageMedia'})
+
+MAX_POLL_TIMEOUT = 50       # как у Telegram: дольше getUpdates не ждет
+PHOTO_SIZE = 150 * 1024     # размер фото пользователей, которые отдает сервер
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+RECEIVE_MODES = ('polling', 'webhook')
+
+
+class _ApiError(Exception):
+    """Ответ Bot API с ok: false"""
+
+    def __init__(self, code: int, description: str, parameters: Optional[Dict[str, Any]] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.parameters = parameters
+
+
+@dataclass
+class BotCall:
+    """Запрос бота к API, адресованный чату: отправка, редактирование, ответ на нажатие кнопки"""
+    method: str
+    chat_id: Optional[int]
+    at: float                                            # time.perf_counter() при получении запроса
+    message_id: Optional[int] = None
+    text: str = ''
+    buttons: List[str] = field(default_factory=list)    # callback_data inline-клавиатуры
+    keyboard: List[str] = field(default_factory=list)   # кнопки обычной клавиатуры (ReplyKeyboardMarkup)
+
+
+@dataclass
+class FailedCall:
+    """Запрос бота, на который API ответил ok: false"""
+    method: str
+    chat_id: Optional[int]
+    at: float
+    error_code: int
+    description: str
+
+
+def _parse_markup(raw: Any) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    markup = json.loads(raw) if isinstance(raw, str) else raw
+    return markup if isinstance(markup, dict) else None
+
+
+def _button_data(markup: Optional[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """(callback_data inline-кнопок, тексты кнопок обычной клавиатуры)"""
+    if not markup:
+        return [], []
+    inline = [button.get('callback_data', '') for row in markup.get('inline_keyboard', []) for button in row]
+    keyboard = [button if isinstance(button, str) else button.get('text', '')
+                for row in markup.get('keyboard', []) for button in row]
+    return [data for data in inline if data], keyboard
+
+
+def _photo_bytes(file_id: str, size: int) -> bytes:
+    """Содержимое фото пользователя: свое для каждого file_id (хранилище фото бота - по хэшу содержимого)"""
+    block = hashlib.sha256(file_id.encode('utf-8')).digest() * 64
+    body = (block * (size // len(block) + 1))[:max(0, size - 4)]
+    return b'\xff\xd8' + body + b'\xff\xd9'
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Tuple[Dict[str, str], Dict[str, Tuple[str, bytes]]]:
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+    fields: Dict[str, str] = {}
+    files: Dict[str, Tuple[str, bytes]] = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        payload = part.get_payload(decode=True) or b''
+        filename = part.get_filename()
+        if filename is None:
+            fields[name] = payload.decode('utf-8')
+        else:
+            files[name] = (filename, payload)
+    return fields, files
+
+
+class FakeBotApi:
+    """Bot API на localhost. Обновления пользователей - push_update / send_text / send_photo / click,
+    ответы бота - chat_calls / wait_call, все запросы - requests, ошибки - fail_next.
+    Бот подключается через use_with_telebot()"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, photo_size: int = PHOTO_SIZE):
+        self.latency = latency            # задержка ответа на каждый запрос (сеть до Telegram), секунды
+        self.photo_size = photo_size
+        self.logger = logging.getLogger('FakeBotApi')
+        self.stats: Dict[str, int] = {}   # запросы по методам
+        self.uploaded_bytes = 0
+        self.downloaded_bytes = 0
+        self.calls: List[BotCall] = []
+        self.requests: List[Tuple[str, Dict[str, Any], float]] = []   # (метод, параметры, time.monotonic())
+        self.errors: List[FailedCall] = []
+        self._chat_calls: Dict[int, List[BotCall]] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._updates: List[Dict[str, Any]] = []        # до подтверждения offset-ом или доставки webhook
+        self._update_ids = itertools.count(1)
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._messages: Dict[Tuple[int, int], Dict[str, Any]] = {}   # текущие текст и клавиатура сообщений
+        self._callbacks: Dict[str, int] = {}             # id нажатия -> чат
+        self._callback_ids = itertools.count(1)
+        self._files: Dict[str, Optional[bytes]] = {}     # None - фото пользователя, содержимое генерируется
+        self._file_ids = itertools.count(1)
+        self._webhook: Optional[Tuple[str, Optional[str]]] = None
+        self._webhook_thread: Optional[threading.Thread] = None
+        self._failures: Dict[str, List[_ApiError]] = {}   # метод -> ошибки следующих запросов
+        self._saved_urls: List[Tuple[Any, str, str]] = []
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    # ✅ ЗАПУСК И ПОДКЛЮЧЕНИЕ БОТА
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.httpd.server_address[0]}:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        """Шаблон как у telebot.apihelper.API_URL: {0} - токен, {1} - метод"""
+        return self.base_url + "/bot{0}/{1}"
+
+    @property
+    def file_url(self) -> str:
+        return self.base_url + "/file/bot{0}/{1}"
+
+    def use_with_telebot(self) -> None:
+        """Направить запросы TeleBot и AsyncTeleBot на этот сервер (до создания бота). stop() возвращает адреса"""
+        from telebot import apihelper, asyncio_helper
+        for helper in (apihelper, asyncio_helper):
+            self._saved_urls.append((helper, helper.API_URL, helper.FILE_URL))
+            helper.API_URL = self.api_url
+            helper.FILE_URL = self.file_url
+
+    def start(self) -> None:
+        """Запуск в фоновом потоке"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        self.logger.info(f"✅ Локальный Bot API: {self.base_url}")
+
+    def stop(self) -> None:
+        """Остановка. Ожидающие getUpdates сразу получают пустой ответ, адреса Bot API в telebot восстанавливаются"""
+        with self._changed:
+            self._closed = True
+            self._webhook = None
+            self._changed.notify_all()
+        for helper, api_url, file_url in reversed(self._saved_urls):
+            helper.API_URL, helper.FILE_URL = api_url, file_url
+        self._saved_urls.clear()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for thread in (self._thread, self._webhook_thread):
+            if thread:
+                thread.join(timeout=5)
+
+    # ✅ ОБНОВЛЕНИЯ ОТ ПОЛЬЗОВАТЕЛЕЙ
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Поставить обновление в очередь (getUpdates или webhook). Возвращает update_id"""
+        with self._changed:
+            update = {'update_id': next(self._update_ids), **update}
+            self._updates.append(update)
+            self._changed.notify_all()
+        return update['update_id']
+
+    def send_text(self, chat_id: int, text: str) -> int:
+        message = self._user_message(chat_id, text=text)
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self.push_update({'message': message})
+
+    def send_photo(self, chat_id: int, file_id: Optional[str] = None, media_group_id: Optional[str] = None) -> str:
+        """Фото от пользователя. Бот скачает его через getFile. Возвращает file_id"""
+        file_id = file_id or f"photo-{chat_id}-{next(self._file_ids)}"
+        self.add_file(file_id)
+        photo = {'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 960,
+                 'file_size': self.photo_size}
+        message = self._user_message(chat_id, photo=[photo])
+        if media_group_id:
+            message['media_group_id'] = media_group_id
+        self.push_update({'message': message})
+        return file_id
+
+    def add_file(self, file_id: str, content: Optional[bytes] = None) -> None:
+        """Файл пользователя, доступный боту через getFile (None - содержимое как у фото)"""
+        with self._lock:
+            if content is not None or file_id not in self._files:
+                self._files[file_id] = content
+
+    def click(self, chat_id: int, data: str, message_id: int) -> str:
+        """Нажатие inline-кнопки под сообщением бота. Возвращает id нажатия"""
+        callback_id = f"cb-{next(self._callback_ids)}"
+        with self._lock:
+            self._callbacks[callback_id] = chat_id
+            current = self._messages.get((chat_id, message_id), {})
+            message = {'message_id': message_id, 'date': int(time.time()), 'chat': self._chat(chat_id),
+                       'from': BOT_USER, 'text': current.get('text', '')}
+            if current.get('reply_markup'):
+                message['reply_markup'] = current['reply_markup']
+        self.push_update({'callback_query': {
+            'id': callback_id, 'from': self._user(chat_id), 'chat_instance': str(chat_id),
+            'data': data, 'message': message,
+        }})
+        return callback_id
+
+    # ✅ ОШИБКИ TELEGRAM
+    def fail_next(self, method: str, error_code: int, description: str = '', retry_after: Optional[int] = None,
+                  times: int = 1) -> None:
+        """Следующие times запросов method получат ok: false (429 - с parameters.retry_after, 5xx - сбой сервера)"""
+        if not description:
+            if error_code == 429:
+                description = f"Too Many Requests: retry after {retry_after or 1}"
+            elif error_code >= 500:
+                description = 'Internal Server Error'
+            else:
+                description = 'Bad Request'
+        parameters = {'retry_after': retry_after or 1} if error_code == 429 else None
+        with self._lock:
+            self._failures.setdefault(method, []).extend(
+                _ApiError(error_code, description, parameters) for _ in range(times))
+
+    def methods(self) -> List[str]:
+        """Методы всех запросов по порядку, включая ответившие ошибкой"""
+        with self._lock:
+            return [method for method, _, _ in self.requests]
+
+    # ✅ ОТВЕТЫ БОТА
+    def chat_calls(self, chat_id: int) -> List[BotCall]:
+        with self._lock:
+            return list(self._chat_calls.get(chat_id, []))
+
+    def chat_errors(self, chat_id: int) -> List[FailedCall]:
+        """Запросы к чату, завершившиеся ошибкой API"""
+        with self._lock:
+            return [error for error in self.errors if error.chat_id == chat_id]
+
+    def message_with_button(self, chat_id: int, data: str) -> Optional[int]:
+        """Последнее сообщение бота в чате, под которым сейчас есть кнопка data"""
+        with self._lock:
+            found = [message_id for (chat, message_id), message in self._messages.items()
+                     if chat == chat_id and data in _button_data(message.get('reply_markup'))[0]]
+        return max(found) if found else None
+
+    def wait_call(self, chat_id: int, predicate: Callable[[BotCall], bool], start: int = 0,
+                  timeout: float = 30.0) -> Tuple[int, BotCall]:
+        """Первый ответ чату с позиции start, для которого predicate истинно -> (позиция, ответ).
+        Нет за timeout - TimeoutError"""
+        deadline = time.monotonic() + timeout
+        position = start
+        with self._changed:
+            while True:
+                calls = self._chat_calls.get(chat_id, [])
+                while position < len(calls):
+                    if predicate(calls[position]):
+                        return position, calls[position]
+                    position += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    raise TimeoutError(f"Чат {chat_id}: нет ожидаемого ответа бота за {timeout:g} с")
+                self._changed.wait(remaining)
+
+    # ✅ ОБРАБОТКА ЗАПРОСОВ
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self) -> None:
+                self._route()
+
+            def do_POST(self) -> None:
+                self._route()
+
+            def _route(self) -> None:
+                url = urlsplit(self.path)
+                parts = url.path.split('/')
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if len(parts) >= 4 and parts[1] == 'file' and parts[2].startswith('bot'):
+                    self._send_file(unquote('/'.join(parts[3:])))
+                    return
+                if len(parts) != 3 or not parts[1].startswith('bot'):
+                    self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                    return
+
+                params: Dict[str, Any] = dict(parse_qsl(url.query))
+                files: Dict[str, Tuple[str, bytes]] = {}
+                content_type = self.headers.get('Content-Type', '')
+                try:
+                    if content_type.startswith('application/json') and body:
+                        params.update(json.loads(body))
+                    elif content_type.startswith('multipart/form-data'):
+                        fields, files = _parse_multipart(content_type, body)
+                        params.update(fields)
+                    elif body:
+                        params.update(parse_qsl(body.decode('utf-8')))
+                    result = server._call(parts[2], params, files)
+                except _ApiError as e:
+                    server._record_error(parts[2], params, e)
+                    error = {'ok': False, 'error_code': e.code, 'description': e.description}
+                    if e.parameters:
+                        error['parameters'] = e.parameters
+                    self._reply(e.code, error)
+                    return
+                except Exception as e:
+                    server.logger.error(f"❌ Ошибка локального Bot API ({parts[2]}): {e}")
+                    self._reply(500, {'ok': False, 'error_code': 500, 'description': f"Internal Server Error: {e}"})
+                    return
+                self._reply(200, {'ok': True, 'result': result})
+
+            def _send_file(self, file_path: str) -> None:
+                content = server._file_content(file_path)
+                if content is None:
+                    self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                    return
+                server._count('file', downloaded=len(content))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                server.logger.debug(format % args)
+
+        return _Handler
+
+    def _call(self, method: str, params: Dict[str, Any], files: Dict[str, Tuple[str, bytes]]) -> Any:
+        handler = getattr(self, f"_method_{method}", None)
+        if handler is None and method not in ACK_METHODS and method not in EDIT_METHODS:
+            raise _ApiError(404, 'Not Found: method not found')
+        self._count(method)
+        with self._lock:
+            self.requests.append((method, dict(params), time.monotonic()))
+            failures = self._failures.get(method)
+            failure = failures.pop(0) if failures else None
+        if failure:
+            raise failure
+        if self.latency and method != 'getUpdates':
+            time.sleep(self.latency)
+        if method in EDIT_METHODS:
+            return self._edit(method, params)
+        if handler is None:
+            if method == 'answerCallbackQuery':
+                with self._lock:
+                    chat_id = self._callbacks.pop(params.get('callback_query_id', ''), None)
+                self._record(BotCall(method, chat_id, time.perf_counter(), text=params.get('text', '')))
+            elif 'chat_id' in params:
+                self._record(BotCall(method, int(params['chat_id']), time.perf_counter()))
+            return True
+        return handler(params, files)
+
+    def _count(self, method: str, uploaded: int = 0, downloaded: int = 0) -> None:
+        with self._lock:
+            self.stats[method] = self.stats.get(method, 0) + 1
+            self.uploaded_bytes += uploaded
+            self.downloaded_bytes += downloaded
+
+    def _record(self, call: BotCall) -> None:
+        with self._changed:
+            self.calls.append(call)
+            if call.chat_id is not None:
+                self._chat_calls.setdefault(call.chat_id, []).append(call)
+            self._changed.notify_all()
+
+    def _record_error(self, method: str, params: Dict[str, Any], error: _ApiError) -> None:
+        try:
+            chat_id = int(params['chat_id'])
+        except (KeyError, TypeError, ValueError):
+            chat_id = None
+        with self._lock:
+            self.errors.append(FailedCall(method, chat_id, time.perf_counter(), error.code, error.description))
+
+    # ✅ МЕТОДЫ BOT API
+    def _method_getMe(self, params: Dict[str, Any], files: Dict) -> Dict[str, Any]:
+        return dict(BOT_USER)
+
+    def _method_getUpdates(self, params: Dict[str, Any], files: Dict) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), MAX_POLL_TIMEOUT)
+        with self._changed:
+            if self._webhook:
+                raise _ApiError(409, "Conflict: can't use getUpdates method while webhook is active")
+            while True:
+                # Обновления до offset подтверждены ботом
+                self._updates = [update for update in self._updates if update['update_id'] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0 or self._closed:
+                    return self._updates[:limit]
+                self._changed.wait(remaining)
+
+    def _method_setWebhook(self, params: Dict[str, Any], files: Dict) -> bool:
+        url = params.get('url', '')
+        with self._changed:
+            self._webhook = (url, params.get('secret_token')) if url else None
+            self._changed.notify_all()
+        if url and not (self._webhook_thread and self._webhook_thread.is_alive()):
+            self._webhook_thread = threading.Thread(target=self._deliver_webhook, name='fake-bot-api-webhook',
+                                                    daemon=True)
+            self._webhook_thread.start()
+        return True
+
+    def _method_deleteWebhook(self, params: Dict[str, Any], files: Dict) -> bool:
+        with self._changed:
+            self._webhook = None
+            if str(params.get('drop_pending_updates', '')).lower() == 'true':
+                self._updates.clear()
+            self._changed.notify_all()
+        return True
+
+    def _method_getWebhookInfo(self, params: Dict[str, Any], files: Dict) -> Dict[str, Any]:
+        with self._lock:
+            return {'url': self._webhook[0] if self._webhook else '', 'has_custom_certificate': False,
+                    'pending_update_count': len(self._updates)}
+
+    def _method_sendMessage(self, params: Dict[str, Any], files: Dict) -> Dict[str, Any]:
+        text = str(params.get('text', '')).strip()
+        if not text:
+            raise _ApiError(400, 'Bad Request: message text is empty')
+        return self._send(params, 'sendMessage', text, {'text': text})
+
+    def _method_sendDocument(self, params: Dict[str, Any], files: Dict[str, Tuple[str, bytes]]) -> Dict[str, Any]:
+        file_id, name, size = self._store_file('document', params, files, 'document.bin')
+        document = {'file_id': file_id, 'file_unique_id': file_id, 'file_name': name, 'file_size': size}
+        return self._send(params, 'sendDocument', str(params.get('caption', '')), {'document': document})
+
+    def _method_sendPhoto(self, params: Dict[str, Any], files: Dict[str, Tuple[str, bytes]]) -> Dict[str, Any]:
+        file_id, _, size = self._store_file('photo', params, files, 'photo.jpg')
+        photo = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 960, 'file_size': size}]
+        return self._send(params, 'sendPhoto', str(params.get('caption', '')), {'photo': photo})
+
+    def _method_sendMediaGroup(self, params: Dict[str, Any], files: Dict[str, Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+        media = params.get('media')
+        media = json.loads(media) if isinstance(media, str) else media
+        if not media or not 2 <= len(media) <= 10:
+            raise _ApiError(400, 'Bad Request: media group must include 2-10 items')
+        chat_id = int(params['chat_id'])
+        messages = []
+        for item in media:
+            reference = str(item.get('media', ''))
+            item_files = {}
+            if reference.startswith('attach://'):
+                if reference[len('attach://'):] not in files:
+                    raise _ApiError(400, f'Bad Request: file {reference} not found')
+                item_files['file'] = files[reference[len('attach://'):]]
+            file_id, name, size = self._store_file('file', {'file': reference}, item_files, 'file.bin')
+            kind = 'photo' if item.get('type') == 'photo' else 'document'
+            content = ([{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 960,
+                         'file_size': size}] if kind == 'photo'
+                       else {'file_id': file_id, 'file_unique_id': file_id, 'file_name': name, 'file_size': size})
+            message = self._bot_message(chat_id, **{kind: content})
+            if item.get('caption'):
+                message['caption'] = item['caption']
+            messages.append(message)
+        self._record(BotCall('sendMediaGroup', chat_id, time.perf_counter(), messages[0]['message_id'],
+                             text=str(media[0].get('caption', ''))))
+        return messages
+
+    def _method_getFile(self, params: Dict[str, Any], files: Dict) -> Dict[str, Any]:
+        file_id = str(params.get('file_id', ''))
+        with self._lock:
+            if file_id not in self._files:
+                raise _ApiError(400, 'Bad Request: invalid file_id')
+            content = self._files[file_id]
+        size = self.photo_size if content is None else len(content)
+        return {'file_id': file_id, 'file_unique_id': file_id, 'file_size': size, 'file_path': f"files/{file_id}"}
+
+    # ✅ СООБЩЕНИЯ И ФАЙЛЫ
+    def _send(self, params: Dict[str, Any], method: str, text: str, content: Dict[str, Any]) -> Dict[str, Any]:
+        if 'chat_id' not in params:
+            raise _ApiError(400, 'Bad Request: chat_id is empty')
+        chat_id = int(params['chat_id'])
+        markup = _parse_markup(params.get('reply_markup'))
+        if method != 'sendMessage' and text:
+            content['caption'] = text
+        message = self._bot_message(chat_id, **content)
+        inline = markup if markup and 'inline_keyboard' in markup else None
+        if inline:
+            message['reply_markup'] = inline
+        with self._lock:
+            self._messages[(chat_id, message['message_id'])] = {'text': text, 'reply_markup': inline}
+        buttons, keyboard = _button_data(markup)
+        self._record(BotCall(method, chat_id, time.perf_counter(), message['message_id'], text, buttons, keyboard))
+        return message
+
+    def _edit(self, method: str, params: Dict[str, Any]) -> Any:
+        if 'inline_message_id' in params:
+            return True
+        chat_id, message_id = int(params.get('chat_id', 0)), int(params.get('message_id', 0))
+        markup = _parse_markup(params.get('reply_markup'))
+        with self._lock:
+            current = self._messages.get((chat_id, message_id))
+            if current is None:
+                raise _ApiError(400, 'Bad Request: message to edit not found')
+            text = current['text']
+            if method == 'editMessageText':
+                text = str(params.get('text', '')).strip()
+            elif method == 'editMessageCaption':
+                text = str(params.get('caption', '')).strip()
+            if text == current['text'] and markup == current['reply_markup'] and method != 'editMessageMedia':
+                raise _ApiError(400, 'Bad Request: message is not modified: specified new message content and '
+                                     'reply markup are exactly the same as a current content and reply markup '
+                                     'of the message')
+            self._messages[(chat_id, message_id)] = {'text': text, 'reply_markup': markup}
+        buttons, _ = _button_data(markup)
+        self._record(BotCall(method, chat_id, time.perf_counter(), message_id, text, buttons))
+        message = {'message_id': message_id, 'date': int(time.time()), 'edit_date': int(time.time()),
+                   'chat': self._chat(chat_id), 'from': BOT_USER, 'text': text}
+        if markup:
+            message['reply_markup'] = markup
+        return message
+
+    def _store_file(self, field_name: str, params: Dict[str, Any], files: Dict[str, Tuple[str, bytes]],
+                    default_name: str) -> Tuple[str, str, int]:
+        """Загрузка файла (multipart) или повторная отправка по file_id -> (file_id, имя, размер)"""
+        if field_name in files:
+            name, content = files[field_name]
+            file_id = f"file-{next(self._file_ids)}"
+            with self._lock:
+                self._files[file_id] = content
+            self._count('upload', uploaded=len(content))
+            return file_id, name or default_name, len(content)
+        file_id = str(params.get(field_name, ''))
+        with self._lock:
+            if file_id not in self._files:
+                raise _ApiError(400, 'Bad Request: wrong file identifier/HTTP URL specified')
+            content = self._files[file_id]
+        return file_id, default_name, self.photo_size if content is None else len(content)
+
+    def _file_content(self, file_path: str) -> Optional[bytes]:
+        file_id = file_path.rsplit('/', 1)[-1]
+        with self._lock:
+            if file_id not in self._files:
+                return None
+            content = self._files[file_id]
+        return _photo_bytes(file_id, self.photo_size) if content is None else content
+
+    def _next_message_id(self, chat_id: int) -> int:
+        with self._lock:
+            counter = self._message_ids.setdefault(chat_id, itertools.count(1))
+            return next(counter)
+
+    def _bot_message(self, chat_id: int, **content: Any) -> Dict[str, Any]:
+        return {'message_id': self._next_message_id(chat_id), 'date': int(time.time()),
+                'chat': self._chat(chat_id), 'from': BOT_USER, **content}
+
+    def _user_message(self, chat_id: int, **content: Any) -> Dict[str, Any]:
+        return {'message_id': self._next_message_id(chat_id), 'date': int(time.time()),
+                'chat': self._chat(chat_id), 'from': self._user(chat_id), **content}
+
+    @staticmethod
+    def _user(chat_id: int) -> Dict[str, Any]:
+        return {'id': chat_id, 'is_bot': False, 'first_name': f"Техник {chat_id}", 'language_code': 'ru'}
+
+    @staticmethod
+    def _chat(chat_id: int) -> Dict[str, Any]:
+        if chat_id < 0:
+            return {'id': chat_id, 'type': 'supergroup', 'title': 'Рабочий чат'}
+        return {'id': chat_id, 'type': 'private', 'first_name': f"Техник {chat_id}"}
+
+    # ✅ ДОСТАВКА WEBHOOK
+    def _deliver_webhook(self) -> None:
+        """Обновления по одному, по порядку; при ошибке - повтор, как у Telegram"""
+        while True:
+            with self._changed:
+                while not self._closed and self._webhook and not self._updates:
+                    self._changed.wait()
+                if self._closed or not self._webhook:
+                    return
+                update = self._updates[0]
+                url, secret = self._webhook
+            request = urllib.request.Request(url, data=json.dumps(update, ensure_ascii=False).encode('utf-8'),
+                                             headers={'Content-Type': 'application/json'})
+            if secret:
+                request.add_header(SECRET_HEADER, secret)
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as e:
+                self.logger.warning(f"⚠️ Webhook {url} недоступен: {e}")
+                time.sleep(0.5)
+                continue
+            with self._changed:
+                if self._updates and self._updates[0] is update:
+                    self._updates.pop(0)
+
+
+def serve_bot(bot: Any, mode: str = 'polling') -> Callable[[], None]:
+    """Прием обновлений TruckServiceManagerBot в фоне - как run() или run_webhook(), но с остановкой.
+    Возвращает функцию, прекращающую прием (до bot.shutdown())"""
+    if mode not in RECEIVE_MODES:
+        raise ValueError(f"Режим приема обновлений: {', '.join(RECEIVE_MODES)}")
+
+    if mode == 'webhook':
+        from modules.webhook_server import WebhookServer
+        process_updates = bot.runtime.process_updates_nowait if bot.runtime else bot.bot.process_new_updates
+        server = WebhookServer(process_updates, '127.0.0.1', 0)
+        server.start()
+        bot.bot.set_webhook(url=server.url)
+        bot.startup.ready()
+
+        def stop_webhook() -> None:
+            bot.bot.delete_webhook()
+            server.stop()
+        return stop_webhook
+
+    if bot.runtime:
+        # Задача polling в цикле событий - отменяется без закрытия цикла (он нужен bot.shutdown())
+        import asyncio
+        polling = asyncio.run_coroutine_threadsafe(
+            bot.runtime.async_bot.infinity_polling(timeout=30, request_timeout=60), bot.runtime.loop)
+        bot.startup.ready()
+
+        def stop_async_polling() -> None:
+            polling.cancel()
+        return stop_async_polling
+
+    thread = threading.Thread(target=bot.run, name='bot-polling', daemon=True)
+    thread.start()
+    return bot.bot.stop_polling
@@ -0,0 +1,314 @@
+# utils/load_test.py
+"""
+🏋️ НАГРУЗОЧНЫЙ ТЕСТ ПОЛНОГО ЦИКЛА ЗАКАЗА
+N техников одновременно проходят раздел -> шапка -> госномер -> дата -> номер -> исполнители -> работы ->
+материалы -> фото -> завершение. Telegram заменен локальным Bot API (utils/fake_bot_api.py), бот - настоящий
+TruckServiceManagerBot во временной папке (шаблоны копируются из проекта, email отключен).
+Итог: заказов в минуту, p50/p95/p99 ответа бота по шагам и времени заказа целиком
+
+Запуск (из папки проекта):
+    python utils/load_test.py --technicians 20 --orders 3
+    python utils/load_test.py --technicians 50 --runtime async --mode webhook --api-latency-ms 80 --album
+"""
+
+import argparse
+import contextlib
+import os
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fake_bot_api import BotCall, EDIT_METHODS, RECEIVE_MODES, FakeBotApi, serve_bot
+from modules.order_trace import percentile
+
+PROJECT_FOLDER = pathlib.Path(__file__).resolve().parent.parent
+TOKEN = '123456:LOAD-TEST'
+FIRST_CHAT_ID = 700000
+PLATE_LETTERS = 'АВЕКМНОРСТУХ'
+# Без лимитов Telegram (--no-rate-limit): замеряется только сам бот
+UNLIMITED_RATE = 1_000_000.0
+
+Predicate = Callable[[BotCall], bool]
+
+
+class OrderFailed(Exception):
+    """Бот ответил ошибкой или не ответил на шаге заказа"""
+    pass
+
+
+def message_with(*fragments: str) -> Predicate:
+    return lambda call: call.method == 'sendMessage' and all(fragment in call.text for fragment in fragments)
+
+
+def buttons_with(prefix: str) -> Predicate:
+    return lambda call: call.method == 'sendMessage' and any(data.startswith(prefix) for data in call.buttons)
+
+
+def edit_of(message_id: int) -> Predicate:
+    return lambda call: call.method in EDIT_METHODS and call.message_id == message_id
+
+
+def is_error(call: BotCall) -> bool:
+    return call.method in ('sendMessage', 'answerCallbackQuery') and call.text.startswith(('❌', '⚠️'))
+
+
+class LoadStats:
+    """Задержки ответа бота по шагам, время заказов и ошибки (потокобезопасно)"""
+
+    def __init__(self):
+        self.steps: Dict[str, List[float]] = {}
+        self.orders: List[float] = []
+        self.failures: List[str] = []
+        self._lock = threading.Lock()
+
+    def step(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.steps.setdefault(name, []).append(seconds)
+
+    def order(self, seconds: float) -> None:
+        with self._lock:
+            self.orders.append(seconds)
+
+    def failure(self, text: str) -> None:
+        with self._lock:
+            self.failures.append(text)
+
+
+class Technician:
+    """Техник в личном чате: жмет кнопки из ответов бота, как в Telegram"""
+
+    def __init__(self, api: FakeBotApi, index: int, args: argparse.Namespace, stats: LoadStats):
+        self.api = api
+        self.index = index
+        self.chat_id = FIRST_CHAT_ID + index
+        self.args = args
+        self.stats = stats
+        self.random = random.Random(index)
+        self.cursor = 0    # ответы бота до этой позиции уже разобраны
+        self.last_action = 0.0
+
+    def run(self) -> None:
+        for number in range(self.args.orders):
+            try:
+                self.run_order(number)
+            except (OrderFailed, TimeoutError) as e:
+                self.stats.failure(f"техник {self.index + 1}, заказ {number + 1}: {e}")
+                # Следующий заказ - с чистого листа
+                self.cursor = len(self.api.chat_calls(self.chat_id))
+
+    def act(self, step: str, action: Callable[[], object], expected: Predicate,
+            since: Optional[float] = None) -> BotCall:
+        """Действие техника -> ожидаемый ответ бота. Задержка - до получения ответа локальным API
+        (since - от более раннего момента, например от последнего фото)"""
+        if self.args.think_ms and since is None:
+            time.sleep(self.random.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+        started = time.perf_counter() if since is None else since
+        self.last_action = started
+        action()
+        position, call = self.api.wait_call(self.chat_id, lambda call: expected(call) or is_error(call),
+                                            self.cursor, self.args.timeout)
+        self.cursor = position + 1
+        if not expected(call):
+            raise OrderFailed(f"{step}: {call.text.splitlines()[0] if call.text else call.method}")
+        self.stats.step(step, call.at - started)
+        return call
+
+    def click(self, step: str, message: BotCall, data: str, expected: Predicate) -> BotCall:
+        return self.act(step, lambda: self.api.click(self.chat_id, data, message.message_id), expected)
+
+    def say(self, step: str, text: str, expected: Predicate) -> BotCall:
+        return self.act(step, lambda: self.api.send_text(self.chat_id, text), expected)
+
+    def pick(self, message: BotCall, prefix: str, count: int) -> List[str]:
+        options = [data for data in message.buttons if data.startswith(prefix)]
+        return self.random.sample(options, min(count, len(options)))
+
+    def run_order(self, number: int) -> None:
+        started = time.perf_counter()
+        menu = self.say('new_order', '/new_order', buttons_with('section:'))
+        reply = self.click('section', menu, self.pick(menu, 'section:', 1)[0],
+                           lambda call: buttons_with('header:')(call) or message_with('госномер')(call))
+        if reply.buttons:
+            self.click('header', reply, self.pick(reply, 'header:', 1)[0], message_with('госномер'))
+
+        letters = self.random.choices(PLATE_LETTERS, k=3)
+        plate = f"{letters[0]}{self.random.randint(1, 999):03d}{letters[1]}{letters[2]}77"
+        dates = self.say('license_plate', plate, lambda call: call.method == 'sendMessage' and bool(call.keyboard))
+        self.say('date', dates.keyboard[0], message_with('номер заказ-наряда'))
+        self.say('order_number', f"{self.index + 1}{number + 1:03d}", message_with('исполнител'))
+
+        works = self.say('workers', "Иванов, Петров", buttons_with('work:'))
+        for data in self.pick(works, 'work:', self.args.works):
+            self.click('work_toggle', works, data, edit_of(works.message_id))
+        materials = self.click('select_materials', works, 'select_materials',
+                               lambda call: buttons_with('material:')(call) or buttons_with('add_photos_yes')(call))
+        question = materials
+        if 'add_photos_yes' not in materials.buttons:
+            for data in self.pick(materials, 'material:', self.args.materials):
+                self.click('material_toggle', materials, data, edit_of(materials.message_id))
+            question = self.click('create_order', materials, 'create_order', buttons_with('add_photos_yes'))
+
+        if self.args.no_photos:
+            self.click('photos_no', question, 'add_photos_no', lambda call: call.method == 'answerCallbackQuery')
+        else:
+            self.click('photos_yes', question, 'add_photos_yes', message_with('СПЕРЕДИ'))
+            if self.args.album:
+                group = f"album-{self.chat_id}-{number}"
+                self.act('photos', lambda: [self.api.send_photo(self.chat_id, media_group_id=group) for _ in range(3)],
+                         message_with('Все 3 фото получены'))
+            else:
+                for index in range(3):
+                    self.act('photo', lambda: self.api.send_photo(self.chat_id),
+                             message_with('Все 3 фото получены' if index == 2 else 'получено'))
+
+        # ✅ ДОКУМЕНТЫ И ИТОГ - ИЗ КОНВЕЙЕРА ЗАКАЗА: ОТ ПОСЛЕДНЕГО ДЕЙСТВИЯ ТЕХНИКА ДО СООБЩЕНИЯ "СОЗДАН"
+        result = self.act('finalize', lambda: None, message_with('успешно создан'), since=self.last_action)
+        self.stats.order(result.at - started)
+
+
+def prepare_home(home: pathlib.Path) -> None:
+    """Рабочая папка бота в home: шаблоны и списки работ - копия из проекта"""
+    main_folder = home / "Desktop" / "TruckService_Manager"
+    main_folder.mkdir(parents=True, exist_ok=True)
+    templates = main_folder / "Шаблоны"
+    if not templates.exists() and (PROJECT_FOLDER / "Шаблоны").exists():
+        shutil.copytree(PROJECT_FOLDER / "Шаблоны", templates)
+    os.environ['HOME'] = os.environ['USERPROFILE'] = str(home)
+    # Нагрузочный тест не отправляет писем и не пишет руководителям
+    for name in ('EMAIL_TO', 'EMAIL_FROM', 'EMAIL_PASSWORD', 'SUPERVISOR_CHAT_IDS'):
+        os.environ[name] = ''
+
+
+def add_bot_arguments(parser: argparse.ArgumentParser) -> None:
+    """Параметры бота и локального Bot API (общие с utils/replay_updates.py)"""
+    parser.add_argument('--runtime', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--mode', choices=RECEIVE_MODES, default='polling', help="Получение обновлений ботом")
+    parser.add_argument('--workers', type=int, default=0, help="Потоков обработки обновлений (0 - как у бота)")
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help="Задержка ответа Bot API (сеть до Telegram)")
+    parser.add_argument('--no-rate-limit', action='store_true', help="Без лимитов Telegram на отправку")
+    parser.add_argument('--home', type=pathlib.Path, help="Папка данных бота (по умолчанию временная, удаляется)")
+    parser.add_argument('--verbose', action='store_true', help="Показывать вывод бота")
+
+
+@contextlib.contextmanager
+def running_bot(args: argparse.Namespace, progress) -> Iterator[Any]:
+    """TruckServiceManagerBot, получающий обновления от локального API (use_with_telebot - заранее).
+    Вывод и лог бота (в т.ч. из рабочих потоков) без --verbose - в /dev/null"""
+    quiet = open(os.devnull, 'w', encoding='utf-8')
+    try:
+        with contextlib.redirect_stdout(progress if args.verbose else quiet), \
+                contextlib.redirect_stderr(sys.stderr if args.verbose else quiet):
+            import bot as bot_module
+            bot = bot_module.TruckServiceManagerBot(TOKEN, runtime=args.runtime,
+                                                    workers=args.workers or bot_module.DEFAULT_WORKERS)
+            if args.no_rate_limit:
+                bot.bot.set_rate_limits(UNLIMITED_RATE, UNLIMITED_RATE, UNLIMITED_RATE, UNLIMITED_RATE, UNLIMITED_RATE)
+                bot.work_chat.set_rate(UNLIMITED_RATE, UNLIMITED_RATE)
+            stop_receiving = serve_bot(bot, args.mode)
+            try:
+                yield bot
+            finally:
+                stop_receiving()
+                # Публикации в рабочий чат (лимит группы) дописываются при остановке
+                print(f"⏳ Остановка бота, в очереди рабочего чата: {bot.work_chat.pending()}", file=progress)
+                bot.shutdown()
+    finally:
+        quiet.close()
+
+
+def run_technicians(api: FakeBotApi, args: argparse.Namespace, stats: LoadStats, progress) -> float:
+    """Все техники параллельно (старт с разбросом --ramp-up). Возвращает длительность, секунды"""
+    technicians = [Technician(api, index, args, stats) for index in range(args.technicians)]
+    threads = []
+    started = time.perf_counter()
+    for technician in technicians:
+        thread = threading.Thread(target=technician.run, name=f"technician-{technician.index + 1}", daemon=True)
+        thread.start()
+        threads.append(thread)
+        if args.ramp_up:
+            time.sleep(args.ramp_up / args.technicians)
+
+    total = args.technicians * args.orders
+    reported = None
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
+        done = (len(stats.orders) + len(stats.failures), len(stats.failures))
+        if done != reported:
+            print(f"⏳ Заказов: {done[0]}/{total}, ошибок: {done[1]}", file=progress, flush=True)
+            reported = done
+    return time.perf_counter() - started
+
+
+def format_report(stats: LoadStats, seconds: float, api: FakeBotApi, client_stats: Dict[str, float]) -> str:
+    completed = len(stats.orders)
+    lines = ["📊 НАГРУЗОЧНЫЙ ТЕСТ",
+             f"Заказов: {completed}, ошибок: {len(stats.failures)}, время: {seconds:.1f} с, "
+             f"заказов в минуту: {completed / seconds * 60 if seconds else 0:.1f}", "",
+             f"{'шаг':<20} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}"]
+    rows = list(stats.steps.items()) + ([('заказ целиком', stats.orders)] if stats.orders else [])
+    for name, values in rows:
+        ms = [value * 1000 for value in values]
+        lines.append(f"{name:<20} {len(ms):>7} {percentile(ms, 50):>9.1f} {percentile(ms, 95):>9.1f} "
+                     f"{percentile(ms, 99):>9.1f} {max(ms):>9.1f}")
+
+    top_methods = sorted(api.stats.items(), key=lambda item: item[1], reverse=True)
+    lines += ["", "🌐 Bot API: " + ", ".join(f"{method} {count}" for method, count in top_methods),
+              f"   загружено ботом: {api.uploaded_bytes / 1024 / 1024:.2f} МБ, "
+              f"скачано: {api.downloaded_bytes / 1024 / 1024:.2f} МБ",
+              "🚦 Лимиты отправки: " + ", ".join(f"{key} {value:g}" if isinstance(value, float) else f"{key} {value}"
+                                                 for key, value in client_stats.items())]
+    if stats.failures:
+        lines += ["", "❌ ОШИБКИ:"] + [f"  {failure}" for failure in stats.failures[:20]]
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: N техников оформляют заказы через локальный Bot API")
+    parser.add_argument('--technicians', type=int, default=10, help="Техников одновременно")
+    parser.add_argument('--orders', type=int, default=2, help="Заказов на техника (подряд)")
+    parser.add_argument('--works', type=int, default=3, help="Работ в заказе")
+    parser.add_argument('--materials', type=int, default=2, help="Материалов в заказе")
+    parser.add_argument('--album', action='store_true', help="Фото одним альбомом (по умолчанию - по одному)")
+    parser.add_argument('--no-photos', action='store_true', help="Заказы без фото")
+    add_bot_arguments(parser)
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Пауза техника перед действием (в среднем)")
+    parser.add_argument('--ramp-up', type=float, default=0.0, help="Старт техников равномерно за столько секунд")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Ожидание ответа бота на шаге, секунды")
+    parser.add_argument('--record', type=pathlib.Path,
+                        help="Записать обновления техников для utils/replay_updates.py (JSONL)")
+    args = parser.parse_args()
+
+    home = args.home or pathlib.Path(tempfile.mkdtemp(prefix='truckservice_load_'))
+    prepare_home(home)
+    api = FakeBotApi(latency=args.api_latency_ms / 1000)
+    api.start()
+    api.use_with_telebot()
+
+    stats = LoadStats()
+    print(f"🏋️ {args.technicians} техников x {args.orders} заказов, {args.runtime}/{args.mode}, "
+          f"Bot API {api.base_url}, данные: {home}")
+    try:
+        with running_bot(args, sys.stdout) as bot:
+            if args.record:
+                bot.start_update_recording(args.record.resolve())
+            seconds = run_technicians(api, args, stats, sys.stdout)
+        print(format_report(stats, seconds, api, bot.bot.stats))
+        traces = bot.main_folder / "Логи" / "order_traces.jsonl"
+        if args.home and traces.exists():
+            print(f"\n⏱️ Этапы заказов: python utils/trace_report.py \"{traces}\"")
+    finally:
+        api.stop()
+        if not args.home:
+            shutil.rmtree(home, ignore_errors=True)
+    return 1 if stats.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
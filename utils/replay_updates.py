@@ -0,0 +1,323 @@
+# utils/replay_updates.py
+"""
+📼 ВОСПРОИЗВЕДЕНИЕ ЗАПИСАННЫХ ОБНОВЛЕНИЙ
+Запись бота (python bot.py --record-updates или RECORD_UPDATES=1 -> Логи/updates/*.jsonl) подается
+настоящему TruckServiceManagerBot через локальный Bot API (utils/fake_bot_api.py) во временной папке.
+Чаты воспроизводятся параллельно, внутри чата - по порядку: следующее обновление уходит после ответа
+бота на предыдущее (как у пользователя), --speed 1 - с записанными паузами, --speed 0 - без пауз.
+Ответ закончен, когда задачи чата, заказы и загрузки фото выполнены и в чате нет новых сообщений.
+Нажатия кнопок попадают на сообщение бота с этой кнопкой из текущего прогона.
+Итог: время прогона (до завершения всех заказов и публикаций), p50/p95/p99 первого ответа бота
+по типам обновлений и ошибки Bot API - для сравнения версий
+
+Запуск (из папки проекта):
+    python utils/replay_updates.py Логи/updates/updates_20250201_090000.jsonl --speed 0
+    python utils/replay_updates.py updates.jsonl --speed 1 --max-gap 10 --runtime async --save release.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.order_trace import percentile
+from modules.update_recorder import load_recording
+from utils.fake_bot_api import EDIT_METHODS, FailedCall, FakeBotApi
+from utils.load_test import add_bot_arguments, is_error, prepare_home, running_bot
+
+# Ответ бота пользователю; answerCallbackQuery уходит сразу, до обработки нажатия - не ответ
+REPLY_METHODS = frozenset({'sendMessage', 'sendDocument', 'sendPhoto', 'sendMediaGroup'}) | EDIT_METHODS
+
+
+def record_chat(update: Dict[str, Any]) -> int:
+    if 'callback_query' in update:
+        callback = update['callback_query']
+        return (callback.get('message') or {}).get('chat', {}).get('id') or callback['from']['id']
+    return update['message']['chat']['id']
+
+
+def record_type(update: Dict[str, Any]) -> str:
+    """Строка отчета: команда, text, photo, document или callback:<раздел callback_data>"""
+    if 'callback_query' in update:
+        return "callback:" + update['callback_query'].get('data', '').split(':')[0]
+    message = update['message']
+    text = message.get('text')
+    if text is not None:
+        return text.split()[0] if text.startswith('/') else 'text'
+    for content_type in ('photo', 'document'):
+        if content_type in message:
+            return content_type
+    return 'other'
+
+
+def is_api_error(error: FailedCall) -> bool:
+    """4xx Bot API - ошибка бота. 429 повторяет клиент, "message is not modified" бот считает успехом"""
+    return 400 <= error.error_code < 500 and error.error_code != 429 \
+        and 'message is not modified' not in error.description
+
+
+def bot_idle(bot: Any, chat_id: Optional[int] = None) -> bool:
+    """Задачи чата (None - всех чатов), заказы в конвейере и загрузки фото выполнены;
+    для всего бота - и публикации в рабочий чат"""
+    if bot.dispatcher.pending(chat_id) or bot.order_pipeline.pending() or bot.photo_ingestor.pending():
+        return False
+    return chat_id is not None or bot.work_chat.idle()
+
+
+def schedule(records: List[Dict[str, Any]], max_gap: float) -> List[float]:
+    """Смещения обновлений от начала записи, паузы длиннее max_gap сокращаются до max_gap"""
+    offsets, offset = [], 0.0
+    for index, record in enumerate(records):
+        if index:
+            offset += min(max(0.0, record['ts'] - records[index - 1]['ts']), max_gap)
+        offsets.append(offset)
+    return offsets
+
+
+class ReplayStats:
+    """Задержки первого ответа по типам обновлений, обновления без ответа, ответы с ошибкой и ошибки Bot API"""
+
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.replayed = 0
+        self.unanswered: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def sent(self) -> None:
+        with self._lock:
+            self.replayed += 1
+
+    def answered(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self.latency.setdefault(kind, []).append(seconds)
+
+    def no_answer(self, kind: str) -> None:
+        with self._lock:
+            self.unanswered[kind] = self.unanswered.get(kind, 0) + 1
+
+    def error(self, text: str) -> None:
+        with self._lock:
+            self.errors.append(text)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{тип: {count, p50, p95, p99, max}} в миллисекундах"""
+        result = {}
+        for kind, values in sorted(self.latency.items()):
+            ms = [value * 1000 for value in values]
+            result[kind] = {'count': len(ms), 'p50': percentile(ms, 50), 'p95': percentile(ms, 95),
+                            'p99': percentile(ms, 99), 'max': max(ms)}
+        return result
+
+
+class ChatReplay:
+    """Обновления одного чата по порядку: пауза по записи -> обновление -> ответ бота -> бот закончил ответ"""
+
+    def __init__(self, api: FakeBotApi, bot: Any, chat_id: int, items: List[tuple], args: argparse.Namespace,
+                 stats: ReplayStats, started: float):
+        self.api = api
+        self.bot = bot
+        self.chat_id = chat_id
+        self.items = items          # [(смещение, запись)]
+        self.args = args
+        self.stats = stats
+        self.started = started
+        self.errors_seen = 0
+
+    def run(self) -> None:
+        for index, (offset, record) in enumerate(self.items):
+            if self.args.speed > 0:
+                delay = self.started + offset / self.args.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            update = record['update']
+            cursor = len(self.api.chat_calls(self.chat_id))
+            pushed = time.perf_counter()
+            self.push(update)
+            self.stats.sent()
+
+            # Фото альбома по отдельности не отвечаются - бот ждет весь альбом
+            following = self.items[index + 1][1]['update'] if index + 1 < len(self.items) else {}
+            group = update.get('message', {}).get('media_group_id')
+            if group and following.get('message', {}).get('media_group_id') == group:
+                continue
+            self.wait_reply(record_type(update), cursor, pushed)
+
+    def push(self, update: Dict[str, Any]) -> None:
+        if 'callback_query' in update:
+            callback = update['callback_query']
+            data = callback.get('data', '')
+            message_id = self.api.message_with_button(self.chat_id, data)
+            if message_id is None:
+                message_id = (callback.get('message') or {}).get('message_id', 0)
+            self.api.click(self.chat_id, data, message_id)
+            return
+        message = dict(update['message'], date=int(time.time()))
+        for size in message.get('photo', []):
+            self.api.add_file(size['file_id'])
+        if 'document' in message:
+            self.api.add_file(message['document']['file_id'])
+        self.api.push_update({'message': message})
+
+    def wait_reply(self, kind: str, cursor: int, pushed: float) -> None:
+        try:
+            position, call = self.api.wait_call(
+                self.chat_id, lambda call: call.method in REPLY_METHODS or call.method == 'answerCallbackQuery',
+                cursor, self.args.reply_timeout)
+        except TimeoutError:
+            self.stats.no_answer(kind)
+        else:
+            if call.method not in REPLY_METHODS:
+                # Нажатие подтверждено - ответ (правка, сообщение), если он есть, приходит после обработки
+                self.settle()
+                replies = [reply for reply in self.api.chat_calls(self.chat_id)[position + 1:]
+                           if reply.method in REPLY_METHODS]
+                call = replies[0] if replies else call
+            self.stats.answered(kind, call.at - pushed)
+            if is_error(call):
+                self.stats.error(f"чат {self.chat_id}, {kind}: {call.text.splitlines()[0]}")
+        # Ответ из нескольких сообщений (документы, итог заказа) - следующее обновление после всего ответа
+        self.settle()
+        self.check_errors(kind)
+
+    def settle(self) -> None:
+        """Дождаться, пока бот закончит ответ: задачи чата, заказы и загрузки фото выполнены,
+        в чате settle_ms нет новых сообщений (отправки в лимите чата ждут в задаче чата)"""
+        deadline = time.monotonic() + self.args.reply_timeout
+        position = len(self.api.chat_calls(self.chat_id))
+        while time.monotonic() < deadline:
+            try:
+                position, _ = self.api.wait_call(self.chat_id, lambda call: True, position,
+                                                 self.args.settle_ms / 1000)
+                position += 1
+            except TimeoutError:
+                if bot_idle(self.bot, self.chat_id):
+                    return
+
+    def check_errors(self, kind: str) -> None:
+        """Ошибки Bot API в этом чате с прошлой проверки - ошибки ответа на обновление kind"""
+        errors = self.api.chat_errors(self.chat_id)
+        for error in errors[self.errors_seen:]:
+            if is_api_error(error):
+                self.stats.error(f"чат {self.chat_id}, {kind}: {error.method} {error.error_code} "
+                                 f"{error.description}")
+        self.errors_seen = len(errors)
+
+
+def replay(api: FakeBotApi, bot: Any, records: List[Dict[str, Any]], args: argparse.Namespace,
+           stats: ReplayStats, progress) -> float:
+    """Все чаты параллельно, затем - до завершения всех заказов и публикаций.
+    Возвращает длительность прогона, секунды"""
+    chats: Dict[int, List[tuple]] = {}
+    for offset, record in zip(schedule(records, args.max_gap), records):
+        chats.setdefault(record_chat(record['update']), []).append((offset, record))
+
+    started = time.perf_counter()
+    threads = []
+    replays = [ChatReplay(api, bot, chat_id, items, args, stats, started) for chat_id, items in chats.items()]
+    for chat in replays:
+        thread = threading.Thread(target=chat.run, name=f"replay-{chat.chat_id}", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    reported = None
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.2)
+        if stats.replayed != reported and (reported is None or stats.replayed - reported >= 50):
+            print(f"⏳ Обновлений: {stats.replayed}/{len(records)}", file=progress, flush=True)
+            reported = stats.replayed
+
+    # Заказы, документы и публикации в рабочий чат после последнего обновления - часть прогона
+    deadline = time.monotonic() + args.drain_timeout
+    while not bot_idle(bot):
+        if time.monotonic() > deadline:
+            stats.error(f"бот не закончил работу за {args.drain_timeout:g} с после последнего обновления")
+            break
+        time.sleep(0.1)
+    seconds = time.perf_counter() - started
+
+    for chat in replays:
+        chat.check_errors('после воспроизведения')
+    for error in api.errors:
+        if error.chat_id not in chats and is_api_error(error):
+            stats.error(f"{error.method} (чат {error.chat_id}): {error.error_code} {error.description}")
+    return seconds
+
+
+def format_report(records: List[Dict[str, Any]], stats: ReplayStats, seconds: float, api: FakeBotApi) -> str:
+    recorded = records[-1]['ts'] - records[0]['ts'] if records else 0.0
+    unanswered = sum(stats.unanswered.values())
+    lines = ["📼 ВОСПРОИЗВЕДЕНИЕ",
+             f"Обновлений: {stats.replayed}, без ответа: {unanswered}, ошибок: {len(stats.errors)}",
+             f"Время прогона: {seconds:.1f} с (в записи: {recorded:.1f} с), обновлений в секунду: "
+             f"{stats.replayed / seconds if seconds else 0:.1f}", "",
+             f"{'тип':<24} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}"]
+    for kind, row in stats.summary().items():
+        lines.append(f"{kind:<24} {row['count']:>7} {row['p50']:>9.1f} {row['p95']:>9.1f} "
+                     f"{row['p99']:>9.1f} {row['max']:>9.1f}")
+    if stats.unanswered:
+        lines += ["", "🔇 Без ответа: " + ", ".join(f"{kind} {count}" for kind, count in stats.unanswered.items())]
+    top_methods = sorted(api.stats.items(), key=lambda item: item[1], reverse=True)
+    lines += ["", "🌐 Bot API: " + ", ".join(f"{method} {count}" for method, count in top_methods)]
+    if stats.errors:
+        lines += ["", "❌ ОШИБКИ (ответы бота и Bot API):"] + [f"  {error}" for error in stats.errors[:20]]
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений на локальном Bot API")
+    parser.add_argument('recording', type=pathlib.Path, help="Файл записи (JSONL)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 - паузы как в записи, 2 - вдвое быстрее, 0 - без пауз")
+    parser.add_argument('--max-gap', type=float, default=30.0, help="Паузы длиннее (секунды) сокращаются до этой")
+    parser.add_argument('--settle-ms', type=float, default=200.0,
+                        help="Ответ бота закончен, если задачи чата выполнены и столько мс нет новых сообщений")
+    parser.add_argument('--reply-timeout', type=float, default=10.0, help="Ожидание ответа бота, секунды")
+    parser.add_argument('--drain-timeout', type=float, default=120.0,
+                        help="Ожидание заказов и публикаций после последнего обновления, секунды")
+    parser.add_argument('--save', type=pathlib.Path, help="Итог в JSON (сравнение версий)")
+    add_bot_arguments(parser)
+    args = parser.parse_args()
+
+    records = load_recording(args.recording)
+    if not records:
+        print(f"❌ В записи {args.recording} нет обновлений")
+        return 1
+
+    home = args.home or pathlib.Path(tempfile.mkdtemp(prefix='truckservice_replay_'))
+    prepare_home(home)
+    api = FakeBotApi(latency=args.api_latency_ms / 1000)
+    api.start()
+    api.use_with_telebot()
+
+    stats = ReplayStats()
+    chats = len({record_chat(record['update']) for record in records})
+    print(f"📼 {len(records)} обновлений, {chats} чатов, скорость {args.speed:g}x, {args.runtime}/{args.mode}, "
+          f"данные: {home}")
+    try:
+        with running_bot(args, sys.stdout) as bot:
+            seconds = replay(api, bot, records, args, stats, sys.stdout)
+        print(format_report(records, stats, seconds, api))
+        if args.save:
+            result = {'recording': str(args.recording), 'updates': stats.replayed, 'seconds': round(seconds, 3),
+                      'unanswered': stats.unanswered, 'errors': len(stats.errors), 'latency_ms': stats.summary(),
+                      'api_calls': dict(api.stats)}
+            args.save.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+            print(f"\n💾 Итог: {args.save}")
+    finally:
+        api.stop()
+        if not args.home:
+            shutil.rmtree(home, ignore_errors=True)
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
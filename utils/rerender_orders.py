@@ -0,0 +1,85 @@
+# utils/rerender_orders.py
+"""
+🔁 ПАКЕТНАЯ ПЕРЕГЕНЕРАЦИЯ ЗАКАЗ-НАРЯДОВ
+Используется после изменения реквизитов в Шаблоны/header_templates/*.json
+
+Запуск (из папки проекта):
+    python utils/rerender_orders.py --from 01.10.2025 --to 31.10.2025 --template bridge_town
+"""
+
+import argparse
+import datetime
+import os
+import pathlib
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.excel_processor import ExcelProcessor
+from modules.document_factory import DocumentFactory
+
+SECTION_FOLDERS = {
+    'base': "Типовой_заказ",
+}
+
+
+def parse_date(text: str) -> datetime.datetime:
+    return datetime.datetime.strptime(text, '%d.%m.%Y')
+
+
+def collect_section_folders(main_folder: pathlib.Path, custom_lists_path: pathlib.Path) -> dict:
+    """Папки стандартных разделов и пользовательских списков"""
+    folders = {section_id: main_folder / folder for section_id, folder in SECTION_FOLDERS.items()}
+    if custom_lists_path.exists():
+        for list_folder in custom_lists_path.iterdir():
+            if list_folder.is_dir():
+                folders[f"custom_{list_folder.name}"] = list_folder
+    return folders
+
+
+def print_progress(done: int, total: int, elapsed: float) -> None:
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"\r⏳ [{done:>5}/{total}] {rate:6.1f} заказ/с", end='', flush=True)
+    if done == total:
+        print()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетная перегенерация заказ-нарядов")
+    parser.add_argument('--from', dest='date_from', type=parse_date, help="Дата начала ДД.ММ.ГГГГ")
+    parser.add_argument('--to', dest='date_to', type=parse_date, help="Дата окончания ДД.ММ.ГГГГ")
+    parser.add_argument('--section', help="ID раздела (base, custom_<список>) или имя папки")
+    parser.add_argument('--template', help="ID шаблона шапки")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Количество процессов")
+    parser.add_argument('--force', action='store_true', help="Перегенерировать даже без изменений")
+    parser.add_argument('--main-folder', type=pathlib.Path,
+                        default=pathlib.Path.home() / "Desktop" / "TruckService_Manager")
+    parser.add_argument('--dry-run', action='store_true', help="Только показать найденные заказы")
+    args = parser.parse_args()
+
+    factory = DocumentFactory(ExcelProcessor())
+    section_folders = collect_section_folders(args.main_folder, pathlib.Path("Пользовательские_списки"))
+
+    orders = factory.find_orders(section_folders, args.date_from, args.date_to, args.section, args.template)
+    print(f"🔍 Найдено заказов: {len(orders)}")
+
+    if args.dry_run:
+        for order in orders:
+            print(f"   📄 {order['excel_path']}")
+        return 0
+
+    stats = factory.rerender_orders(orders, workers=args.workers, force=args.force, progress=print_progress)
+
+    print("=" * 50)
+    print(f"✅ Перегенерировано: {stats['rendered']}")
+    print(f"⏭️ Без изменений: {stats['skipped']}")
+    print(f"❌ Ошибок: {stats['failed']}")
+    print(f"⏱️ Время: {stats['elapsed']:.1f} c, {stats['throughput']:.1f} заказ/с")
+    for error in stats['errors']:
+        print(f"   ❌ {error}")
+
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# utils/trace_report.py
+"""
+⏱️ ОТЧЕТ ПО ТРАССАМ ЗАКАЗОВ
+p50 / p95 / p99 по этапам и самые медленные заказы из Логи/order_traces.jsonl
+Этапы конвейера: render - DocumentFactory.create_all, persist - save_order,
+deliver_documents - отправка документов технику, work_chat_post - рабочий чат, smtp - письмо
+
+Запуск (из папки проекта):
+    python utils/trace_report.py --slowest 20
+    python utils/trace_report.py --trace 4d8aedbd8aea
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.order_trace import load_spans, format_report
+
+DEFAULT_TRACE_FILE = pathlib.Path.home() / "Desktop" / "TruckService_Manager" / "Логи" / "order_traces.jsonl"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Перцентили этапов и самые медленные заказы")
+    parser.add_argument('files', nargs='*', type=pathlib.Path, default=[DEFAULT_TRACE_FILE],
+                        help="Файлы трасс JSONL (по умолчанию Логи/order_traces.jsonl)")
+    parser.add_argument('--slowest', type=int, default=10, help="Сколько медленных заказов показать")
+    parser.add_argument('--stage', help="Только этапы, начинающиеся с этой строки (например handle_button_click)")
+    parser.add_argument('--trace', help="Все этапы одного заказа по trace_id")
+    args = parser.parse_args()
+
+    missing = [path for path in args.files if not path.exists()]
+    if missing:
+        print(f"❌ Файл трасс не найден: {', '.join(map(str, missing))}")
+        return 1
+
+    spans = load_spans(args.files)
+    if args.trace:
+        spans = sorted((span for span in spans if span['trace'] == args.trace), key=lambda span: span['ts'])
+        if not spans:
+            print(f"❌ Трасса {args.trace} не найдена")
+            return 1
+        started = spans[0]['ts'] - spans[0]['ms'] / 1000
+        for span in spans:
+            extra = {key: value for key, value in span.items() if key not in ('ts', 'trace', 'stage', 'ms')}
+            print(f"+{span['ts'] - started:8.3f} с  {span['stage']:<40} {span['ms']:>9.1f} мс  {extra or ''}")
+        return 0
+
+    if args.stage:
+        spans = [span for span in spans if span['stage'].startswith(args.stage)]
+    if not spans:
+        print("ℹ️ Нет записанных этапов")
+        return 0
+
+    print(format_report(spans, args.slowest))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())